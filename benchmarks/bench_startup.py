@@ -0,0 +1,74 @@
+"""
+Benchmark the startup time of the CLI: the wall time of `git-loc --version` (which
+ only imports the CLI entrypoint) and of `git-loc count --help` (which also imports
+ the `count` sub-command and its deps), each run in a new Python process.
+
+With `--max-ms`, it exits with code 1 if the median time of `git-loc --version` is
+ higher, so that a regression (eg. a heavy import at module level) can be caught in CI.
+
+Run with:
+$ poetry run python benchmarks/bench_startup.py --runs 20 --max-ms 150
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+# Like the `git-loc` script installed by pip.
+ENTRYPOINT = "from git_loc.cli import cli; cli()"
+# The heavy deps, that must not be imported by `git-loc --version`.
+LAZY_MODULES = ("rich", "dynaconf")
+
+
+def time_run(*args) -> float:
+    t0 = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-c", ENTRYPOINT, *args], check=True, capture_output=True
+    )
+    return (time.perf_counter() - t0) * 1000
+
+
+def get_imported_lazy_modules() -> list[str]:
+    code = (
+        "import sys; import git_loc.cli; "
+        f"print(' '.join(x for x in {LAZY_MODULES!r} if x in sys.modules))"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], check=True, capture_output=True
+    ).stdout.decode()
+    return output.split()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--max-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    # A first run, to write the .pyc files.
+    time_run("--version")
+    medians = dict()
+    for cmd_args in (("--version",), ("count", "--help")):
+        timings = [time_run(*cmd_args) for _ in range(args.runs)]
+        name = "git-loc " + " ".join(cmd_args)
+        medians[name] = statistics.median(timings)
+        print(
+            f"{name:>22}: median {medians[name]:7.1f}ms"
+            f" (min {min(timings):7.1f}ms, max {max(timings):7.1f}ms)"
+        )
+
+    is_failed = False
+    imported_lazy_modules = get_imported_lazy_modules()
+    if imported_lazy_modules:
+        print(f"Imported by the CLI entrypoint: {imported_lazy_modules}")
+        is_failed = True
+    if args.max_ms is not None and medians["git-loc --version"] > args.max_ms:
+        print(f"Slower than {args.max_ms}ms")
+        is_failed = True
+    if is_failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,29 @@
 import click
 
 from .__version__ import __version__
-from .views import introspection, main
+from .utils import command
 
 
 # The entrypoint.
 # Run in dev with: `$ poetry run git-loc`.
 # Run in prod (after a pip install) with: `$ git-loc`.
-@click.group(help="Count LOC in a Git repo branch")
+# The sub-commands (and their deps, like rich and Dynaconf) are only imported when
+#  invoked, so that the startup is fast (eg. for `$ git-loc --version`).
+@click.group(
+    cls=command.LazyGroup,
+    help="Count LOC in a Git repo branch",
+    lazy_subcommands={
+        "health": "git_loc.views.introspection._health",
+        "unhealth": "git_loc.views.introspection._unhealth",
+        "settings": "git_loc.views.introspection._settings",
+        "count": "git_loc.views.main._count",
+        "count-many": "git_loc.views.batch._count_many",
+        "cache": "git_loc.views.cache._cache",
+        "index": "git_loc.views.index._index",
+        "bench": "git_loc.views.bench._bench",
+        "serve": "git_loc.views.serve._serve",
+    },
+)
 @click.version_option(__version__)
 def cli() -> None:
     pass
-
-
-# Register all sub-commands.
-cli.add_command(introspection._health)
-cli.add_command(introspection._unhealth)
-cli.add_command(introspection._settings)
-cli.add_command(main._count)
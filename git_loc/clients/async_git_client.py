@@ -0,0 +1,252 @@
+import asyncio
+import contextlib
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, AsyncIterator, Collection, Iterator, Optional
+
+from git_loc.conf import get_settings
+from git_loc.utils.profiler import NULL_PROFILER, STAGE_PARSE, Profiler
+
+from .git_client import (
+    DIFF_BACKEND_DIFF_TREE,
+    FULL_HASH_REGEX,
+    READ_CHUNK_SIZE,
+    GitClient,
+    GitDiffEntry,
+    GitLogEntry,
+    GitProcessError,
+    LogParser,
+    NumstatParser,
+    _decrement_n_git_processes_running,
+    _increment_n_git_processes,
+)
+
+if TYPE_CHECKING:
+    from .diff_cache import DiffCache
+
+
+class AsyncGitClient(GitClient):
+    def __init__(
+        self,
+        root_dir: Path | str,
+        diff_cache: Optional["DiffCache"] = None,
+        pathspecs: Collection[str] = (),
+        profiler: Profiler = NULL_PROFILER,
+        semaphore: Optional[asyncio.Semaphore] = None,
+    ):
+        """
+        Like `GitClient`, with `alog()`, `alog_numstat()` and `adiff()`: the async
+         generators of `log()`, `log_numstat()` and `diff()`, to be used in an asyncio
+         event loop. The git processes are run with asyncio, so the loop is not
+         blocked while waiting for git.
+
+        At most `ASYNC_MAX_GIT_PROCESSES` (a setting) git processes run at the same
+         time, or as many as `semaphore` allows: share the same semaphore between
+         many clients (eg. of many repos) to limit the git processes of all of them.
+
+        With the "diff-tree" diff backend, each diff is a `git diff-tree` process
+         (not a long-running one). With the "objects" backend, the objects are read
+         in a thread. All the methods of `GitClient` (like `log()` or
+         `rev_parse()`) are inherited as they are: the blocking ones.
+        """
+        super().__init__(
+            root_dir, diff_cache=diff_cache, pathspecs=pathspecs, profiler=profiler
+        )
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(
+                get_settings().get("ASYNC_MAX_GIT_PROCESSES", 8)
+            )
+        self.semaphore = semaphore
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, exc_tb):
+        self.close()
+
+    async def _run_git_process_async(
+        self, parser: LogParser | NumstatParser, git_base_cmd, *args
+    ) -> AsyncIterator:
+        """
+        Like `GitClient._run_git_process`, but with an asyncio process, and yield the
+         items parsed by `parser` from its output (see `GitClient._parse_chunks`).
+         The process holds the semaphore until it exits.
+        """
+        run_args = self._build_run_args(git_base_cmd, *args)
+        async with self.semaphore:
+            t0 = time.perf_counter()
+            n_bytes_read = 0
+            # Stderr goes to a temp file rather than to a pipe: git could block
+            #  writing to a full stderr pipe while we are still reading stdout.
+            with tempfile.TemporaryFile() as stderr:
+                if self.DO_USE_POPEN_SHELL:
+                    process = await asyncio.create_subprocess_shell(
+                        run_args,
+                        cwd=self.root_dir,
+                        stdout=asyncio.subprocess.PIPE,
+                        stderr=stderr,
+                    )
+                else:
+                    process = await asyncio.create_subprocess_exec(
+                        *run_args,
+                        cwd=self.root_dir,
+                        stdout=asyncio.subprocess.PIPE,
+                        stderr=stderr,
+                    )
+                _increment_n_git_processes()
+                is_exhausted = False
+                try:
+                    while chunk := await process.stdout.read(READ_CHUNK_SIZE):
+                        n_bytes_read += len(chunk)
+                        with self.profiler.stage(STAGE_PARSE):
+                            items = parser.feed(chunk)
+                        for item in items:
+                            yield item
+                    with self.profiler.stage(STAGE_PARSE):
+                        items = parser.close()
+                    for item in items:
+                        yield item
+                    is_exhausted = True
+                finally:
+                    # The consumer stopped iterating early: no need to wait for git.
+                    if not is_exhausted and process.returncode is None:
+                        process.kill()
+                    returncode = await process.wait()
+                    _decrement_n_git_processes_running()
+                    self.profiler.add_git_process(
+                        time.perf_counter() - t0, n_bytes_read
+                    )
+                if returncode != 0:
+                    stderr.seek(0)
+                    raise GitProcessError(
+                        run_args, returncode, stderr.read().decode("utf-8", "replace")
+                    )
+
+    async def alog(
+        self,
+        branch: str,
+        author: Optional[str] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+    ) -> AsyncIterator[GitLogEntry]:
+        if self.is_objects_backend:
+            git_log = await asyncio.to_thread(
+                _list, self.log(branch, author, start_date, end_date)
+            )
+            for commit in git_log:
+                yield commit
+            return
+        run_args = self._build_log_args(branch, author, start_date, end_date)
+        run_args += self._build_pathspec_args()
+        commits = self._run_git_process_async(LogParser(), self.GIT_LOG_BIN, *run_args)
+        # Kill git as soon as the consumer stops iterating (see `_run_git_process`).
+        async with contextlib.aclosing(commits):
+            async for commit in commits:
+                yield commit
+
+    async def alog_numstat(
+        self,
+        branch: str,
+        author: Optional[str] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+    ) -> AsyncIterator[tuple[GitLogEntry, list[GitDiffEntry]]]:
+        """
+        Like `GitClient.log_numstat()` (see the format of the output there).
+        """
+        if self.is_objects_backend:
+            commits_with_diffs = await asyncio.to_thread(
+                _list, self.log_numstat(branch, author, start_date, end_date)
+            )
+            for commit, diff_entries in commits_with_diffs:
+                yield commit, diff_entries
+            return
+        run_args = self._build_log_args(branch, author, start_date, end_date)
+        run_args.append("--numstat")
+        run_args += self._build_pathspec_args()
+        commits_with_diffs = self._run_git_process_async(
+            LogParser(do_parse_numstat=True), self.GIT_LOG_BIN, *run_args
+        )
+        async with contextlib.aclosing(commits_with_diffs):
+            async for commit, diff_entries in commits_with_diffs:
+                yield commit, diff_entries
+
+    async def adiff(self, hash: str) -> AsyncIterator[GitDiffEntry]:
+        # The cache has the numstat of all the files: not the one of the pathspecs.
+        if self.diff_cache is None or self.pathspecs or not FULL_HASH_REGEX.match(hash):
+            async for git_diff_entry in self._diff_async(hash):
+                yield git_diff_entry
+            return
+        # The cache is a SQLite db: the queries run in a thread, not to block the
+        #  loop (the connection is shared by the threads, see `DiffCache`).
+        git_diff_entries = await asyncio.to_thread(
+            self.diff_cache.get, hash, self.GIT_DIFF_BACKEND
+        )
+        if git_diff_entries is None:
+            git_diff_entries = [x async for x in self._diff_async(hash)]
+            await asyncio.to_thread(
+                self.diff_cache.set, hash, self.GIT_DIFF_BACKEND, git_diff_entries
+            )
+        for git_diff_entry in git_diff_entries:
+            yield git_diff_entry
+
+    async def _diff_async(self, hash: str) -> AsyncIterator[GitDiffEntry]:
+        if self.is_objects_backend:
+            git_diff_entries = await asyncio.to_thread(_list, self._diff(hash))
+            for git_diff_entry in git_diff_entries:
+                yield git_diff_entry
+            return
+        if self.GIT_DIFF_BACKEND == DIFF_BACKEND_DIFF_TREE and FULL_HASH_REGEX.match(
+            hash
+        ):
+            # Ref. command:
+            # $ git diff-tree --no-commit-id -z --numstat -r --root -M 2fdffa2
+            # The same output as the long-running `git diff-tree --stdin` process.
+            git_diff_entries = self._run_git_process_async(
+                NumstatParser(),
+                self.GIT_DIFF_BIN,
+                "diff-tree",
+                "--no-commit-id",
+                "-z",
+                "--numstat",
+                "-r",
+                "--root",
+                "-M",
+                hash,
+                *self._build_pathspec_args(),
+            )
+            async with contextlib.aclosing(git_diff_entries):
+                async for git_diff_entry in git_diff_entries:
+                    yield git_diff_entry
+            return
+
+        # Ref. command:
+        # $ git diff -z --numstat 2fdffa2~1 2fdffa2
+        git_diff_entries = self._run_git_process_async(
+            NumstatParser(),
+            self.GIT_DIFF_BIN,
+            "diff",
+            "-z",
+            "--numstat",
+            f"{hash}~1",
+            hash,
+            *self._build_pathspec_args(),
+        )
+        try:
+            async with contextlib.aclosing(git_diff_entries):
+                async for git_diff_entry in git_diff_entries:
+                    yield git_diff_entry
+        except GitProcessError as exc:
+            # A root commit has no parent, so `hash~1` is an unknown revision (or a
+            #  bad revision, with pathspecs): there is no diff to yield.
+            if "unknown revision" not in exc.stderr and (
+                f"bad revision '{hash}~1'" not in exc.stderr
+            ):
+                raise
+
+
+def _list(iterator: Iterator) -> list:
+    # The (blocking) iteration of a generator of `GitClient`, to run in a thread.
+    return list(iterator)
@@ -0,0 +1,174 @@
+import sqlite3
+import threading
+from collections import namedtuple
+from pathlib import Path
+from typing import Iterator, Optional
+
+from ..conf import get_settings
+from ..utils.cache_dir import get_cache_dir, get_repo_cache_dir
+from .git_client import GitDiffEntry, parse_diff_line
+
+DIFF_CACHE_FILE_NAME = "numstat.sqlite3"
+# The version of the format of the rows: the rows of an older version are dropped.
+#  2: NUL-terminated rows, with the destination path of renames.
+DIFF_CACHE_VERSION = 2
+
+DiffCacheStats = namedtuple(
+    "DiffCacheStats", ("root_dir", "path", "n_commits", "size_bytes")
+)
+
+
+class DiffCache:
+    # Commit the pending writes every N writes.
+    COMMIT_EVERY_N_WRITES = 1000
+
+    def __init__(self, root_dir: Path | str, max_size_bytes: Optional[int] = None):
+        """
+        Persistent cache of the numstat of commits of a repo, keyed by the full commit
+         hash: the numstat of a commit against its parent never changes.
+
+        The cache is a SQLite db in the repo cache dir, like:
+         ~/.cache/git-loc/mierecensioni-be-1f3a6b2c9d0e/numstat.sqlite3
+        When it grows over `max_size_bytes`, the least recently used commits are
+         evicted (on `close()`).
+        """
+        self.path = get_repo_cache_dir(root_dir) / DIFF_CACHE_FILE_NAME
+        if max_size_bytes is None:
+            max_size_bytes = (
+                get_settings().get("DIFF_CACHE_MAX_SIZE_MB", 100) * 1024 * 1024
+            )
+        self.max_size_bytes = max_size_bytes
+
+        # The connection is shared by the threads that run `GitClient.diff`.
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        version = self._connection.execute("PRAGMA user_version").fetchone()[0]
+        if version != DIFF_CACHE_VERSION:
+            self._connection.execute("DROP TABLE IF EXISTS numstat")
+            self._connection.execute(f"PRAGMA user_version = {DIFF_CACHE_VERSION}")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS numstat ("
+            " hash TEXT NOT NULL,"
+            " backend TEXT NOT NULL,"
+            " rows TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " accessed_at INTEGER NOT NULL,"
+            " PRIMARY KEY (hash, backend)"
+            ")"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS numstat_accessed_at ON numstat (accessed_at)"
+        )
+        self._connection.commit()
+        # A logical clock for the LRU eviction.
+        self._clock = self._connection.execute(
+            "SELECT COALESCE(MAX(accessed_at), 0) FROM numstat"
+        ).fetchone()[0]
+        # Hits are recorded in memory and written on commit, to keep reads cheap.
+        self._hits: dict[tuple[str, str], int] = dict()
+        self._n_pending_writes = 0
+
+    def get(self, hash: str, backend: str) -> Optional[list[GitDiffEntry]]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT rows FROM numstat WHERE hash = ? AND backend = ?",
+                (hash, backend),
+            ).fetchone()
+            if row is None:
+                return None
+            self._clock += 1
+            self._hits[(hash, backend)] = self._clock
+        return [parse_diff_line(line) for line in row[0].split("\0") if line]
+
+    def set(self, hash: str, backend: str, git_diff_entries: list[GitDiffEntry]):
+        # Store the rows in the same format as git numstat, NUL-terminated (as the
+        #  paths can include newlines).
+        rows = "".join(
+            f"{x.insertions}\t{x.deletions}\t{x.path}\0" for x in git_diff_entries
+        )
+        with self._lock:
+            self._clock += 1
+            self._connection.execute(
+                "INSERT OR REPLACE INTO numstat VALUES (?, ?, ?, ?, ?)",
+                (hash, backend, rows, len(hash) + len(rows), self._clock),
+            )
+            self._n_pending_writes += 1
+            if self._n_pending_writes >= self.COMMIT_EVERY_N_WRITES:
+                self._commit()
+
+    def _commit(self):
+        self._connection.executemany(
+            "UPDATE numstat SET accessed_at = ? WHERE hash = ? AND backend = ?",
+            ((clock, hash, backend) for (hash, backend), clock in self._hits.items()),
+        )
+        self._connection.commit()
+        self._hits = dict()
+        self._n_pending_writes = 0
+
+    def evict(self):
+        """
+        Delete the least recently used commits until the total size is under the cap.
+        """
+        with self._lock:
+            self._commit()
+            self._connection.execute(
+                "DELETE FROM numstat WHERE rowid IN ("
+                " SELECT rowid FROM ("
+                "  SELECT rowid, SUM(size) OVER (ORDER BY accessed_at DESC) AS tot_size"
+                "  FROM numstat"
+                " ) WHERE tot_size > ?"
+                ")",
+                (self.max_size_bytes,),
+            )
+            self._connection.commit()
+
+    def close(self):
+        if self._connection is None:
+            return
+        self.evict()
+        with self._lock:
+            self._connection.close()
+            self._connection = None
+
+
+def iter_stats() -> Iterator[DiffCacheStats]:
+    """
+    Yield the stats of the diff cache of all repos.
+    """
+    cache_dir = get_cache_dir()
+    if not cache_dir.is_dir():
+        return
+    for path in sorted(cache_dir.glob(f"*/{DIFF_CACHE_FILE_NAME}")):
+        root_dir_file = path.parent / "root_dir"
+        root_dir = root_dir_file.read_text() if root_dir_file.is_file() else None
+        connection = sqlite3.connect(path)
+        try:
+            n_commits, size_bytes = connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM numstat"
+            ).fetchone()
+        finally:
+            connection.close()
+        yield DiffCacheStats(
+            root_dir=root_dir,
+            path=path,
+            n_commits=n_commits,
+            size_bytes=size_bytes,
+        )
+
+
+def clear(root_dir: Optional[Path | str] = None) -> int:
+    """
+    Delete the diff cache of the given repo, or of all repos.
+    Return the number of caches deleted.
+    """
+    if root_dir is not None:
+        # Do not create the cache dir of a repo that has none.
+        paths = [get_repo_cache_dir(root_dir, do_create=False) / DIFF_CACHE_FILE_NAME]
+    else:
+        paths = list(get_cache_dir().glob(f"*/{DIFF_CACHE_FILE_NAME}"))
+    n_deleted = 0
+    for path in paths:
+        if path.is_file():
+            path.unlink()
+            n_deleted += 1
+    return n_deleted
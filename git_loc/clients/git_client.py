@@ -1,14 +1,65 @@
+import itertools
+import re
+import shlex
 import subprocess
-from collections import namedtuple
-from datetime import datetime
+import tempfile
+import threading
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Iterator, Optional
+from typing import TYPE_CHECKING, Collection, Iterable, Iterator, Optional
 
-from git_loc.conf import settings
+from git_loc.conf import get_settings
+from git_loc.utils.profiler import NULL_PROFILER, STAGE_PARSE, Profiler
 
-GitLogEntry = namedtuple("GitLogEntry", ("hash", "date", "email", "summary"))
+if TYPE_CHECKING:
+    from .diff_cache import DiffCache
+    from .git_objects import GitObjectsReader
+
+# `date` is the author date in its own timezone (like 2020-02-10), `timestamp` the
+#  author time in seconds since the epoch (to compare dates as integers).
+GitLogEntry = namedtuple(
+    "GitLogEntry",
+    ("hash", "date", "email", "summary", "timestamp"),
+    defaults=(None,),
+)
+# `insertions` and `deletions` are "-" for binary files. `path` is the destination
+#  path for renames.
 GitDiffEntry = namedtuple("GitDiffEntry", ("insertions", "deletions", "path"))
 
+# The format of each commit in `git log -z`: the full hash, the author timestamp, the
+#  author date, the author email and the subject with the ref names, each one
+#  NUL-terminated, so they are framed exactly whatever their content.
+LOG_FORMAT = "%H%x00%at%x00%ad%x00%ae%x00%s%d%x00"
+N_LOG_FIELDS = 5
+
+# The max size of the chunks read from the stdout of git.
+READ_CHUNK_SIZE = 2**16
+
+# Backends for `GitClient.diff`:
+#  - "diff": one `git diff` process per commit.
+#  - "diff-tree": one long-running `git diff-tree --stdin` process.
+DIFF_BACKEND_DIFF = "diff"
+DIFF_BACKEND_DIFF_TREE = "diff-tree"
+
+# Backends for `GitClient`:
+#  - "subprocess": run git processes.
+#  - "objects": read the objects database directly, with no git process (see
+#     `GitObjectsReader`).
+GIT_BACKEND_SUBPROCESS = "subprocess"
+GIT_BACKEND_OBJECTS = "objects"
+
+# A full SHA-1 or SHA-256 commit hash.
+FULL_HASH_REGEX = re.compile(r"^([0-9a-f]{40}|[0-9a-f]{64})$")
+
+# The number of git processes started in this Python process (see `git-loc bench`),
+#  and of the ones still running (see `Progress`).
+_n_git_processes = 0
+_n_git_processes_running = 0
+_n_git_processes_lock = threading.Lock()
+
 
 class BaseGitClientException(Exception):
     pass
@@ -19,48 +70,294 @@ class NotADate(BaseGitClientException):
         self.date = date
 
 
+class GitProcessError(BaseGitClientException):
+    def __init__(self, run_args, returncode: int, stderr: str):
+        self.run_args = run_args
+        self.returncode = returncode
+        self.stderr = stderr
+
+    def __str__(self):
+        return f"Git process exited with {self.returncode}: {self.stderr.strip()}"
+
+
+class GitDiffTreeProcessDied(BaseGitClientException):
+    def __init__(self, stderr: str):
+        self.stderr = stderr
+
+
+class GitDiffTreeProcess:
+    def __init__(
+        self,
+        run_args,
+        root_dir: Path | str,
+        do_use_popen_shell: bool,
+        profiler: Profiler = NULL_PROFILER,
+    ):
+        """
+        A long-running `git diff-tree --stdin -z` process: commit hashes are written
+         to its stdin and their numstat is read back from its stdout.
+
+        Each hash is followed by an empty line: diff-tree echoes the lines it does not
+         understand, so the (not NUL-terminated) newline marks the end of the numstat
+         of the commit.
+        """
+        self.run_args = run_args
+        self.root_dir = root_dir
+        self.do_use_popen_shell = do_use_popen_shell
+        self.profiler = profiler
+        self.process: Optional[subprocess.Popen] = None
+        self.stderr = None
+        self.t0 = None
+
+    def _start(self):
+        self.stderr = tempfile.TemporaryFile()
+        self.t0 = time.perf_counter()
+        self.process = _popen(
+            self.run_args,
+            cwd=self.root_dir,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=self.stderr,
+            shell=self.do_use_popen_shell,
+        )
+
+    def numstat(self, hash: str) -> list[GitDiffEntry]:
+        """
+        Return the numstat of the given commit (a full hash).
+        If the process died, then restart it and retry once.
+        """
+        if self.process is None or self.process.poll() is not None:
+            self.close()
+            self._start()
+        try:
+            return self._numstat(hash)
+        except (BrokenPipeError, GitDiffTreeProcessDied):
+            self.close()
+            self._start()
+            return self._numstat(hash)
+
+    def _numstat(self, hash: str) -> list[GitDiffEntry]:
+        self.process.stdin.write(f"{hash}\n\n".encode("utf-8"))
+        self.process.stdin.flush()
+        # The output is the hash and the numstat records (NUL-terminated), then the
+        #  echoed newline, like: b"2fdf...\0" b"31\t10\tgit_loc/main.py\0" b"\n".
+        parser = NumstatParser()
+        diff_entries = list()
+        is_hash_read = False
+        buffer = b""
+        while True:
+            chunk = self.process.stdout.read1(READ_CHUNK_SIZE)
+            if not chunk:
+                self.stderr.seek(0)
+                raise GitDiffTreeProcessDied(
+                    self.stderr.read().decode("utf-8", "replace")
+                )
+            self.profiler.add_git_bytes_read(len(chunk))
+            buffer += chunk
+            with self.profiler.stage(STAGE_PARSE):
+                start = 0
+                while True:
+                    # A path can start with a newline, but not a numstat record.
+                    if (
+                        is_hash_read
+                        and not parser.is_in_rename
+                        and buffer.startswith(b"\n", start)
+                    ):
+                        return diff_entries
+                    end = buffer.find(b"\0", start)
+                    if end == -1:
+                        break
+                    record = buffer[start:end]
+                    start = end + 1
+                    if not is_hash_read:
+                        is_hash_read = True
+                        continue
+                    git_diff_entry = parser.feed_record(record)
+                    if git_diff_entry is not None:
+                        diff_entries.append(git_diff_entry)
+                buffer = buffer[start:]
+
+    def close(self):
+        if self.process is not None:
+            try:
+                self.process.stdin.close()
+            except BrokenPipeError:
+                pass
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+            self.process.stdout.close()
+            self.process = None
+            _decrement_n_git_processes_running()
+            self.profiler.add_git_process(time.perf_counter() - self.t0, 0)
+        if self.stderr is not None:
+            self.stderr.close()
+            self.stderr = None
+
+
 class GitClient:
-    def __init__(self, root_dir: Path | str):
+    def __init__(
+        self,
+        root_dir: Path | str,
+        diff_cache: Optional["DiffCache"] = None,
+        pathspecs: Collection[str] = (),
+        profiler: Profiler = NULL_PROFILER,
+    ):
+        """
+        If `diff_cache` is given, then `diff()` reads and writes the numstat of
+         commits (identified by their full hash) from/to it.
+
+        `pathspecs` (see `build_pathspecs`) limit the log to the commits that modify
+         the matching files, and the diffs to the matching files. Git filters them
+         itself, so it can skip the other commits with the changed-path Bloom filters
+         of the commit-graph (if written). The diffs are not cached then.
+
+        `profiler` collects the git processes run, the bytes read from them and the
+         time spent parsing their output (see `Profiler`).
+        """
         self.root_dir = root_dir
+        self.diff_cache = diff_cache
+        self.pathspecs = list(pathspecs)
+        self.profiler = profiler
 
+        settings = get_settings()
         # Or: "/usr/local/bin/git".
         self.GIT_LOG_BIN = settings.get("GIT_LOG_BIN", "git")
         self.GIT_DIFF_BIN = settings.get("GIT_DIFF_BIN", "git")
         self.DO_USE_POPEN_SHELL = settings.get("DO_USE_POPEN_SHELL", False)
+        self.GIT_DIFF_BACKEND = settings.get("GIT_DIFF_BACKEND", DIFF_BACKEND_DIFF)
+        self.GIT_BACKEND = settings.get("GIT_BACKEND", GIT_BACKEND_SUBPROCESS)
+        self._objects_reader: Optional["GitObjectsReader"] = None
+        self._objects_reader_lock = threading.Lock()
 
-    def _run_git_process(self, git_base_cmd, *args):
+        # One `git diff-tree` process per thread, so that diffs can still run in
+        #  parallel (see `LocCounter.count` with `jobs`).
+        self._diff_tree_local = threading.local()
+        self._diff_tree_processes: list[GitDiffTreeProcess] = list()
+        self._diff_tree_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.close()
+
+    def close(self):
+        """
+        Stop the long-running processes, if any.
+        """
+        with self._diff_tree_lock:
+            for process in self._diff_tree_processes:
+                process.close()
+            self._diff_tree_processes = list()
+            self._diff_tree_local = threading.local()
+        with self._objects_reader_lock:
+            if self._objects_reader is not None:
+                self._objects_reader.close()
+                self._objects_reader = None
+
+    def _get_objects_reader(self) -> "GitObjectsReader":
+        with self._objects_reader_lock:
+            if self._objects_reader is None:
+                # Imported here, as it is only needed by the objects backend.
+                from .git_objects import GitObjectsReader
+
+                self._objects_reader = GitObjectsReader(self.root_dir)
+            return self._objects_reader
+
+    @property
+    def is_objects_backend(self) -> bool:
+        return self.GIT_BACKEND == GIT_BACKEND_OBJECTS
+
+    def _build_run_args(self, git_base_cmd, *args):
         run_args = (git_base_cmd,) + args
         if self.DO_USE_POPEN_SHELL:
             run_args = " ".join(run_args)
-        return subprocess.run(
+        return run_args
+
+    def _build_pathspec_args(self) -> list[str]:
+        if not self.pathspecs:
+            return list()
+        pathspecs = self.pathspecs
+        # Unlike the other args, the pathspecs come from the user: quote them.
+        if self.DO_USE_POPEN_SHELL:
+            pathspecs = [shlex.quote(x) for x in pathspecs]
+        return ["--", *pathspecs]
+
+    def _run_git_process(self, git_base_cmd, *args) -> Iterator[bytes]:
+        """
+        Run a git process and yield its stdout in chunks of bytes as soon as git
+         writes them, so the memory used does not depend on the size of the output.
+        Raise GitProcessError if the process exits with a non-zero code.
+        """
+        run_args = self._build_run_args(git_base_cmd, *args)
+        t0 = time.perf_counter()
+        n_bytes_read = 0
+        # Stderr goes to a temp file rather than to a pipe: git could block writing
+        #  to a full stderr pipe while we are still reading stdout.
+        with tempfile.TemporaryFile() as stderr, _popen(
             run_args,
             cwd=self.root_dir,
-            capture_output=True,
+            stdout=subprocess.PIPE,
+            stderr=stderr,
             shell=self.DO_USE_POPEN_SHELL,
-        )
+        ) as process:
+            is_exhausted = False
+            try:
+                while chunk := process.stdout.read1(READ_CHUNK_SIZE):
+                    n_bytes_read += len(chunk)
+                    yield chunk
+                is_exhausted = True
+            finally:
+                # The consumer stopped iterating early: no need to wait for git.
+                if not is_exhausted:
+                    process.kill()
+                returncode = process.wait()
+                _decrement_n_git_processes_running()
+                self.profiler.add_git_process(time.perf_counter() - t0, n_bytes_read)
+            if returncode != 0:
+                stderr.seek(0)
+                raise GitProcessError(
+                    run_args, returncode, stderr.read().decode("utf-8", "replace")
+                )
 
-    def log(
+    def _build_log_args(
         self,
         branch: str,
         author: Optional[str] = None,
         start_date: Optional[datetime] = None,
         end_date: Optional[datetime] = None,
-    ) -> Iterator[GitLogEntry]:
+    ) -> list[str]:
         # Ref. command:
         # $ git log master \
-        #   --pretty=format:"%h %ad %ae %s%d" \
+        #   -z \
+        #   --pretty=format:"%H%x00%at%x00%ad%x00%ae%x00%s%d%x00" \
         #   --date=short \
         #   --no-merges \
         #   --since="2021-01-01" \
         #   --before="2021-12-31" \
-        #   --author="paolo"
+        #   --author="paolo" \
+        #   --full-history \
+        #   -- services/payments ':(exclude)*.lock'
         run_args = [
             "log",
             branch,
-            "--pretty=format:'%h %ad %ae %s%d'",
+            "-z",
+            f"--pretty=format:{LOG_FORMAT}",
             "--date=short",
-            "--no-merges",
         ]
+        return run_args + self._build_log_filter_args(author, start_date, end_date)
+
+    def _build_log_filter_args(
+        self,
+        author: Optional[str] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+    ) -> list[str]:
+        # The args that select the commits, shared by `git log` and `git rev-list`.
+        run_args = ["--no-merges"]
         if start_date:
             if not isinstance(start_date, datetime):
                 raise NotADate(start_date)
@@ -72,36 +369,522 @@ class GitClient:
         if author:
             # No need to use quotes even if `author` includes a whitespace.
             run_args.append(f"--author={author}")
-        result = self._run_git_process(self.GIT_LOG_BIN, *run_args)
-        for commit in result.stdout.decode("utf-8").split("\n"):
-            if not commit:
-                continue
-            tokens: str = commit.split(" ")
-            # Tokens is a string like:
-            # 2fdffa2 2020-02-10 foo@gmail.com NEW Enable CORS for qa.mierecensioni.it (HEAD -> master, origin/master)
-            yield GitLogEntry(
-                hash=tokens[0][1:],  # Slice to remove the initial quote.
-                date=tokens[1],
-                email=tokens[2],
-                # Combine summary (subject in Git terms) and ref name, but remove the
-                #  ending quote.
-                summary=" ".join(tokens[3:])[:-1],
+        if self.pathspecs:
+            # Do not simplify the history: also walk the side branches of merges
+            #  which did not change the matching files, like without pathspecs.
+            run_args.append("--full-history")
+        return run_args
+
+    def log(
+        self,
+        branch: str,
+        author: Optional[str] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+    ) -> Iterator[GitLogEntry]:
+        run_args = self._build_log_args(branch, author, start_date, end_date)
+        run_args += self._build_pathspec_args()
+        if self.is_objects_backend:
+            chunks = self._get_objects_reader().log_output(
+                branch, author, start_date, end_date, self.pathspecs
+            )
+        else:
+            chunks = self._run_git_process(self.GIT_LOG_BIN, *run_args)
+        yield from self._parse_chunks(LogParser(), chunks)
+
+    def log_numstat(
+        self,
+        branch: str,
+        author: Optional[str] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+    ) -> Iterator[tuple[GitLogEntry, list[GitDiffEntry]]]:
+        """
+        Like `log()` but also get the numstat of each commit, in a single `git log`
+         process (instead of one `git diff` process per commit).
+
+        Notice that root commits (commits with no parent) are also diffed (against the
+         empty tree) while `diff()` returns nothing for them.
+        """
+        # Ref. command:
+        # $ git log master \
+        #   -z \
+        #   --pretty=format:"%H%x00%at%x00%ad%x00%ae%x00%s%d%x00" \
+        #   --date=short \
+        #   --no-merges \
+        #   --numstat
+        run_args = self._build_log_args(branch, author, start_date, end_date)
+        run_args.append("--numstat")
+        run_args += self._build_pathspec_args()
+        if self.is_objects_backend:
+            reader = self._get_objects_reader()
+            chunks = reader.log_output(
+                branch, author, start_date, end_date, self.pathspecs
             )
+            for commit in self._parse_chunks(LogParser(), chunks):
+                output = reader.numstat_output(
+                    commit.hash, do_diff_root=True, pathspecs=self.pathspecs
+                )
+                yield commit, list(self._parse_chunks(NumstatParser(), (output,)))
+            return
+
+        chunks = self._run_git_process(self.GIT_LOG_BIN, *run_args)
+        yield from self._parse_chunks(LogParser(do_parse_numstat=True), chunks)
+
+    def rev_list(
+        self,
+        branch: str,
+        author: Optional[str] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+    ) -> Iterator[str]:
+        """
+        Yield the full hashes of the commits of `log()`, in the same order.
+        """
+        if self.is_objects_backend:
+            for commit in self.log(branch, author, start_date, end_date):
+                yield commit.hash
+            return
+        # Ref. command:
+        # $ git rev-list master --no-merges --since="2021-01-01" --author="paolo"
+        run_args = ["rev-list", branch]
+        run_args += self._build_log_filter_args(author, start_date, end_date)
+        run_args += self._build_pathspec_args()
+        rest = b""
+        for chunk in self._run_git_process(self.GIT_LOG_BIN, *run_args):
+            *lines, rest = (rest + chunk).split(b"\n")
+            for line in lines:
+                yield line.decode("ascii")
+        if rest:
+            yield rest.decode("ascii")
+
+    def rev_list_count(
+        self,
+        branch: str,
+        author: Optional[str] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+    ) -> Optional[int]:
+        """
+        Return the number of commits of `log()`, or None with the "objects" backend
+         (where counting them means reading the whole history).
+        """
+        if self.is_objects_backend:
+            return None
+        # Ref. command:
+        # $ git rev-list --count master --no-merges --since="2021-01-01"
+        run_args = ["rev-list", "--count", branch]
+        run_args += self._build_log_filter_args(author, start_date, end_date)
+        run_args += self._build_pathspec_args()
+        return int(b"".join(self._run_git_process(self.GIT_LOG_BIN, *run_args)))
+
+    def log_sharded(
+        self,
+        branch: str,
+        author: Optional[str] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        jobs: int = 2,
+        do_parse_numstat: bool = False,
+    ) -> Iterator:
+        """
+        Like `log()` (or `log_numstat()`, with `do_parse_numstat`), with the same
+         output, but run up to `jobs` `git log` processes at the same time, each one
+         on a shard of the history.
+
+        The hashes of the commits are listed by a single `git rev-list` (which walks
+         the history but does not format the commits, nor diff them), and split in
+         shards of `LOG_SHARD_SIZE` (a setting) consecutive commits. Each shard is
+         formatted (and diffed) by a `git log --no-walk` of its hashes, in a thread,
+         and the shards are yielded in order. The shards are disjoint, so no commit
+         is yielded twice, and only up to `2 * jobs` shards are pending at any time,
+         to bound the memory.
+        """
+        if jobs <= 1 or self.is_objects_backend:
+            if do_parse_numstat:
+                yield from self.log_numstat(branch, author, start_date, end_date)
+            else:
+                yield from self.log(branch, author, start_date, end_date)
+            return
+        shard_size = get_settings().get("LOG_SHARD_SIZE", 1000)
+        executor = ThreadPoolExecutor(max_workers=jobs)
+        pending = deque()
+        try:
+            hashes = self.rev_list(branch, author, start_date, end_date)
+            while shard := list(itertools.islice(hashes, shard_size)):
+                pending.append(
+                    executor.submit(self._log_shard, shard, do_parse_numstat)
+                )
+                if len(pending) >= 2 * jobs:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _log_shard(self, hashes: Collection[str], do_parse_numstat: bool) -> list:
+        # Ref. command:
+        # $ git log --no-walk=unsorted \
+        #   -z \
+        #   --pretty=format:"%H%x00%at%x00%ad%x00%ae%x00%s%d%x00" \
+        #   --date=short \
+        #   --numstat \
+        #   2fdffa2... 1e2c6d1... -- services/payments
+        run_args = ["log", "--no-walk=unsorted", "-z", f"--pretty=format:{LOG_FORMAT}"]
+        run_args.append("--date=short")
+        if do_parse_numstat:
+            run_args.append("--numstat")
+        run_args += hashes
+        run_args += self._build_pathspec_args()
+        chunks = self._run_git_process(self.GIT_LOG_BIN, *run_args)
+        return list(self._parse_chunks(LogParser(do_parse_numstat), chunks))
+
+    def rev_parse(self, rev: str) -> str:
+        """
+        Return the full hash of the commit `rev` (eg. a branch name).
+        """
+        if self.is_objects_backend:
+            return self._get_objects_reader().resolve(rev)
+        # Ref. command:
+        # $ git rev-parse --verify master^{commit}
+        chunks = self._run_git_process(
+            self.GIT_LOG_BIN, "rev-parse", "--verify", f"{rev}^{{commit}}"
+        )
+        return b"".join(chunks).decode("ascii").strip()
+
+    def is_ancestor(self, ancestor: str, descendant: str) -> bool:
+        """
+        Return True if the commit `ancestor` is an ancestor of (or the same commit as)
+         `descendant`. Return False also if `ancestor` does not exist anymore (eg. its
+         history was rewritten and it was garbage collected).
+        """
+        if self.is_objects_backend:
+            return self._get_objects_reader().is_ancestor(ancestor, descendant)
+        # Ref. command:
+        # $ git merge-base --is-ancestor 2fdffa2 master
+        try:
+            for _ in self._run_git_process(
+                self.GIT_LOG_BIN, "merge-base", "--is-ancestor", ancestor, descendant
+            ):
+                pass
+        except GitProcessError as exc:
+            # Exit code 1 means: not an ancestor; 128: `ancestor` is not a commit.
+            if exc.returncode in (1, 128):
+                return False
+            raise
+        return True
 
     def diff(self, hash: str) -> Iterator[GitDiffEntry]:
+        # The cache has the numstat of all the files: not the one of the pathspecs.
+        if self.diff_cache is None or self.pathspecs or not FULL_HASH_REGEX.match(hash):
+            yield from self._diff(hash)
+            return
+        git_diff_entries = self.diff_cache.get(hash, self.GIT_DIFF_BACKEND)
+        if git_diff_entries is None:
+            git_diff_entries = list(self._diff(hash))
+            self.diff_cache.set(hash, self.GIT_DIFF_BACKEND, git_diff_entries)
+        yield from git_diff_entries
+
+    def _diff(self, hash: str) -> Iterator[GitDiffEntry]:
+        if self.is_objects_backend:
+            # The same output as the (subprocess) diff backend in use.
+            is_diff_tree = self.GIT_DIFF_BACKEND == DIFF_BACKEND_DIFF_TREE
+            output = self._get_objects_reader().numstat_output(
+                hash,
+                do_diff_root=is_diff_tree,
+                do_diff_merges=not is_diff_tree,
+                pathspecs=self.pathspecs,
+            )
+            yield from self._parse_chunks(NumstatParser(), (output,))
+            return
+        if self.GIT_DIFF_BACKEND == DIFF_BACKEND_DIFF_TREE and FULL_HASH_REGEX.match(
+            hash
+        ):
+            yield from self._diff_tree_numstat(hash)
+            return
+
         # Ref. command:
-        # $ git diff --numstat 2fdffa2~1 2fdffa2
-        result = self._run_git_process(
-            self.GIT_DIFF_BIN, "diff", "--numstat", f"{hash}~1", hash
+        # $ git diff -z --numstat 2fdffa2~1 2fdffa2
+        chunks = self._run_git_process(
+            self.GIT_DIFF_BIN,
+            "diff",
+            "-z",
+            "--numstat",
+            f"{hash}~1",
+            hash,
+            *self._build_pathspec_args(),
         )
-        for file_diff_stats in result.stdout.decode("utf-8").split("\n"):
-            if not file_diff_stats:
-                continue
-            tokens: str = file_diff_stats.split("\t")
-            # Tokens is a string like:
-            # 31	10	git_loc/main.py
-            yield GitDiffEntry(
-                insertions=tokens[0],
-                deletions=tokens[1],
-                path=tokens[2],
+        try:
+            yield from self._parse_chunks(NumstatParser(), chunks)
+        except GitProcessError as exc:
+            # A root commit has no parent, so `hash~1` is an unknown revision (or a
+            #  bad revision, with pathspecs): there is no diff to yield.
+            if "unknown revision" not in exc.stderr and (
+                f"bad revision '{hash}~1'" not in exc.stderr
+            ):
+                raise
+
+    def _diff_tree_numstat(self, hash: str) -> list[GitDiffEntry]:
+        process = getattr(self._diff_tree_local, "process", None)
+        if process is None:
+            # Ref. command:
+            # $ git diff-tree --stdin -z --numstat -r --root -M --always
+            # Where:
+            #  -r: recurse into subdirs, like `git diff`
+            #  --root: diff root commits against the empty tree
+            #  -M: detect renames, like `git diff`
+            #  --always: print the commit hash even if the diff is empty
+            run_args = self._build_run_args(
+                self.GIT_DIFF_BIN,
+                "diff-tree",
+                "--stdin",
+                "-z",
+                "--numstat",
+                "-r",
+                "--root",
+                "-M",
+                "--always",
+                *self._build_pathspec_args(),
             )
+            process = GitDiffTreeProcess(
+                run_args, self.root_dir, self.DO_USE_POPEN_SHELL, self.profiler
+            )
+            self._diff_tree_local.process = process
+            with self._diff_tree_lock:
+                self._diff_tree_processes.append(process)
+        return process.numstat(hash)
+
+    def _parse_chunks(
+        self, parser: "LogParser | NumstatParser", chunks: Iterable[bytes]
+    ) -> Iterator:
+        """
+        Yield the items parsed by `parser` from the chunks of the output of git.
+        """
+        for chunk in chunks:
+            with self.profiler.stage(STAGE_PARSE):
+                items = parser.feed(chunk)
+            yield from items
+        with self.profiler.stage(STAGE_PARSE):
+            items = parser.close()
+        yield from items
+
+
+def _popen(*args, **kwargs) -> subprocess.Popen:
+    process = subprocess.Popen(*args, **kwargs)
+    _increment_n_git_processes()
+    return process
+
+
+def _increment_n_git_processes():
+    global _n_git_processes, _n_git_processes_running
+    with _n_git_processes_lock:
+        _n_git_processes += 1
+        _n_git_processes_running += 1
+
+
+def _decrement_n_git_processes_running():
+    global _n_git_processes_running
+    with _n_git_processes_lock:
+        _n_git_processes_running -= 1
+
+
+def get_n_git_processes() -> int:
+    """
+    Return the number of git processes started so far in this Python process.
+    """
+    return _n_git_processes
+
+
+def get_n_git_processes_running() -> int:
+    """
+    Return the number of git processes running now in this Python process.
+    """
+    return _n_git_processes_running
+
+
+def build_pathspecs(
+    paths: Optional[Collection[str]] = None,
+    paths_to_exclude: Optional[Collection[str]] = None,
+) -> list[str]:
+    """
+    Build the git pathspecs to include only `paths` (all the files, if empty) and to
+     exclude `paths_to_exclude`, like: services/payments ':(exclude)*.lock'.
+    A path is a dir, a file or a pattern where `*` also matches slashes.
+    """
+    pathspecs = list(paths or ())
+    pathspecs += [f":(exclude){x}" for x in paths_to_exclude or ()]
+    return pathspecs
+
+
+def get_timestamp_range(
+    start_date: Optional[datetime] = None, end_date: Optional[datetime] = None
+) -> tuple[int, int]:
+    """
+    Return the range of timestamps [start, end) of the whole days from `start_date`
+     to `end_date` (included), in the local timezone, to compare with the `timestamp`
+     of the commits.
+    """
+    for date in (start_date, end_date):
+        if date and not isinstance(date, datetime):
+            raise NotADate(date)
+    start = end = None
+    if start_date:
+        start = datetime.combine(start_date.date(), datetime.min.time()).timestamp()
+    if end_date:
+        end_day = end_date.date() + timedelta(days=1)
+        end = datetime.combine(end_day, datetime.min.time()).timestamp()
+    return (
+        int(start) if start is not None else -(2**63),
+        int(end) if end is not None else 2**63,
+    )
+
+
+def parse_diff_line(line: str) -> GitDiffEntry:
+    # A line like (the path can include tabs):
+    # 31	10	git_loc/main.py
+    insertions, deletions, path = line.split("\t", 2)
+    return GitDiffEntry(insertions=insertions, deletions=deletions, path=path)
+
+
+class NumstatParser:
+    def __init__(self):
+        """
+        Parse the output of `git diff -z --numstat`, fed in chunks of any size as read
+         from git: `feed()` returns the files completed so far and `close()` the last
+         one.
+
+        The output is a sequence of NUL-terminated records, a record per file like:
+         b"31\t10\tgit_loc/main.py\0" (b"-\t-\t..." for a binary file), or for a
+         rename: b"31\t10\t\0" followed by the source and destination paths, like
+         b"old/main.py\0" b"git_loc/main.py\0".
+        """
+        self._rest = b""
+        # The records of the rename being parsed: insertions, deletions and paths.
+        self._rename: Optional[list[bytes]] = None
+
+    @property
+    def is_in_rename(self) -> bool:
+        return self._rename is not None
+
+    def feed(self, chunk: bytes) -> list[GitDiffEntry]:
+        records = (self._rest + chunk).split(b"\0")
+        # The last record is not complete yet.
+        self._rest = records.pop()
+        git_diff_entries = list()
+        for record in records:
+            git_diff_entry = self.feed_record(record)
+            if git_diff_entry is not None:
+                git_diff_entries.append(git_diff_entry)
+        return git_diff_entries
+
+    def close(self) -> list[GitDiffEntry]:
+        rest, self._rest = self._rest, b""
+        git_diff_entry = self.feed_record(rest) if rest else None
+        return [git_diff_entry] if git_diff_entry is not None else []
+
+    def feed_record(self, record: bytes) -> Optional[GitDiffEntry]:
+        """
+        Parse a record (with no NUL) and return the file, or None if the record is
+         only a part of a rename.
+        """
+        if self._rename is not None:
+            self._rename.append(record)
+            if len(self._rename) < 4:
+                return None
+            insertions, deletions, _, path = self._rename
+            self._rename = None
+        else:
+            insertions, deletions, path = record.split(b"\t", 2)
+            if not path:
+                self._rename = [insertions, deletions]
+                return None
+        return GitDiffEntry(
+            insertions=insertions.decode("ascii"),
+            deletions=deletions.decode("ascii"),
+            path=path.decode("utf-8", "replace"),
+        )
+
+
+class LogParser:
+    def __init__(self, do_parse_numstat: bool = False):
+        """
+        Parse the output of `git log -z --pretty=format:<LOG_FORMAT>` (with
+         `--numstat` if `do_parse_numstat`), fed in chunks of any size as read from
+         git: `feed()` returns the commits completed so far (with their numstat, if
+         `do_parse_numstat`) and `close()` the last one.
+
+        The output is a sequence of NUL-terminated records: the `N_LOG_FIELDS` fields
+         of each commit, then (with `--numstat`) a newline followed by the numstat
+         records (see `NumstatParser`), and an empty record between commits, like:
+         b"2fdf...\0" b"1581336000\0" b"2020-02-10\0" b"foo@gmail.com\0"
+         b"NEW Enable CORS (HEAD -> master)\0" b"\n31\t10\tgit_loc/main.py\0" b"\0"
+        """
+        self.do_parse_numstat = do_parse_numstat
+        self._rest = b""
+        self._fields: list[bytes] = list()
+        # The commit whose numstat is being parsed.
+        self._commit: Optional[GitLogEntry] = None
+        self._diff_entries: list[GitDiffEntry] = list()
+        self._numstat_parser = NumstatParser()
+
+    def feed(self, chunk: bytes) -> list:
+        records = (self._rest + chunk).split(b"\0")
+        # The last record is not complete yet.
+        self._rest = records.pop()
+        items = list()
+        for record in records:
+            self._feed_record(record, items)
+        return items
+
+    def close(self) -> list:
+        items = list()
+        rest, self._rest = self._rest, b""
+        if rest:
+            self._feed_record(rest, items)
+        if self._commit is not None:
+            items.append((self._commit, self._diff_entries))
+            self._commit = None
+        return items
+
+    def _feed_record(self, record: bytes, items: list):
+        if self._commit is None:
+            # The empty record between commits (a hash is never empty).
+            if not record and not self._fields:
+                return
+            self._fields.append(record)
+            if len(self._fields) < N_LOG_FIELDS:
+                return
+            commit = self._build_commit(self._fields)
+            self._fields = list()
+            if self.do_parse_numstat:
+                self._commit = commit
+                self._diff_entries = list()
+            else:
+                items.append(commit)
+            return
+
+        if self._numstat_parser.is_in_rename:
+            git_diff_entry = self._numstat_parser.feed_record(record)
+        elif not record:
+            # The empty record between commits: the end of the numstat.
+            items.append((self._commit, self._diff_entries))
+            self._commit = None
+            return
+        else:
+            # The numstat starts on a new line.
+            if record.startswith(b"\n"):
+                record = record[1:]
+            git_diff_entry = self._numstat_parser.feed_record(record)
+        if git_diff_entry is not None:
+            self._diff_entries.append(git_diff_entry)
+
+    @staticmethod
+    def _build_commit(fields: list[bytes]) -> GitLogEntry:
+        hash, timestamp, date, email, summary = fields
+        return GitLogEntry(
+            hash=hash.decode("ascii"),
+            date=date.decode("ascii"),
+            email=email.decode("utf-8", "replace"),
+            summary=summary.decode("utf-8", "replace"),
+            timestamp=int(timestamp),
+        )
@@ -0,0 +1,1288 @@
+import fnmatch
+import heapq
+import itertools
+import mmap
+import os
+import posixpath
+import re
+import struct
+import threading
+import zlib
+from collections import OrderedDict, defaultdict, namedtuple
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Collection, Iterator, Optional
+
+from . import xdiff
+
+# Object types, as in the packs.
+OBJ_COMMIT = 1
+OBJ_TREE = 2
+OBJ_BLOB = 3
+OBJ_TAG = 4
+OBJ_OFS_DELTA = 6
+OBJ_REF_DELTA = 7
+OBJ_TYPES_BY_NAME = {
+    b"commit": OBJ_COMMIT,
+    b"tree": OBJ_TREE,
+    b"blob": OBJ_BLOB,
+    b"tag": OBJ_TAG,
+}
+
+# File modes in the trees.
+S_IFMT = 0o170000
+S_IFDIR = 0o040000
+S_IFREG = 0o100000
+S_IFGITLINK = 0o160000
+
+HASH_REGEX = re.compile(r"^[0-9a-f]{40}$")
+PACK_IDX_V2_MAGIC = b"\377tOc"
+
+# Ref: diffcore-rename.c.
+NUM_CANDIDATE_PER_DST = 4
+RENAME_LIMIT = 1000
+MIN_BASENAME_SCORE = (
+    xdiff.DEFAULT_RENAME_SCORE + (xdiff.MAX_SCORE - xdiff.DEFAULT_RENAME_SCORE) // 2
+)
+
+GitCommit = namedtuple(
+    "GitCommit",
+    ("hash", "tree", "parents", "author", "committer_time", "message"),
+)
+# A file in a diff: `src_*` is None for an added file, `dst_*` for a deleted one.
+FilePair = namedtuple(
+    "FilePair",
+    ("src_path", "src_mode", "src_hash", "dst_path", "dst_mode", "dst_hash"),
+)
+
+
+class BaseGitObjectsException(Exception):
+    pass
+
+
+class NotAGitRepo(BaseGitObjectsException):
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+
+
+class UnsupportedRepo(BaseGitObjectsException):
+    def __init__(self, reason: str):
+        self.reason = reason
+
+    def __str__(self):
+        return self.reason
+
+
+class ObjectNotFound(BaseGitObjectsException):
+    def __init__(self, hash: str):
+        self.hash = hash
+
+
+class UnknownRevision(BaseGitObjectsException):
+    def __init__(self, rev: str):
+        self.rev = rev
+
+
+class CorruptObject(BaseGitObjectsException):
+    def __init__(self, reason: str):
+        self.reason = reason
+
+    def __str__(self):
+        return self.reason
+
+
+class PathspecMatcher:
+    def __init__(self, pathspecs: Collection[str], prefix: str = ""):
+        """
+        Match the paths (relative to the root of the repo) like git pathspecs given in
+         the dir `prefix` (like: "services/"): a path matches if it is (or is in) an
+         included path, or it matches an included pattern (where `*` also matches
+         slashes), and it matches no excluded path or pattern.
+
+        Only the `exclude` magic is supported, like: ':(exclude)*.lock', ':!*.lock'.
+        """
+        self.includes: list[bytes] = list()
+        self.excludes: list[bytes] = list()
+        for pathspec in pathspecs:
+            for magic in (":(exclude)", ":!", ":^"):
+                if pathspec.startswith(magic):
+                    self.excludes.append(
+                        _normalize_pathspec(pathspec[len(magic) :], prefix)
+                    )
+                    break
+            else:
+                self.includes.append(_normalize_pathspec(pathspec, prefix))
+        # Like git, only excluded paths means all the other paths (in `prefix`).
+        if not self.includes:
+            self.includes.append(_normalize_pathspec(".", prefix))
+
+    def matches(self, path: bytes) -> bool:
+        if not any(_match_pathspec(x, path) for x in self.includes):
+            return False
+        return not any(_match_pathspec(x, path) for x in self.excludes)
+
+
+def _normalize_pathspec(pathspec: str, prefix: str) -> bytes:
+    pathspec = posixpath.normpath(posixpath.join(prefix, pathspec))
+    return b"" if pathspec == "." else pathspec.encode("utf-8")
+
+
+def _match_pathspec(pathspec: bytes, path: bytes) -> bool:
+    if not pathspec or path == pathspec or path.startswith(pathspec + b"/"):
+        return True
+    if any(x in pathspec for x in (b"*", b"?", b"[")):
+        return fnmatch.fnmatchcase(path, pathspec)
+    return False
+
+
+class _LruCache:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return None
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+
+class _Pack:
+    def __init__(self, idx_path: Path):
+        """
+        A pack (`.pack`) and its index (`.idx`, version 2), memory-mapped.
+        """
+        with open(idx_path, "rb") as fin:
+            self.idx = mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.idx[:4] != PACK_IDX_V2_MAGIC or self.idx[4:8] != b"\0\0\0\2":
+            self.idx.close()
+            raise UnsupportedRepo(f"Unsupported pack index: {idx_path}")
+        self.fanout = struct.unpack(">256I", self.idx[8:1032])
+        n_objects = self.fanout[255]
+        self._hashes_start = 1032
+        self._offsets_start = 1032 + 24 * n_objects
+        self._large_offsets_start = 1032 + 28 * n_objects
+        with open(idx_path.with_suffix(".pack"), "rb") as fin:
+            self.data = mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def find_offset(self, hash: bytes) -> Optional[int]:
+        first = hash[0]
+        lo = self.fanout[first - 1] if first else 0
+        hi = self.fanout[first]
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = self._hashes_start + 20 * mid
+            candidate = self.idx[start : start + 20]
+            if candidate < hash:
+                lo = mid + 1
+            elif candidate > hash:
+                hi = mid
+            else:
+                (offset,) = struct.unpack_from(
+                    ">I", self.idx, self._offsets_start + 4 * mid
+                )
+                if offset & 0x80000000:
+                    (offset,) = struct.unpack_from(
+                        ">Q",
+                        self.idx,
+                        self._large_offsets_start + 8 * (offset & 0x7FFFFFFF),
+                    )
+                return offset
+        return None
+
+    def close(self):
+        self.idx.close()
+        self.data.close()
+
+
+class ObjectStore:
+    def __init__(self, objects_dir: Path):
+        """
+        Read the objects of a repo: in the packs and loose, also in the alternates.
+        """
+        self.objects_dirs = [objects_dir] + _read_alternates(objects_dir)
+        self._packs: list[_Pack] = list()
+        self._pack_paths: set[Path] = set()
+        self._lock = threading.Lock()
+        self._load_packs()
+        # The objects resolved from a delta chain, to not resolve the chain again.
+        self._delta_base_cache = _LruCache(256)
+
+    def _load_packs(self):
+        for objects_dir in self.objects_dirs:
+            pack_dir = objects_dir / "pack"
+            if not pack_dir.is_dir():
+                continue
+            for idx_path in sorted(pack_dir.glob("*.idx")):
+                if idx_path in self._pack_paths:
+                    continue
+                if not idx_path.with_suffix(".pack").is_file():
+                    continue
+                self._packs.append(_Pack(idx_path))
+                self._pack_paths.add(idx_path)
+
+    def close(self):
+        with self._lock:
+            for pack in self._packs:
+                pack.close()
+            self._packs = list()
+            self._pack_paths = set()
+
+    def read(self, hash: bytes) -> tuple[int, bytes]:
+        """
+        Return the type and the content of an object (a binary hash).
+        """
+        result = self._read(hash)
+        if result is None:
+            # A `git gc` could have packed the loose objects meanwhile.
+            with self._lock:
+                self._load_packs()
+            result = self._read(hash)
+        if result is None:
+            raise ObjectNotFound(hash.hex())
+        return result
+
+    def _read(self, hash: bytes) -> Optional[tuple[int, bytes]]:
+        for pack in self._packs:
+            offset = pack.find_offset(hash)
+            if offset is not None:
+                return self._read_packed(pack, offset)
+        return self._read_loose(hash)
+
+    def _read_loose(self, hash: bytes) -> Optional[tuple[int, bytes]]:
+        hex_hash = hash.hex()
+        for objects_dir in self.objects_dirs:
+            try:
+                raw = (objects_dir / hex_hash[:2] / hex_hash[2:]).read_bytes()
+            except FileNotFoundError:
+                continue
+            header, _, data = zlib.decompress(raw).partition(b"\0")
+            type_name, _, size = header.partition(b" ")
+            if int(size) != len(data):
+                raise CorruptObject(f"Wrong size of object {hex_hash}")
+            return OBJ_TYPES_BY_NAME[type_name], data
+        return None
+
+    def _read_packed(self, pack: _Pack, offset: int) -> tuple[int, bytes]:
+        # Walk the delta chain down to a base object, then apply the deltas upwards.
+        chain = list()
+        while True:
+            cached = self._delta_base_cache.get((id(pack), offset))
+            if cached is not None:
+                obj_type, data = cached
+                break
+            obj_type, size, pos = _parse_pack_object_header(pack.data, offset)
+            if obj_type == OBJ_OFS_DELTA:
+                base_offset, pos = _parse_ofs_delta_offset(pack.data, pos)
+                chain.append((pack, offset, pos, size))
+                offset = offset - base_offset
+                continue
+            if obj_type == OBJ_REF_DELTA:
+                base_hash = pack.data[pos : pos + 20]
+                chain.append((pack, offset, pos + 20, size))
+                base_pack, base_offset = self._find_packed(base_hash)
+                if base_pack is None:
+                    obj_type, data = self.read(base_hash)
+                    break
+                pack, offset = base_pack, base_offset
+                continue
+            data = _inflate(pack.data, pos, size)
+            break
+        for pack, offset, pos, size in reversed(chain):
+            data = _apply_delta(data, _inflate(pack.data, pos, size))
+            self._delta_base_cache.set((id(pack), offset), (obj_type, data))
+        return obj_type, data
+
+    def _find_packed(self, hash: bytes) -> tuple[Optional[_Pack], Optional[int]]:
+        for pack in self._packs:
+            offset = pack.find_offset(hash)
+            if offset is not None:
+                return pack, offset
+        return None, None
+
+
+class GitObjectsReader:
+    # Sizes of the in-memory caches (number of objects).
+    COMMIT_CACHE_SIZE = 4096
+    TREE_CACHE_SIZE = 4096
+    BLOB_CACHE_SIZE = 512
+
+    def __init__(self, root_dir: Path | str):
+        """
+        Read the history of a repo directly from its object database (the packs and
+         the loose objects), without running any git process, and produce the same
+         output lines as `git log` and `git diff --numstat` (see `GitClient`).
+
+        Not supported (the output could differ from git's): .mailmap and
+         .gitattributes files, replace refs and non-default diff configs (like
+         `diff.algorithm` or `diff.renames`).
+        """
+        self.root_dir = root_dir
+        # `prefix` is the dir of `root_dir` in the repo (for the pathspecs).
+        self.git_dir, self.prefix = _find_git_dir(Path(root_dir))
+        common_dir_file = self.git_dir / "commondir"
+        if common_dir_file.is_file():
+            common_dir = common_dir_file.read_text().strip()
+            self.common_dir = (self.git_dir / common_dir).resolve()
+        else:
+            self.common_dir = self.git_dir
+        _check_repo_format(self.common_dir)
+
+        self.store = ObjectStore(self.common_dir / "objects")
+        self._shallow = _read_shallow(self.common_dir)
+        self._commit_cache = _LruCache(self.COMMIT_CACHE_SIZE)
+        self._tree_cache = _LruCache(self.TREE_CACHE_SIZE)
+        self._blob_cache = _LruCache(self.BLOB_CACHE_SIZE)
+        self._spans_cache = _LruCache(self.BLOB_CACHE_SIZE)
+        self._numstat_cache = _LruCache(self.BLOB_CACHE_SIZE)
+        self._refs_lock = threading.Lock()
+        self._packed_refs: Optional[dict[str, str]] = None
+        self._decorations: Optional[dict[str, list[tuple[str, str]]]] = None
+
+    def close(self):
+        self.store.close()
+
+    # Refs.
+
+    def resolve(self, rev: str) -> str:
+        """
+        Return the full hash of the commit `rev`: a full hash, a ref or a ref name
+         (like: master, v1.0, origin/master, HEAD).
+        """
+        if HASH_REGEX.match(rev):
+            return self._peel_to_commit(rev, rev)
+        # The same rules as `git rev-parse`.
+        for refname in (
+            rev,
+            f"refs/{rev}",
+            f"refs/tags/{rev}",
+            f"refs/heads/{rev}",
+            f"refs/remotes/{rev}",
+            f"refs/remotes/{rev}/HEAD",
+        ):
+            hash = self._resolve_ref(refname)
+            if hash is not None:
+                return self._peel_to_commit(hash, rev)
+        raise UnknownRevision(rev)
+
+    def _peel_to_commit(self, hash: str, rev: str) -> str:
+        try:
+            obj_type, data = self.store.read(bytes.fromhex(hash))
+        except ObjectNotFound:
+            raise UnknownRevision(rev)
+        while obj_type == OBJ_TAG:
+            hash = _parse_tag_target(data)
+            obj_type, data = self.store.read(bytes.fromhex(hash))
+        if obj_type != OBJ_COMMIT:
+            raise UnknownRevision(rev)
+        return hash
+
+    def _resolve_ref(self, refname: str, depth: int = 0) -> Optional[str]:
+        if depth > 5:
+            return None
+        # The pseudo refs (like HEAD) are in the git dir, the others (refs/...) in the
+        #  common dir (they are different in a worktree).
+        base_dir = self.common_dir if refname.startswith("refs/") else self.git_dir
+        path = base_dir / refname
+        if path.is_file():
+            content = path.read_text(errors="replace").strip()
+            if content.startswith("ref: "):
+                return self._resolve_ref(content[5:].strip(), depth + 1)
+            hash = content.split()[0] if content else ""
+            return hash if HASH_REGEX.match(hash) else None
+        return self._get_packed_refs().get(refname)
+
+    def _get_packed_refs(self) -> dict[str, str]:
+        with self._refs_lock:
+            if self._packed_refs is None:
+                packed_refs = dict()
+                path = self.common_dir / "packed-refs"
+                if path.is_file():
+                    for line in path.read_text(errors="replace").splitlines():
+                        # Skip the comments and the peeled tags (lines like: ^hash).
+                        if not line or line[0] in "#^":
+                            continue
+                        hash, _, refname = line.partition(" ")
+                        packed_refs[refname] = hash
+                self._packed_refs = packed_refs
+        return self._packed_refs
+
+    def _list_refs(self) -> dict[str, str]:
+        """
+        Return all the refs (but HEAD) and their (resolved) hashes.
+        """
+        refnames = set(self._get_packed_refs())
+        refs_dir = self.common_dir / "refs"
+        for dir_path, _, file_names in os.walk(refs_dir):
+            for file_name in file_names:
+                if file_name.endswith(".lock"):
+                    continue
+                path = Path(dir_path) / file_name
+                refnames.add("refs/" + path.relative_to(refs_dir).as_posix())
+        refs = dict()
+        for refname in refnames:
+            hash = self._resolve_ref(refname)
+            if hash is not None:
+                refs[refname] = hash
+        return refs
+
+    def _get_head_symref(self) -> Optional[str]:
+        path = self.git_dir / "HEAD"
+        content = path.read_text(errors="replace").strip() if path.is_file() else ""
+        if content.startswith("ref: "):
+            return content[5:].strip()
+        return None
+
+    def _get_decorations(self) -> dict[str, list[tuple[str, str]]]:
+        """
+        Return the refs pointing at each commit, as (type, refname), in the order git
+         adds them: all the refs sorted by name, then HEAD, then the shallow commits.
+        """
+        if self._decorations is not None:
+            return self._decorations
+        decorations = defaultdict(list)
+        refs = self._list_refs()
+        for refname in sorted(refs, key=lambda x: x.encode("utf-8")):
+            if refname.startswith("refs/replace/"):
+                continue
+            if refname.startswith("refs/heads/"):
+                decoration_type = "local"
+            elif refname.startswith("refs/remotes/"):
+                decoration_type = "remote"
+            elif refname.startswith("refs/tags/"):
+                decoration_type = "tag"
+            else:
+                decoration_type = "ref"
+            self._add_decoration(decorations, decoration_type, refname, refs[refname])
+        head = self._resolve_ref("HEAD")
+        if head is not None:
+            self._add_decoration(decorations, "head", "HEAD", head)
+        # The commits cut by a shallow clone.
+        for hash in sorted(self._shallow):
+            decorations[hash].append(("grafted", "grafted"))
+        self._decorations = decorations
+        return decorations
+
+    def _add_decoration(self, decorations, decoration_type, refname, hash):
+        try:
+            obj_type, data = self.store.read(bytes.fromhex(hash))
+        except ObjectNotFound:
+            return
+        decorations[hash].append((decoration_type, refname))
+        # Annotated tags also decorate the tagged object.
+        while obj_type == OBJ_TAG:
+            hash = _parse_tag_target(data)
+            decorations[hash].append(("tag", refname))
+            try:
+                obj_type, data = self.store.read(bytes.fromhex(hash))
+            except ObjectNotFound:
+                return
+
+    def _format_decorations(self, hash: str) -> str:
+        """
+        Format the refs of a commit like git's `%d`: " (HEAD -> master, tag: v1.0)".
+        """
+        decorations = self._get_decorations().get(hash)
+        if not decorations:
+            return ""
+        # Git shows the decorations in the reverse order of addition.
+        decorations = list(reversed(decorations))
+        current = None
+        head_symref = self._get_head_symref()
+        if head_symref and any(x[0] == "head" for x in decorations):
+            if ("local", head_symref) in decorations:
+                current = ("local", head_symref)
+        names = list()
+        for decoration in decorations:
+            if decoration == current:
+                continue
+            decoration_type, refname = decoration
+            name = _prettify_refname(refname)
+            if decoration_type == "tag":
+                name = f"tag: {name}"
+            if decoration_type == "head" and current is not None:
+                name = f"{name} -> {_prettify_refname(current[1])}"
+            names.append(name)
+        return f" ({', '.join(names)})"
+
+    # Commits.
+
+    def read_commit(self, hash: str) -> GitCommit:
+        commit = self._commit_cache.get(hash)
+        if commit is not None:
+            return commit
+        obj_type, data = self.store.read(bytes.fromhex(hash))
+        if obj_type != OBJ_COMMIT:
+            raise CorruptObject(f"Not a commit: {hash}")
+        commit = _parse_commit(hash, data)
+        if hash in self._shallow:
+            commit = commit._replace(parents=())
+        self._commit_cache.set(hash, commit)
+        return commit
+
+    def is_ancestor(self, ancestor: str, descendant: str) -> bool:
+        try:
+            ancestor = self.resolve(ancestor)
+            descendant = self.resolve(descendant)
+        except (UnknownRevision, ObjectNotFound):
+            return False
+        seen = {descendant}
+        stack = [descendant]
+        while stack:
+            hash = stack.pop()
+            if hash == ancestor:
+                return True
+            for parent in self.read_commit(hash).parents:
+                if parent not in seen:
+                    seen.add(parent)
+                    stack.append(parent)
+        return False
+
+    def log_output(
+        self,
+        rev: str,
+        author: Optional[str] = None,
+        since: Optional[datetime] = None,
+        before: Optional[datetime] = None,
+        pathspecs: Collection[str] = (),
+    ) -> Iterator[bytes]:
+        """
+        Yield the same output as (in chunks, a commit per chunk):
+         git log <rev> -z --pretty=format:"%H%x00%at%x00%ad%x00%ae%x00%s%d%x00"
+         --date=short --no-merges --since=<since> --before=<before>
+         --author=<author> --full-history -- <pathspecs>
+        `rev` is a revision or a range (like: 2fdffa2..master).
+        """
+        excluded_rev, sep, included_rev = rev.rpartition("..")
+        if not sep:
+            excluded_rev, included_rev = "", rev
+        elif not excluded_rev:
+            excluded_rev = "HEAD"
+        tips = [self.resolve(included_rev or "HEAD")]
+        excluded_tips = [self.resolve(excluded_rev)] if sep else []
+
+        # Git parses a date without a time as that date at the current time of day.
+        now = datetime.now()
+        since_time = until_time = None
+        if since:
+            since_time = int(datetime.combine(since.date(), now.time()).timestamp())
+        if before:
+            until_time = int(datetime.combine(before.date(), now.time()).timestamp())
+        author_regex = re.compile(_bre_to_python(author)) if author else None
+        matcher = PathspecMatcher(pathspecs, self.prefix) if pathspecs else None
+
+        separator = b""
+        for commit in self._walk(tips, excluded_tips, since_time):
+            if len(commit.parents) > 1:
+                continue
+            if until_time is not None and commit.committer_time > until_time:
+                continue
+            author_ident = commit.author[: commit.author.rindex(b">") + 1]
+            if author_regex and not author_regex.search(
+                author_ident.decode("utf-8", "replace")
+            ):
+                continue
+            # Only the commits that modify the matching files.
+            if matcher is not None and not self._diff_commit(commit, matcher):
+                continue
+            # Commits are separated by a NUL.
+            yield separator + self._format_log_record(commit)
+            separator = b"\0"
+
+    def _walk(
+        self,
+        tips: list[str],
+        excluded_tips: list[str],
+        since_time: Optional[int] = None,
+    ) -> Iterator[GitCommit]:
+        """
+        Yield the commits reachable from `tips` but not from `excluded_tips`, newest
+         first (by commit date), like `git log`.
+        """
+        heap = list()
+        counter = itertools.count()
+        # Commit hash -> is excluded.
+        seen: dict[str, bool] = dict()
+
+        def push(hash, is_excluded):
+            seen[hash] = is_excluded
+            commit = self.read_commit(hash)
+            heapq.heappush(heap, (-commit.committer_time, next(counter), hash))
+
+        for hash in excluded_tips:
+            push(hash, True)
+        for hash in tips:
+            if hash not in seen:
+                push(hash, False)
+
+        # With excluded commits (a range), a commit could be excluded after it was
+        #  walked, so the commits are only yielded at the end (like git does).
+        is_limited = bool(excluded_tips)
+        candidates = list()
+        while heap:
+            if is_limited and all(seen[x[2]] for x in heap):
+                break
+            _, _, hash = heapq.heappop(heap)
+            commit = self.read_commit(hash)
+            is_excluded = seen[hash]
+            if since_time is not None and commit.committer_time < since_time:
+                # Git stops walking at the commits older than --since.
+                if not is_limited:
+                    continue
+                is_excluded = seen[hash] = True
+            for parent in commit.parents:
+                if parent not in seen:
+                    push(parent, is_excluded)
+                elif is_excluded and not seen[parent]:
+                    self._mark_excluded(parent, seen)
+            if is_excluded:
+                continue
+            if is_limited:
+                candidates.append(commit)
+            else:
+                yield commit
+        for commit in candidates:
+            if not seen[commit.hash]:
+                yield commit
+
+    def _mark_excluded(self, hash: str, seen: dict[str, bool]):
+        stack = [hash]
+        while stack:
+            hash = stack.pop()
+            if seen.get(hash) is not False:
+                continue
+            seen[hash] = True
+            stack.extend(self.read_commit(hash).parents)
+
+    def _format_log_record(self, commit: GitCommit) -> bytes:
+        author = commit.author
+        email = author[author.index(b"<") + 1 :]
+        email = email[: email.index(b">")]
+        # Like: b" 1581336000 +0100".
+        author_date = author[author.rindex(b">") + 1 :]
+        timestamp = (author_date.split() or [b"0"])[0]
+        date = _format_short_date(author_date)
+        subject = _format_subject(commit.message)
+        decorations = self._format_decorations(commit.hash)
+        fields = (
+            commit.hash.encode("ascii"),
+            timestamp,
+            date.encode("ascii"),
+            email,
+            subject + decorations.encode("utf-8"),
+        )
+        return b"".join(x + b"\0" for x in fields)
+
+    # Diffs.
+
+    def numstat_output(
+        self,
+        rev: str,
+        do_diff_root: bool = False,
+        do_diff_merges: bool = True,
+        pathspecs: Collection[str] = (),
+    ) -> bytes:
+        """
+        Return the same output as `git diff -z --numstat <rev>~1 <rev> -- <pathspecs>`.
+
+        A root commit is diffed against the empty tree only if `do_diff_root`. A merge
+         commit is diffed against its first parent only if `do_diff_merges` (like
+         `git diff`, while `git diff-tree` ignores the merges).
+        """
+        commit = self.read_commit(self.resolve(rev))
+        if not commit.parents and not do_diff_root:
+            return b""
+        if len(commit.parents) > 1 and not do_diff_merges:
+            return b""
+        matcher = PathspecMatcher(pathspecs, self.prefix) if pathspecs else None
+        pairs = self._diff_commit(commit, matcher)
+        return b"".join(
+            self._format_numstat_record(pair) for pair in self._detect_renames(pairs)
+        )
+
+    def _diff_commit(
+        self, commit: GitCommit, matcher: Optional[PathspecMatcher] = None
+    ) -> list[FilePair]:
+        """
+        Return the files changed by a commit (from its first parent, or from the empty
+         tree for a root commit), before the rename detection.
+        """
+        src_tree = None
+        if commit.parents:
+            src_tree = self.read_commit(commit.parents[0]).tree
+        pairs = list()
+        self._diff_trees(
+            bytes.fromhex(src_tree) if src_tree else None,
+            bytes.fromhex(commit.tree),
+            b"",
+            pairs,
+            matcher,
+        )
+        return pairs
+
+    def _read_tree(self, hash: bytes) -> list[tuple[bytes, int, bytes]]:
+        entries = self._tree_cache.get(hash)
+        if entries is None:
+            obj_type, data = self.store.read(hash)
+            if obj_type != OBJ_TREE:
+                raise CorruptObject(f"Not a tree: {hash.hex()}")
+            entries = _parse_tree(data)
+            self._tree_cache.set(hash, entries)
+        return entries
+
+    def _diff_trees(
+        self,
+        src_hash: Optional[bytes],
+        dst_hash: Optional[bytes],
+        prefix: bytes,
+        pairs: list[FilePair],
+        matcher: Optional[PathspecMatcher] = None,
+    ):
+        """
+        Append the changed files (matching `matcher`, if any) to `pairs`, in git's
+         order.
+        """
+        src_entries = self._read_tree(src_hash) if src_hash else []
+        dst_entries = self._read_tree(dst_hash) if dst_hash else []
+        i = j = 0
+        while i < len(src_entries) or j < len(dst_entries):
+            src = src_entries[i] if i < len(src_entries) else None
+            dst = dst_entries[j] if j < len(dst_entries) else None
+            # The entries are sorted by name, with a trailing slash for the dirs.
+            src_key = _tree_entry_key(src) if src else None
+            dst_key = _tree_entry_key(dst) if dst else None
+            if dst is None or (src is not None and src_key < dst_key):
+                self._diff_entries(src, None, prefix, pairs, matcher)
+                i += 1
+            elif src is None or dst_key < src_key:
+                self._diff_entries(None, dst, prefix, pairs, matcher)
+                j += 1
+            else:
+                if src[1] != dst[1] or src[2] != dst[2]:
+                    self._diff_entries(src, dst, prefix, pairs, matcher)
+                i += 1
+                j += 1
+
+    def _diff_entries(
+        self,
+        src,
+        dst,
+        prefix: bytes,
+        pairs: list[FilePair],
+        matcher: Optional[PathspecMatcher] = None,
+    ):
+        entry = src or dst
+        path = prefix + entry[0]
+        if entry[1] & S_IFMT == S_IFDIR:
+            self._diff_trees(
+                src[2] if src else None,
+                dst[2] if dst else None,
+                path + b"/",
+                pairs,
+                matcher,
+            )
+            return
+        if matcher is not None and not matcher.matches(path):
+            return
+        pairs.append(
+            FilePair(
+                src_path=path if src else None,
+                src_mode=src[1] if src else None,
+                src_hash=src[2] if src else None,
+                dst_path=path if dst else None,
+                dst_mode=dst[1] if dst else None,
+                dst_hash=dst[2] if dst else None,
+            )
+        )
+
+    def _detect_renames(self, pairs: list[FilePair]) -> list[FilePair]:
+        """
+        Pair the deleted and the added files that are renames, like git's
+         diffcore-rename: the exact renames first, then the files with the same (unique)
+         basename and at least 75% similar, then the most similar files (at least 50%).
+        """
+        srcs = [i for i, pair in enumerate(pairs) if pair.dst_hash is None]
+        dsts = [i for i, pair in enumerate(pairs) if pair.src_hash is None]
+        if not srcs or not dsts:
+            return pairs
+        # Dst index -> src index.
+        renames: dict[int, int] = dict()
+        used_srcs: set[int] = set()
+
+        # Exact renames.
+        srcs_by_hash = defaultdict(list)
+        for i in srcs:
+            srcs_by_hash[pairs[i].src_hash].append(i)
+        for i in dsts:
+            dst = pairs[i]
+            best = None
+            best_score = -1
+            n_left = 100
+            for j in srcs_by_hash.get(dst.dst_hash, ()):
+                src = pairs[j]
+                if not _is_regular(src.src_mode) or not _is_regular(dst.dst_mode):
+                    if src.src_mode != dst.dst_mode:
+                        continue
+                if j in used_srcs:
+                    continue
+                score = 1 + xdiff.basename_same(src.src_path, dst.dst_path)
+                if score > best_score:
+                    best = j
+                    best_score = score
+                    if score == 2:
+                        break
+                n_left -= 1
+                if not n_left:
+                    break
+            if best is not None:
+                renames[i] = best
+                used_srcs.add(best)
+
+        # Renames with the same basename.
+        srcs = [i for i in srcs if i not in used_srcs]
+        src_by_basename = dict()
+        for i in srcs:
+            basename = pairs[i].src_path.rpartition(b"/")[2]
+            src_by_basename[basename] = -1 if basename in src_by_basename else i
+        dst_by_basename = dict()
+        for i in dsts:
+            if i in renames:
+                continue
+            basename = pairs[i].dst_path.rpartition(b"/")[2]
+            dst_by_basename[basename] = -1 if basename in dst_by_basename else i
+        for i in srcs:
+            basename = pairs[i].src_path.rpartition(b"/")[2]
+            j = dst_by_basename.get(basename)
+            if j is None or j == -1 or src_by_basename[basename] == -1:
+                continue
+            if j in renames:
+                continue
+            score = self._estimate_similarity(pairs[i], pairs[j], MIN_BASENAME_SCORE)
+            if score < MIN_BASENAME_SCORE:
+                continue
+            renames[j] = i
+            used_srcs.add(i)
+
+        # Inexact renames: the best candidates of each dst, the most similar first.
+        srcs = [i for i in srcs if i not in used_srcs]
+        dsts_left = [i for i in dsts if i not in renames]
+        if (
+            srcs
+            and dsts_left
+            and len(srcs) * len(dsts_left) <= RENAME_LIMIT * RENAME_LIMIT
+        ):
+            matrix = list()
+            for j in dsts_left:
+                candidates = [_UNUSED_SCORE] * NUM_CANDIDATE_PER_DST
+                for i in srcs:
+                    score = self._estimate_similarity(
+                        pairs[i], pairs[j], xdiff.DEFAULT_RENAME_SCORE
+                    )
+                    name_score = xdiff.basename_same(
+                        pairs[i].src_path, pairs[j].dst_path
+                    )
+                    _record_if_better(candidates, (score, name_score, j, i))
+                matrix.extend(candidates)
+            matrix.sort(key=_score_sort_key)
+            for score, _, j, i in matrix:
+                if j < 0 or score < xdiff.DEFAULT_RENAME_SCORE:
+                    break
+                if j in renames or i in used_srcs:
+                    continue
+                renames[j] = i
+                used_srcs.add(i)
+
+        if not renames:
+            return pairs
+        result = list()
+        for i, pair in enumerate(pairs):
+            if i in renames:
+                src = pairs[renames[i]]
+                pair = pair._replace(
+                    src_path=src.src_path,
+                    src_mode=src.src_mode,
+                    src_hash=src.src_hash,
+                )
+            elif i in used_srcs:
+                continue
+            result.append(pair)
+        return result
+
+    def _estimate_similarity(
+        self, src: FilePair, dst: FilePair, minimum_score: int
+    ) -> int:
+        if not _is_regular(src.src_mode) or not _is_regular(dst.dst_mode):
+            return 0
+        src_data = self._read_blob(src.src_hash)
+        dst_data = self._read_blob(dst.dst_hash)
+        return xdiff.estimate_similarity(
+            len(src_data),
+            len(dst_data),
+            lambda: self._get_spans(src.src_hash, src_data),
+            lambda: self._get_spans(dst.dst_hash, dst_data),
+            minimum_score,
+        )
+
+    def _get_spans(self, hash: bytes, data: bytes) -> dict[int, int]:
+        spans = self._spans_cache.get(hash)
+        if spans is None:
+            spans = xdiff.hash_spans(data)
+            self._spans_cache.set(hash, spans)
+        return spans
+
+    def _read_blob(self, hash: bytes) -> bytes:
+        data = self._blob_cache.get(hash)
+        if data is None:
+            obj_type, data = self.store.read(hash)
+            if obj_type != OBJ_BLOB:
+                raise CorruptObject(f"Not a blob: {hash.hex()}")
+            self._blob_cache.set(hash, data)
+        return data
+
+    def _read_file(self, mode: Optional[int], hash: Optional[bytes]) -> bytes:
+        if hash is None:
+            return b""
+        # Git diffs a submodule as a line with its commit.
+        if mode & S_IFMT == S_IFGITLINK:
+            return f"Subproject commit {hash.hex()}\n".encode("ascii")
+        return self._read_blob(hash)
+
+    def _format_numstat_record(self, pair: FilePair) -> bytes:
+        # With -z, the paths are not quoted, and a rename is followed by the source and
+        #  destination paths, each NUL-terminated.
+        if pair.src_path is not None and pair.dst_path is not None:
+            if pair.src_path != pair.dst_path:
+                path = b"\0" + pair.src_path + b"\0" + pair.dst_path
+            else:
+                path = pair.dst_path
+        else:
+            path = pair.src_path or pair.dst_path
+
+        # The same blobs are diffed often (eg. in cherry-picks and reverts).
+        key = (pair.src_mode, pair.src_hash, pair.dst_mode, pair.dst_hash)
+        numstat = self._numstat_cache.get(key)
+        if numstat is None:
+            numstat = self._count_lines(pair)
+            self._numstat_cache.set(key, numstat)
+        return f"{numstat[0]}\t{numstat[1]}\t".encode("ascii") + path + b"\0"
+
+    def _count_lines(self, pair: FilePair) -> tuple[str, str]:
+        src_data = self._read_file(pair.src_mode, pair.src_hash)
+        dst_data = self._read_file(pair.dst_mode, pair.dst_hash)
+        if xdiff.is_binary(src_data) or xdiff.is_binary(dst_data):
+            return "-", "-"
+        if pair.src_hash == pair.dst_hash:
+            return "0", "0"
+        insertions, deletions = xdiff.count_changed_lines(
+            xdiff.split_lines(src_data), xdiff.split_lines(dst_data)
+        )
+        return str(insertions), str(deletions)
+
+
+# A free slot in the rename candidates of a dst.
+_UNUSED_SCORE = (0, 0, -1, -1)
+
+
+def _score_sort_key(candidate: tuple[int, int, int, int]) -> tuple[int, int, int]:
+    # The unused slots last, then the highest score, then the same basename first.
+    score, name_score, dst, _ = candidate
+    if dst < 0:
+        return 1, 0, 0
+    return 0, -score, -name_score
+
+
+def _record_if_better(candidates: list, candidate: tuple[int, int, int, int]):
+    # Replace the worst candidate (the first, among the equally bad ones).
+    worst = 0
+    for i in range(1, len(candidates)):
+        if _score_sort_key(candidates[i]) > _score_sort_key(candidates[worst]):
+            worst = i
+    if _score_sort_key(candidates[worst]) > _score_sort_key(candidate):
+        candidates[worst] = candidate
+
+
+def _is_regular(mode: int) -> bool:
+    return mode & S_IFMT == S_IFREG
+
+
+def _tree_entry_key(entry: tuple[bytes, int, bytes]) -> bytes:
+    name, mode, _ = entry
+    return name + b"/" if mode & S_IFMT == S_IFDIR else name
+
+
+def _parse_tree(data: bytes) -> list[tuple[bytes, int, bytes]]:
+    """
+    Return the entries of a tree object as (name, mode, binary hash).
+    """
+    entries = list()
+    pos = 0
+    size = len(data)
+    while pos < size:
+        space = data.index(b" ", pos)
+        nul = data.index(b"\0", space)
+        entries.append(
+            (data[space + 1 : nul], int(data[pos:space], 8), data[nul + 1 : nul + 21])
+        )
+        pos = nul + 21
+    return entries
+
+
+def _parse_commit(hash: str, data: bytes) -> GitCommit:
+    header, _, message = data.partition(b"\n\n")
+    tree = None
+    parents = list()
+    author = b""
+    committer_time = 0
+    encoding = None
+    for line in header.split(b"\n"):
+        # Skip the continuation lines of multi-line headers (like gpgsig).
+        if line.startswith(b" "):
+            continue
+        key, _, value = line.partition(b" ")
+        if key == b"tree":
+            tree = value.decode("ascii")
+        elif key == b"parent":
+            parents.append(value.decode("ascii"))
+        elif key == b"author":
+            author = value
+        elif key == b"committer":
+            committer_time = _parse_ident_time(value)
+        elif key == b"encoding":
+            encoding = value.decode("ascii", "replace")
+    if encoding and encoding.lower() not in ("utf-8", "utf8"):
+        try:
+            message = message.decode(encoding, "replace").encode("utf-8")
+        except LookupError:
+            pass
+    return GitCommit(
+        hash=hash,
+        tree=tree,
+        parents=tuple(parents),
+        author=author,
+        committer_time=committer_time,
+        message=message,
+    )
+
+
+def _parse_ident_time(ident: bytes) -> int:
+    # Like: John <john@gmail.com> 1581336000 +0100
+    tokens = ident[ident.rindex(b">") + 1 :].split()
+    return int(tokens[0]) if tokens else 0
+
+
+def _format_short_date(date: bytes) -> str:
+    """
+    Format a date like " 1581336000 +0100" in its own timezone, like: 2020-02-10.
+    """
+    tokens = date.split()
+    timestamp = int(tokens[0]) if tokens else 0
+    tz = int(tokens[1]) if len(tokens) > 1 else 0
+    sign = -1 if tz < 0 else 1
+    offset = sign * ((abs(tz) // 100) * 60 + abs(tz) % 100)
+    date = datetime.fromtimestamp(timestamp, timezone.utc) + timedelta(minutes=offset)
+    return date.strftime("%Y-%m-%d")
+
+
+def _format_subject(message: bytes) -> bytes:
+    """
+    Return the first paragraph of the message in a single line, like git's `%s`.
+    """
+    lines = message.split(b"\n")
+    i = 0
+    while i < len(lines) and not lines[i].rstrip(b" \t\r\n"):
+        i += 1
+    subject_lines = list()
+    for line in lines[i:]:
+        line = line.rstrip(b" \t\r\n")
+        if not line:
+            break
+        subject_lines.append(line)
+    return b" ".join(subject_lines)
+
+
+def _parse_tag_target(data: bytes) -> str:
+    # The first line of a tag object is like: object <hash>
+    first_line = data.split(b"\n", 1)[0]
+    return first_line.partition(b" ")[2].decode("ascii")
+
+
+def _prettify_refname(refname: str) -> str:
+    for prefix in ("refs/heads/", "refs/tags/", "refs/remotes/"):
+        if refname.startswith(prefix):
+            return refname[len(prefix) :]
+    return refname
+
+
+def _bre_to_python(pattern: str) -> str:
+    """
+    Convert a POSIX basic regex (used by `git log --author`) to a Python regex: the
+     chars `+?|(){}` are literal, unless escaped.
+    """
+    converted = list()
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "\\" and i + 1 < len(pattern):
+            next_char = pattern[i + 1]
+            converted.append(next_char if next_char in "+?|(){}" else char + next_char)
+            i += 2
+            continue
+        converted.append("\\" + char if char in "+?|(){}" else char)
+        i += 1
+    return "".join(converted)
+
+
+def _parse_pack_object_header(data, offset: int) -> tuple[int, int, int]:
+    """
+    Return the type, the (inflated) size and the position of the data of the object
+     at `offset` in a pack.
+    """
+    byte = data[offset]
+    offset += 1
+    obj_type = (byte >> 4) & 7
+    size = byte & 15
+    shift = 4
+    while byte & 0x80:
+        byte = data[offset]
+        offset += 1
+        size |= (byte & 0x7F) << shift
+        shift += 7
+    return obj_type, size, offset
+
+
+def _parse_ofs_delta_offset(data, pos: int) -> tuple[int, int]:
+    byte = data[pos]
+    pos += 1
+    offset = byte & 0x7F
+    while byte & 0x80:
+        byte = data[pos]
+        pos += 1
+        offset = ((offset + 1) << 7) | (byte & 0x7F)
+    return offset, pos
+
+
+def _inflate(data, pos: int, size: int) -> bytes:
+    decompressor = zlib.decompressobj()
+    # The compressed data is about as big as the inflated data, at most.
+    step = max(size + size // 64 + 64, 4096)
+    chunks = list()
+    while not decompressor.eof:
+        compressed = data[pos : pos + step]
+        if not compressed:
+            raise CorruptObject("Truncated pack")
+        chunks.append(decompressor.decompress(compressed))
+        pos += step
+    inflated = b"".join(chunks)
+    if len(inflated) != size:
+        raise CorruptObject("Wrong size of a packed object")
+    return inflated
+
+
+def _read_varint(data: bytes, pos: int) -> tuple[int, int]:
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            return value, pos
+
+
+def _apply_delta(base: bytes, delta: bytes) -> bytes:
+    base_size, pos = _read_varint(delta, 0)
+    if base_size != len(base):
+        raise CorruptObject("Wrong size of a delta base")
+    result_size, pos = _read_varint(delta, pos)
+    result = bytearray()
+    while pos < len(delta):
+        opcode = delta[pos]
+        pos += 1
+        if opcode & 0x80:
+            # Copy from the base.
+            offset = 0
+            for i in range(4):
+                if opcode & (1 << i):
+                    offset |= delta[pos] << (8 * i)
+                    pos += 1
+            size = 0
+            for i in range(3):
+                if opcode & (0x10 << i):
+                    size |= delta[pos] << (8 * i)
+                    pos += 1
+            result += base[offset : offset + (size or 0x10000)]
+        elif opcode:
+            # Insert new data.
+            result += delta[pos : pos + opcode]
+            pos += opcode
+        else:
+            raise CorruptObject("Invalid delta opcode")
+    if len(result) != result_size:
+        raise CorruptObject("Wrong size of a delta result")
+    return bytes(result)
+
+
+def _find_git_dir(root_dir: Path) -> tuple[Path, str]:
+    """
+    Return the git dir of the repo of `root_dir`, and the dir of `root_dir` in the
+     repo (like: "services/payments/", or "" at the root of the repo).
+    """
+    root_dir = root_dir.expanduser().resolve()
+    for dir_path in (root_dir, *root_dir.parents):
+        prefix = root_dir.relative_to(dir_path).as_posix()
+        prefix = "" if prefix == "." else prefix + "/"
+        dot_git = dir_path / ".git"
+        if dot_git.is_dir():
+            return dot_git, prefix
+        if dot_git.is_file():
+            # A worktree or a submodule, like: gitdir: ../.git/worktrees/foo
+            content = dot_git.read_text().strip()
+            if content.startswith("gitdir: "):
+                return (dir_path / content[8:].strip()).resolve(), prefix
+        # A bare repo.
+        if (
+            (dir_path / "HEAD").is_file()
+            and (dir_path / "objects").is_dir()
+            and (dir_path / "refs").is_dir()
+        ):
+            return dir_path, ""
+    raise NotAGitRepo(root_dir)
+
+
+def _check_repo_format(common_dir: Path):
+    config_path = common_dir / "config"
+    config = config_path.read_text(errors="replace") if config_path.is_file() else ""
+    if re.search(r"^\s*objectformat\s*=\s*sha256", config, re.I | re.M):
+        raise UnsupportedRepo("SHA-256 repos are not supported")
+    if (common_dir / "reftable").is_dir():
+        raise UnsupportedRepo("Reftable repos are not supported")
+
+
+def _read_alternates(objects_dir: Path) -> list[Path]:
+    path = objects_dir / "info" / "alternates"
+    if not path.is_file():
+        return list()
+    alternates = list()
+    for line in path.read_text().splitlines():
+        line = line.strip()
+        if line and not line.startswith("#"):
+            alternates.append((objects_dir / line).resolve())
+    return alternates
+
+
+def _read_shallow(common_dir: Path) -> set[str]:
+    path = common_dir / "shallow"
+    if not path.is_file():
+        return set()
+    return set(path.read_text().split())
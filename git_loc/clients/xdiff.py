@@ -0,0 +1,489 @@
+"""
+A port of the parts of git's xdiff and diffcore that produce `git diff --numstat`:
+ the Myers line diff (with git's heuristics, so that the counts are identical to
+ git's, even when they are not minimal), and the similarity score used to detect the
+ renames. Used by the objects backend (see `git_objects.py`).
+"""
+from collections import Counter, defaultdict
+
+# Ref: xdiff/xdiffi.c and xdiff/xprepare.c.
+XDL_MAX_COST_MIN = 256
+XDL_HEUR_MIN_COST = 256
+XDL_SNAKE_CNT = 20
+XDL_K_HEUR = 4
+XDL_MAX_EQLIMIT = 1024
+XDL_SIMSCAN_WINDOW = 100
+XDL_KPDIS_RUN = 4
+XDL_LINE_MAX = 2**63 - 1
+
+# Ref: diff.c, diffcore-rename.c and diffcore-delta.c.
+FIRST_FEW_BYTES = 8000
+MAX_SCORE = 60000
+DEFAULT_RENAME_SCORE = 30000  # 50%.
+HASHBASE = 107927
+UINT32_MASK = 0xFFFFFFFF
+
+
+def is_binary(data: bytes) -> bool:
+    """
+    Git considers a file binary if there is a NUL byte in its first 8000 bytes.
+    """
+    return b"\0" in data[:FIRST_FEW_BYTES]
+
+
+def split_lines(data: bytes) -> list[bytes]:
+    """
+    Split in lines, like xdiff: on "\\n" only, keeping it (so the last line without a
+     newline differs from the same line with a newline).
+    """
+    parts = data.split(b"\n")
+    lines = [part + b"\n" for part in parts[:-1]]
+    if parts[-1]:
+        lines.append(parts[-1])
+    return lines
+
+
+def count_changed_lines(lines1: list[bytes], lines2: list[bytes]) -> tuple[int, int]:
+    """
+    Return the insertions and deletions from `lines1` to `lines2`, like git's Myers
+     diff (not necessarily minimal).
+    """
+    classes: dict[bytes, int] = dict()
+    ha1 = [classes.setdefault(line, len(classes)) for line in lines1]
+    ha2 = [classes.setdefault(line, len(classes)) for line in lines2]
+    nrec1 = len(ha1)
+    nrec2 = len(ha2)
+    rchg1 = bytearray(nrec1)
+    rchg2 = bytearray(nrec2)
+
+    # xdl_trim_ends: skip the common head and tail.
+    lim = min(nrec1, nrec2)
+    dstart = 0
+    while dstart < lim and ha1[dstart] == ha2[dstart]:
+        dstart += 1
+    lim -= dstart
+    i = 0
+    while i < lim and ha1[nrec1 - 1 - i] == ha2[nrec2 - 1 - i]:
+        i += 1
+    dend1 = nrec1 - i - 1
+    dend2 = nrec2 - i - 1
+
+    # xdl_cleanup_records: the lines with no match in the other file are changed for
+    #  sure, and so are the lines with many matches surrounded by changed lines.
+    count1 = Counter(ha1)
+    count2 = Counter(ha2)
+    rindex1, rha1 = _cleanup_records(ha1, dstart, dend1, count2, nrec1, rchg1)
+    rindex2, rha2 = _cleanup_records(ha2, dstart, dend2, count1, nrec2, rchg2)
+
+    _recs_cmp(rha1, rindex1, rchg1, rha2, rindex2, rchg2)
+    return sum(rchg2), sum(rchg1)
+
+
+def _bogosqrt(n: int) -> int:
+    i = 1
+    while n > 0:
+        i <<= 1
+        n >>= 2
+    return i
+
+
+def _cleanup_records(
+    ha: list[int],
+    dstart: int,
+    dend: int,
+    other_count: Counter,
+    nrec: int,
+    rchg: bytearray,
+) -> tuple[list[int], list[int]]:
+    mlim = min(_bogosqrt(nrec), XDL_MAX_EQLIMIT)
+    # 0: no match (discard), 1: keep, 2: many matches (maybe discard).
+    dis = bytearray(nrec + 1)
+    for i in range(dstart, dend + 1):
+        nm = other_count.get(ha[i], 0)
+        dis[i] = 0 if nm == 0 else 2 if nm >= mlim else 1
+    rindex = list()
+    rha = list()
+    for i in range(dstart, dend + 1):
+        if dis[i] == 1 or (dis[i] == 2 and not _clean_mmatch(dis, i, dstart, dend)):
+            rindex.append(i)
+            rha.append(ha[i])
+        else:
+            rchg[i] = 1
+    return rindex, rha
+
+
+def _clean_mmatch(dis: bytearray, i: int, s: int, e: int) -> bool:
+    if i - s > XDL_SIMSCAN_WINDOW:
+        s = i - XDL_SIMSCAN_WINDOW
+    if e - i > XDL_SIMSCAN_WINDOW:
+        e = i + XDL_SIMSCAN_WINDOW
+
+    r = 1
+    rdis0 = 0
+    rpdis0 = 1
+    while i - r >= s:
+        if not dis[i - r]:
+            rdis0 += 1
+        elif dis[i - r] == 2:
+            rpdis0 += 1
+        else:
+            break
+        r += 1
+    if rdis0 == 0:
+        return False
+    r = 1
+    rdis1 = 0
+    rpdis1 = 1
+    while i + r <= e:
+        if not dis[i + r]:
+            rdis1 += 1
+        elif dis[i + r] == 2:
+            rpdis1 += 1
+        else:
+            break
+        r += 1
+    if rdis1 == 0:
+        return False
+    rdis1 += rdis0
+    rpdis1 += rpdis0
+    return rpdis1 * XDL_KPDIS_RUN < rpdis1 + rdis1
+
+
+def _recs_cmp(
+    ha1: list[int],
+    rindex1: list[int],
+    rchg1: bytearray,
+    ha2: list[int],
+    rindex2: list[int],
+    rchg2: bytearray,
+):
+    """
+    xdl_recs_cmp: divide and conquer, with a stack instead of the recursion.
+    """
+    ndiags = len(ha1) + len(ha2) + 3
+    kvdf = [0] * ndiags
+    kvdb = [0] * ndiags
+    # The diagonals can be negative (down to -len(ha2) - 1).
+    koff = len(ha2) + 1
+    mxcost = max(_bogosqrt(ndiags), XDL_MAX_COST_MIN)
+
+    stack = [(0, len(ha1), 0, len(ha2), False)]
+    while stack:
+        off1, lim1, off2, lim2, need_min = stack.pop()
+        while off1 < lim1 and off2 < lim2 and ha1[off1] == ha2[off2]:
+            off1 += 1
+            off2 += 1
+        while off1 < lim1 and off2 < lim2 and ha1[lim1 - 1] == ha2[lim2 - 1]:
+            lim1 -= 1
+            lim2 -= 1
+
+        if off1 == lim1:
+            for i in range(off2, lim2):
+                rchg2[rindex2[i]] = 1
+        elif off2 == lim2:
+            for i in range(off1, lim1):
+                rchg1[rindex1[i]] = 1
+        else:
+            i1, i2, min_lo, min_hi = _split(
+                ha1, off1, lim1, ha2, off2, lim2, kvdf, kvdb, koff, need_min, mxcost
+            )
+            # The low half first, like git.
+            stack.append((i1, lim1, i2, lim2, min_hi))
+            stack.append((off1, i1, off2, i2, min_lo))
+
+
+def _split(ha1, off1, lim1, ha2, off2, lim2, kvdf, kvdb, koff, need_min, mxcost):
+    """
+    xdl_split: find the middle snake, or a good enough split when the edit cost is
+     too high. Return (i1, i2, min_lo, min_hi).
+    """
+    dmin = off1 - lim2
+    dmax = lim1 - off2
+    fmid = off1 - off2
+    bmid = lim1 - lim2
+    odd = (fmid - bmid) & 1
+    fmin = fmax = fmid
+    bmin = bmax = bmid
+
+    kvdf[fmid + koff] = off1
+    kvdb[bmid + koff] = lim1
+
+    ec = 0
+    while True:
+        ec += 1
+        got_snake = False
+
+        # Forward path.
+        if fmin > dmin:
+            fmin -= 1
+            kvdf[fmin - 1 + koff] = -1
+        else:
+            fmin += 1
+        if fmax < dmax:
+            fmax += 1
+            kvdf[fmax + 1 + koff] = -1
+        else:
+            fmax -= 1
+        for d in range(fmax, fmin - 1, -2):
+            if kvdf[d - 1 + koff] >= kvdf[d + 1 + koff]:
+                i1 = kvdf[d - 1 + koff] + 1
+            else:
+                i1 = kvdf[d + 1 + koff]
+            prev1 = i1
+            i2 = i1 - d
+            while i1 < lim1 and i2 < lim2 and ha1[i1] == ha2[i2]:
+                i1 += 1
+                i2 += 1
+            if i1 - prev1 > XDL_SNAKE_CNT:
+                got_snake = True
+            kvdf[d + koff] = i1
+            if odd and bmin <= d <= bmax and kvdb[d + koff] <= i1:
+                return i1, i2, True, True
+
+        # Backward path.
+        if bmin > dmin:
+            bmin -= 1
+            kvdb[bmin - 1 + koff] = XDL_LINE_MAX
+        else:
+            bmin += 1
+        if bmax < dmax:
+            bmax += 1
+            kvdb[bmax + 1 + koff] = XDL_LINE_MAX
+        else:
+            bmax -= 1
+        for d in range(bmax, bmin - 1, -2):
+            if kvdb[d - 1 + koff] < kvdb[d + 1 + koff]:
+                i1 = kvdb[d - 1 + koff]
+            else:
+                i1 = kvdb[d + 1 + koff] - 1
+            prev1 = i1
+            i2 = i1 - d
+            while i1 > off1 and i2 > off2 and ha1[i1 - 1] == ha2[i2 - 1]:
+                i1 -= 1
+                i2 -= 1
+            if prev1 - i1 > XDL_SNAKE_CNT:
+                got_snake = True
+            kvdb[d + koff] = i1
+            if not odd and fmin <= d <= fmax and i1 <= kvdf[d + koff]:
+                return i1, i2, True, True
+
+        if need_min:
+            continue
+
+        # The edit cost is high, but we got a good snake: look for a diagonal that
+        #  reached an "interesting" path.
+        if got_snake and ec > XDL_HEUR_MIN_COST:
+            best = 0
+            for d in range(fmax, fmin - 1, -2):
+                dd = d - fmid if d > fmid else fmid - d
+                i1 = kvdf[d + koff]
+                i2 = i1 - d
+                v = (i1 - off1) + (i2 - off2) - dd
+                if (
+                    v > XDL_K_HEUR * ec
+                    and v > best
+                    and off1 + XDL_SNAKE_CNT <= i1 < lim1
+                    and off2 + XDL_SNAKE_CNT <= i2 < lim2
+                ):
+                    k = 1
+                    while ha1[i1 - k] == ha2[i2 - k]:
+                        if k == XDL_SNAKE_CNT:
+                            best = v
+                            spl = (i1, i2)
+                            break
+                        k += 1
+            if best > 0:
+                return spl[0], spl[1], True, False
+
+            best = 0
+            for d in range(bmax, bmin - 1, -2):
+                dd = d - bmid if d > bmid else bmid - d
+                i1 = kvdb[d + koff]
+                i2 = i1 - d
+                v = (lim1 - i1) + (lim2 - i2) - dd
+                if (
+                    v > XDL_K_HEUR * ec
+                    and v > best
+                    and off1 < i1 <= lim1 - XDL_SNAKE_CNT
+                    and off2 < i2 <= lim2 - XDL_SNAKE_CNT
+                ):
+                    k = 0
+                    while ha1[i1 + k] == ha2[i2 + k]:
+                        if k == XDL_SNAKE_CNT - 1:
+                            best = v
+                            spl = (i1, i2)
+                            break
+                        k += 1
+            if best > 0:
+                return spl[0], spl[1], False, True
+
+        # Enough is enough: take the furthest reaching path.
+        if ec >= mxcost:
+            fbest = fbest1 = -1
+            for d in range(fmax, fmin - 1, -2):
+                i1 = min(kvdf[d + koff], lim1)
+                i2 = i1 - d
+                if lim2 < i2:
+                    i1 = lim2 + d
+                    i2 = lim2
+                if fbest < i1 + i2:
+                    fbest = i1 + i2
+                    fbest1 = i1
+
+            bbest = bbest1 = XDL_LINE_MAX
+            for d in range(bmax, bmin - 1, -2):
+                i1 = max(off1, kvdb[d + koff])
+                i2 = i1 - d
+                if i2 < off2:
+                    i1 = off2 + d
+                    i2 = off2
+                if i1 + i2 < bbest:
+                    bbest = i1 + i2
+                    bbest1 = i1
+
+            if (lim1 + lim2) - bbest < fbest - (off1 + off2):
+                return fbest1, fbest - fbest1, True, False
+            return bbest1, bbest - bbest1, False, True
+
+
+def hash_spans(data: bytes) -> dict[int, int]:
+    """
+    Hash the file in spans (lines, or 64 bytes chunks), like diffcore-delta: return
+     the number of bytes for each span hash.
+    """
+    is_text = not is_binary(data)
+    counts: dict[int, int] = defaultdict(int)
+    n = 0
+    accum1 = accum2 = 0
+    size = len(data)
+    for i in range(size):
+        c = data[i]
+        # Ignore CR in CRLF sequence if text.
+        if is_text and c == 13 and i + 1 < size and data[i + 1] == 10:
+            continue
+        old_1 = accum1
+        accum1 = ((accum1 << 7) ^ (accum2 >> 25)) & UINT32_MASK
+        accum2 = ((accum2 << 7) ^ (old_1 >> 25)) & UINT32_MASK
+        accum1 = (accum1 + c) & UINT32_MASK
+        n += 1
+        if n < 64 and c != 10:
+            continue
+        counts[((accum1 + accum2 * 0x61) & UINT32_MASK) % HASHBASE] += n
+        n = 0
+        accum1 = accum2 = 0
+    if n > 0:
+        counts[((accum1 + accum2 * 0x61) & UINT32_MASK) % HASHBASE] += n
+    return counts
+
+
+def estimate_similarity(
+    src_size: int,
+    dst_size: int,
+    get_src_spans,
+    get_dst_spans,
+    minimum_score: int = DEFAULT_RENAME_SCORE,
+) -> int:
+    """
+    Return how similar two (regular) files are, between 0 and MAX_SCORE, like
+     diffcore-rename. The spans (see `hash_spans`) are only computed, by calling
+     `get_src_spans` and `get_dst_spans`, if the sizes are close enough.
+    """
+    max_size = max(src_size, dst_size)
+    base_size = min(src_size, dst_size)
+    delta_size = max_size - base_size
+    # Edits that change the size so drastically are not considered.
+    if max_size * (MAX_SCORE - minimum_score) < delta_size * MAX_SCORE:
+        return 0
+    if not dst_size:
+        return 0
+    src_spans = get_src_spans()
+    dst_spans = get_dst_spans()
+    src_copied = 0
+    for hashval, src_cnt in src_spans.items():
+        src_copied += min(src_cnt, dst_spans.get(hashval, 0))
+    return src_copied * MAX_SCORE // max_size
+
+
+def basename_same(src_path: bytes, dst_path: bytes) -> bool:
+    return src_path.rpartition(b"/")[2] == dst_path.rpartition(b"/")[2]
+
+
+def quote_path(path: bytes) -> str:
+    """
+    Quote a path like git does in its output (with core.quotePath true): in double
+     quotes with C-style escapes, if it has control chars, quotes, backslashes or
+     non-ASCII bytes.
+    """
+    if not any(_must_quote(c) for c in path):
+        return path.decode("ascii")
+    quoted = ['"']
+    for c in path:
+        if c in _C_ESCAPES:
+            quoted.append("\\" + _C_ESCAPES[c])
+        elif _must_quote(c):
+            quoted.append(f"\\{c:03o}")
+        else:
+            quoted.append(chr(c))
+    quoted.append('"')
+    return "".join(quoted)
+
+
+_C_ESCAPES = {
+    7: "a",
+    8: "b",
+    9: "t",
+    10: "n",
+    11: "v",
+    12: "f",
+    13: "r",
+    ord('"'): '"',
+    ord("\\"): "\\",
+}
+
+
+def _must_quote(c: int) -> bool:
+    return c < 0x20 or c == 0x22 or c == 0x5C or c >= 0x7F
+
+
+def format_rename(src_path: bytes, dst_path: bytes) -> str:
+    """
+    Format a renamed path like git's numstat: "dir/{old => new}/file.py".
+    """
+    if any(_must_quote(c) for c in src_path + dst_path):
+        return f"{quote_path(src_path)} => {quote_path(dst_path)}"
+    a = src_path.decode("ascii")
+    b = dst_path.decode("ascii")
+    len_a = len(a)
+    len_b = len(b)
+
+    # The common prefix, up to a slash.
+    pfx_length = 0
+    i = 0
+    while i < len_a and i < len_b and a[i] == b[i]:
+        if a[i] == "/":
+            pfx_length = i + 1
+        i += 1
+
+    # The common suffix, from a slash. The index len is the (equal) string end.
+    sfx_length = 0
+    pfx_adjust_for_slash = 1 if pfx_length else 0
+    ia = len_a
+    ib = len_b
+    while (
+        pfx_length - pfx_adjust_for_slash <= ia
+        and pfx_length - pfx_adjust_for_slash <= ib
+        and (a[ia] if ia < len_a else "") == (b[ib] if ib < len_b else "")
+    ):
+        if ia < len_a and a[ia] == "/":
+            sfx_length = len_a - ia
+        ia -= 1
+        ib -= 1
+
+    a_midlen = max(len_a - pfx_length - sfx_length, 0)
+    b_midlen = max(len_b - pfx_length - sfx_length, 0)
+    a_mid = a[pfx_length : pfx_length + a_midlen]
+    b_mid = b[pfx_length : pfx_length + b_midlen]
+    if pfx_length + sfx_length:
+        suffix = a[len_a - sfx_length :] if sfx_length else ""
+        return f"{a[:pfx_length]}{{{a_mid} => {b_mid}}}{suffix}"
+    return f"{a_mid} => {b_mid}"
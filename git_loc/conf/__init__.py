@@ -1 +1,12 @@
-from .config import settings
+# Dynaconf (and the settings files) are loaded lazily, on the first access to the
+#  settings, not when importing this package: use `get_settings()` to read the settings
+#  and `settings` (the Dynaconf object) only to inspect or override them.
+from .snapshot import SettingsSnapshot, get_settings, reset_settings, set_setting
+
+
+def __getattr__(name):
+    if name == "settings":
+        from .config import settings
+
+        return settings
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,80 @@
+import threading
+from types import MappingProxyType
+from typing import Any, Optional
+
+
+class BaseSettingsException(Exception):
+    pass
+
+
+class FrozenSettings(BaseSettingsException):
+    pass
+
+
+class SettingsSnapshot:
+    __slots__ = ("_data",)
+
+    def __init__(self, data: dict):
+        """
+        A frozen copy of the settings: a plain dict lookup (no Dynaconf machinery),
+         for the settings read in hot paths (like `ConsoleAdapter.print`).
+        """
+        object.__setattr__(self, "_data", MappingProxyType(dict(data)))
+
+    def __getattr__(self, key: str) -> Any:
+        try:
+            return self._data[key]
+        except KeyError:
+            raise AttributeError(key) from None
+
+    def __setattr__(self, key: str, value: Any):
+        raise FrozenSettings
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._data
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self._data.get(key, default)
+
+    def as_dict(self) -> dict:
+        return dict(self._data)
+
+
+_snapshot: Optional[SettingsSnapshot] = None
+_lock = threading.Lock()
+
+
+def get_settings() -> SettingsSnapshot:
+    """
+    Return the snapshot of the settings, resolved (by Dynaconf) on the first call only.
+    """
+    global _snapshot
+    snapshot = _snapshot
+    if snapshot is None:
+        with _lock:
+            if _snapshot is None:
+                from .config import settings
+
+                _snapshot = SettingsSnapshot(settings.as_dict())
+            snapshot = _snapshot
+    return snapshot
+
+
+def reset_settings():
+    """
+    Drop the snapshot, so the next `get_settings()` resolves the settings again (eg.
+     after they were overridden).
+    """
+    global _snapshot
+    with _lock:
+        _snapshot = None
+
+
+def set_setting(key: str, value: Any):
+    """
+    Override a setting in this process (and update the snapshot).
+    """
+    from .config import settings
+
+    settings.set(key, value)
+    reset_settings()
@@ -0,0 +1,204 @@
+import heapq
+import sys
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional
+
+from ..clients.git_client import GitLogEntry
+
+
+@dataclass
+class LocStats:
+    insertions: int = 0
+    deletions: int = 0
+    commits: int = 0
+
+    @property
+    def loc(self) -> int:
+        return self.insertions + self.deletions
+
+
+class BaseAggregator:
+    """
+    Aggregate the LOC while `LocCounter.count` walks the history, so many breakdowns can
+     be computed in a single traversal.
+
+    `add_commit` is called once per commit with the insertions and deletions of its
+     non-ignored files. If `is_per_file` is True, then `add_file` is also called for
+     each non-ignored file (binary files have 0 insertions and deletions).
+    """
+
+    is_per_file = False
+
+    def add_commit(self, commit: GitLogEntry, insertions: int, deletions: int):
+        pass
+
+    def add_file(self, commit: GitLogEntry, path: str, insertions: int, deletions: int):
+        pass
+
+
+class AuthorAggregator(BaseAggregator):
+    def __init__(
+        self,
+        aliases: Optional[dict[str, str]] = None,
+        do_normalize: bool = True,
+    ):
+        """
+        Aggregate the LOC by author email.
+
+        `do_normalize`: lowercase and strip the emails, so `John@Gmail.com` and
+         `john@gmail.com` are the same author.
+        `aliases`: map an email (normalized, if `do_normalize`) to the email to use
+         instead, eg. to merge the work and personal emails of a developer.
+        """
+        self.do_normalize = do_normalize
+        self.aliases = dict()
+        for alias, email in (aliases or dict()).items():
+            self.aliases[self._normalize(alias)] = self._normalize(email)
+        self.stats: dict[str, LocStats] = dict()
+
+    def _normalize(self, email: str) -> str:
+        if self.do_normalize:
+            return email.strip().lower()
+        return email
+
+    def add_commit(self, commit: GitLogEntry, insertions: int, deletions: int):
+        self.add_stats(commit.email, insertions, deletions, 1)
+
+    def add_stats(self, email: str, insertions: int, deletions: int, commits: int):
+        """
+        Add the LOC of many commits of `email` at once (see `count_store_numpy`).
+        """
+        email = self._normalize(email)
+        email = self.aliases.get(email, email)
+        try:
+            stats = self.stats[email]
+        except KeyError:
+            stats = self.stats[email] = LocStats()
+        stats.insertions += insertions
+        stats.deletions += deletions
+        stats.commits += commits
+
+    def get_sorted_stats(self) -> list[tuple[str, LocStats]]:
+        """
+        Return the stats sorted by LOC, the highest first.
+        """
+        return sorted(self.stats.items(), key=lambda x: (-x[1].loc, x[0]))
+
+
+class PathAggregator(BaseAggregator):
+    is_per_file = True
+
+    def __init__(self):
+        """
+        Aggregate the LOC by file path, so the memory depends on the number of distinct
+         paths rather than on the number of commits by files. The paths are interned,
+         as the same path is read in many commits.
+        """
+        self.stats: dict[str, LocStats] = dict()
+
+    def add_file(self, commit: GitLogEntry, path: str, insertions: int, deletions: int):
+        self.add_stats(path, insertions, deletions, 1)
+
+    def add_stats(self, path: str, insertions: int, deletions: int, commits: int):
+        """
+        Add the LOC of `path` in many commits at once (see `count_store_numpy`).
+        """
+        try:
+            stats = self.stats[path]
+        except KeyError:
+            stats = self.stats[sys.intern(path)] = LocStats()
+        stats.insertions += insertions
+        stats.deletions += deletions
+        stats.commits += commits
+
+    def get_top_stats(self, n: Optional[int] = None) -> list[tuple[str, LocStats]]:
+        """
+        Return the `n` most churned paths (all the paths if `n` is None), sorted by LOC,
+         the highest first.
+        """
+        key = lambda x: (-x[1].loc, x[0])
+        if n is None:
+            return sorted(self.stats.items(), key=key)
+        # A heap of size n, instead of sorting all the paths.
+        return heapq.nsmallest(n, self.stats.items(), key=key)
+
+
+# Time buckets.
+BUCKET_DAY = "day"
+BUCKET_WEEK = "week"
+BUCKET_MONTH = "month"
+BUCKETS = (BUCKET_DAY, BUCKET_WEEK, BUCKET_MONTH)
+
+
+class BaseAggregatorException(Exception):
+    pass
+
+
+class UnknownBucket(BaseAggregatorException):
+    def __init__(self, bucket):
+        self.bucket = bucket
+
+
+class BucketAggregator(BaseAggregator):
+    def __init__(self, bucket: str):
+        """
+        Aggregate the LOC by commit date in buckets of a day, a week or a month.
+
+        The buckets are named after their first day, like: 2020-02-10 (a day, or the
+         week starting on Monday 2020-02-10), or 2020-02 (a month).
+        """
+        if bucket not in BUCKETS:
+            raise UnknownBucket(bucket)
+        self.bucket = bucket
+        self.stats: dict[str, LocStats] = dict()
+        # Many commits have the same date: memoize the bucket of each date.
+        self._date_to_bucket: dict[str, str] = dict()
+
+    def _get_bucket(self, date: str) -> str:
+        try:
+            return self._date_to_bucket[date]
+        except KeyError:
+            pass
+        # `date` is like: 2020-02-12.
+        if self.bucket == BUCKET_DAY:
+            bucket = date
+        elif self.bucket == BUCKET_MONTH:
+            bucket = date[:7]
+        else:
+            day = datetime.strptime(date, "%Y-%m-%d").date()
+            bucket = (day - timedelta(days=day.weekday())).isoformat()
+        self._date_to_bucket[date] = bucket
+        return bucket
+
+    def add_commit(self, commit: GitLogEntry, insertions: int, deletions: int):
+        self.add_stats(commit.date, insertions, deletions, 1)
+
+    def add_stats(self, date: str, insertions: int, deletions: int, commits: int):
+        """
+        Add the LOC of many commits on `date` at once (see `count_store_numpy`).
+        """
+        bucket = self._get_bucket(date)
+        try:
+            stats = self.stats[bucket]
+        except KeyError:
+            stats = self.stats[bucket] = LocStats()
+        stats.insertions += insertions
+        stats.deletions += deletions
+        stats.commits += commits
+
+    def get_records(self) -> list[dict]:
+        """
+        Return the stats of each bucket, sorted by bucket, like:
+         {"bucket": "2020-02", "insertions": 10, "deletions": 2, "loc": 12, "commits": 1}
+        """
+        return [
+            dict(
+                bucket=bucket,
+                insertions=stats.insertions,
+                deletions=stats.deletions,
+                loc=stats.loc,
+                commits=stats.commits,
+            )
+            for bucket, stats in sorted(self.stats.items())
+        ]
@@ -0,0 +1,152 @@
+import tomllib
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from pathlib import Path
+from typing import Optional
+
+from ..conf import set_setting
+from .main import LocCounter
+from .writers import FORMAT_NONE
+
+# `error` is None if the count succeeded, else a description of the exception.
+RepoResult = namedtuple("RepoResult", ("root_dir", "branch", "loc_tot", "error"))
+
+# Options of `LocCounter.count` that can be set in a manifest.
+COUNT_OPTIONS = (
+    "branch",
+    "author",
+    "start_date",
+    "end_date",
+    "files_to_ignore",
+    "globs_to_ignore",
+    "ignore_file_path",
+    "paths",
+    "paths_to_exclude",
+    "strategy",
+    "jobs",
+    "do_use_cache",
+)
+
+
+class BaseBatchLocCounterException(Exception):
+    pass
+
+
+class InvalidManifest(BaseBatchLocCounterException):
+    def __init__(self, reason: str):
+        self.reason = reason
+
+    def __str__(self):
+        return self.reason
+
+
+class BatchLocCounter:
+    def __init__(self, repos_options: list[dict]):
+        """
+        Count the LOC in many repos, in a pool of processes.
+
+        `repos_options` is a list of dicts, each with the `root_dir` of a repo and the
+         kwargs for `LocCounter.count` (at least `branch`).
+        """
+        self.repos_options = repos_options
+
+    @classmethod
+    def from_manifest(cls, path: Path | str) -> "BatchLocCounter":
+        """
+        Read the repos from a TOML manifest like:
+
+            [defaults]  # Shared by all repos, optional.
+            branch = "master"
+            start_date = 2020-01-01
+            files_to_ignore = ["package-lock.json", "poetry.lock"]
+
+            [[repos]]
+            root_dir = "/srv/repos/payments"
+
+            [[repos]]
+            root_dir = "/srv/repos/users"
+            branch = "main"
+        """
+        try:
+            manifest = tomllib.loads(Path(path).read_text())
+        except tomllib.TOMLDecodeError as exc:
+            raise InvalidManifest(f"Invalid TOML: {exc}") from exc
+
+        defaults = manifest.get("defaults", dict())
+        repos_options = list()
+        for repo in manifest.get("repos", list()):
+            options = {**defaults, **repo}
+            unknown_options = set(options) - set(COUNT_OPTIONS) - {"root_dir"}
+            if unknown_options:
+                raise InvalidManifest(f"Unknown options: {sorted(unknown_options)}")
+            if not options.get("root_dir") or not options.get("branch"):
+                raise InvalidManifest("Each repo requires a root_dir and a branch")
+            for key in ("start_date", "end_date"):
+                options[key] = _to_datetime(options.get(key))
+            repos_options.append(options)
+        if not repos_options:
+            raise InvalidManifest("No repos")
+        return cls(repos_options)
+
+    def count(self, processes: Optional[int] = None) -> list[RepoResult]:
+        """
+        Return the results in the same order as the repos. A failure in a repo is
+         reported in its result and does not stop the other repos.
+        """
+        results = list()
+        with ProcessPoolExecutor(
+            max_workers=processes, initializer=_init_worker
+        ) as executor:
+            futures = [
+                executor.submit(_count_repo, options) for options in self.repos_options
+            ]
+            for options, future in zip(self.repos_options, futures):
+                try:
+                    result = future.result()
+                except Exception as exc:
+                    # Eg. the worker process died.
+                    result = RepoResult(
+                        root_dir=str(options["root_dir"]),
+                        branch=options["branch"],
+                        loc_tot=None,
+                        error=repr(exc),
+                    )
+                results.append(result)
+        return results
+
+
+def _init_worker():
+    # The workers share the stdout: do not print their messages.
+    set_setting("DO_SUPPRESS_PRINT", True)
+
+
+def _count_repo(options: dict) -> RepoResult:
+    options = dict(options)
+    root_dir = options.pop("root_dir")
+    try:
+        loc_tot = LocCounter(root_dir).count(output_format=FORMAT_NONE, **options)
+    except Exception as exc:
+        return RepoResult(
+            root_dir=str(root_dir),
+            branch=options["branch"],
+            loc_tot=None,
+            error=repr(exc),
+        )
+    return RepoResult(
+        root_dir=str(root_dir),
+        branch=options["branch"],
+        loc_tot=loc_tot,
+        error=None,
+    )
+
+
+def _to_datetime(value) -> Optional[datetime]:
+    if value is None or isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except (TypeError, ValueError) as exc:
+        raise InvalidManifest(f"Not a valid date: {value}") from exc
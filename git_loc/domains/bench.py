@@ -0,0 +1,282 @@
+import json
+import multiprocessing
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Collection, Optional
+
+from ..__version__ import __version__
+from ..clients.git_client import (
+    DIFF_BACKEND_DIFF,
+    DIFF_BACKEND_DIFF_TREE,
+    GIT_BACKEND_OBJECTS,
+    GIT_BACKEND_SUBPROCESS,
+    get_n_git_processes,
+)
+from ..conf import set_setting
+from .main import STRATEGY_DIFF, STRATEGY_LOG_NUMSTAT, LocCounter
+from .writers import FORMAT_NONE
+
+# The size and shape of a synthetic repo. The same spec always generates the same repo
+#  (same commit hashes).
+SyntheticRepoSpec = namedtuple(
+    "SyntheticRepoSpec",
+    (
+        "n_commits",
+        "n_files_per_commit",
+        "n_lines_per_file",
+        "n_authors",
+        "binary_ratio",
+        "seed",
+    ),
+    defaults=(500, 5, 50, 5, 0.05, 0),
+)
+
+# A way to run `LocCounter.count`.
+BenchConfig = namedtuple(
+    "BenchConfig", ("name", "strategy", "git_backend", "diff_backend")
+)
+BENCH_CONFIGS = (
+    BenchConfig("diff", STRATEGY_DIFF, GIT_BACKEND_SUBPROCESS, DIFF_BACKEND_DIFF),
+    BenchConfig(
+        "diff-tree", STRATEGY_DIFF, GIT_BACKEND_SUBPROCESS, DIFF_BACKEND_DIFF_TREE
+    ),
+    BenchConfig(
+        "log-numstat", STRATEGY_LOG_NUMSTAT, GIT_BACKEND_SUBPROCESS, DIFF_BACKEND_DIFF
+    ),
+    BenchConfig(
+        "objects", STRATEGY_LOG_NUMSTAT, GIT_BACKEND_OBJECTS, DIFF_BACKEND_DIFF
+    ),
+)
+BENCH_CONFIG_NAMES = tuple(x.name for x in BENCH_CONFIGS)
+
+# `peak_rss_kb` is the peak RSS of the (spawned) Python process running the count
+#  (its own memory, not the one of the bench process), `git_peak_rss_kb` the one of
+#  the biggest git process (at least the RSS of the Python process when it forked it).
+BenchResult = namedtuple(
+    "BenchResult",
+    (
+        "name",
+        "n_commits",
+        "loc_tot",
+        "wall_time_s",
+        "commits_per_s",
+        "n_git_processes",
+        "peak_rss_kb",
+        "git_peak_rss_kb",
+    ),
+)
+
+# Synthetic commits are 1 hour apart, starting on 2020-01-01.
+START_TIMESTAMP = 1577836800
+
+
+class BaseBenchException(Exception):
+    pass
+
+
+class InvalidBenchResults(BaseBenchException):
+    def __init__(self, reason: str):
+        self.reason = reason
+
+    def __str__(self):
+        return self.reason
+
+
+def generate_repo(root_dir: Path | str, spec: SyntheticRepoSpec) -> None:
+    """
+    Generate a Git repo in `root_dir` with the commits described by `spec`, in the
+     branch master, using a single `git fast-import` process.
+
+    Each commit, by a random author, adds, edits or deletes `spec.n_files_per_commit`
+     files out of a pool of `10 * spec.n_files_per_commit` paths. A share
+     `spec.binary_ratio` of the paths are binary files.
+    """
+    rnd = random.Random(spec.seed)
+    n_paths = 10 * spec.n_files_per_commit
+    n_binary_paths = round(n_paths * spec.binary_ratio)
+    paths = [
+        f"dir{i % 10}/file{i}.bin" if i < n_binary_paths else f"dir{i % 10}/file{i}.txt"
+        for i in range(n_paths)
+    ]
+    # The current lines of each text file.
+    files: dict[str, list[str]] = dict()
+
+    stream = bytearray()
+    for i in range(spec.n_commits):
+        author = f"author{rnd.randrange(spec.n_authors)}"
+        message = f"Commit {i}".encode()
+        stream += b"commit refs/heads/master\n"
+        stream += (
+            f"committer {author} <{author}@example.com>"
+            f" {START_TIMESTAMP + i * 3600} +0000\n"
+        ).encode()
+        stream += b"data %d\n%s\n" % (len(message), message)
+        for path in rnd.sample(paths, spec.n_files_per_commit):
+            if path.endswith(".bin"):
+                content = b"\0" + rnd.randbytes(spec.n_lines_per_file * 20)
+            elif path in files and rnd.random() < 0.05:
+                del files[path]
+                stream += f"D {path}\n".encode()
+                continue
+            else:
+                files[path] = _edit_lines(rnd, files.get(path), spec.n_lines_per_file)
+                content = "".join(files[path]).encode()
+            stream += f"M 644 inline {path}\n".encode()
+            stream += b"data %d\n%s\n" % (len(content), content)
+    subprocess.run(["git", "init", "-q", "-b", "master", str(root_dir)], check=True)
+    subprocess.run(
+        ["git", "fast-import", "--quiet"],
+        cwd=root_dir,
+        input=bytes(stream),
+        check=True,
+    )
+
+
+def _edit_lines(
+    rnd: random.Random, lines: Optional[list[str]], n_lines: int
+) -> list[str]:
+    if not lines:
+        return [_random_line(rnd) for _ in range(rnd.randint(1, 2 * n_lines))]
+    lines = list(lines)
+    for _ in range(rnd.randint(1, max(1, n_lines // 10))):
+        pos = rnd.randrange(len(lines) + 1)
+        op = rnd.random()
+        if op < 0.4:
+            lines[pos:pos] = [_random_line(rnd) for _ in range(rnd.randint(1, 5))]
+        elif op < 0.7 and len(lines) > 1:
+            del lines[pos : pos + rnd.randint(1, 3)]
+        else:
+            lines[pos : pos + 1] = [_random_line(rnd)]
+    return lines
+
+
+def _random_line(rnd: random.Random) -> str:
+    return f"x = {rnd.randrange(10**6)}\n"
+
+
+class Bench:
+    def __init__(self, spec: SyntheticRepoSpec):
+        """
+        Measure `LocCounter.count` on the synthetic repo described by `spec`.
+        """
+        self.spec = spec
+
+    def run(
+        self,
+        config_names: Collection[str] = BENCH_CONFIG_NAMES,
+        jobs: int = 1,
+        repeat: int = 1,
+    ) -> list[BenchResult]:
+        """
+        Return a result for each config, the fastest of `repeat` runs.
+
+        Each run is in a new interpreter (spawned, not forked), so that its peak RSS
+         is neither the one of a previous run nor includes the memory of this
+         process. The diff cache is not used.
+        """
+        configs = [x for x in BENCH_CONFIGS if x.name in config_names]
+        results = list()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            generate_repo(tmp_dir, self.spec)
+            for config in configs:
+                runs = list()
+                for _ in range(repeat):
+                    with ProcessPoolExecutor(
+                        max_workers=1, mp_context=multiprocessing.get_context("spawn")
+                    ) as executor:
+                        future = executor.submit(
+                            _run_config, tmp_dir, config, self.spec.n_commits, jobs
+                        )
+                        runs.append(future.result())
+                results.append(min(runs, key=lambda x: x.wall_time_s))
+        return results
+
+
+def _run_config(
+    root_dir: str, config: BenchConfig, n_commits: int, jobs: int
+) -> BenchResult:
+    set_setting("DO_SUPPRESS_PRINT", True)
+    set_setting("GIT_BACKEND", config.git_backend)
+    set_setting("GIT_DIFF_BACKEND", config.diff_backend)
+    n_git_processes = get_n_git_processes()
+    t0 = time.perf_counter()
+    loc_tot = LocCounter(root_dir).count(
+        branch="master",
+        strategy=config.strategy,
+        jobs=jobs,
+        do_use_cache=False,
+        output_format=FORMAT_NONE,
+    )
+    wall_time_s = time.perf_counter() - t0
+    return BenchResult(
+        name=config.name,
+        n_commits=n_commits,
+        loc_tot=loc_tot,
+        wall_time_s=wall_time_s,
+        commits_per_s=n_commits / wall_time_s,
+        n_git_processes=get_n_git_processes() - n_git_processes,
+        peak_rss_kb=_get_self_peak_rss_kb(),
+        git_peak_rss_kb=_get_peak_rss_kb(resource.RUSAGE_CHILDREN),
+    )
+
+
+def _get_self_peak_rss_kb() -> int:
+    # On Linux, `ru_maxrss` is kept across exec: so even in a spawned process it is
+    #  at least the RSS of the process that forked it. The peak RSS of the memory of
+    #  this process only is `VmHWM`.
+    try:
+        with open("/proc/self/status") as fp:
+            for line in fp:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return _get_peak_rss_kb(resource.RUSAGE_SELF)
+
+
+def _get_peak_rss_kb(who: int) -> int:
+    peak_rss = resource.getrusage(who).ru_maxrss
+    # In bytes on macOS, in KB on Linux.
+    if sys.platform == "darwin":
+        peak_rss //= 1024
+    return peak_rss
+
+
+def save_results(
+    path: Path | str, spec: SyntheticRepoSpec, results: Collection[BenchResult]
+) -> None:
+    """
+    Write the results to a JSON file, with the versions of git-loc, Python and git,
+     to compare them later with `load_results`.
+    """
+    git_version = subprocess.run(
+        ["git", "--version"], capture_output=True, check=True
+    ).stdout.decode("utf-8")
+    data = dict(
+        git_loc_version=__version__,
+        python_version=platform.python_version(),
+        git_version=git_version.strip(),
+        spec=spec._asdict(),
+        results=[x._asdict() for x in results],
+    )
+    Path(path).write_text(json.dumps(data, indent=2) + "\n")
+
+
+def load_results(path: Path | str) -> dict[str, BenchResult]:
+    """
+    Return the results in a file written by `save_results`, by config name.
+    """
+    try:
+        data = json.loads(Path(path).read_text())
+        results = [BenchResult(**x) for x in data["results"]]
+    except (ValueError, TypeError, KeyError) as exc:
+        raise InvalidBenchResults(f"Not a bench results file: {exc!r}") from exc
+    return {x.name: x for x in results}
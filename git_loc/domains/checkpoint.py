@@ -0,0 +1,45 @@
+import hashlib
+import json
+from collections import namedtuple
+from pathlib import Path
+from typing import Optional
+
+from ..utils.cache_dir import get_repo_cache_dir
+
+# `tip` is the full hash of the last commit processed, `loc_tot` the LOC count of all
+#  the commits up to `tip`.
+Checkpoint = namedtuple("Checkpoint", ("tip", "loc_tot"))
+
+
+class CheckpointStore:
+    def __init__(self, root_dir: Path | str):
+        """
+        Store the checkpoints of the incremental counts of a repo, one JSON file per
+         set of count options (branch, author, dates, ignored files...), like:
+         ~/.cache/git-loc/mierecensioni-be-1f3a6b2c9d0e/checkpoints/5b1f...json
+        """
+        self.dir = get_repo_cache_dir(root_dir) / "checkpoints"
+
+    @staticmethod
+    def build_key(**options) -> str:
+        """
+        Build the key of a set of count options: the options must be
+         JSON-serializable (or have a meaningful `str()`, like dates).
+        """
+        data = json.dumps(options, sort_keys=True, default=str)
+        return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Checkpoint]:
+        path = self.dir / f"{key}.json"
+        if not path.is_file():
+            return None
+        data = json.loads(path.read_text())
+        return Checkpoint(tip=data["tip"], loc_tot=data["loc_tot"])
+
+    def set(self, key: str, checkpoint: Checkpoint):
+        self.dir.mkdir(parents=True, exist_ok=True)
+        path = self.dir / f"{key}.json"
+        # Write to a temp file, then rename, so a checkpoint is never half-written.
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(checkpoint._asdict()))
+        tmp_path.replace(path)
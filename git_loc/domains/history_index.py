@@ -0,0 +1,333 @@
+import itertools
+import sqlite3
+from collections import namedtuple
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, Optional
+
+from ..clients.git_client import (
+    GitClient,
+    GitDiffEntry,
+    GitLogEntry,
+    get_timestamp_range,
+)
+from ..utils.cache_dir import get_repo_cache_dir
+from .history_store import HistoryStore
+
+HISTORY_INDEX_FILE_NAME = "history.sqlite3"
+# The version of the schema: an index of an older version is rebuilt.
+HISTORY_INDEX_VERSION = 1
+
+# The result of `HistoryIndex.update`.
+IndexUpdate = namedtuple("IndexUpdate", ("branch", "tip", "n_new_commits"))
+# An indexed branch: `tip` is the full hash of the last commit indexed.
+IndexedBranch = namedtuple(
+    "IndexedBranch", ("name", "tip", "n_commits", "n_file_changes")
+)
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS commits ("
+    " id INTEGER PRIMARY KEY,"
+    " hash TEXT NOT NULL UNIQUE,"
+    " timestamp INTEGER NOT NULL,"
+    " date TEXT NOT NULL,"
+    " email TEXT NOT NULL,"
+    " summary TEXT NOT NULL"
+    ")",
+    "CREATE INDEX IF NOT EXISTS commits_timestamp ON commits (timestamp)",
+    "CREATE TABLE IF NOT EXISTS paths ("
+    " id INTEGER PRIMARY KEY,"
+    " path TEXT NOT NULL UNIQUE"
+    ")",
+    # `insertions` and `deletions` are 0 for binary files.
+    "CREATE TABLE IF NOT EXISTS file_changes ("
+    " commit_id INTEGER NOT NULL REFERENCES commits (id),"
+    " path_id INTEGER NOT NULL REFERENCES paths (id),"
+    " insertions INTEGER NOT NULL,"
+    " deletions INTEGER NOT NULL,"
+    " is_binary INTEGER NOT NULL"
+    ")",
+    # A covering index: the counts read the file changes of a commit from the index
+    #  only.
+    "CREATE INDEX IF NOT EXISTS file_changes_commit_id"
+    " ON file_changes (commit_id, path_id, insertions, deletions, is_binary)",
+    "CREATE TABLE IF NOT EXISTS branches ("
+    " id INTEGER PRIMARY KEY,"
+    " name TEXT NOT NULL UNIQUE,"
+    " tip TEXT NOT NULL"
+    ")",
+    # The commits of each branch: the higher `seq`, the more recent the commit (in
+    #  the `git log` order).
+    "CREATE TABLE IF NOT EXISTS branch_commits ("
+    " branch_id INTEGER NOT NULL REFERENCES branches (id),"
+    " seq INTEGER NOT NULL,"
+    " commit_id INTEGER NOT NULL REFERENCES commits (id),"
+    " PRIMARY KEY (branch_id, seq)"
+    ") WITHOUT ROWID",
+)
+
+
+class BaseHistoryIndexException(Exception):
+    pass
+
+
+class BranchNotIndexed(BaseHistoryIndexException):
+    def __init__(self, branch: str):
+        self.branch = branch
+
+    def __str__(self):
+        return f"Branch not indexed: {self.branch} (run: git-loc index)"
+
+
+class HistoryIndex:
+    def __init__(self, root_dir: Path | str):
+        """
+        A SQLite db with the commits of the indexed branches of a repo and the numstat
+         of their files (like `git log --numstat`, so root commits are diffed against
+         the empty tree), in the repo cache dir, like:
+         ~/.cache/git-loc/mierecensioni-be-1f3a6b2c9d0e/history.sqlite3
+
+        Build and update it with `update()` (or `$ git-loc index`), then count it with
+         `LocCounter.count_index`, with no git process. The commits shared by many
+         branches are stored once.
+        """
+        self.root_dir = root_dir
+        self.path = get_repo_cache_dir(root_dir) / HISTORY_INDEX_FILE_NAME
+        self._connection = sqlite3.connect(self.path)
+        version = self._connection.execute("PRAGMA user_version").fetchone()[0]
+        if version != HISTORY_INDEX_VERSION:
+            for table in (
+                "branch_commits",
+                "branches",
+                "file_changes",
+                "paths",
+                "commits",
+            ):
+                self._connection.execute(f"DROP TABLE IF EXISTS {table}")
+            self._connection.execute(f"PRAGMA user_version = {HISTORY_INDEX_VERSION}")
+        for statement in SCHEMA:
+            self._connection.execute(statement)
+        self._connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.close()
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def update(self, branch: str, jobs: int = 1) -> IndexUpdate:
+        """
+        Index the commits of `branch` added since the last update: only the new
+         commits are read from git, unless the history was rewritten (eg. after a
+         force push), then the whole branch is read again (but the commits already
+         indexed are not stored again).
+
+        `jobs` is the number of `git log` processes run in parallel (see
+         `GitClient.log_sharded`).
+        """
+        connection = self._connection
+        row = connection.execute(
+            "SELECT id, tip FROM branches WHERE name = ?", (branch,)
+        ).fetchone()
+        branch_id, old_tip = row if row else (None, None)
+        with GitClient(self.root_dir) as git_client:
+            tip = git_client.rev_parse(branch)
+            if tip == old_tip:
+                return IndexUpdate(branch, tip, 0)
+            is_incremental = old_tip is not None and git_client.is_ancestor(
+                old_tip, tip
+            )
+            rev = f"{old_tip}..{tip}" if is_incremental else tip
+            # In the `git log` order: the most recent first.
+            commit_ids = list()
+            n_new_commits = 0
+            # Path -> id.
+            path_ids = {
+                path: id
+                for id, path in connection.execute("SELECT id, path FROM paths")
+            }
+            with connection:
+                for commit, git_diff in git_client.log_sharded(
+                    rev, jobs=jobs, do_parse_numstat=True
+                ):
+                    commit_id, is_new = self._insert_commit(commit, git_diff, path_ids)
+                    commit_ids.append(commit_id)
+                    n_new_commits += is_new
+
+                if branch_id is None:
+                    branch_id = connection.execute(
+                        "INSERT INTO branches (name, tip) VALUES (?, ?)", (branch, tip)
+                    ).lastrowid
+                else:
+                    connection.execute(
+                        "UPDATE branches SET tip = ? WHERE id = ?", (tip, branch_id)
+                    )
+                if not is_incremental:
+                    connection.execute(
+                        "DELETE FROM branch_commits WHERE branch_id = ?", (branch_id,)
+                    )
+                max_seq = connection.execute(
+                    "SELECT COALESCE(MAX(seq), 0) FROM branch_commits"
+                    " WHERE branch_id = ?",
+                    (branch_id,),
+                ).fetchone()[0]
+                connection.executemany(
+                    "INSERT INTO branch_commits VALUES (?, ?, ?)",
+                    (
+                        (branch_id, max_seq + len(commit_ids) - i, commit_id)
+                        for i, commit_id in enumerate(commit_ids)
+                    ),
+                )
+        return IndexUpdate(branch, tip, n_new_commits)
+
+    def _insert_commit(
+        self, commit: GitLogEntry, git_diff: list[GitDiffEntry], path_ids: dict
+    ) -> tuple[int, bool]:
+        # Return the id of the commit, and whether it was not indexed yet.
+        connection = self._connection
+        row = connection.execute(
+            "SELECT id FROM commits WHERE hash = ?", (commit.hash,)
+        ).fetchone()
+        if row is not None:
+            return row[0], False
+        commit_id = connection.execute(
+            "INSERT INTO commits (hash, timestamp, date, email, summary)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (commit.hash, commit.timestamp, commit.date, commit.email, commit.summary),
+        ).lastrowid
+        rows = list()
+        for file_diff_stats in git_diff:
+            path_id = path_ids.get(file_diff_stats.path)
+            if path_id is None:
+                path_id = path_ids[file_diff_stats.path] = connection.execute(
+                    "INSERT INTO paths (path) VALUES (?)", (file_diff_stats.path,)
+                ).lastrowid
+            # Binary files have "-" insertions and deletions.
+            if file_diff_stats.insertions == "-":
+                rows.append((commit_id, path_id, 0, 0, 1))
+            else:
+                rows.append(
+                    (
+                        commit_id,
+                        path_id,
+                        int(file_diff_stats.insertions),
+                        int(file_diff_stats.deletions),
+                        0,
+                    )
+                )
+        connection.executemany("INSERT INTO file_changes VALUES (?, ?, ?, ?, ?)", rows)
+        return commit_id, True
+
+    def get_branch(self, branch: str) -> IndexedBranch:
+        row = self._connection.execute(
+            "SELECT b.name, b.tip, COUNT(DISTINCT bc.commit_id), COUNT(f.commit_id)"
+            " FROM branches b"
+            " LEFT JOIN branch_commits bc ON bc.branch_id = b.id"
+            " LEFT JOIN file_changes f ON f.commit_id = bc.commit_id"
+            " WHERE b.name = ?",
+            (branch,),
+        ).fetchone()
+        if row is None or row[0] is None:
+            raise BranchNotIndexed(branch)
+        return IndexedBranch(*row)
+
+    def _get_branch_id(self, branch: str) -> int:
+        row = self._connection.execute(
+            "SELECT id FROM branches WHERE name = ?", (branch,)
+        ).fetchone()
+        if row is None:
+            raise BranchNotIndexed(branch)
+        return row[0]
+
+    def _build_where(
+        self,
+        branch: str,
+        author: Optional[str] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+    ) -> tuple[str, list]:
+        # `author` is a substring of the email (case-sensitive, unlike LIKE), and the
+        #  dates include the whole days, like in `LocCounter.count_store`.
+        start, end = get_timestamp_range(start_date, end_date)
+        where = "bc.branch_id = ?"
+        params = [self._get_branch_id(branch)]
+        # The open bounds (+-2**63) do not fit a SQLite integer.
+        if start_date:
+            where += " AND c.timestamp >= ?"
+            params.append(start)
+        if end_date:
+            where += " AND c.timestamp < ?"
+            params.append(end)
+        if author:
+            where += " AND instr(c.email, ?) > 0"
+            params.append(author)
+        return where, params
+
+    def iter_path_stats(
+        self,
+        branch: str,
+        author: Optional[str] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+    ) -> Iterator[tuple[str, int, int]]:
+        """
+        Yield the path, the insertions and the deletions of each file changed by the
+         commits of `branch` authored by `author` within the start and end date, summed
+         up by path in SQL.
+        """
+        where, params = self._build_where(branch, author, start_date, end_date)
+        yield from self._connection.execute(
+            "SELECT p.path, s.insertions, s.deletions FROM ("
+            "  SELECT f.path_id, SUM(f.insertions) AS insertions,"
+            "   SUM(f.deletions) AS deletions"
+            "  FROM branch_commits bc"
+            "  JOIN commits c ON c.id = bc.commit_id"
+            "  JOIN file_changes f ON f.commit_id = bc.commit_id"
+            f"  WHERE {where}"
+            "  GROUP BY f.path_id"
+            " ) s JOIN paths p ON p.id = s.path_id",
+            params,
+        )
+
+    def load_store(
+        self,
+        branch: str,
+        author: Optional[str] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+    ) -> HistoryStore:
+        """
+        Return a `HistoryStore` with the commits of `branch` authored by `author`
+         within the start and end date, in the `git log` order, and their files.
+        """
+        where, params = self._build_where(branch, author, start_date, end_date)
+        rows = self._connection.execute(
+            "SELECT c.id, c.hash, c.date, c.email, c.summary, c.timestamp,"
+            " p.path, f.insertions, f.deletions, f.is_binary"
+            " FROM branch_commits bc"
+            " JOIN commits c ON c.id = bc.commit_id"
+            " LEFT JOIN file_changes f ON f.commit_id = bc.commit_id"
+            " LEFT JOIN paths p ON p.id = f.path_id"
+            f" WHERE {where}"
+            " ORDER BY bc.seq DESC, f.rowid",
+            params,
+        )
+        store = HistoryStore()
+        for _, commit_rows in itertools.groupby(rows, key=lambda x: x[0]):
+            first_row, *other_rows = commit_rows
+            commit = GitLogEntry(*first_row[1:6])
+            git_diff = [
+                GitDiffEntry("-", "-", path)
+                if is_binary
+                else GitDiffEntry(str(insertions), str(deletions), path)
+                for *_, path, insertions, deletions, is_binary in [first_row]
+                + other_rows
+                if path is not None
+            ]
+            store.append(commit, git_diff)
+        return store
@@ -0,0 +1,240 @@
+from array import array
+from collections import namedtuple
+from datetime import date, datetime
+from typing import Iterable, Iterator, Optional
+
+from ..clients.git_client import GitDiffEntry, GitLogEntry, get_timestamp_range
+
+# A file in a commit of a `HistoryStore`. `insertions` and `deletions` are None for
+#  binary files.
+StoreFile = namedtuple(
+    "StoreFile", ("path_id", "path", "insertions", "deletions", "is_binary")
+)
+
+
+class _StringTable:
+    def __init__(self):
+        """
+        Interned strings: each distinct string is stored once, and referenced by its
+         index.
+        """
+        self.strings: list[str] = list()
+        self.ids: dict[str, int] = dict()
+
+    def intern(self, string: str) -> int:
+        id = self.ids.get(string)
+        if id is None:
+            id = self.ids[string] = len(self.strings)
+            self.strings.append(string)
+        return id
+
+    def copy(self) -> "_StringTable":
+        table = _StringTable()
+        table.strings = self.strings.copy()
+        table.ids = self.ids.copy()
+        return table
+
+    def __len__(self):
+        return len(self.strings)
+
+
+class HistoryStore:
+    def __init__(self):
+        """
+        The commits and the numstat of their files, in compact columns (arrays of
+         integers) rather than in namedtuples of strings: about 13 bytes per file
+         instead of hundreds. The emails and the paths are interned in string tables,
+         the insertions and deletions are integers (with a flag for binary files).
+
+        Fill it while counting with `LocCounter.count(store=...)` (or with `append`),
+         then count it again, with other options and no git process, with
+         `LocCounter.count_store`.
+        """
+        # Commits columns.
+        self._hashes: list[str] = list()
+        self._summaries: list[str] = list()
+        # Proleptic Gregorian ordinals (see `date.toordinal`).
+        self._dates = array("I")
+        self._timestamps = array("q")
+        self._email_ids = array("I")
+        # Index of the first file of each commit in the files columns, and a last
+        #  item with the number of files: the files of commit i are in
+        #  `self._file_starts[i]:self._file_starts[i + 1]`.
+        self._file_starts = array("I", [0])
+        # Files columns.
+        self._path_ids = array("I")
+        self._insertions = array("I")
+        self._deletions = array("I")
+        self._is_binary = bytearray()
+        self._emails = _StringTable()
+        self._paths = _StringTable()
+
+    def append(self, commit: GitLogEntry, git_diff: Iterable[GitDiffEntry]) -> None:
+        """
+        Append a commit and the numstat of its files (as returned by `GitClient`).
+        """
+        for file_diff_stats in git_diff:
+            self._path_ids.append(self._paths.intern(file_diff_stats.path))
+            # Binary files have "-" insertions and deletions.
+            if file_diff_stats.insertions == "-":
+                self._insertions.append(0)
+                self._deletions.append(0)
+                self._is_binary.append(1)
+            else:
+                self._insertions.append(int(file_diff_stats.insertions))
+                self._deletions.append(int(file_diff_stats.deletions))
+                self._is_binary.append(0)
+        self._hashes.append(commit.hash)
+        self._summaries.append(commit.summary)
+        self._dates.append(date.fromisoformat(commit.date).toordinal())
+        self._timestamps.append(commit.timestamp)
+        self._email_ids.append(self._emails.intern(commit.email))
+        self._file_starts.append(len(self._path_ids))
+
+    def record(
+        self, commits_with_diffs: Iterable[tuple[GitLogEntry, Iterable[GitDiffEntry]]]
+    ) -> Iterator[tuple[GitLogEntry, list[GitDiffEntry]]]:
+        """
+        Yield the commits with their diffs, appending them to the store on the way.
+        """
+        for commit, git_diff in commits_with_diffs:
+            git_diff = list(git_diff)
+            self.append(commit, git_diff)
+            yield commit, git_diff
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    @property
+    def n_files(self) -> int:
+        return len(self._path_ids)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        The size of the columns of integers (the string tables and the hashes and
+         summaries of the commits are not included).
+        """
+        arrays = (
+            self._dates,
+            self._timestamps,
+            self._email_ids,
+            self._file_starts,
+            self._path_ids,
+            self._insertions,
+            self._deletions,
+        )
+        return sum(x.itemsize * len(x) for x in arrays) + len(self._is_binary)
+
+    def get_commit(self, index: int) -> GitLogEntry:
+        return GitLogEntry(
+            hash=self._hashes[index],
+            date=date.fromordinal(self._dates[index]).isoformat(),
+            email=self._emails.strings[self._email_ids[index]],
+            summary=self._summaries[index],
+            timestamp=self._timestamps[index],
+        )
+
+    def iter_files(self, index: int) -> Iterator[StoreFile]:
+        """
+        Yield the files of the commit at `index`.
+        """
+        paths = self._paths.strings
+        for i in range(self._file_starts[index], self._file_starts[index + 1]):
+            path_id = self._path_ids[i]
+            if self._is_binary[i]:
+                yield StoreFile(path_id, paths[path_id], None, None, True)
+            else:
+                yield StoreFile(
+                    path_id,
+                    paths[path_id],
+                    self._insertions[i],
+                    self._deletions[i],
+                    False,
+                )
+
+    def iter_commits(
+        self,
+        author: Optional[str] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+    ) -> Iterator[tuple[int, GitLogEntry]]:
+        """
+        Yield the index and the commit of the commits authored by `author` (a
+         substring of the email) within the start and end date (whole days, included).
+        """
+        start, end = get_timestamp_range(start_date, end_date)
+        # Whether each email (by id) matches, computed once per email.
+        is_email_matching: dict[int, bool] = dict()
+        for index in range(len(self)):
+            if not start <= self._timestamps[index] < end:
+                continue
+            if author:
+                email_id = self._email_ids[index]
+                is_matching = is_email_matching.get(email_id)
+                if is_matching is None:
+                    email = self._emails.strings[email_id]
+                    is_matching = is_email_matching[email_id] = author in email
+                if not is_matching:
+                    continue
+            yield index, self.get_commit(index)
+
+    def __iter__(self) -> Iterator[tuple[GitLogEntry, list[GitDiffEntry]]]:
+        """
+        Yield the commits with their diffs, like `GitClient.log_numstat`.
+        """
+        for index in range(len(self)):
+            yield self[index]
+
+    def __getitem__(self, key: int | slice):
+        """
+        Return the commit at an index with its diff (like an item of `__iter__`), or
+         a new store with the commits in a slice.
+        """
+        if isinstance(key, slice):
+            return self._slice(key)
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError(key)
+        git_diff = [
+            GitDiffEntry(
+                "-" if x.is_binary else str(x.insertions),
+                "-" if x.is_binary else str(x.deletions),
+                x.path,
+            )
+            for x in self.iter_files(key)
+        ]
+        return self.get_commit(key), git_diff
+
+    def _slice(self, key: slice) -> "HistoryStore":
+        start, stop, step = key.indices(len(self))
+        if step != 1:
+            store = HistoryStore()
+            for index in range(start, stop, step):
+                store.append(*self[index])
+            return store
+        stop = max(start, stop)
+        # The columns and the string tables are copied (a memcpy each, or about), so
+        #  appending to the new store does not change this one.
+        store = HistoryStore()
+        store._emails = self._emails.copy()
+        store._paths = self._paths.copy()
+        store._hashes = self._hashes[start:stop]
+        store._summaries = self._summaries[start:stop]
+        store._dates = self._dates[start:stop]
+        store._timestamps = self._timestamps[start:stop]
+        store._email_ids = self._email_ids[start:stop]
+        first_file = self._file_starts[start]
+        if first_file:
+            store._file_starts = array(
+                "I", (x - first_file for x in self._file_starts[start : stop + 1])
+            )
+        else:
+            store._file_starts = self._file_starts[start : stop + 1]
+        last_file = self._file_starts[stop]
+        store._path_ids = self._path_ids[first_file:last_file]
+        store._insertions = self._insertions[first_file:last_file]
+        store._deletions = self._deletions[first_file:last_file]
+        store._is_binary = self._is_binary[first_file:last_file]
+        return store
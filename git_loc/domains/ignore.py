@@ -0,0 +1,162 @@
+import re
+from pathlib import Path
+from typing import Collection, Optional
+
+
+class IgnoreMatcher:
+    def __init__(
+        self,
+        substrings: Optional[Collection[str]] = None,
+        globs: Optional[Collection[str]] = None,
+    ):
+        """
+        Match the paths to ignore, built once per count and memoized per path.
+
+        `substrings`: a path is ignored if it includes any of them (the original
+         `--ignore-file` semantics). They are compiled in a single regex.
+        `globs`: .gitignore-style patterns (`*`, `?`, `**`, `[...]`, a leading or
+         inner `/` anchors the pattern to the root, a trailing `/` only matches dirs,
+         a leading `!` negates the pattern and the last matching pattern wins, a `\\`
+         escapes the next char).
+        """
+        self.substrings = tuple(substrings or ())
+        self.globs = tuple(globs or ())
+
+        self._substrings_regex = None
+        if self.substrings:
+            self._substrings_regex = re.compile(
+                "|".join(re.escape(x) for x in self.substrings)
+            )
+
+        # Rules as (regex, is_negated), in the order they are defined.
+        rules = [_compile_glob(glob) for glob in self.globs]
+        self._has_negated_rules = any(is_negated for _, is_negated in rules)
+        self._rules = rules
+        self._globs_regex = None
+        if rules and not self._has_negated_rules:
+            # Without negations, all the rules can be combined in a single regex.
+            self._globs_regex = re.compile(
+                "|".join(f"(?:{regex.pattern})" for regex, _ in rules)
+            )
+
+        self._cache: dict[str, bool] = dict()
+
+    @classmethod
+    def from_file(
+        cls,
+        path: Path | str,
+        substrings: Optional[Collection[str]] = None,
+        globs: Optional[Collection[str]] = None,
+    ) -> "IgnoreMatcher":
+        """
+        Build a matcher with the patterns in a .gitignore-style file (after the given
+         `globs`). Empty lines and comments (lines starting with #) are skipped.
+        """
+        file_globs = list()
+        for line in Path(path).read_text().splitlines():
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            file_globs.append(line)
+        return cls(substrings=substrings, globs=list(globs or ()) + file_globs)
+
+    def __bool__(self):
+        return bool(self.substrings or self.globs)
+
+    def is_ignored(self, path: str) -> bool:
+        try:
+            return self._cache[path]
+        except KeyError:
+            pass
+        is_ignored = self._is_ignored(path)
+        self._cache[path] = is_ignored
+        return is_ignored
+
+    def _is_ignored(self, path: str) -> bool:
+        if self._substrings_regex is not None and self._substrings_regex.search(path):
+            return True
+        if self._globs_regex is not None:
+            return bool(self._globs_regex.match(path))
+        # With negations, the last matching rule wins.
+        for regex, is_negated in reversed(self._rules):
+            if regex.match(path):
+                return not is_negated
+        return False
+
+
+def _compile_glob(glob: str) -> tuple[re.Pattern, bool]:
+    """
+    Compile a .gitignore-style pattern to a regex that matches a file path.
+    """
+    is_negated = glob.startswith("!")
+    if is_negated:
+        glob = glob[1:]
+    is_dir_only = glob.endswith("/")
+    glob = glob.rstrip("/")
+    # A pattern with a `/` (but not at the end) is relative to the root dir, otherwise
+    #  it matches at any depth.
+    is_anchored = "/" in glob
+    glob = glob.lstrip("/")
+
+    regex = ""
+    i = 0
+    while i < len(glob):
+        if glob.startswith("**/", i):
+            regex += "(?:.*/)?"
+            i += 3
+        elif glob.startswith("/**", i) and i + 3 == len(glob):
+            regex += "/.*"
+            i += 3
+        elif glob.startswith("**", i):
+            regex += ".*"
+            i += 2
+        elif glob[i] == "*":
+            regex += "[^/]*"
+            i += 1
+        elif glob[i] == "?":
+            regex += "[^/]"
+            i += 1
+        elif glob[i] == "[":
+            char_class, i = _translate_char_class(glob, i)
+            regex += char_class
+        elif glob[i] == "\\" and i + 1 < len(glob):
+            # An escaped char, like `\*` or `\!`, matches itself.
+            regex += re.escape(glob[i + 1])
+            i += 2
+        else:
+            regex += re.escape(glob[i])
+            i += 1
+
+    prefix = "" if is_anchored else "(?:.*/)?"
+    # The numstat paths are files: a dir pattern matches the files in the dir, a
+    #  non-dir pattern matches a file or the files in a dir.
+    suffix = "/.*" if is_dir_only else "(?:/.*)?"
+    return re.compile(f"{prefix}{regex}{suffix}$"), is_negated
+
+
+def _translate_char_class(glob: str, start: int) -> tuple[str, int]:
+    """
+    Translate the `[...]` starting at `start` in `glob` to a regex, like
+     `fnmatch.translate`. Return the regex and the index after the `]`.
+
+    A leading `!` (or `^`) negates the class and a `]` right after the `[` (or
+     after the `!`) is a char of the class. A `[` with no closing `]` is a literal.
+    """
+    end = start + 1
+    if glob[end : end + 1] in ("!", "^"):
+        end += 1
+    if glob[end : end + 1] == "]":
+        end += 1
+    end = glob.find("]", end)
+    if end == -1:
+        return re.escape("["), start + 1
+
+    chars = glob[start + 1 : end]
+    is_negated = chars[:1] in ("!", "^")
+    if is_negated:
+        chars = chars[1:]
+    # The chars special in a regex class are escaped, so the backslash and the
+    #  brackets are literals, while the ranges (`a-z`) are kept.
+    chars = re.sub(r"([\\\[\]^&~|])", r"\\\1", chars)
+    # Like `*` and `?`, a negated class does not match the `/` between dirs.
+    return (f"[^/{chars}]" if is_negated else f"[{chars}]"), end + 1
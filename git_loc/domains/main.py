@@ -1,11 +1,42 @@
+import asyncio
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import Collection, Optional
+from typing import AsyncIterator, Collection, Iterable, Iterator, Optional, TextIO
 
-from rich.table import Table
-
-from ..clients.git_client import GitClient
+from ..clients.async_git_client import AsyncGitClient
+from ..clients.diff_cache import DiffCache
+from ..clients.git_client import (
+    GitClient,
+    GitDiffEntry,
+    GitLogEntry,
+    build_pathspecs,
+    get_timestamp_range,
+)
+from ..conf import get_settings
 from ..utils import printer
+from ..utils.profiler import (
+    NULL_PROFILER,
+    STAGE_AGGREGATE,
+    STAGE_COUNT,
+    STAGE_GIT_DIFF,
+    STAGE_GIT_DIFF_WAIT,
+    STAGE_GIT_LOG,
+    STAGE_IGNORE,
+    STAGE_RENDER,
+    STAGE_WRITE,
+    Profiler,
+)
+from .aggregators import BaseAggregator
+from .checkpoint import Checkpoint, CheckpointStore
+from .history_index import HistoryIndex
+from .history_store import HistoryStore
+from .ignore import IgnoreMatcher
+from .numpy_engine import count_store_numpy, import_numpy
+from .progress import Progress
+from .writers import FORMAT_NONE, FORMAT_TABLE, BaseWriter, build_writer
 
 
 class BaseLocCounterException(Exception):
@@ -26,6 +57,35 @@ class EndDateMismatch(BaseLocCounterException):
 
 console = printer.ConsoleAdapter()
 
+# Strategies to get the numstat of each commit:
+#  - "diff": one `git log` process, then one `git diff` process per commit.
+#  - "log-numstat": a single `git log --numstat` process.
+STRATEGY_DIFF = "diff"
+STRATEGY_LOG_NUMSTAT = "log-numstat"
+STRATEGIES = (STRATEGY_DIFF, STRATEGY_LOG_NUMSTAT)
+
+
+class UnknownStrategy(BaseLocCounterException):
+    def __init__(self, strategy):
+        self.strategy = strategy
+
+
+class AggregatorsNotSupportedWithCheckpoint(BaseLocCounterException):
+    pass
+
+
+# Engines to count the numstat of the commits:
+#  - "python": a Python loop over each file of each commit.
+#  - "numpy": vectorized with NumPy, an optional dependency (see `count_store_numpy`).
+ENGINE_PYTHON = "python"
+ENGINE_NUMPY = "numpy"
+ENGINES = (ENGINE_PYTHON, ENGINE_NUMPY)
+
+
+class UnknownEngine(BaseLocCounterException):
+    def __init__(self, engine):
+        self.engine = engine
+
 
 class LocCounter:
     def __init__(self, root_dir: Path | str):
@@ -43,64 +103,686 @@ class LocCounter:
         start_date: Optional[datetime] = None,
         end_date: Optional[datetime] = None,
         files_to_ignore: Optional[Collection] = None,
+        globs_to_ignore: Optional[Collection] = None,
+        ignore_file_path: Optional[Path | str] = None,
+        paths: Optional[Collection[str]] = None,
+        paths_to_exclude: Optional[Collection[str]] = None,
+        strategy: str = STRATEGY_DIFF,
+        jobs: int = 1,
+        do_use_cache: bool = True,
+        do_use_checkpoint: bool = False,
+        aggregators: Collection[BaseAggregator] = (),
+        output_format: str = FORMAT_TABLE,
+        output: Optional[TextIO] = None,
+        profiler: Optional[Profiler] = None,
+        store: Optional[HistoryStore] = None,
+        engine: str = ENGINE_PYTHON,
+        progress: Optional[Progress] = None,
     ):
-        console.print("Computing...")
-        table = Table(title="[bold underline]Files[/]")
-        table.add_column("insertions")
-        table.add_column("deletions")
-        table.add_column("file path", overflow="fold")
+        """
+        Return the LOC count.
+
+        A file is ignored if its path includes any of `files_to_ignore`, or if it
+         matches any of the .gitignore-style patterns in `globs_to_ignore` or in the
+         file `ignore_file_path`.
+
+        `paths` and `paths_to_exclude` limit the count to the files in (or matching)
+         `paths` but not in `paths_to_exclude`, like: "services/payments", "*.lock".
+         Unlike the ignored files, they are passed to git as pathspecs, so git skips
+         the commits which modify no matching file (and does not diff the other
+         files).
+
+        With `jobs` > 1, the history is read by up to `jobs` `git log` processes run
+         in parallel, each one on a shard of the commits (see
+         `GitClient.log_sharded`), and with the "diff" strategy `jobs` is also the
+         number of `git diff` processes run in parallel. The result does not depend
+         on it.
+
+        With the "diff" strategy, the numstat of each commit is read from (and written
+         to) the on-disk cache, unless `do_use_cache` is False or the setting
+         `DO_USE_DIFF_CACHE` is false.
+
+        With `do_use_checkpoint`, the count is incremental: the tip of the branch and
+         the LOC count are saved in a checkpoint (one per set of options) and the next
+         count only processes the commits added after the checkpoint. If the
+         checkpoint is not in the branch history anymore, then the count starts over.
+
+        `aggregators` compute more breakdowns of the LOC (eg. by author, see
+         `AuthorAggregator`) in the same history traversal. They are not supported in
+         the incremental count, as a checkpoint only stores the LOC count.
+
+        `output_format` is how the files are written: "table" prints a table at the
+         end, "jsonl" and "csv" stream a record per file (and a last summary record
+         with the LOC count) to `output` (default: stdout) as each commit is
+         processed, "none" writes nothing.
+
+        `profiler` collects the time spent in each stage (git log, git diff, parsing,
+         ignoring files, writing...) and the git processes run (see `Profiler`).
+
+        The commits processed (with the numstat of all their files, also the ignored
+         ones) are appended to `store`, if given, to count them again with
+         `count_store`.
+
+        With the "numpy" `engine`, the commits are first collected in a
+         `HistoryStore` (`store`, if given), then counted with NumPy (see
+         `count_store`): the result is the same.
+
+        `progress` reports the commits processed, out of the total counted with `git
+         rev-list --count` (with the same filters) in the background (see
+         `Progress`).
+        """
+        if strategy not in STRATEGIES:
+            raise UnknownStrategy(strategy)
+        self._check_engine(engine)
+        if do_use_checkpoint and aggregators:
+            raise AggregatorsNotSupportedWithCheckpoint
+        if profiler is None:
+            profiler = NULL_PROFILER
+
+        writer = self._build_writer(output_format, output)
+        ignore_matcher = self._build_ignore_matcher(
+            files_to_ignore, globs_to_ignore, ignore_file_path
+        )
+        diff_cache = self._build_diff_cache(strategy, do_use_cache)
+        pathspecs = build_pathspecs(paths, paths_to_exclude)
+
+        try:
+            with GitClient(
+                self.root_dir,
+                diff_cache=diff_cache,
+                pathspecs=pathspecs,
+                profiler=profiler,
+            ) as git_client:
+                rev = branch
+                loc_tot = 0
+                if do_use_checkpoint:
+                    checkpoint_store = CheckpointStore(self.root_dir)
+                    checkpoint_key = checkpoint_store.build_key(
+                        branch=branch,
+                        author=author,
+                        start_date=start_date,
+                        end_date=end_date,
+                        files_to_ignore=sorted(ignore_matcher.substrings),
+                        globs_to_ignore=ignore_matcher.globs,
+                        pathspecs=pathspecs,
+                        strategy=strategy,
+                        diff_backend=git_client.GIT_DIFF_BACKEND,
+                    )
+                    tip = git_client.rev_parse(branch)
+                    rev, loc_tot = self._get_incremental_rev(
+                        git_client, checkpoint_store.get(checkpoint_key), tip
+                    )
+
+                commits_with_diffs = self._get_commits_with_diffs(
+                    git_client,
+                    strategy,
+                    branch=rev,
+                    start_date=start_date,
+                    end_date=end_date,
+                    author=author,
+                    jobs=jobs,
+                    profiler=profiler,
+                )
+                if progress is not None:
+                    progress.start(
+                        lambda: git_client.rev_list_count(
+                            rev, author, start_date, end_date
+                        )
+                    )
+                    commits_with_diffs = progress.track(commits_with_diffs)
+                if engine == ENGINE_NUMPY:
+                    loc_tot += self._count_commits_numpy(
+                        commits_with_diffs,
+                        writer if output_format != FORMAT_NONE else None,
+                        author=author,
+                        start_date=start_date,
+                        end_date=end_date,
+                        ignore_matcher=ignore_matcher,
+                        aggregators=aggregators,
+                        profiler=profiler,
+                        store=store,
+                    )
+                else:
+                    if store is not None:
+                        commits_with_diffs = store.record(commits_with_diffs)
+                    loc_tot += self._count_commits(
+                        commits_with_diffs,
+                        writer,
+                        author=author,
+                        start_date=start_date,
+                        end_date=end_date,
+                        ignore_matcher=ignore_matcher,
+                        aggregators=aggregators,
+                        profiler=profiler,
+                    )
+
+                if do_use_checkpoint:
+                    checkpoint_store.set(checkpoint_key, Checkpoint(tip, loc_tot))
+        finally:
+            if progress is not None:
+                progress.stop()
+            if diff_cache is not None:
+                diff_cache.close()
+
+        with profiler.stage(STAGE_RENDER):
+            writer.write_summary(loc_tot)
+        return loc_tot
+
+    async def count_async(
+        self,
+        branch: str,
+        author: Optional[str] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        files_to_ignore: Optional[Collection] = None,
+        globs_to_ignore: Optional[Collection] = None,
+        ignore_file_path: Optional[Path | str] = None,
+        paths: Optional[Collection[str]] = None,
+        paths_to_exclude: Optional[Collection[str]] = None,
+        strategy: str = STRATEGY_DIFF,
+        do_use_cache: bool = True,
+        aggregators: Collection[BaseAggregator] = (),
+        output_format: str = FORMAT_TABLE,
+        output: Optional[TextIO] = None,
+        semaphore: Optional[asyncio.Semaphore] = None,
+    ) -> int:
+        """
+        Like `count()`, but to be awaited in an asyncio event loop: the git processes
+         are run with asyncio (see `AsyncGitClient`), so the loop is not blocked
+         while waiting for git.
+
+        With the "diff" strategy, the diffs run concurrently, up to the setting
+         `ASYNC_MAX_GIT_PROCESSES` git processes at a time, or as many as `semaphore`
+         allows: share a semaphore between many counts to limit the git processes of
+         all of them.
+
+        The incremental count (`do_use_checkpoint`) is not supported.
+        """
+        if strategy not in STRATEGIES:
+            raise UnknownStrategy(strategy)
+
+        writer = self._build_writer(output_format, output)
+        ignore_matcher = self._build_ignore_matcher(
+            files_to_ignore, globs_to_ignore, ignore_file_path
+        )
+        diff_cache = self._build_diff_cache(strategy, do_use_cache)
+        pathspecs = build_pathspecs(paths, paths_to_exclude)
+
+        loc_tot = 0
+        try:
+            async with AsyncGitClient(
+                self.root_dir,
+                diff_cache=diff_cache,
+                pathspecs=pathspecs,
+                semaphore=semaphore,
+            ) as git_client:
+                commits_with_diffs = self._aiter_commits_with_diffs(
+                    git_client,
+                    strategy,
+                    branch=branch,
+                    start_date=start_date,
+                    end_date=end_date,
+                    author=author,
+                )
+                async for commit, git_diff in commits_with_diffs:
+                    loc_tot += self._count_commits(
+                        [(commit, git_diff)],
+                        writer,
+                        author=author,
+                        start_date=start_date,
+                        end_date=end_date,
+                        ignore_matcher=ignore_matcher,
+                        aggregators=aggregators,
+                    )
+        finally:
+            if diff_cache is not None:
+                # The LRU eviction can take a while: do not block the loop.
+                await asyncio.to_thread(diff_cache.close)
+
+        writer.write_summary(loc_tot)
+        return loc_tot
+
+    def count_store(
+        self,
+        store: HistoryStore,
+        author: Optional[str] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        files_to_ignore: Optional[Collection] = None,
+        globs_to_ignore: Optional[Collection] = None,
+        ignore_file_path: Optional[Path | str] = None,
+        aggregators: Collection[BaseAggregator] = (),
+        output_format: str = FORMAT_TABLE,
+        output: Optional[TextIO] = None,
+        engine: str = ENGINE_PYTHON,
+    ) -> int:
+        """
+        Return the LOC count of the commits in `store` (see `HistoryStore`), with no
+         git process: the commits are filtered in memory, so the history read once
+         can be counted many times with different options.
+
+        `author` is matched as a substring of the email, and `start_date` and
+         `end_date` include the whole days (while git compares the commit times with
+         the current time of day on those days). Each path is matched against the
+         ignored files only once.
+
+        With the "numpy" `engine`, the filters, the totals and the group-bys are
+         vectorized with NumPy (see `count_store_numpy`), with the same result.
+        """
+        self._check_engine(engine)
+        writer = self._build_writer(output_format, output)
+        ignore_matcher = self._build_ignore_matcher(
+            files_to_ignore, globs_to_ignore, ignore_file_path
+        )
+        if engine == ENGINE_NUMPY:
+            loc_tot = count_store_numpy(
+                store,
+                author,
+                start_date,
+                end_date,
+                ignore_matcher=ignore_matcher,
+                aggregators=aggregators,
+                writer=writer if output_format != FORMAT_NONE else None,
+            )
+            writer.write_summary(loc_tot)
+            return loc_tot
+
+        per_file_aggregators = [x for x in aggregators if x.is_per_file]
+        # Whether each path (by id) is ignored.
+        is_ignored_by_path_id: dict[int, bool] = dict()
+        loc_tot = 0
+        for index, commit in store.iter_commits(author, start_date, end_date):
+            ins_in_commit = 0
+            del_in_commit = 0
+            for file in store.iter_files(index):
+                is_ignored = is_ignored_by_path_id.get(file.path_id)
+                if is_ignored is None:
+                    is_ignored = is_ignored_by_path_id[file.path_id] = bool(
+                        ignore_matcher and ignore_matcher.is_ignored(file.path)
+                    )
+                if is_ignored:
+                    writer.add_file(commit, file.path, None, None, True)
+                    continue
 
+                ins_in_commit += file.insertions or 0
+                del_in_commit += file.deletions or 0
+                writer.add_file(
+                    commit, file.path, file.insertions, file.deletions, False
+                )
+                for aggregator in per_file_aggregators:
+                    aggregator.add_file(
+                        commit, file.path, file.insertions or 0, file.deletions or 0
+                    )
+
+            for aggregator in aggregators:
+                aggregator.add_commit(commit, ins_in_commit, del_in_commit)
+            loc_tot += ins_in_commit + del_in_commit
+
+        writer.write_summary(loc_tot)
+        return loc_tot
+
+    def count_index(
+        self,
+        index: HistoryIndex,
+        branch: str,
+        author: Optional[str] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        files_to_ignore: Optional[Collection] = None,
+        globs_to_ignore: Optional[Collection] = None,
+        ignore_file_path: Optional[Path | str] = None,
+        aggregators: Collection[BaseAggregator] = (),
+        output_format: str = FORMAT_TABLE,
+        output: Optional[TextIO] = None,
+        engine: str = ENGINE_PYTHON,
+    ) -> int:
+        """
+        Return the LOC count of the commits of `branch` in `index` (see
+         `HistoryIndex`), with no git process: the commits are filtered in SQL, like
+         in `count_store` (so the dates include whole days).
+
+        With no aggregators and the "none" output format, the insertions and deletions
+         are summed up by path in SQL, and each path is matched against the ignored
+         files only once. Else the commits are loaded in a `HistoryStore` and counted
+         with `count_store` (with `engine`).
+        """
+        self._check_engine(engine)
+        if aggregators or output_format != FORMAT_NONE:
+            store = index.load_store(branch, author, start_date, end_date)
+            # The commits are already filtered.
+            return self.count_store(
+                store,
+                files_to_ignore=files_to_ignore,
+                globs_to_ignore=globs_to_ignore,
+                ignore_file_path=ignore_file_path,
+                aggregators=aggregators,
+                output_format=output_format,
+                output=output,
+                engine=engine,
+            )
+
+        writer = self._build_writer(output_format, output)
+        ignore_matcher = self._build_ignore_matcher(
+            files_to_ignore, globs_to_ignore, ignore_file_path
+        )
+        loc_tot = 0
+        for path, insertions, deletions in index.iter_path_stats(
+            branch, author, start_date, end_date
+        ):
+            if not (ignore_matcher and ignore_matcher.is_ignored(path)):
+                loc_tot += insertions + deletions
+        writer.write_summary(loc_tot)
+        return loc_tot
+
+    def _check_engine(self, engine: str) -> None:
+        if engine not in ENGINES:
+            raise UnknownEngine(engine)
+        if engine == ENGINE_NUMPY:
+            # Fail before reading the history.
+            import_numpy()
+
+    def _build_writer(self, output_format: str, output: Optional[TextIO]) -> BaseWriter:
+        if output is None:
+            output = sys.stdout
+        writer = build_writer(output_format, output)
+        # Do not mix the messages with the records streamed to stdout.
+        if output_format == FORMAT_TABLE or output is not sys.stdout:
+            console.print("Computing...")
+        return writer
+
+    def _build_ignore_matcher(
+        self,
+        files_to_ignore: Optional[Collection],
+        globs_to_ignore: Optional[Collection],
+        ignore_file_path: Optional[Path | str],
+    ) -> IgnoreMatcher:
         if files_to_ignore is None:
             files_to_ignore = list()
+        if ignore_file_path:
+            return IgnoreMatcher.from_file(
+                ignore_file_path, substrings=files_to_ignore, globs=globs_to_ignore
+            )
+        return IgnoreMatcher(substrings=files_to_ignore, globs=globs_to_ignore)
+
+    def _build_diff_cache(
+        self, strategy: str, do_use_cache: bool
+    ) -> Optional[DiffCache]:
+        if (
+            strategy == STRATEGY_DIFF
+            and do_use_cache
+            and get_settings().get("DO_USE_DIFF_CACHE", False)
+        ):
+            return DiffCache(self.root_dir)
+        return None
 
-        git_client = GitClient(self.root_dir)
-        git_log = git_client.log(
+    def _get_incremental_rev(
+        self, git_client: GitClient, checkpoint: Optional[Checkpoint], tip: str
+    ) -> tuple[str, int]:
+        """
+        Return the revision (range) to process and the LOC count of the commits
+         already processed.
+        """
+        if checkpoint is None:
+            return tip, 0
+        # If the checkpoint is not an ancestor of the tip anymore (eg. after a force
+        #  push), then the history was rewritten: recompute everything.
+        if not git_client.is_ancestor(checkpoint.tip, tip):
+            console.print("Checkpoint not in the branch history: full recompute...")
+            return tip, 0
+        return f"{checkpoint.tip}..{tip}", checkpoint.loc_tot
+
+    def _get_commits_with_diffs(
+        self,
+        git_client: GitClient,
+        strategy: str,
+        branch: str,
+        author: Optional[str] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        jobs: int = 1,
+        profiler: Profiler = NULL_PROFILER,
+    ) -> Iterator[tuple[GitLogEntry, Iterable[GitDiffEntry]]]:
+        if strategy == STRATEGY_LOG_NUMSTAT:
+            return profiler.iter_stage(
+                STAGE_GIT_LOG,
+                git_client.log_sharded(
+                    branch=branch,
+                    start_date=start_date,
+                    end_date=end_date,
+                    author=author,
+                    jobs=jobs,
+                    do_parse_numstat=True,
+                ),
+            )
+        return self._iter_commits_with_diffs(
+            git_client,
             branch=branch,
             start_date=start_date,
             end_date=end_date,
             author=author,
+            jobs=jobs,
+            profiler=profiler,
         )
 
+    def _count_commits(
+        self,
+        commits_with_diffs: Iterable[tuple[GitLogEntry, Iterable[GitDiffEntry]]],
+        writer: BaseWriter,
+        author: Optional[str] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        ignore_matcher: Optional[IgnoreMatcher] = None,
+        aggregators: Collection[BaseAggregator] = (),
+        profiler: Profiler = NULL_PROFILER,
+    ) -> int:
+        if ignore_matcher is None:
+            ignore_matcher = IgnoreMatcher()
+        per_file_aggregators = [x for x in aggregators if x.is_per_file]
+        start_timestamp, end_timestamp = get_timestamp_range(start_date, end_date)
         loc_tot = 0
-        # Note: we could use multi-threading here.
-        for commit in git_log:
-            # Ensure this commit actually matches the criteria.
-            if author and author not in commit.email:
-                raise AuthorMismatch
-            date = datetime.strptime(commit.date, "%Y-%m-%d").date()
-            if start_date and date < start_date.date():
-                raise StartDateMismatch
-            if end_date and date > end_date.date():
-                raise EndDateMismatch
-
-            # Get the diff for this commit.
-            git_diff = git_client.diff(commit.hash)
-            loc_in_commit = 0
-            # For each file in the diff, compute the loc.
-            for file_diff_stats in git_diff:
-                # Ignore some files.
-                do_ignore = False
-                for file_to_ignore in files_to_ignore:
-                    if file_to_ignore in file_diff_stats.path:
-                        do_ignore = True
-                if do_ignore:
-                    table.add_row("ignored", "ignored", file_diff_stats.path)
-                    continue
+        # The time spent in the loop itself (the nested stages are excluded).
+        with profiler.stage(STAGE_COUNT):
+            for commit, git_diff in commits_with_diffs:
+                self._check_commit(commit, author, start_timestamp, end_timestamp)
 
-                try:
-                    loc_ins = int(file_diff_stats.insertions)
-                    loc_in_commit += loc_ins
-                except ValueError:
-                    loc_ins = file_diff_stats.insertions
-                try:
-                    loc_del = int(file_diff_stats.deletions)
-                    loc_in_commit += loc_del
-                except ValueError:
-                    loc_del = file_diff_stats.deletions
+                ins_in_commit = 0
+                del_in_commit = 0
+                # For each file in the diff, compute the loc.
+                for file_diff_stats in git_diff:
+                    # Ignore some files.
+                    with profiler.stage(STAGE_IGNORE):
+                        is_ignored = ignore_matcher and ignore_matcher.is_ignored(
+                            file_diff_stats.path
+                        )
+                    if is_ignored:
+                        with profiler.stage(STAGE_WRITE):
+                            writer.add_file(
+                                commit, file_diff_stats.path, None, None, True
+                            )
+                        continue
 
-                table.add_row(str(loc_ins), str(loc_del), file_diff_stats.path)
+                    # Binary files have "-" insertions and deletions.
+                    try:
+                        loc_ins = int(file_diff_stats.insertions)
+                        ins_in_commit += loc_ins
+                    except ValueError:
+                        loc_ins = None
+                    try:
+                        loc_del = int(file_diff_stats.deletions)
+                        del_in_commit += loc_del
+                    except ValueError:
+                        loc_del = None
 
-            loc_tot += loc_in_commit
+                    with profiler.stage(STAGE_WRITE):
+                        writer.add_file(
+                            commit, file_diff_stats.path, loc_ins, loc_del, False
+                        )
+                    with profiler.stage(STAGE_AGGREGATE):
+                        for aggregator in per_file_aggregators:
+                            aggregator.add_file(
+                                commit, file_diff_stats.path, loc_ins or 0, loc_del or 0
+                            )
 
-        console.print(table)
+                with profiler.stage(STAGE_AGGREGATE):
+                    for aggregator in aggregators:
+                        aggregator.add_commit(commit, ins_in_commit, del_in_commit)
+                loc_tot += ins_in_commit + del_in_commit
         return loc_tot
+
+    def _check_commit(
+        self,
+        commit: GitLogEntry,
+        author: Optional[str],
+        start_timestamp: int,
+        end_timestamp: int,
+    ) -> None:
+        # Ensure this commit actually matches the criteria.
+        if author and author not in commit.email:
+            raise AuthorMismatch
+        if commit.timestamp < start_timestamp:
+            raise StartDateMismatch
+        if commit.timestamp >= end_timestamp:
+            raise EndDateMismatch
+
+    def _count_commits_numpy(
+        self,
+        commits_with_diffs: Iterable[tuple[GitLogEntry, Iterable[GitDiffEntry]]],
+        writer: Optional[BaseWriter],
+        author: Optional[str] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        ignore_matcher: Optional[IgnoreMatcher] = None,
+        aggregators: Collection[BaseAggregator] = (),
+        profiler: Profiler = NULL_PROFILER,
+        store: Optional[HistoryStore] = None,
+    ) -> int:
+        # Collect the commits in a store (after the ones already in `store`), then
+        #  count them with NumPy. Git already selected the commits: they are checked
+        #  like in `_count_commits`, but not filtered again.
+        if store is None:
+            store = HistoryStore()
+        n_commits_before = len(store)
+        start_timestamp, end_timestamp = get_timestamp_range(start_date, end_date)
+        with profiler.stage(STAGE_COUNT):
+            for commit, git_diff in commits_with_diffs:
+                self._check_commit(commit, author, start_timestamp, end_timestamp)
+                store.append(commit, git_diff)
+            new_store = store[n_commits_before:] if n_commits_before else store
+            with profiler.stage(STAGE_AGGREGATE):
+                return count_store_numpy(
+                    new_store,
+                    ignore_matcher=ignore_matcher,
+                    aggregators=aggregators,
+                    writer=writer,
+                )
+
+    def _iter_commits_with_diffs(
+        self,
+        git_client: GitClient,
+        branch: str,
+        author: Optional[str] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        jobs: int = 1,
+        profiler: Profiler = NULL_PROFILER,
+    ) -> Iterator[tuple[GitLogEntry, Iterable[GitDiffEntry]]]:
+        git_log = profiler.iter_stage(
+            STAGE_GIT_LOG,
+            git_client.log_sharded(
+                branch=branch,
+                start_date=start_date,
+                end_date=end_date,
+                author=author,
+                jobs=jobs,
+            ),
+        )
+        if jobs <= 1:
+            for commit in git_log:
+                # Get the diff for this commit.
+                yield commit, profiler.iter_stage(
+                    STAGE_GIT_DIFF, git_client.diff(commit.hash)
+                )
+            return
+
+        # Run the diffs in a pool of threads (the actual work is done by the git
+        #  processes, so the GIL is not a bottleneck) but yield them in the same
+        #  order as `git log`, so the result is deterministic.
+        # Only up to `2 * jobs` diffs are pending at any time, to bound the memory.
+        executor = ThreadPoolExecutor(max_workers=jobs)
+        pending = deque()
+        try:
+            for commit in git_log:
+                future = executor.submit(_list_diff, git_client, commit.hash, profiler)
+                pending.append((commit, future))
+                if len(pending) >= 2 * jobs:
+                    commit, future = pending.popleft()
+                    with profiler.stage(STAGE_GIT_DIFF_WAIT):
+                        git_diff = future.result()
+                    yield commit, git_diff
+            while pending:
+                commit, future = pending.popleft()
+                with profiler.stage(STAGE_GIT_DIFF_WAIT):
+                    git_diff = future.result()
+                yield commit, git_diff
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    async def _aiter_commits_with_diffs(
+        self,
+        git_client: AsyncGitClient,
+        strategy: str,
+        branch: str,
+        author: Optional[str] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+    ) -> AsyncIterator[tuple[GitLogEntry, Iterable[GitDiffEntry]]]:
+        if strategy == STRATEGY_LOG_NUMSTAT:
+            async for commit, git_diff in git_client.alog_numstat(
+                branch=branch,
+                start_date=start_date,
+                end_date=end_date,
+                author=author,
+            ):
+                yield commit, git_diff
+            return
+
+        # The whole log is read first, so that its git process does not hold the
+        #  semaphore while waiting for the diffs (a deadlock, if it is the last slot).
+        git_log = [
+            commit
+            async for commit in git_client.alog(
+                branch=branch,
+                start_date=start_date,
+                end_date=end_date,
+                author=author,
+            )
+        ]
+        # Run the diffs concurrently but yield them in the same order as `git log`,
+        #  so the result is deterministic. Only up to twice the max number of git
+        #  processes are pending at any time, to bound the memory.
+        max_pending = 2 * get_settings().get("ASYNC_MAX_GIT_PROCESSES", 8)
+        pending = deque()
+        try:
+            for commit in git_log:
+                task = asyncio.create_task(_alist_diff(git_client, commit.hash))
+                pending.append((commit, task))
+                if len(pending) >= max_pending:
+                    commit, task = pending.popleft()
+                    yield commit, await task
+            while pending:
+                commit, task = pending.popleft()
+                yield commit, await task
+        finally:
+            for _, task in pending:
+                task.cancel()
+
+
+async def _alist_diff(git_client: AsyncGitClient, hash: str) -> list[GitDiffEntry]:
+    return [x async for x in git_client.adiff(hash)]
+
+
+def _list_diff(
+    git_client: GitClient, hash: str, profiler: Profiler
+) -> list[GitDiffEntry]:
+    with profiler.stage(STAGE_GIT_DIFF):
+        return list(git_client.diff(hash))
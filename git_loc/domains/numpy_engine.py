@@ -0,0 +1,220 @@
+"""
+An optional engine to count a `HistoryStore` with NumPy: the columns of the store are
+ loaded in arrays, the filters are boolean masks and the totals and the group-bys are
+ computed with vectorized operations, instead of a Python loop over each file of each
+ commit. Install it with: $ pip install git-loc[numpy]
+
+See `count_store_numpy`.
+"""
+
+from datetime import date, datetime
+from typing import TYPE_CHECKING, Collection, Optional
+
+from ..clients.git_client import get_timestamp_range
+from .aggregators import (
+    AuthorAggregator,
+    BaseAggregator,
+    BucketAggregator,
+    PathAggregator,
+)
+from .history_store import HistoryStore
+from .ignore import IgnoreMatcher
+from .writers import BaseWriter
+
+if TYPE_CHECKING:
+    import numpy
+
+
+class BaseNumpyEngineException(Exception):
+    pass
+
+
+class NumpyNotInstalled(BaseNumpyEngineException):
+    def __str__(self):
+        return "NumPy is not installed (run: pip install git-loc[numpy])"
+
+
+def import_numpy():
+    """
+    Return the numpy module, or raise `NumpyNotInstalled`.
+    """
+    try:
+        import numpy
+    except ImportError as exc:
+        raise NumpyNotInstalled from exc
+    return numpy
+
+
+def count_store_numpy(
+    store: HistoryStore,
+    author: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    ignore_matcher: Optional[IgnoreMatcher] = None,
+    aggregators: Collection[BaseAggregator] = (),
+    writer: Optional[BaseWriter] = None,
+) -> int:
+    """
+    Return the LOC count of the commits in `store`, like the Python loop of
+     `LocCounter.count_store` (with the same result), but vectorized with NumPy.
+
+    `AuthorAggregator`, `BucketAggregator` and `PathAggregator` are filled with
+     their `add_stats` method, once per author, date or path. Any other aggregator
+     is filled with `add_commit` (and `add_file`), once per commit, like in the
+     Python loop. The files are written to `writer`, if given, in a Python loop: so
+     skip it when writing nothing.
+    """
+    np = import_numpy()
+    # Copies of the columns of the store (a memcpy each): views on the buffers of
+    #  the arrays would prevent appending to the store while they are alive.
+    timestamps = np.frombuffer(store._timestamps, dtype=np.int64).copy()
+    email_ids = np.frombuffer(store._email_ids, dtype=np.uintc).astype(np.intp)
+    file_starts = np.frombuffer(store._file_starts, dtype=np.uintc).astype(np.intp)
+    path_ids = np.frombuffer(store._path_ids, dtype=np.uintc).astype(np.intp)
+    insertions = np.frombuffer(store._insertions, dtype=np.uintc).astype(np.int64)
+    deletions = np.frombuffer(store._deletions, dtype=np.uintc).astype(np.int64)
+
+    # The commits filters.
+    is_commit_selected = np.ones(len(store), dtype=bool)
+    # The open bounds of the range (+-2**63) do not fit an int64.
+    start, end = get_timestamp_range(start_date, end_date)
+    if start_date:
+        is_commit_selected &= timestamps >= start
+    if end_date:
+        is_commit_selected &= timestamps < end
+    if author:
+        # Each email is matched once.
+        is_email_matching = np.array(
+            [author in x for x in store._emails.strings], dtype=bool
+        )
+        if len(is_email_matching):
+            is_commit_selected &= is_email_matching[email_ids]
+
+    # The files filters: the commit of each file, and whether its path is ignored.
+    file_commit_indexes = np.repeat(np.arange(len(store)), np.diff(file_starts))
+    is_file_selected = is_commit_selected[file_commit_indexes]
+    is_path_ignored = np.zeros(len(store._paths), dtype=bool)
+    if ignore_matcher:
+        # Each path (in the selected commits) is matched once.
+        paths = store._paths.strings
+        for path_id in np.unique(path_ids[is_file_selected]).tolist():
+            is_path_ignored[path_id] = ignore_matcher.is_ignored(paths[path_id])
+    is_file_counted = is_file_selected & ~is_path_ignored[path_ids]
+    # Binary files have 0 insertions and deletions in the store.
+    counted_insertions = np.where(is_file_counted, insertions, 0)
+    counted_deletions = np.where(is_file_counted, deletions, 0)
+
+    # The insertions and deletions of each commit, summed up with a cumulative sum
+    #  (exact integers, unlike `np.bincount` with weights).
+    ins_by_commit = _sum_by_commit(np, counted_insertions, file_starts)
+    del_by_commit = _sum_by_commit(np, counted_deletions, file_starts)
+    loc_tot = int(ins_by_commit.sum() + del_by_commit.sum())
+
+    commit_indexes = np.flatnonzero(is_commit_selected)
+    for aggregator in aggregators:
+        if isinstance(aggregator, AuthorAggregator):
+            _add_stats(
+                np,
+                aggregator,
+                email_ids[commit_indexes],
+                ins_by_commit[commit_indexes],
+                del_by_commit[commit_indexes],
+                store._emails.strings.__getitem__,
+            )
+        elif isinstance(aggregator, BucketAggregator):
+            dates = np.frombuffer(store._dates, dtype=np.uintc).astype(np.intp)
+            _add_stats(
+                np,
+                aggregator,
+                dates[commit_indexes],
+                ins_by_commit[commit_indexes],
+                del_by_commit[commit_indexes],
+                lambda x: date.fromordinal(x).isoformat(),
+            )
+        elif isinstance(aggregator, PathAggregator):
+            file_indexes = np.flatnonzero(is_file_counted)
+            _add_stats(
+                np,
+                aggregator,
+                path_ids[file_indexes],
+                counted_insertions[file_indexes],
+                counted_deletions[file_indexes],
+                store._paths.strings.__getitem__,
+            )
+        else:
+            _add_commits(
+                store,
+                aggregator,
+                commit_indexes,
+                ins_by_commit,
+                del_by_commit,
+                is_path_ignored,
+            )
+
+    if writer is not None:
+        for index in commit_indexes.tolist():
+            commit = store.get_commit(index)
+            for file in store.iter_files(index):
+                if is_path_ignored[file.path_id]:
+                    writer.add_file(commit, file.path, None, None, True)
+                else:
+                    writer.add_file(
+                        commit, file.path, file.insertions, file.deletions, False
+                    )
+    return loc_tot
+
+
+def _sum_by_commit(
+    np, values: "numpy.ndarray", file_starts: "numpy.ndarray"
+) -> "numpy.ndarray":
+    # The files of commit i are in `file_starts[i]:file_starts[i + 1]`.
+    cumsum = np.concatenate(([0], np.cumsum(values, dtype=np.int64)))
+    return cumsum[file_starts[1:]] - cumsum[file_starts[:-1]]
+
+
+def _add_stats(
+    np,
+    aggregator: BaseAggregator,
+    keys: "numpy.ndarray",
+    insertions: "numpy.ndarray",
+    deletions: "numpy.ndarray",
+    get_key,
+):
+    # Group by key: sort the keys, then sum up each run of equal keys.
+    if not len(keys):
+        return
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    counts = np.diff(np.concatenate((starts, [len(keys)])))
+    insertions = np.add.reduceat(insertions[order], starts)
+    deletions = np.add.reduceat(deletions[order], starts)
+    for key, ins, dels, count in zip(
+        keys[starts].tolist(),
+        insertions.tolist(),
+        deletions.tolist(),
+        counts.tolist(),
+    ):
+        aggregator.add_stats(get_key(key), ins, dels, count)
+
+
+def _add_commits(
+    store: HistoryStore,
+    aggregator: BaseAggregator,
+    commit_indexes: "numpy.ndarray",
+    ins_by_commit: "numpy.ndarray",
+    del_by_commit: "numpy.ndarray",
+    is_path_ignored: "numpy.ndarray",
+):
+    # An aggregator with no `add_stats`: one call per commit (and file).
+    for index in commit_indexes.tolist():
+        commit = store.get_commit(index)
+        if aggregator.is_per_file:
+            for file in store.iter_files(index):
+                if not is_path_ignored[file.path_id]:
+                    aggregator.add_file(
+                        commit, file.path, file.insertions or 0, file.deletions or 0
+                    )
+        aggregator.add_commit(
+            commit, int(ins_by_commit[index]), int(del_by_commit[index])
+        )
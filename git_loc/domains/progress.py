@@ -0,0 +1,183 @@
+import json
+import threading
+import time
+from collections import namedtuple
+from typing import Callable, Iterable, Iterator, Optional
+
+from ..clients.git_client import get_n_git_processes_running
+from ..conf import get_settings
+from ..utils import printer
+
+# The progress of a count. `total` (and so `eta_s`) is None while the commits are
+#  being counted, or if their number is unknown.
+ProgressSnapshot = namedtuple(
+    "ProgressSnapshot",
+    ("n_commits", "total", "elapsed_s", "commits_per_s", "n_git_processes", "eta_s"),
+)
+
+
+# Notice that this is a context manager!
+class Progress:
+    def __init__(
+        self,
+        console: Optional[printer.ConsoleAdapter] = None,
+        is_tty: Optional[bool] = None,
+    ):
+        """
+        Report the progress of a count: the commits processed out of the total, the
+         commits per second, the git processes running and the ETA.
+
+        Use it like:
+            LocCounter(root_dir).count(branch="master", progress=Progress())
+
+        On a terminal, it is a status line refreshed every `PROGRESS_REFRESH_S` (a
+         setting). Else (eg. in CI logs, or with `is_tty` False) it is a JSON line
+         printed every `PROGRESS_LOG_INTERVAL_S`, like:
+         {"type": "progress", "commits": 1200, "total": 5000, "elapsed_s": 3.4,
+          "commits_per_s": 352.9, "git_processes": 3, "eta_s": 10.8}
+
+        The count only increments a counter for each commit: the total is counted
+         (eg. with `git rev-list --count`) and the progress is rendered in two
+         background threads.
+        """
+        if console is None:
+            console = printer.ConsoleAdapter(stderr=True)
+        self.console = console
+        self.is_tty = console.is_terminal if is_tty is None else is_tty
+        self.n_commits = 0
+        self.total: Optional[int] = None
+        self._t0 = None
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._total_thread: Optional[threading.Thread] = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.stop()
+
+    def start(self, get_total: Optional[Callable[[], Optional[int]]] = None):
+        """
+        Start rendering the progress. `get_total` returns the number of commits to
+         process (or None if unknown): it is called in its own background thread.
+        """
+        self._t0 = time.perf_counter()
+        self._stop_event.clear()
+        if get_total is not None:
+            self._total_thread = threading.Thread(
+                target=self._count_total, args=(get_total,), daemon=True
+            )
+            self._total_thread.start()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        if self._total_thread is not None:
+            # The count can end before the total is known (eg. `git rev-list` is
+            #  slower than a count with few matching commits): do not wait for it
+            #  longer than the timeout. The thread is a daemon, so it does not keep
+            #  the process alive.
+            self._total_thread.join(
+                timeout=get_settings().get("PROGRESS_TOTAL_TIMEOUT_S", 0.5)
+            )
+            self._total_thread = None
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+
+    def track(self, iterable: Iterable) -> Iterator:
+        """
+        Yield the items of `iterable` (the commits), counting them.
+        """
+        for item in iterable:
+            yield item
+            self.n_commits += 1
+
+    def snapshot(self) -> ProgressSnapshot:
+        elapsed_s = time.perf_counter() - self._t0 if self._t0 is not None else 0.0
+        n_commits = self.n_commits
+        commits_per_s = n_commits / elapsed_s if elapsed_s > 0 else 0.0
+        eta_s = None
+        if self.total is not None and commits_per_s > 0:
+            eta_s = max(self.total - n_commits, 0) / commits_per_s
+        return ProgressSnapshot(
+            n_commits=n_commits,
+            total=self.total,
+            elapsed_s=elapsed_s,
+            commits_per_s=commits_per_s,
+            n_git_processes=get_n_git_processes_running(),
+            eta_s=eta_s,
+        )
+
+    def _count_total(self, get_total: Callable[[], Optional[int]]):
+        try:
+            total = get_total()
+        except Exception:
+            # The total is only for the ETA: do not fail the count.
+            total = None
+        if not self._stop_event.is_set():
+            self.total = total
+
+    def _run(self):
+        status = None
+        if self.is_tty:
+            interval_s = get_settings().get("PROGRESS_REFRESH_S", 0.5)
+            # The spinner of the status runs in its own thread.
+            status = self.console.status(self._format_status(self.snapshot()))
+            if status is not None:
+                status.start()
+        else:
+            interval_s = get_settings().get("PROGRESS_LOG_INTERVAL_S", 10)
+        try:
+            while not self._stop_event.wait(interval_s):
+                self._render(status)
+        finally:
+            if status is not None:
+                status.stop()
+            elif not self.is_tty:
+                # The last line, so the logs include the final numbers.
+                self._render(status)
+
+    def _render(self, status):
+        snapshot = self.snapshot()
+        if status is not None:
+            status.update(self._format_status(snapshot))
+        elif not self.is_tty:
+            self.console.print(
+                self._format_line(snapshot),
+                markup=False,
+                highlight=False,
+                soft_wrap=True,
+            )
+
+    def _format_status(self, snapshot: ProgressSnapshot) -> str:
+        if snapshot.total is None:
+            commits = f"{snapshot.n_commits} commits"
+        else:
+            percent = snapshot.n_commits / snapshot.total * 100 if snapshot.total else 0
+            commits = f"{snapshot.n_commits}/{snapshot.total} commits ({percent:.0f}%)"
+        text = (
+            f"Computing... {commits}, {snapshot.commits_per_s:.1f} commits/s,"
+            f" {snapshot.n_git_processes} git processes"
+        )
+        if snapshot.eta_s is not None:
+            minutes, seconds = divmod(int(snapshot.eta_s), 60)
+            text += f", ETA {minutes}:{seconds:02d}"
+        return text
+
+    def _format_line(self, snapshot: ProgressSnapshot) -> str:
+        return json.dumps(
+            dict(
+                type="progress",
+                commits=snapshot.n_commits,
+                total=snapshot.total,
+                elapsed_s=round(snapshot.elapsed_s, 1),
+                commits_per_s=round(snapshot.commits_per_s, 1),
+                git_processes=snapshot.n_git_processes,
+                eta_s=round(snapshot.eta_s, 1) if snapshot.eta_s is not None else None,
+            )
+        )
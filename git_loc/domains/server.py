@@ -0,0 +1,389 @@
+import json
+import socketserver
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future
+from datetime import datetime
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Collection, Hashable, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from ..clients.git_client import GitClient, GitProcessError
+from .aggregators import (
+    BUCKETS,
+    AuthorAggregator,
+    BucketAggregator,
+    LocStats,
+    PathAggregator,
+)
+from .history_store import HistoryStore
+from .main import LocCounter
+from .writers import FORMAT_NONE
+
+GROUP_BY_AUTHOR = "author"
+GROUP_BY_PATH = "path"
+GROUP_BYS = (GROUP_BY_AUTHOR, GROUP_BY_PATH)
+
+# A query to a `LocServer`: the options of `LocCounter.count_store`, plus the
+#  breakdowns (like the `--group-by` and `--bucket` options of the `count` command).
+ServerQuery = namedtuple(
+    "ServerQuery",
+    (
+        "root_dir",
+        "branch",
+        "author",
+        "start_date",
+        "end_date",
+        "files_to_ignore",
+        "globs_to_ignore",
+        "group_by",
+        "top_files",
+        "bucket",
+    ),
+    defaults=(None, None, None, None, None, (), (), None, 50, None),
+)
+
+# The query params of `GET /count`, by the name of the `ServerQuery` field.
+QUERY_PARAMS = dict(
+    root_dir="dir",
+    branch="branch",
+    author="author",
+    start_date="start_date",
+    end_date="end_date",
+    files_to_ignore="ignore_file",
+    globs_to_ignore="ignore_glob",
+    group_by="group_by",
+    top_files="top_files",
+    bucket="bucket",
+)
+# The params that can be repeated, like: ?ignore_file=a.lock&ignore_file=b.lock.
+MULTIPLE_QUERY_PARAMS = ("ignore_file", "ignore_glob")
+
+
+class BaseLocServerException(Exception):
+    pass
+
+
+class InvalidQuery(BaseLocServerException):
+    def __init__(self, reason: str):
+        self.reason = reason
+
+    def __str__(self):
+        return self.reason
+
+
+class UnknownRepo(BaseLocServerException):
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+
+    def __str__(self):
+        return f"Unknown repo: {self.root_dir}"
+
+
+class SingleFlight:
+    def __init__(self):
+        """
+        Run a function once per key at a time: the calls with the same key made while
+         it is running wait for its result (or its exception) instead of running it
+         again.
+        """
+        self._lock = threading.Lock()
+        self._in_flight: dict[Hashable, Future] = dict()
+
+    def run(self, key: Hashable, fn: Callable, *args):
+        with self._lock:
+            future = self._in_flight.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = self._in_flight[key] = Future()
+        if not is_leader:
+            return future.result()
+        try:
+            result = fn(*args)
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+
+class BranchHistory:
+    def __init__(self, root_dir: Path | str, branch: str):
+        """
+        The history of a branch in a `HistoryStore`, refreshed when the tip of the
+         branch moves.
+        """
+        self.root_dir = root_dir
+        self.branch = branch
+        self.store: Optional[HistoryStore] = None
+        self.tip: Optional[str] = None
+
+    def refresh(self) -> tuple[HistoryStore, str]:
+        """
+        Return the store and the tip, after reading the commits added since the last
+         refresh (or the whole history, if it was rewritten).
+
+        The store is never modified once returned: a refresh builds a new one, so the
+         queries running on the previous one are not affected. When the branch moved
+         forward, the new store is a copy of the columns of the previous one (a
+         memcpy each, see `HistoryStore.__getitem__`) with the new commits appended
+         after the old ones (the order of the commits does not change the counts).
+        """
+        with GitClient(self.root_dir) as git_client:
+            tip = git_client.rev_parse(self.branch)
+            if tip == self.tip:
+                return self.store, self.tip
+            if self.tip is not None and git_client.is_ancestor(self.tip, tip):
+                store = self.store[:]
+                rev = f"{self.tip}..{tip}"
+            else:
+                store = HistoryStore()
+                rev = tip
+            for commit, git_diff in git_client.log_numstat(rev):
+                store.append(commit, git_diff)
+        self.store, self.tip = store, tip
+        return store, tip
+
+
+class LocServer:
+    def __init__(self, root_dirs: Collection[Path | str], max_results: int = 256):
+        """
+        Answer count queries (see `ServerQuery`) on the repos in `root_dirs`, keeping
+         the history of each branch in memory (see `BranchHistory`): a query runs a
+         single `git rev-parse` to check whether the branch moved, and no other git
+         process unless it did.
+
+        It is thread-safe. The concurrent refreshes of the same branch, and the
+         concurrent identical queries, are run once (see `SingleFlight`). The results
+         of the last `max_results` queries are kept, until the branch moves.
+        """
+        self.root_dirs = {str(Path(x).resolve()): x for x in root_dirs}
+        self.max_results = max_results
+        self._lock = threading.Lock()
+        self._histories: dict[tuple[str, str], BranchHistory] = dict()
+        self._results: OrderedDict[tuple[ServerQuery, str], dict] = OrderedDict()
+        self._refreshes = SingleFlight()
+        self._counts = SingleFlight()
+
+    def query(self, query: ServerQuery) -> dict:
+        """
+        Return the LOC count, like:
+         {"dir": "/srv/repo", "branch": "master", "tip": "2fdffa2...", "loc": 12}
+         and the breakdowns by author, by path or by bucket, if asked.
+        """
+        if query.root_dir is None:
+            if len(self.root_dirs) != 1:
+                raise InvalidQuery("Missing param: dir (there are many repos)")
+            query = query._replace(root_dir=next(iter(self.root_dirs)))
+        else:
+            query = query._replace(root_dir=str(Path(query.root_dir).resolve()))
+        if query.root_dir not in self.root_dirs:
+            raise UnknownRepo(query.root_dir)
+
+        history = self._get_history(query.root_dir, query.branch)
+        store, tip = self._refreshes.run(
+            (query.root_dir, query.branch), history.refresh
+        )
+        key = (query, tip)
+        with self._lock:
+            result = self._results.get(key)
+            if result is not None:
+                self._results.move_to_end(key)
+                return result
+        result = self._counts.run(key, self._count, store, tip, query)
+        with self._lock:
+            # The branch moved while counting: the result is already stale.
+            if history.tip != tip:
+                return result
+            self._results[key] = result
+            # The results on a previous tip of the branch are not needed anymore.
+            for old_query, old_tip in list(self._results):
+                if old_tip != tip and (old_query.root_dir, old_query.branch) == (
+                    query.root_dir,
+                    query.branch,
+                ):
+                    del self._results[(old_query, old_tip)]
+            while len(self._results) > self.max_results:
+                self._results.popitem(last=False)
+        return result
+
+    def _get_history(self, root_dir: str, branch: str) -> BranchHistory:
+        with self._lock:
+            history = self._histories.get((root_dir, branch))
+            if history is None:
+                history = self._histories[(root_dir, branch)] = BranchHistory(
+                    self.root_dirs[root_dir], branch
+                )
+            return history
+
+    def _count(self, store: HistoryStore, tip: str, query: ServerQuery) -> dict:
+        author_aggregator = path_aggregator = bucket_aggregator = None
+        aggregators = list()
+        if query.group_by == GROUP_BY_AUTHOR:
+            author_aggregator = AuthorAggregator()
+            aggregators.append(author_aggregator)
+        elif query.group_by == GROUP_BY_PATH:
+            path_aggregator = PathAggregator()
+            aggregators.append(path_aggregator)
+        if query.bucket:
+            bucket_aggregator = BucketAggregator(query.bucket)
+            aggregators.append(bucket_aggregator)
+
+        loc_tot = LocCounter(self.root_dirs[query.root_dir]).count_store(
+            store,
+            author=query.author,
+            start_date=query.start_date,
+            end_date=query.end_date,
+            files_to_ignore=list(query.files_to_ignore),
+            globs_to_ignore=list(query.globs_to_ignore),
+            aggregators=aggregators,
+            output_format=FORMAT_NONE,
+        )
+        result = dict(dir=query.root_dir, branch=query.branch, tip=tip, loc=loc_tot)
+        if author_aggregator is not None:
+            result["authors"] = [
+                dict(author=email, **_format_stats(stats))
+                for email, stats in author_aggregator.get_sorted_stats()
+            ]
+        if path_aggregator is not None:
+            result["paths"] = [
+                dict(path=path, **_format_stats(stats))
+                for path, stats in path_aggregator.get_top_stats(query.top_files)
+            ]
+        if bucket_aggregator is not None:
+            result["buckets"] = bucket_aggregator.get_records()
+        return result
+
+
+def _format_stats(stats: LocStats) -> dict:
+    return dict(
+        insertions=stats.insertions,
+        deletions=stats.deletions,
+        loc=stats.loc,
+        commits=stats.commits,
+    )
+
+
+def parse_query(params: dict[str, list[str]]) -> ServerQuery:
+    """
+    Return the query in the params of a query string (as parsed by
+     `urllib.parse.parse_qs`), like:
+     dir=/srv/repo&branch=master&author=john&start_date=2020-01-01&ignore_glob=*.lock
+    """
+    unknown_params = set(params) - set(QUERY_PARAMS.values())
+    if unknown_params:
+        raise InvalidQuery(f"Unknown params: {sorted(unknown_params)}")
+    values = dict()
+    for field, param in QUERY_PARAMS.items():
+        if param not in params:
+            continue
+        if param in MULTIPLE_QUERY_PARAMS:
+            values[field] = tuple(params[param])
+        elif len(params[param]) > 1:
+            raise InvalidQuery(f"Repeated param: {param}")
+        else:
+            values[field] = params[param][0]
+    if not values.get("branch"):
+        raise InvalidQuery("Missing param: branch")
+    for field in ("start_date", "end_date"):
+        if field in values:
+            try:
+                values[field] = datetime.strptime(values[field], "%Y-%m-%d")
+            except ValueError:
+                raise InvalidQuery(f"Not a valid date (eg.: 2020-01-12): {field}")
+    if values.get("group_by", GROUP_BY_AUTHOR) not in GROUP_BYS:
+        raise InvalidQuery(f"group_by is not one of: {', '.join(GROUP_BYS)}")
+    if values.get("bucket", BUCKETS[0]) not in BUCKETS:
+        raise InvalidQuery(f"bucket is not one of: {', '.join(BUCKETS)}")
+    if "top_files" in values:
+        try:
+            values["top_files"] = int(values["top_files"])
+        except ValueError:
+            values["top_files"] = 0
+        if values["top_files"] < 1:
+            raise InvalidQuery("top_files is not a positive integer")
+    return ServerQuery(**values)
+
+
+class LocRequestHandler(BaseHTTPRequestHandler):
+    """
+    The HTTP API of a `LocServer` (in `self.server.loc_server`):
+     - GET /count?branch=master&... (see `parse_query`): the result of
+       `LocServer.query` as JSON;
+     - GET /health: {"status": "ok", "repos": [...]}.
+    The errors are JSON too, like: {"error": "Missing param: branch"}.
+    """
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        loc_server: LocServer = self.server.loc_server
+        if url.path == "/health":
+            return self._send_json(
+                HTTPStatus.OK, dict(status="ok", repos=sorted(loc_server.root_dirs))
+            )
+        if url.path != "/count":
+            return self._send_json(HTTPStatus.NOT_FOUND, dict(error="Not found"))
+        try:
+            query = parse_query(parse_qs(url.query))
+            result = loc_server.query(query)
+        except InvalidQuery as exc:
+            return self._send_json(HTTPStatus.BAD_REQUEST, dict(error=str(exc)))
+        except UnknownRepo as exc:
+            return self._send_json(HTTPStatus.NOT_FOUND, dict(error=str(exc)))
+        except GitProcessError as exc:
+            # Eg. an unknown branch.
+            return self._send_json(
+                HTTPStatus.BAD_REQUEST, dict(error=exc.stderr.strip() or repr(exc))
+            )
+        except Exception as exc:
+            return self._send_json(
+                HTTPStatus.INTERNAL_SERVER_ERROR, dict(error=repr(exc))
+            )
+        self._send_json(HTTPStatus.OK, result)
+
+    def _send_json(self, status: HTTPStatus, data: dict):
+        body = (json.dumps(data) + "\n").encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # The access log is noise for a local daemon (and a Unix socket has no client
+        #  address to log).
+        pass
+
+
+class _ThreadingUnixHTTPServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def server_close(self):
+        super().server_close()
+        Path(self.server_address).unlink(missing_ok=True)
+
+
+def build_http_server(
+    loc_server: LocServer,
+    host: str = "127.0.0.1",
+    port: int = 0,
+    socket_path: Optional[Path | str] = None,
+) -> socketserver.BaseServer:
+    """
+    Return an HTTP server (each request in a thread) with the API of `loc_server`
+     (see `LocRequestHandler`), listening on `host` and `port` (0: any free port, see
+     `server.server_address`), or on the Unix socket `socket_path`.
+     Run it with `server.serve_forever()`.
+    """
+    if socket_path is not None:
+        server = _ThreadingUnixHTTPServer(str(socket_path), LocRequestHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), LocRequestHandler)
+    server.loc_server = loc_server
+    return server
@@ -0,0 +1,201 @@
+import csv
+import json
+from typing import Optional, TextIO
+
+from rich.table import Table
+
+from ..clients.git_client import GitLogEntry
+from ..utils import printer
+
+console = printer.ConsoleAdapter()
+
+# Output formats of the files counted by `LocCounter.count`.
+FORMAT_TABLE = "table"
+FORMAT_JSONL = "jsonl"
+FORMAT_CSV = "csv"
+FORMAT_NONE = "none"
+FORMATS = (FORMAT_TABLE, FORMAT_JSONL, FORMAT_CSV, FORMAT_NONE)
+
+# Types of the records written by the machine-readable writers.
+RECORD_FILE = "file"
+RECORD_REPO = "repo"
+RECORD_SUMMARY = "summary"
+
+CSV_COLUMNS = (
+    "type",
+    "hash",
+    "date",
+    "email",
+    "path",
+    "insertions",
+    "deletions",
+    "is_ignored",
+    "loc",
+)
+# The columns of the CSV of the repos counted by `BatchLocCounter.count`.
+REPO_CSV_COLUMNS = ("type", "root_dir", "branch", "error", "loc")
+
+
+class BaseWriterException(Exception):
+    pass
+
+
+class UnknownFormat(BaseWriterException):
+    def __init__(self, output_format):
+        self.output_format = output_format
+
+
+class BaseWriter:
+    """
+    Write the files counted by `LocCounter.count` while it walks the history.
+
+    `add_file` is called once per file in each commit. `insertions` and `deletions`
+     are None for binary files. `write_summary` is called once at the end with the
+     LOC count.
+
+    The same writers write the repos counted by `BatchLocCounter.count`: `add_repo`
+     is called once per repo, with `loc_tot` None and the `error` if it failed.
+    """
+
+    def add_file(
+        self,
+        commit: GitLogEntry,
+        path: str,
+        insertions: Optional[int],
+        deletions: Optional[int],
+        is_ignored: bool,
+    ):
+        pass
+
+    def add_repo(
+        self,
+        root_dir: str,
+        branch: str,
+        loc_tot: Optional[int],
+        error: Optional[str],
+    ):
+        pass
+
+    def write_summary(self, loc_tot: int):
+        pass
+
+
+class TableWriter(BaseWriter):
+    def __init__(self):
+        """
+        Print a rich table with all the files, at the end (so all the rows are kept in
+         memory).
+        """
+        self.table = Table(title="[bold underline]Files[/]")
+        self.table.add_column("insertions")
+        self.table.add_column("deletions")
+        self.table.add_column("file path", overflow="fold")
+
+    def add_file(self, commit, path, insertions, deletions, is_ignored):
+        if is_ignored:
+            self.table.add_row("ignored", "ignored", path)
+            return
+        self.table.add_row(_format_loc(insertions), _format_loc(deletions), path)
+
+    def write_summary(self, loc_tot: int):
+        console.print(self.table)
+
+
+class JsonlWriter(BaseWriter):
+    def __init__(self, stream: TextIO):
+        """
+        Stream a JSON record per line, like:
+         {"type": "file", "hash": "...", "date": "2020-02-10", "email": "...",
+          "path": "...", "insertions": 10, "deletions": 2, "is_ignored": false}
+         {"type": "summary", "loc": 12}
+        """
+        self.stream = stream
+
+    def add_file(self, commit, path, insertions, deletions, is_ignored):
+        record = dict(
+            type=RECORD_FILE,
+            hash=commit.hash,
+            date=commit.date,
+            email=commit.email,
+            path=path,
+            insertions=insertions,
+            deletions=deletions,
+            is_ignored=is_ignored,
+        )
+        self.stream.write(json.dumps(record) + "\n")
+
+    def add_repo(self, root_dir, branch, loc_tot, error):
+        record = dict(
+            type=RECORD_REPO, root_dir=root_dir, branch=branch, loc=loc_tot, error=error
+        )
+        self.stream.write(json.dumps(record) + "\n")
+
+    def write_summary(self, loc_tot: int):
+        self.stream.write(json.dumps(dict(type=RECORD_SUMMARY, loc=loc_tot)) + "\n")
+        self.stream.flush()
+
+
+class CsvWriter(BaseWriter):
+    def __init__(self, stream: TextIO, columns: tuple[str, ...] = CSV_COLUMNS):
+        """
+        Stream a CSV row per file (the columns are `CSV_COLUMNS`), and a last summary
+         row with only the type and the LOC count. Binary files have empty insertions
+         and deletions.
+
+        For the repos of `BatchLocCounter.count`, pass `REPO_CSV_COLUMNS`: a row per
+         repo, and the same summary row.
+        """
+        self.stream = stream
+        self.columns = columns
+        self.writer = csv.writer(stream, lineterminator="\n")
+        self.writer.writerow(columns)
+
+    def add_file(self, commit, path, insertions, deletions, is_ignored):
+        self.writer.writerow(
+            (
+                RECORD_FILE,
+                commit.hash,
+                commit.date,
+                commit.email,
+                path,
+                insertions,
+                deletions,
+                int(is_ignored),
+                None,
+            )
+        )
+
+    def add_repo(self, root_dir, branch, loc_tot, error):
+        self.writer.writerow((RECORD_REPO, root_dir, branch, error, loc_tot))
+
+    def write_summary(self, loc_tot: int):
+        row = [None] * len(self.columns)
+        row[0] = RECORD_SUMMARY
+        row[-1] = loc_tot
+        self.writer.writerow(row)
+        self.stream.flush()
+
+
+def build_writer(
+    output_format: str,
+    stream: Optional[TextIO] = None,
+    csv_columns: tuple[str, ...] = CSV_COLUMNS,
+) -> BaseWriter:
+    """
+    Build the writer for an output format. The machine-readable formats are written to
+     `stream` (eg. `sys.stdout` or an open file).
+    """
+    if output_format == FORMAT_TABLE:
+        return TableWriter()
+    if output_format == FORMAT_NONE:
+        return BaseWriter()
+    if output_format == FORMAT_JSONL:
+        return JsonlWriter(stream)
+    if output_format == FORMAT_CSV:
+        return CsvWriter(stream, columns=csv_columns)
+    raise UnknownFormat(output_format)
+
+
+def _format_loc(loc: Optional[int]) -> str:
+    # Binary files have "-" insertions and deletions, like in git numstat.
+    return "-" if loc is None else str(loc)
@@ -0,0 +1,28 @@
+import hashlib
+from pathlib import Path
+
+from ..conf import get_settings
+
+
+def get_cache_dir() -> Path:
+    """
+    Return the root dir of all git-loc caches, like: ~/.cache/git-loc.
+    """
+    return Path(get_settings().get("CACHE_DIR", "~/.cache/git-loc")).expanduser()
+
+
+def get_repo_cache_dir(root_dir: Path | str, do_create: bool = True) -> Path:
+    """
+    Return (and create, if `do_create`) the cache dir of the given repo, like:
+     ~/.cache/git-loc/mierecensioni-be-1f3a6b2c9d0e
+    The dir name includes a hash of the absolute path of the repo, so different repos
+     with the same name do not clash. The absolute path is also written in the file
+     `root_dir` in the cache dir.
+    """
+    root_dir = Path(root_dir).expanduser().resolve()
+    repo_id = hashlib.sha1(str(root_dir).encode("utf-8")).hexdigest()[:12]
+    repo_cache_dir = get_cache_dir() / f"{root_dir.name}-{repo_id}"
+    if do_create and not repo_cache_dir.is_dir():
+        repo_cache_dir.mkdir(parents=True, exist_ok=True)
+        (repo_cache_dir / "root_dir").write_text(str(root_dir))
+    return repo_cache_dir
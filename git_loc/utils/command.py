@@ -1,5 +1,32 @@
+import importlib
+from typing import Optional
+
 import click
 
 
 class BaseCommand(click.Command):
     pass
+
+
+class LazyGroup(click.Group):
+    def __init__(
+        self, *args, lazy_subcommands: Optional[dict[str, str]] = None, **kwargs
+    ):
+        """
+        A group of commands whose sub-commands are imported only when they are invoked
+         (or listed in the help).
+
+        `lazy_subcommands` maps a sub-command name to the import path of the command,
+         like: {"count": "git_loc.views.main._count"}.
+        """
+        super().__init__(*args, **kwargs)
+        self.lazy_subcommands = lazy_subcommands or dict()
+
+    def list_commands(self, ctx: click.Context) -> list[str]:
+        return sorted(set(super().list_commands(ctx)) | set(self.lazy_subcommands))
+
+    def get_command(self, ctx: click.Context, cmd_name: str) -> Optional[click.Command]:
+        if cmd_name in self.lazy_subcommands:
+            module_name, _, attr_name = self.lazy_subcommands[cmd_name].rpartition(".")
+            return getattr(importlib.import_module(module_name), attr_name)
+        return super().get_command(ctx, cmd_name)
@@ -2,22 +2,22 @@ import re
 
 from rich.console import Console
 
-from ..conf import settings
+from ..conf import get_settings
 
 ESCAPE_ANSI_REGEX = re.compile(r"\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])")
 
 
 class ConsoleAdapter(Console):
     def log(self, *args, **kwargs):
-        if not settings.DO_SUPPRESS_PRINT:
+        if not get_settings().DO_SUPPRESS_PRINT:
             super().log(*args, **kwargs)
 
     def print(self, *args, **kwargs):
-        if not settings.DO_SUPPRESS_PRINT:
+        if not get_settings().DO_SUPPRESS_PRINT:
             super().print(*args, **kwargs)
 
     def status(self, *args, **kwargs):
-        if not settings.DO_SUPPRESS_PRINT:
+        if not get_settings().DO_SUPPRESS_PRINT:
             return super().status(*args, **kwargs)
 
 
@@ -0,0 +1,237 @@
+import json
+import threading
+import time
+import tracemalloc
+from collections import namedtuple
+from contextlib import nullcontext
+from typing import Iterable, Iterator, Optional, TextIO
+
+# The stages of `LocCounter.count`:
+#  - "git log": reading the log (and the numstat, with the "log-numstat" strategy).
+#  - "git diff": reading the numstat of each commit, with the "diff" strategy.
+#  - "git diff wait": waiting for the diffs run in parallel (with `jobs` > 1).
+#  - "parse": parsing the output of git, in `GitClient`.
+#  - "ignore": matching the paths against the ignored files.
+#  - "write": writing each file (eg. adding a row to the table).
+#  - "aggregate": the aggregators (eg. by author).
+#  - "render": writing the summary (eg. printing the table).
+#  - "count": the rest of `LocCounter.count`.
+STAGE_GIT_LOG = "git log"
+STAGE_GIT_DIFF = "git diff"
+STAGE_GIT_DIFF_WAIT = "git diff wait"
+STAGE_PARSE = "parse"
+STAGE_IGNORE = "ignore"
+STAGE_WRITE = "write"
+STAGE_AGGREGATE = "aggregate"
+STAGE_RENDER = "render"
+STAGE_COUNT = "count"
+
+# The time spent in a stage, excluding its nested stages.
+ProfileStage = namedtuple("ProfileStage", ("name", "n_calls", "wall_s", "cpu_s"))
+# `git_latency_*` are about the time from the start to the exit of each git process.
+#  `tracemalloc_peak_bytes` is None if the memory was not traced.
+ProfileReport = namedtuple(
+    "ProfileReport",
+    (
+        "wall_s",
+        "cpu_s",
+        "stages",
+        "n_git_processes",
+        "git_latency_total_s",
+        "git_latency_p50_s",
+        "git_latency_p95_s",
+        "git_latency_max_s",
+        "git_bytes_read",
+        "tracemalloc_peak_bytes",
+    ),
+)
+
+
+class _Stage:
+    __slots__ = ("profiler", "name", "wall_t0", "cpu_t0", "child_wall", "child_cpu")
+
+    def __init__(self, profiler: "Profiler", name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler._get_stack().append(self)
+        self.child_wall = 0.0
+        self.child_cpu = 0.0
+        self.wall_t0 = time.perf_counter()
+        self.cpu_t0 = time.thread_time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        wall = time.perf_counter() - self.wall_t0
+        cpu = time.thread_time() - self.cpu_t0
+        stack = self.profiler._get_stack()
+        stack.pop()
+        if stack:
+            stack[-1].child_wall += wall
+            stack[-1].child_cpu += cpu
+        self.profiler._add_stage(
+            self.name, wall - self.child_wall, cpu - self.child_cpu
+        )
+
+
+# Notice that this is a context manager!
+class Profiler:
+    def __init__(self, do_trace_memory: bool = True):
+        """
+        Collect the timings of the stages of a count, and the git processes run.
+
+        Use it like:
+            with Profiler() as profiler:
+                LocCounter(root_dir).count(branch="master", profiler=profiler)
+            report = profiler.report()
+
+        The wall and CPU time of a stage exclude its nested stages, so (in a single
+         thread) they add up to the total. With `jobs` > 1, the diffs run in other
+         threads, so their time overlaps with the one of the main thread.
+        With `do_trace_memory`, the peak of the memory allocated by Python is traced
+         (with tracemalloc, which makes the count slower).
+        """
+        self.do_trace_memory = do_trace_memory
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # Name -> [n_calls, wall_s, cpu_s].
+        self._stages: dict[str, list] = dict()
+        self._git_latencies: list[float] = list()
+        self._git_bytes_read = 0
+        self._wall_t0 = None
+        self._cpu_t0 = None
+        self._wall_s = None
+        self._cpu_s = None
+        self._tracemalloc_peak_bytes = None
+        self._is_tracing = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.stop()
+
+    def start(self):
+        if self.do_trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._is_tracing = True
+        self._wall_t0 = time.perf_counter()
+        self._cpu_t0 = time.process_time()
+
+    def stop(self):
+        self._wall_s = time.perf_counter() - self._wall_t0
+        self._cpu_s = time.process_time() - self._cpu_t0
+        if self._is_tracing:
+            _, self._tracemalloc_peak_bytes = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self._is_tracing = False
+
+    def stage(self, name: str) -> _Stage:
+        """
+        Return a context manager that adds the time spent in it to the stage `name`.
+        """
+        return _Stage(self, name)
+
+    def iter_stage(self, name: str, iterable: Iterable) -> Iterator:
+        """
+        Yield the items of `iterable`, adding the time spent to get each item (but not
+         the time spent by the consumer) to the stage `name`.
+        """
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def add_git_process(self, latency_s: float, n_bytes_read: int):
+        with self._lock:
+            self._git_latencies.append(latency_s)
+            self._git_bytes_read += n_bytes_read
+
+    def add_git_bytes_read(self, n_bytes_read: int):
+        with self._lock:
+            self._git_bytes_read += n_bytes_read
+
+    def _get_stack(self) -> list[_Stage]:
+        try:
+            return self._local.stack
+        except AttributeError:
+            self._local.stack = list()
+            return self._local.stack
+
+    def _add_stage(self, name: str, wall_s: float, cpu_s: float):
+        with self._lock:
+            stage = self._stages.setdefault(name, [0, 0.0, 0.0])
+            stage[0] += 1
+            stage[1] += wall_s
+            stage[2] += cpu_s
+
+    def report(self) -> ProfileReport:
+        """
+        Return the metrics collected so far. The total wall and CPU time are None if
+         the profiler was not stopped.
+        """
+        with self._lock:
+            stages = [
+                ProfileStage(name, n_calls, wall_s, cpu_s)
+                for name, (n_calls, wall_s, cpu_s) in self._stages.items()
+            ]
+            latencies = sorted(self._git_latencies)
+            git_bytes_read = self._git_bytes_read
+        return ProfileReport(
+            wall_s=self._wall_s,
+            cpu_s=self._cpu_s,
+            stages=sorted(stages, key=lambda x: x.wall_s, reverse=True),
+            n_git_processes=len(latencies),
+            git_latency_total_s=sum(latencies),
+            git_latency_p50_s=_percentile(latencies, 50),
+            git_latency_p95_s=_percentile(latencies, 95),
+            git_latency_max_s=latencies[-1] if latencies else None,
+            git_bytes_read=git_bytes_read,
+            tracemalloc_peak_bytes=self._tracemalloc_peak_bytes,
+        )
+
+
+class NullProfiler(Profiler):
+    """
+    A profiler that collects nothing, used when profiling is off.
+    """
+
+    _null_stage = nullcontext()
+
+    def stage(self, name: str):
+        return self._null_stage
+
+    def iter_stage(self, name: str, iterable: Iterable) -> Iterable:
+        return iterable
+
+    def add_git_process(self, latency_s: float, n_bytes_read: int):
+        pass
+
+    def add_git_bytes_read(self, n_bytes_read: int):
+        pass
+
+
+NULL_PROFILER = NullProfiler(do_trace_memory=False)
+
+
+def dump_report(report: ProfileReport, stream: TextIO) -> None:
+    """
+    Write the report to `stream` as JSON.
+    """
+    data = report._asdict()
+    data["stages"] = [x._asdict() for x in report.stages]
+    stream.write(json.dumps(data, indent=2) + "\n")
+
+
+def _percentile(sorted_values: list[float], percent: int) -> Optional[float]:
+    # Nearest-rank percentile.
+    if not sorted_values:
+        return None
+    rank = -(-percent * len(sorted_values) // 100)
+    return sorted_values[max(rank, 1) - 1]
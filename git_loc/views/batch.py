@@ -0,0 +1,131 @@
+import sys
+from typing import Optional
+
+import click
+from rich.table import Table
+
+from ..domains.batch import BatchLocCounter, InvalidManifest, RepoResult
+from ..domains.writers import (
+    FORMAT_CSV,
+    FORMAT_JSONL,
+    FORMAT_TABLE,
+    FORMATS,
+    REPO_CSV_COLUMNS,
+    build_writer,
+)
+from ..utils import command, printer
+
+console = printer.ConsoleAdapter()
+err_console = printer.ConsoleAdapter(stderr=True)
+
+
+@click.command(cls=command.BaseCommand, name="count-many")
+@click.option(
+    "--manifest",
+    "manifest_path",
+    required=True,
+    type=click.Path(exists=True, dir_okay=False, file_okay=True),
+    help="TOML manifest with the repos and the shared options.",
+)
+@click.option(
+    "--processes",
+    required=False,
+    type=click.IntRange(min=1),
+    help="Number of repos to count in parallel [default: number of CPUs].",
+)
+@click.option(
+    "--format",
+    "output_format",
+    required=False,
+    type=click.Choice(FORMATS),
+    default=FORMAT_TABLE,
+    show_default=True,
+    help="How to write the repos: a table, or a record per repo.",
+)
+@click.option(
+    "--output",
+    "output_path",
+    required=False,
+    type=click.Path(dir_okay=False, file_okay=True, writable=True),
+    help="With --format jsonl or csv, write the records to this file (not stdout).",
+)
+def _count_many(
+    manifest_path: str,
+    processes: Optional[int] = None,
+    output_format: str = FORMAT_TABLE,
+    output_path: Optional[str] = None,
+) -> None:
+    """
+    Count LOC in many Git repos.
+    """
+    results = count_many(manifest_path, processes, output_format, output_path)
+    if any(result.error for result in results):
+        sys.exit(1)
+
+
+def count_many(
+    manifest_path: str,
+    processes: Optional[int] = None,
+    output_format: str = FORMAT_TABLE,
+    output_path: Optional[str] = None,
+) -> list[RepoResult]:
+    is_streaming = output_format in (FORMAT_JSONL, FORMAT_CSV)
+    if output_path and not is_streaming:
+        raise click.BadParameter(
+            "requires --format jsonl or csv", param_hint="--output"
+        )
+    # Do not mix the messages with the records streamed to stdout.
+    out_console = err_console if is_streaming and not output_path else console
+
+    try:
+        counter = BatchLocCounter.from_manifest(manifest_path)
+    except InvalidManifest as exc:
+        raise click.BadParameter(str(exc), param_hint="--manifest")
+
+    out_console.print("Computing...")
+    results = counter.count(processes=processes)
+    loc_tot = sum(result.loc_tot for result in results if not result.error)
+
+    if is_streaming:
+        _write_records(results, loc_tot, output_format, output_path)
+    elif output_format == FORMAT_TABLE:
+        _print_table(results, out_console)
+
+    n_errors = sum(1 for result in results if result.error)
+    if n_errors:
+        out_console.print(f"[red]Failed repos: {n_errors}")
+    out_console.print(f"[bold blue on yellow2]LOC: {loc_tot}\n")
+    return results
+
+
+def _write_records(
+    results: list[RepoResult],
+    loc_tot: int,
+    output_format: str,
+    output_path: Optional[str] = None,
+):
+    output = open(output_path, "w", newline="") if output_path else sys.stdout
+    try:
+        writer = build_writer(output_format, output, csv_columns=REPO_CSV_COLUMNS)
+        for result in results:
+            writer.add_repo(
+                result.root_dir, result.branch, result.loc_tot, result.error
+            )
+        writer.write_summary(loc_tot)
+    finally:
+        if output_path:
+            output.close()
+
+
+def _print_table(results: list[RepoResult], out_console: printer.ConsoleAdapter):
+    table = Table(title="[bold underline]Repos[/]")
+    table.add_column("repo root dir", overflow="fold")
+    table.add_column("branch")
+    table.add_column("LOC")
+    table.add_column("error", overflow="fold")
+    for result in results:
+        if result.error:
+            table.add_row(result.root_dir, result.branch, "-", f"[red]{result.error}")
+            continue
+        table.add_row(result.root_dir, result.branch, str(result.loc_tot), "")
+    out_console.print(table)
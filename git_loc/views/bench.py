@@ -0,0 +1,193 @@
+from typing import Collection, Optional
+
+import click
+from rich.table import Table
+
+from ..domains.bench import (
+    BENCH_CONFIG_NAMES,
+    Bench,
+    BenchResult,
+    InvalidBenchResults,
+    SyntheticRepoSpec,
+    load_results,
+    save_results,
+)
+from ..utils import command, printer
+
+console = printer.ConsoleAdapter()
+
+
+@click.command(cls=command.BaseCommand, name="bench")
+@click.option(
+    "--commits",
+    "n_commits",
+    default=SyntheticRepoSpec().n_commits,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of commits in the synthetic repo.",
+)
+@click.option(
+    "--files-per-commit",
+    "n_files_per_commit",
+    default=SyntheticRepoSpec().n_files_per_commit,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of files added, edited or deleted by each commit.",
+)
+@click.option(
+    "--lines-per-file",
+    "n_lines_per_file",
+    default=SyntheticRepoSpec().n_lines_per_file,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Average number of lines in a new file.",
+)
+@click.option(
+    "--authors",
+    "n_authors",
+    default=SyntheticRepoSpec().n_authors,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of authors.",
+)
+@click.option(
+    "--binary-ratio",
+    default=SyntheticRepoSpec().binary_ratio,
+    show_default=True,
+    type=click.FloatRange(min=0, max=1),
+    help="Share of binary files.",
+)
+@click.option(
+    "--seed",
+    default=SyntheticRepoSpec().seed,
+    show_default=True,
+    type=int,
+    help="Seed of the synthetic repo: the same seed generates the same repo.",
+)
+@click.option(
+    "--config",
+    "config_names",
+    required=False,
+    multiple=True,
+    type=click.Choice(BENCH_CONFIG_NAMES),
+    help="Config (strategy and backend) to run (repeatable) [default: all].",
+)
+@click.option(
+    "--jobs",
+    default=1,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help='Number of parallel `git diff` processes, with the "diff" strategy.',
+)
+@click.option(
+    "--repeat",
+    default=3,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of runs of each config: the fastest one is reported.",
+)
+@click.option(
+    "--output",
+    "output_path",
+    required=False,
+    type=click.Path(dir_okay=False, file_okay=True, writable=True),
+    help="JSON file to save the results to.",
+)
+@click.option(
+    "--compare",
+    "baseline_path",
+    required=False,
+    type=click.Path(exists=True, dir_okay=False, file_okay=True),
+    help="JSON file with the results (of a previous version) to compare with.",
+)
+def _bench(
+    n_commits: int,
+    n_files_per_commit: int,
+    n_lines_per_file: int,
+    n_authors: int,
+    binary_ratio: float,
+    seed: int,
+    config_names: Collection[str] = (),
+    jobs: int = 1,
+    repeat: int = 3,
+    output_path: Optional[str] = None,
+    baseline_path: Optional[str] = None,
+) -> None:
+    """
+    Measure the performance of the count on a synthetic repo.
+    """
+    spec = SyntheticRepoSpec(
+        n_commits=n_commits,
+        n_files_per_commit=n_files_per_commit,
+        n_lines_per_file=n_lines_per_file,
+        n_authors=n_authors,
+        binary_ratio=binary_ratio,
+        seed=seed,
+    )
+    return bench(spec, config_names, jobs, repeat, output_path, baseline_path)
+
+
+def bench(
+    spec: SyntheticRepoSpec,
+    config_names: Collection[str] = (),
+    jobs: int = 1,
+    repeat: int = 3,
+    output_path: Optional[str] = None,
+    baseline_path: Optional[str] = None,
+) -> list[BenchResult]:
+    baseline = dict()
+    if baseline_path:
+        try:
+            baseline = load_results(baseline_path)
+        except InvalidBenchResults as exc:
+            raise click.BadParameter(str(exc), param_hint="--compare")
+
+    console.print(
+        f"Synthetic repo: {spec.n_commits} commits, {spec.n_files_per_commit}"
+        f" files per commit, seed {spec.seed}"
+    )
+    console.print("Computing...")
+    results = Bench(spec).run(
+        config_names=config_names or BENCH_CONFIG_NAMES, jobs=jobs, repeat=repeat
+    )
+
+    table = Table(title="[bold underline]Bench[/]")
+    table.add_column("config")
+    table.add_column("LOC")
+    table.add_column("time (s)")
+    table.add_column("commits/s")
+    table.add_column("git processes")
+    table.add_column("peak RSS (MB)")
+    table.add_column("git peak RSS (MB)")
+    if baseline:
+        table.add_column("vs baseline")
+    for result in results:
+        row = [
+            result.name,
+            str(result.loc_tot),
+            f"{result.wall_time_s:.3f}",
+            f"{result.commits_per_s:.1f}",
+            str(result.n_git_processes),
+            f"{result.peak_rss_kb / 1024:.1f}",
+            f"{result.git_peak_rss_kb / 1024:.1f}",
+        ]
+        if baseline:
+            row.append(_format_speedup(result, baseline.get(result.name)))
+        table.add_row(*row)
+    console.print(table)
+
+    if output_path:
+        save_results(output_path, spec, results)
+        console.print(f"Results saved to: {output_path}")
+    return results
+
+
+def _format_speedup(result: BenchResult, baseline: Optional[BenchResult]) -> str:
+    if baseline is None:
+        return "-"
+    speedup = baseline.wall_time_s / result.wall_time_s
+    color = "green" if speedup >= 1 else "red"
+    text = f"[{color}]x{speedup:.2f}"
+    if baseline.loc_tot != result.loc_tot:
+        text += f" [red](LOC was {baseline.loc_tot})"
+    return text
@@ -0,0 +1,64 @@
+from typing import Optional
+
+import click
+from rich.table import Table
+
+from ..clients import diff_cache
+from ..utils import command, printer
+
+console = printer.ConsoleAdapter()
+
+
+@click.group(name="cache")
+def _cache() -> None:
+    """
+    Manage the on-disk cache of the numstat of commits.
+    """
+    pass
+
+
+@_cache.command(cls=command.BaseCommand, name="stats")
+def _stats() -> None:
+    """
+    Print the stats of the cache of each repo.
+    """
+    return stats()
+
+
+def stats() -> list[diff_cache.DiffCacheStats]:
+    all_stats = list(diff_cache.iter_stats())
+    table = Table(title="[bold underline]Cache[/]")
+    table.add_column("repo root dir", overflow="fold")
+    table.add_column("commits")
+    table.add_column("size (MB)")
+    table.add_column("cache file", overflow="fold")
+    for repo_stats in all_stats:
+        table.add_row(
+            repo_stats.root_dir,
+            str(repo_stats.n_commits),
+            f"{repo_stats.size_bytes / 1024 / 1024:.2f}",
+            str(repo_stats.path),
+        )
+    console.print(table)
+    return all_stats
+
+
+@_cache.command(cls=command.BaseCommand, name="clear")
+@click.option(
+    "--dir",
+    "root_dir",
+    required=False,
+    type=click.Path(exists=True, dir_okay=True, file_okay=False),
+    help="Git root dir (default: all repos).",
+)
+def _clear(root_dir: Optional[str] = None) -> None:
+    """
+    Delete the cache of a repo, or of all repos.
+    """
+    return clear(root_dir)
+
+
+def clear(root_dir: Optional[str] = None) -> int:
+    n_deleted = diff_cache.clear(root_dir)
+    console.print(f"Deleted caches: {n_deleted}")
+    return n_deleted
@@ -0,0 +1,65 @@
+from typing import Collection
+
+import click
+from rich.table import Table
+
+from ..domains.history_index import HistoryIndex, IndexedBranch
+from ..utils import command, printer
+
+console = printer.ConsoleAdapter()
+
+
+@click.command(cls=command.BaseCommand, name="index")
+@click.option(
+    "--dir",
+    "root_dir",
+    required=True,
+    type=click.Path(exists=True, dir_okay=True, file_okay=False),
+    help="Git root dir.",
+)
+@click.option(
+    "--branch",
+    "branches",
+    required=True,
+    multiple=True,
+    type=str,
+    help="Git branch to index (repeatable).",
+)
+@click.option(
+    "--jobs",
+    default=1,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of git log processes to run in parallel.",
+)
+def _index(root_dir: str, branches: Collection[str], jobs: int = 1) -> None:
+    """
+    Build (or update) the SQLite index of the history, for count --from-index.
+    """
+    return index(root_dir, branches, jobs)
+
+
+def index(root_dir: str, branches: Collection[str], jobs: int = 1) -> list:
+    console.print("Indexing...")
+    indexed_branches: list[IndexedBranch] = list()
+    with HistoryIndex(root_dir) as history_index:
+        table = Table(title="[bold underline]Index[/]")
+        table.add_column("branch")
+        table.add_column("tip")
+        table.add_column("new commits")
+        table.add_column("commits")
+        table.add_column("file changes")
+        for branch in branches:
+            update = history_index.update(branch, jobs=jobs)
+            indexed_branch = history_index.get_branch(branch)
+            indexed_branches.append(indexed_branch)
+            table.add_row(
+                branch,
+                update.tip[:12],
+                str(update.n_new_commits),
+                str(indexed_branch.n_commits),
+                str(indexed_branch.n_file_changes),
+            )
+        console.print(table)
+        console.print(f"Index file: {history_index.path}")
+    return indexed_branches
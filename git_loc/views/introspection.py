@@ -2,7 +2,7 @@ from datetime import datetime
 
 import click
 
-from ..conf import settings as conf_settings
+from ..conf import get_settings
 from ..utils import command, printer
 
 
@@ -48,7 +48,7 @@ def _settings() -> None:
 
 def settings() -> None:
     console = printer.ConsoleAdapter()
-    for key, value in conf_settings.as_dict().items():
+    for key, value in get_settings().as_dict().items():
         if isinstance(value, str) and (
             "SECRET" in key.upper() or "PASS" in key.upper() or "TOKEN" in key.upper()
         ):
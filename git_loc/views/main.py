@@ -1,14 +1,41 @@
+import json
 from datetime import datetime
 from pathlib import Path
-from typing import Collection, Optional
+from typing import Collection, Optional, TextIO
 
 import click
 from rich.prompt import Prompt
+from rich.table import Table
 
-from ..domains.main import LocCounter
+from ..clients.git_client import GitProcessError
+from ..domains.aggregators import (
+    BUCKETS,
+    AuthorAggregator,
+    BaseAggregator,
+    BucketAggregator,
+    PathAggregator,
+)
+from ..domains.history_index import BranchNotIndexed, HistoryIndex
+from ..domains.main import ENGINE_PYTHON, ENGINES, STRATEGIES, STRATEGY_DIFF, LocCounter
+from ..domains.numpy_engine import NumpyNotInstalled
+from ..domains.progress import Progress
+from ..domains.writers import (
+    FORMAT_CSV,
+    FORMAT_JSONL,
+    FORMAT_NONE,
+    FORMAT_TABLE,
+    FORMATS,
+)
 from ..utils import command, printer
+from ..utils.profiler import Profiler, ProfileReport, dump_report
 
 console = printer.ConsoleAdapter()
+# For the messages, when the records are streamed to stdout.
+err_console = printer.ConsoleAdapter(stderr=True)
+
+GROUP_BY_AUTHOR = "author"
+GROUP_BY_PATH = "path"
+GROUP_BYS = (GROUP_BY_AUTHOR, GROUP_BY_PATH)
 
 
 @click.command(cls=command.BaseCommand, name="count")
@@ -49,7 +76,156 @@ console = printer.ConsoleAdapter()
     required=False,
     type=str,
     multiple=True,
-    help="Ignore file.",
+    help="Ignore file (a file is ignored if its path includes this string).",
+)
+@click.option(
+    "--ignore-glob",
+    "globs_to_ignore",
+    required=False,
+    type=str,
+    multiple=True,
+    help="Ignore files matching this .gitignore-style pattern (eg. '*.lock').",
+)
+@click.option(
+    "--ignore-from",
+    "ignore_file_path",
+    required=False,
+    type=click.Path(exists=True, dir_okay=False, file_okay=True),
+    help="Ignore files matching the patterns in this .gitignore-style file.",
+)
+@click.option(
+    "--path",
+    "paths",
+    required=False,
+    type=str,
+    multiple=True,
+    help="Only count the files in this dir, or matching this pattern (eg. 'src/*.py').",
+)
+@click.option(
+    "--exclude-path",
+    "paths_to_exclude",
+    required=False,
+    type=str,
+    multiple=True,
+    help="Do not count the files in this dir, or matching this pattern (eg. '*.lock').",
+)
+@click.option(
+    "--strategy",
+    required=False,
+    type=click.Choice(STRATEGIES),
+    default=STRATEGY_DIFF,
+    show_default=True,
+    help="How to get the numstat: one git diff per commit or a single git log.",
+)
+@click.option(
+    "--jobs",
+    required=False,
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="Number of git log and git diff processes to run in parallel.",
+)
+@click.option(
+    "--engine",
+    required=False,
+    type=click.Choice(ENGINES),
+    default=ENGINE_PYTHON,
+    show_default=True,
+    help="How to count the numstat: a Python loop or vectorized with NumPy.",
+)
+@click.option(
+    "--no-cache",
+    "do_use_cache",
+    is_flag=True,
+    default=True,
+    flag_value=False,
+    help="Do not use the on-disk cache of the numstat of commits.",
+)
+@click.option(
+    "--incremental",
+    "do_use_checkpoint",
+    is_flag=True,
+    default=False,
+    help="Only process the commits added since the last incremental count.",
+)
+@click.option(
+    "--from-index",
+    "do_use_index",
+    is_flag=True,
+    default=False,
+    help="Count from the SQLite index of the history (see the index command).",
+)
+@click.option(
+    "--group-by",
+    required=False,
+    type=click.Choice(GROUP_BYS),
+    help="Also print the LOC by author or by file path (in the same traversal).",
+)
+@click.option(
+    "--author-alias",
+    "author_aliases",
+    required=False,
+    type=str,
+    multiple=True,
+    help="With --group-by author, count an email as another: alias@x.com=email@x.com.",
+)
+@click.option(
+    "--top-files",
+    required=False,
+    type=click.IntRange(min=1),
+    default=50,
+    show_default=True,
+    help="With --group-by path, only print the most churned files.",
+)
+@click.option(
+    "--bucket",
+    required=False,
+    type=click.Choice(BUCKETS),
+    help="Also compute the LOC per day, week or month (in the same traversal).",
+)
+@click.option(
+    "--bucket-output",
+    "bucket_output_path",
+    required=False,
+    type=click.Path(dir_okay=False, file_okay=True, writable=True),
+    help="With --bucket, write the buckets to this file as JSON lines.",
+)
+@click.option(
+    "--format",
+    "output_format",
+    required=False,
+    type=click.Choice(FORMATS),
+    default=FORMAT_TABLE,
+    show_default=True,
+    help="How to write the files: a table at the end, or a record per file streamed.",
+)
+@click.option(
+    "--output",
+    "output_path",
+    required=False,
+    type=click.Path(dir_okay=False, file_okay=True, writable=True),
+    help="With --format jsonl or csv, write the records to this file (not stdout).",
+)
+@click.option(
+    "--progress",
+    "do_show_progress",
+    is_flag=True,
+    default=False,
+    help="Show the commits processed, commits/s and ETA (JSON lines if not a TTY).",
+)
+@click.option(
+    "--profile",
+    "do_profile",
+    is_flag=True,
+    default=False,
+    help="Print the time spent in each stage and the git processes run (slower).",
+)
+@click.option(
+    "--profile-output",
+    "profile_output_path",
+    required=False,
+    type=click.Path(dir_okay=False, file_okay=True, writable=True),
+    help="With --profile, write the profile to this file as JSON.",
 )
 def _count(
     root_dir: str,
@@ -58,11 +234,58 @@ def _count(
     end_date: Optional[datetime] = None,
     author: Optional[str] = None,
     files_to_ignore: Optional[list[str]] = None,
+    globs_to_ignore: Optional[list[str]] = None,
+    ignore_file_path: Optional[str] = None,
+    paths: Optional[list[str]] = None,
+    paths_to_exclude: Optional[list[str]] = None,
+    strategy: str = STRATEGY_DIFF,
+    jobs: int = 1,
+    engine: str = ENGINE_PYTHON,
+    do_use_cache: bool = True,
+    do_use_checkpoint: bool = False,
+    do_use_index: bool = False,
+    group_by: Optional[str] = None,
+    author_aliases: Optional[list[str]] = None,
+    top_files: int = 50,
+    bucket: Optional[str] = None,
+    bucket_output_path: Optional[str] = None,
+    output_format: str = FORMAT_TABLE,
+    output_path: Optional[str] = None,
+    do_show_progress: bool = False,
+    do_profile: bool = False,
+    profile_output_path: Optional[str] = None,
 ) -> None:
     """
     Count LOC in a Git repo branch.
     """
-    count(root_dir, branch, start_date, end_date, author, files_to_ignore)
+    count(
+        root_dir=root_dir,
+        branch=branch,
+        start_date=start_date,
+        end_date=end_date,
+        author=author,
+        files_to_ignore=files_to_ignore,
+        globs_to_ignore=globs_to_ignore,
+        ignore_file_path=ignore_file_path,
+        paths=paths,
+        paths_to_exclude=paths_to_exclude,
+        strategy=strategy,
+        jobs=jobs,
+        engine=engine,
+        do_use_cache=do_use_cache,
+        do_use_checkpoint=do_use_checkpoint,
+        do_use_index=do_use_index,
+        group_by=group_by,
+        author_aliases=author_aliases,
+        top_files=top_files,
+        bucket=bucket,
+        bucket_output_path=bucket_output_path,
+        output_format=output_format,
+        output_path=output_path,
+        do_show_progress=do_show_progress,
+        do_profile=do_profile,
+        profile_output_path=profile_output_path,
+    )
 
 
 def count(
@@ -72,6 +295,26 @@ def count(
     end_date: Optional[datetime] = None,
     author: Optional[str] = None,
     files_to_ignore: Optional[list[str]] = None,
+    globs_to_ignore: Optional[list[str]] = None,
+    ignore_file_path: Optional[str] = None,
+    paths: Optional[list[str]] = None,
+    paths_to_exclude: Optional[list[str]] = None,
+    strategy: str = STRATEGY_DIFF,
+    jobs: int = 1,
+    engine: str = ENGINE_PYTHON,
+    do_use_cache: bool = True,
+    do_use_checkpoint: bool = False,
+    do_use_index: bool = False,
+    group_by: Optional[str] = None,
+    author_aliases: Optional[list[str]] = None,
+    top_files: int = 50,
+    bucket: Optional[str] = None,
+    bucket_output_path: Optional[str] = None,
+    output_format: str = FORMAT_TABLE,
+    output_path: Optional[str] = None,
+    do_show_progress: bool = False,
+    do_profile: bool = False,
+    profile_output_path: Optional[str] = None,
 ) -> int:
     all_options = dict(
         root_dir=root_dir,
@@ -82,31 +325,301 @@ def count(
         files_to_ignore=files_to_ignore,
     )
 
+    is_streaming = output_format in (FORMAT_JSONL, FORMAT_CSV)
+    if output_path and not is_streaming:
+        raise click.BadParameter(
+            "requires --format jsonl or csv", param_hint="--output"
+        )
+    if profile_output_path and not do_profile:
+        raise click.BadParameter("requires --profile", param_hint="--profile-output")
+    if do_use_index:
+        # The options of the git traversal, that the index does not run.
+        unsupported_options = [
+            name
+            for name, is_set in (
+                ("--path", paths),
+                ("--exclude-path", paths_to_exclude),
+                ("--strategy", strategy != STRATEGY_DIFF),
+                ("--jobs", jobs != 1),
+                ("--no-cache", not do_use_cache),
+                ("--incremental", do_use_checkpoint),
+                ("--progress", do_show_progress),
+                ("--profile", do_profile),
+            )
+            if is_set
+        ]
+        if unsupported_options:
+            raise click.BadParameter(
+                f"not supported with {', '.join(unsupported_options)}",
+                param_hint="--from-index",
+            )
+    if do_use_checkpoint:
+        # The checkpoint only stores the LOC count, not the aggregated stats.
+        unsupported_options = [
+            name
+            for name, is_set in (("--group-by", group_by), ("--bucket", bucket))
+            if is_set
+        ]
+        if unsupported_options:
+            raise click.BadParameter(
+                f"not supported with {', '.join(unsupported_options)}",
+                param_hint="--incremental",
+            )
+    # Do not mix the messages with the records streamed to stdout.
+    out_console = err_console if is_streaming and not output_path else console
+
     prompted_options = dict()
     if not root_dir or not branch:
         prompted_options = _prompt_for_all_options(all_options)
 
     all_options.update(**prompted_options)
 
+    aggregators = list()
+    author_aggregator = None
+    if group_by == GROUP_BY_AUTHOR:
+        author_aggregator = AuthorAggregator(
+            aliases=_parse_author_aliases(author_aliases)
+        )
+        aggregators.append(author_aggregator)
+    path_aggregator = None
+    if group_by == GROUP_BY_PATH:
+        path_aggregator = PathAggregator()
+        aggregators.append(path_aggregator)
+        # The paths table replaces the table with a row per file in each commit.
+        if output_format == FORMAT_TABLE:
+            output_format = FORMAT_NONE
+    bucket_aggregator = None
+    if bucket:
+        bucket_aggregator = BucketAggregator(bucket)
+        aggregators.append(bucket_aggregator)
+
+    profiler = Profiler() if do_profile else None
+    if profiler is not None:
+        profiler.start()
     counter = LocCounter(all_options["root_dir"])
-    tot = counter.count(
-        branch=all_options["branch"],
-        start_date=all_options["start_date"],
-        end_date=all_options["end_date"],
-        author=all_options["author"],
-        files_to_ignore=all_options["files_to_ignore"],
-    )
+    output = open(output_path, "w", newline="") if output_path else None
+    try:
+        if do_use_index:
+            tot = _count_index(
+                counter,
+                all_options,
+                globs_to_ignore=globs_to_ignore,
+                ignore_file_path=ignore_file_path,
+                aggregators=aggregators,
+                output_format=output_format,
+                output=output,
+                engine=engine,
+            )
+        else:
+            tot = counter.count(
+                branch=all_options["branch"],
+                start_date=all_options["start_date"],
+                end_date=all_options["end_date"],
+                author=all_options["author"],
+                files_to_ignore=all_options["files_to_ignore"],
+                globs_to_ignore=globs_to_ignore,
+                ignore_file_path=ignore_file_path,
+                paths=paths,
+                paths_to_exclude=paths_to_exclude,
+                strategy=strategy,
+                jobs=jobs,
+                do_use_cache=do_use_cache,
+                do_use_checkpoint=do_use_checkpoint,
+                aggregators=aggregators,
+                output_format=output_format,
+                output=output,
+                profiler=profiler,
+                engine=engine,
+                progress=Progress(err_console) if do_show_progress else None,
+            )
+    except NumpyNotInstalled as exc:
+        raise click.BadParameter(str(exc), param_hint="--engine")
+    except GitProcessError as exc:
+        # Eg. an unknown branch: the error of git, with no traceback.
+        raise click.ClickException(str(exc))
+    finally:
+        if output is not None:
+            output.close()
+        if profiler is not None:
+            profiler.stop()
 
-    console.print(f"\nRepo root dir: {all_options['root_dir']}")
-    console.print(f"Branch: {all_options['branch']}")
-    console.print(f"Author: {all_options['author']}")
-    console.print(f"Start date: {all_options['start_date'].date()}")
-    console.print(f"End date: {all_options['end_date'].date()}")
-    console.print(f"Ignored files: {all_options['files_to_ignore']}")
-    console.print(f"[bold blue on yellow2]LOC: {tot}\n")
+    if author_aggregator is not None:
+        _print_author_stats(author_aggregator, out_console)
+    if path_aggregator is not None:
+        _print_path_stats(path_aggregator, top_files, out_console)
+    if bucket_aggregator is not None:
+        if bucket_output_path:
+            _write_bucket_records(bucket_aggregator, bucket_output_path)
+        else:
+            _print_bucket_stats(bucket_aggregator, out_console)
+
+    out_console.print(f"\nRepo root dir: {all_options['root_dir']}")
+    out_console.print(f"Branch: {all_options['branch']}")
+    out_console.print(f"Author: {all_options['author']}")
+    out_console.print(f"Start date: {_format_date(all_options['start_date'])}")
+    out_console.print(f"End date: {_format_date(all_options['end_date'])}")
+    out_console.print(f"Ignored files: {all_options['files_to_ignore']}")
+    if globs_to_ignore:
+        out_console.print(f"Ignored globs: {globs_to_ignore}")
+    if ignore_file_path:
+        out_console.print(f"Ignored patterns from: {ignore_file_path}")
+    if paths:
+        out_console.print(f"Paths: {paths}")
+    if paths_to_exclude:
+        out_console.print(f"Excluded paths: {paths_to_exclude}")
+    out_console.print(f"[bold blue on yellow2]LOC: {tot}\n")
+
+    if profiler is not None:
+        report = profiler.report()
+        if profile_output_path:
+            with open(profile_output_path, "w") as fp:
+                dump_report(report, fp)
+            out_console.print(f"Profile written to: {profile_output_path}\n")
+        else:
+            _print_profile(report, out_console)
     return tot
 
 
+def _count_index(
+    counter: LocCounter,
+    all_options: dict,
+    globs_to_ignore: Optional[list[str]] = None,
+    ignore_file_path: Optional[str] = None,
+    aggregators: Collection[BaseAggregator] = (),
+    output_format: str = FORMAT_TABLE,
+    output: Optional[TextIO] = None,
+    engine: str = ENGINE_PYTHON,
+) -> int:
+    with HistoryIndex(counter.root_dir) as history_index:
+        try:
+            return counter.count_index(
+                history_index,
+                branch=all_options["branch"],
+                start_date=all_options["start_date"],
+                end_date=all_options["end_date"],
+                author=all_options["author"],
+                files_to_ignore=all_options["files_to_ignore"],
+                globs_to_ignore=globs_to_ignore,
+                ignore_file_path=ignore_file_path,
+                aggregators=aggregators,
+                output_format=output_format,
+                output=output,
+                engine=engine,
+            )
+        except BranchNotIndexed as exc:
+            raise click.BadParameter(str(exc), param_hint="--from-index")
+
+
+def _print_profile(report: ProfileReport, out_console: printer.ConsoleAdapter):
+    table = Table(title="[bold underline]Profile[/]")
+    table.add_column("stage")
+    table.add_column("calls")
+    table.add_column("wall (s)")
+    table.add_column("CPU (s)")
+    for stage in report.stages:
+        table.add_row(
+            stage.name,
+            str(stage.n_calls),
+            f"{stage.wall_s:.3f}",
+            f"{stage.cpu_s:.3f}",
+        )
+    table.add_row("[bold]total", "", f"{report.wall_s:.3f}", f"{report.cpu_s:.3f}")
+    out_console.print(table)
+
+    out_console.print(f"Git processes: {report.n_git_processes}")
+    if report.n_git_processes:
+        out_console.print(
+            f"Git processes latency (s): total {report.git_latency_total_s:.3f}"
+            f" p50 {report.git_latency_p50_s:.4f}"
+            f" p95 {report.git_latency_p95_s:.4f}"
+            f" max {report.git_latency_max_s:.4f}"
+        )
+    out_console.print(f"Bytes read from git: {report.git_bytes_read}")
+    if report.tracemalloc_peak_bytes is not None:
+        peak_mb = report.tracemalloc_peak_bytes / 1024 / 1024
+        out_console.print(f"Python memory peak (tracemalloc): {peak_mb:.1f} MB\n")
+
+
+def _format_date(date: Optional[datetime]) -> Optional[str]:
+    return str(date.date()) if date else None
+
+
+def _parse_author_aliases(author_aliases: Optional[list[str]]) -> dict[str, str]:
+    aliases = dict()
+    for author_alias in author_aliases or ():
+        alias, sep, email = author_alias.partition("=")
+        if not sep or not alias or not email:
+            raise click.BadParameter(
+                f"'{author_alias}' is not like: alias@x.com=email@x.com",
+                param_hint="--author-alias",
+            )
+        aliases[alias] = email
+    return aliases
+
+
+def _print_author_stats(
+    author_aggregator: AuthorAggregator, out_console: printer.ConsoleAdapter
+):
+    table = Table(title="[bold underline]Authors[/]")
+    table.add_column("author", overflow="fold")
+    table.add_column("commits")
+    table.add_column("insertions")
+    table.add_column("deletions")
+    table.add_column("LOC")
+    for email, stats in author_aggregator.get_sorted_stats():
+        table.add_row(
+            email,
+            str(stats.commits),
+            str(stats.insertions),
+            str(stats.deletions),
+            str(stats.loc),
+        )
+    out_console.print(table)
+
+
+def _print_path_stats(
+    path_aggregator: PathAggregator, top_files: int, out_console: printer.ConsoleAdapter
+):
+    table = Table(title=f"[bold underline]Top {top_files} files[/]")
+    table.add_column("file path", overflow="fold")
+    table.add_column("commits")
+    table.add_column("insertions")
+    table.add_column("deletions")
+    table.add_column("LOC")
+    for path, stats in path_aggregator.get_top_stats(top_files):
+        table.add_row(
+            path,
+            str(stats.commits),
+            str(stats.insertions),
+            str(stats.deletions),
+            str(stats.loc),
+        )
+    out_console.print(table)
+
+
+def _print_bucket_stats(
+    bucket_aggregator: BucketAggregator, out_console: printer.ConsoleAdapter
+):
+    table = Table(title=f"[bold underline]LOC per {bucket_aggregator.bucket}[/]")
+    for column in ("bucket", "commits", "insertions", "deletions", "LOC"):
+        table.add_column(column)
+    for record in bucket_aggregator.get_records():
+        table.add_row(
+            record["bucket"],
+            str(record["commits"]),
+            str(record["insertions"]),
+            str(record["deletions"]),
+            str(record["loc"]),
+        )
+    out_console.print(table)
+
+
+def _write_bucket_records(bucket_aggregator: BucketAggregator, path: str):
+    with open(path, "w") as fout:
+        for record in bucket_aggregator.get_records():
+            fout.write(json.dumps(record) + "\n")
+
+
 def _prompt_for_all_options(cli_options) -> dict:
     options = dict()
 
@@ -0,0 +1,75 @@
+from typing import Collection, Optional
+
+import click
+
+from ..domains.server import LocServer, build_http_server
+from ..utils import command, printer
+
+console = printer.ConsoleAdapter()
+
+
+@click.command(cls=command.BaseCommand, name="serve")
+@click.option(
+    "--dir",
+    "root_dirs",
+    required=True,
+    multiple=True,
+    type=click.Path(exists=True, dir_okay=True, file_okay=False),
+    help="Git root dir of a repo to serve (repeatable).",
+)
+@click.option(
+    "--host",
+    default="127.0.0.1",
+    show_default=True,
+    type=str,
+    help="Host to listen on.",
+)
+@click.option(
+    "--port",
+    default=8765,
+    show_default=True,
+    type=click.IntRange(min=0, max=65535),
+    help="Port to listen on.",
+)
+@click.option(
+    "--socket",
+    "socket_path",
+    required=False,
+    type=click.Path(dir_okay=False, file_okay=True, writable=True),
+    help="Listen on this Unix socket instead of --host and --port.",
+)
+def _serve(
+    root_dirs: Collection[str],
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    socket_path: Optional[str] = None,
+) -> None:
+    """
+    Serve LOC counts as JSON, keeping the history of the repos in memory.
+
+    The counts can differ from `count`: root commits are counted (as a diff with the
+     empty tree, like with --strategy log-numstat) and the start and end dates
+     include whole days in the local timezone (while `git log --since/--until`
+     compare the commit times with the current time of day).
+    """
+    serve(root_dirs, host, port, socket_path)
+
+
+def serve(
+    root_dirs: Collection[str],
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    socket_path: Optional[str] = None,
+) -> None:
+    server = build_http_server(
+        LocServer(root_dirs), host=host, port=port, socket_path=socket_path
+    )
+    address = socket_path or f"http://{host}:{server.server_address[1]}"
+    console.print(f"Serving {len(set(root_dirs))} repo(s) on: {address}")
+    console.print("Eg.: GET /count?branch=master (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,212 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from git_loc.clients.async_git_client import AsyncGitClient
+from git_loc.clients.diff_cache import DiffCache
+from git_loc.clients.git_client import (
+    DIFF_BACKEND_DIFF,
+    DIFF_BACKEND_DIFF_TREE,
+    GIT_BACKEND_OBJECTS,
+    GIT_BACKEND_SUBPROCESS,
+    GitClient,
+    GitLogEntry,
+    GitProcessError,
+)
+
+from ..testfactories.git_log_factory import build_printf_command, format_git_log_entry
+from ..testfactories.git_repo_factory import GitRepoCommit, GitRepoFactory
+from ..testutils.settings_testutils import override_settings
+
+COMMITS = (
+    GitRepoCommit("john@gmail.com", "2020-02-10", {"a.txt": "a\nb\n"}),
+    GitRepoCommit(
+        "mary@gmail.com", "2020-02-11", {"a.txt": "a\nc\n", "b.bin": b"\0\1"}
+    ),
+    GitRepoCommit("john@gmail.com", "2020-02-12", {"dir/c.txt": "c\n"}),
+    GitRepoCommit("john@gmail.com", "2020-02-13", {}),
+)
+
+
+class TrackingDiffCache(DiffCache):
+    """
+    A diff cache that tracks the threads running its queries.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.thread_ids = set()
+
+    def get(self, *args, **kwargs):
+        self.thread_ids.add(threading.get_ident())
+        return super().get(*args, **kwargs)
+
+    def set(self, *args, **kwargs):
+        self.thread_ids.add(threading.get_ident())
+        return super().set(*args, **kwargs)
+
+
+class TrackingSemaphore(asyncio.Semaphore):
+    """
+    A semaphore that tracks the max number of holders at the same time.
+    """
+
+    def __init__(self, value: int):
+        super().__init__(value)
+        self.n_holders = 0
+        self.max_n_holders = 0
+
+    async def acquire(self):
+        await super().acquire()
+        self.n_holders += 1
+        self.max_n_holders = max(self.max_n_holders, self.n_holders)
+        return True
+
+    def release(self):
+        self.n_holders -= 1
+        super().release()
+
+
+async def list_all(git: GitClient | AsyncGitClient) -> dict:
+    if isinstance(git, AsyncGitClient):
+        log = [x async for x in git.alog(branch="master")]
+        log_numstat = [x async for x in git.alog_numstat(branch="master")]
+        diffs = [[x async for x in git.adiff(commit.hash)] for commit in log]
+    else:
+        log = list(git.log(branch="master"))
+        log_numstat = list(git.log_numstat(branch="master"))
+        diffs = [list(git.diff(commit.hash)) for commit in log]
+    return dict(log=log, log_numstat=log_numstat, diffs=diffs)
+
+
+class TestAsyncGitClient:
+    @pytest.mark.parametrize(
+        "git_backend, diff_backend",
+        (
+            (GIT_BACKEND_SUBPROCESS, DIFF_BACKEND_DIFF),
+            (GIT_BACKEND_SUBPROCESS, DIFF_BACKEND_DIFF_TREE),
+            (GIT_BACKEND_OBJECTS, DIFF_BACKEND_DIFF),
+        ),
+    )
+    def test_same_as_git_client(self, tmp_path, git_backend, diff_backend):
+        with GitRepoFactory(tmp_path, COMMITS) as root_dir, override_settings(
+            GIT_BACKEND=git_backend, GIT_DIFF_BACKEND=diff_backend
+        ):
+            with GitClient(root_dir) as git:
+                expected = asyncio.run(list_all(git))
+            with AsyncGitClient(root_dir) as git:
+                actual = asyncio.run(list_all(git))
+        assert actual == expected
+        assert len(actual["log"]) == 4
+        assert actual["diffs"][2][1].path == "b.bin"
+
+    @pytest.mark.parametrize(
+        "git_backend", (GIT_BACKEND_SUBPROCESS, GIT_BACKEND_OBJECTS)
+    )
+    def test_sync_methods(self, tmp_path, git_backend):
+        # The blocking methods of `GitClient`, and the ones that call them, work.
+        def list_sync(git: GitClient) -> dict:
+            return dict(
+                log=list(git.log(branch="master")),
+                log_numstat=list(git.log_numstat(branch="master")),
+                log_sharded=list(git.log_sharded(branch="master", jobs=2)),
+                diffs=[list(git.diff(x.hash)) for x in git.log(branch="master")],
+            )
+
+        with GitRepoFactory(tmp_path, COMMITS) as root_dir, override_settings(
+            GIT_BACKEND=git_backend, LOG_SHARD_SIZE=2
+        ):
+            with GitClient(root_dir) as git:
+                expected = list_sync(git)
+            with AsyncGitClient(root_dir) as git:
+                actual = list_sync(git)
+        assert actual == expected
+        assert len(actual["log_sharded"]) == 4
+
+    def test_semaphore(self, tmp_path):
+        async def diff_all(git: AsyncGitClient) -> list:
+            hashes = [x.hash async for x in git.alog(branch="master")]
+
+            async def diff(hash):
+                return [x async for x in git.adiff(hash)]
+
+            return await asyncio.gather(*[diff(hash) for hash in hashes * 5])
+
+        async def run(root_dir):
+            semaphore = TrackingSemaphore(2)
+            git = AsyncGitClient(root_dir, semaphore=semaphore)
+            diffs = await diff_all(git)
+            return diffs, semaphore.max_n_holders
+
+        with GitRepoFactory(tmp_path, COMMITS) as root_dir:
+            diffs, max_n_holders = asyncio.run(run(root_dir))
+        assert len(diffs) == 20
+        assert max_n_holders == 2
+
+    def test_diff_cache(self, tmp_path):
+        async def run(git: AsyncGitClient) -> list:
+            hashes = [x.hash async for x in git.alog(branch="master")]
+            return [[x async for x in git.adiff(hash)] for hash in hashes]
+
+        with GitRepoFactory(tmp_path / "repo", COMMITS) as root_dir, override_settings(
+            CACHE_DIR=str(tmp_path / "cache")
+        ):
+            with GitClient(root_dir) as git:
+                expected = [list(git.diff(x.hash)) for x in git.log(branch="master")]
+            diff_cache = TrackingDiffCache(root_dir)
+            try:
+                git = AsyncGitClient(root_dir, diff_cache=diff_cache)
+                # The misses (that fill the cache), then the hits.
+                diffs = [asyncio.run(run(git)), asyncio.run(run(git))]
+            finally:
+                diff_cache.close()
+        assert diffs == [expected, expected]
+        # The queries do not block the loop (run in the main thread).
+        assert diff_cache.thread_ids
+        assert threading.get_ident() not in diff_cache.thread_ids
+
+    @override_settings(
+        GIT_LOG_BIN="/bin/echo 'fatal: bad revision' >&2 ; /usr/bin/false",
+        DO_USE_POPEN_SHELL=True,
+    )
+    def test_error(self):
+        async def run():
+            return [x async for x in AsyncGitClient("/tmp").alog(branch="XXX")]
+
+        with pytest.raises(GitProcessError) as exc_info:
+            asyncio.run(run())
+        assert exc_info.value.returncode == 1
+        assert "fatal: bad revision" in exc_info.value.stderr
+
+    @override_settings(
+        GIT_LOG_BIN=build_printf_command(
+            format_git_log_entry(
+                GitLogEntry("2fdffa2", "2020-02-10", "foo@gmail.com", "NEW")
+            )
+        )
+        + " ; exec sleep 10 ;",
+        DO_USE_POPEN_SHELL=True,
+    )
+    def test_stream(self):
+        async def run():
+            git_log = AsyncGitClient("/tmp").alog(branch="master")
+            # The first entry is yielded while git is still running.
+            commit = await anext(git_log)
+            await git_log.aclose()
+            return commit
+
+        t0 = time.monotonic()
+        assert asyncio.run(run()).hash == "2fdffa2"
+        assert time.monotonic() - t0 < 5
+
+    @override_settings(
+        GIT_DIFF_BIN="/bin/echo \"fatal: ambiguous argument '2fdffa2~1': unknown revision\" >&2 ; /usr/bin/false",
+        DO_USE_POPEN_SHELL=True,
+    )
+    def test_diff_root_commit(self):
+        async def run():
+            return [x async for x in AsyncGitClient("/tmp").adiff("2fdffa2")]
+
+        assert asyncio.run(run()) == []
@@ -0,0 +1,78 @@
+from git_loc.clients import diff_cache
+from git_loc.clients.diff_cache import DiffCache
+from git_loc.clients.git_client import GitDiffEntry
+
+from ..testutils.settings_testutils import override_settings
+
+HASH1 = "1" * 40
+HASH2 = "2" * 40
+HASH3 = "3" * 40
+
+
+class TestDiffCache:
+    def setup_method(self):
+        self.git_diff_entry1 = GitDiffEntry(
+            insertions="10",
+            deletions="2",
+            path="/tmp1",
+        )
+        self.git_diff_entry2 = GitDiffEntry(
+            insertions="-",
+            deletions="-",
+            path="/tmp2",
+        )
+
+    def test_happy_flow(self, tmp_path):
+        with override_settings(CACHE_DIR=str(tmp_path)):
+            cache = DiffCache("/tmp")
+            cache.set(HASH1, "diff", [self.git_diff_entry1, self.git_diff_entry2])
+            cache.set(HASH2, "diff", [])
+            cache.close()
+
+            cache = DiffCache("/tmp")
+            assert cache.get(HASH1, "diff") == [
+                self.git_diff_entry1,
+                self.git_diff_entry2,
+            ]
+            assert cache.get(HASH2, "diff") == []
+            assert cache.get(HASH3, "diff") is None
+            assert cache.get(HASH1, "diff-tree") is None
+            cache.close()
+
+    def test_lru_eviction(self, tmp_path):
+        with override_settings(CACHE_DIR=str(tmp_path)):
+            # Each commit takes 40 (hash) + 11 (row) bytes.
+            cache = DiffCache("/tmp", max_size_bytes=110)
+            cache.set(HASH1, "diff", [self.git_diff_entry1])
+            cache.set(HASH2, "diff", [self.git_diff_entry1])
+            # Use HASH1, so HASH2 is the least recently used.
+            cache.get(HASH1, "diff")
+            cache.set(HASH3, "diff", [self.git_diff_entry1])
+            cache.close()
+
+            cache = DiffCache("/tmp")
+            assert cache.get(HASH1, "diff") == [self.git_diff_entry1]
+            assert cache.get(HASH2, "diff") is None
+            assert cache.get(HASH3, "diff") == [self.git_diff_entry1]
+            cache.close()
+
+    def test_stats_and_clear(self, tmp_path):
+        with override_settings(CACHE_DIR=str(tmp_path)):
+            cache = DiffCache("/tmp")
+            cache.set(HASH1, "diff", [self.git_diff_entry1])
+            cache.close()
+
+            all_stats = list(diff_cache.iter_stats())
+            assert len(all_stats) == 1
+            assert all_stats[0].root_dir == "/tmp"
+            assert all_stats[0].n_commits == 1
+            assert all_stats[0].size_bytes == 51
+
+            assert diff_cache.clear() == 1
+            assert not list(diff_cache.iter_stats())
+
+    def test_clear_repo_with_no_cache(self, tmp_path):
+        with override_settings(CACHE_DIR=str(tmp_path / "cache")):
+            assert diff_cache.clear(tmp_path / "repo") == 0
+        # No cache dir is created for the repo.
+        assert not (tmp_path / "cache").exists()
@@ -1,15 +1,29 @@
+import time
 from datetime import datetime
 
 import pytest
 
-from git_loc.clients.git_client import GitClient, NotADate
+from git_loc.clients.git_client import (
+    DIFF_BACKEND_DIFF_TREE,
+    GitClient,
+    GitProcessError,
+    LogParser,
+    NotADate,
+    NumstatParser,
+    build_pathspecs,
+)
 
 from ..testfactories.git_log_factory import (
     GitDiffEntry,
     GitDiffFactory,
     GitLogEntry,
     GitLogFactory,
+    GitLogNumstatFactory,
+    build_printf_command,
+    format_git_log_entry,
 )
+from ..testfactories.git_repo_factory import GitRepoCommit, GitRepoFactory
+from ..testutils.settings_testutils import override_settings
 
 
 class TestLog:
@@ -19,12 +33,14 @@ class TestLog:
             date="2020-02-10",
             email="foo@gmail.com",
             summary="NEW Enable CORS for qa.mierecensioni.it (HEAD -> master, origin/master)",
+            timestamp=1581336000,
         )
         self.git_log_entry2 = GitLogEntry(
             hash="7hdff09",
             date="2020-02-09",
             email="foo@gmail.com",
             summary="NEW Answer model",
+            timestamp=1581249600,
         )
         self.start_date = datetime(2021, 1, 1)
         self.end_date = datetime(2022, 12, 31)
@@ -48,6 +64,7 @@ class TestLog:
             date="2020-02-10",
             email="-",
             summary="NEW Enable CORS for qa.mierecensioni.it (HEAD -> master, origin/master)",
+            timestamp=1581336000,
         )
         with GitLogFactory((git_log_entry,)):
             git = GitClient("/tmp")
@@ -95,6 +112,77 @@ class TestLog:
             [x for x in git_log]
 
 
+class TestLogNumstat:
+    def setup_method(self):
+        self.git_log_entry1 = GitLogEntry(
+            hash="2fdffa2",
+            date="2020-02-10",
+            email="foo@gmail.com",
+            summary="NEW Enable CORS for qa.mierecensioni.it (HEAD -> master, origin/master)",
+            timestamp=1581336000,
+        )
+        self.git_log_entry2 = GitLogEntry(
+            hash="7hdff09",
+            date="2020-02-09",
+            email="foo@gmail.com",
+            summary="NEW Answer model",
+            timestamp=1581249600,
+        )
+        self.git_diff_entry1 = GitDiffEntry(
+            insertions="10",
+            deletions="2",
+            path="/tmp1",
+        )
+        self.git_diff_entry2 = GitDiffEntry(
+            insertions="-",
+            deletions="-",
+            path="/tmp2",
+        )
+
+    def test_happy_flow(self):
+        with GitLogNumstatFactory(
+            (
+                (self.git_log_entry1, (self.git_diff_entry1, self.git_diff_entry2)),
+                (self.git_log_entry2, (self.git_diff_entry1,)),
+            )
+        ):
+            git = GitClient("/tmp")
+            git_log = git.log_numstat(branch="master", author="john")
+            logs = [x for x in git_log]
+        assert logs == [
+            (self.git_log_entry1, [self.git_diff_entry1, self.git_diff_entry2]),
+            (self.git_log_entry2, [self.git_diff_entry1]),
+        ]
+
+    def test_commit_with_no_files(self):
+        with GitLogNumstatFactory(
+            (
+                (self.git_log_entry1, ()),
+                (self.git_log_entry2, (self.git_diff_entry1,)),
+            )
+        ):
+            git = GitClient("/tmp")
+            git_log = git.log_numstat(branch="master")
+            logs = [x for x in git_log]
+        assert logs == [
+            (self.git_log_entry1, []),
+            (self.git_log_entry2, [self.git_diff_entry1]),
+        ]
+
+    def test_no_commits(self):
+        with GitLogNumstatFactory(tuple()):
+            git = GitClient("/tmp")
+            git_log = git.log_numstat(branch="master")
+            logs = [x for x in git_log]
+        assert not logs
+
+    def test_start_date_string(self):
+        with GitLogNumstatFactory(tuple()), pytest.raises(NotADate):
+            git = GitClient("/tmp")
+            git_log = git.log_numstat(branch="master", start_date="XXX")
+            [x for x in git_log]
+
+
 class TestDiff:
     def setup_method(self):
         self.git_diff_entry1 = GitDiffEntry(
@@ -139,3 +227,302 @@ class TestDiff:
             git_log = git.diff(hash="2fdffa2")
             diffs = [x for x in git_log]
         assert diffs[0] == git_diff_entry
+
+
+class TestRunGitProcess:
+    @override_settings(
+        GIT_LOG_BIN="/bin/echo 'fatal: bad revision' >&2 ; /usr/bin/false",
+        DO_USE_POPEN_SHELL=True,
+    )
+    def test_error(self):
+        git = GitClient("/tmp")
+        with pytest.raises(GitProcessError) as exc_info:
+            [x for x in git.log(branch="XXX")]
+        assert exc_info.value.returncode == 1
+        assert "fatal: bad revision" in exc_info.value.stderr
+
+    @override_settings(
+        GIT_LOG_BIN=build_printf_command(
+            format_git_log_entry(
+                GitLogEntry("2fdffa2", "2020-02-10", "foo@gmail.com", "NEW")
+            )
+        )
+        + " ; exec sleep 10 ;",
+        DO_USE_POPEN_SHELL=True,
+    )
+    def test_stream(self):
+        git = GitClient("/tmp")
+        git_log = git.log(branch="master")
+        t0 = time.monotonic()
+        # The first entry is yielded while git is still running.
+        assert next(git_log).hash == "2fdffa2"
+        git_log.close()
+        assert time.monotonic() - t0 < 5
+
+    @override_settings(
+        GIT_DIFF_BIN="/bin/echo 'fatal: bad revision' >&2 ; /usr/bin/false",
+        DO_USE_POPEN_SHELL=True,
+    )
+    def test_diff_error(self):
+        git = GitClient("/tmp")
+        with pytest.raises(GitProcessError):
+            [x for x in git.diff(hash="2fdffa2")]
+
+    @override_settings(
+        GIT_DIFF_BIN="/bin/echo \"fatal: ambiguous argument '2fdffa2~1': unknown revision\" >&2 ; /usr/bin/false",
+        DO_USE_POPEN_SHELL=True,
+    )
+    def test_diff_root_commit(self):
+        git = GitClient("/tmp")
+        assert not [x for x in git.diff(hash="2fdffa2")]
+
+
+class TestDiffTreeBackend:
+    def setup_method(self):
+        self.commits = (
+            GitRepoCommit("john@gmail.com", "2020-02-10", {"a.txt": "a\nb\n"}),
+            GitRepoCommit(
+                "john@gmail.com", "2020-02-11", {"a.txt": "a\nc\n", "b.bin": b"\0\1"}
+            ),
+            GitRepoCommit("john@gmail.com", "2020-02-12", {"dir/c.txt": "c\n"}),
+            GitRepoCommit("john@gmail.com", "2020-02-13", {}),
+        )
+
+    @override_settings(GIT_DIFF_BACKEND=DIFF_BACKEND_DIFF_TREE)
+    def test_same_as_diff_backend(self, tmp_path):
+        with GitRepoFactory(tmp_path, self.commits) as root_dir:
+            with GitClient(root_dir) as git:
+                hashes = [x.hash for x in git.log(branch="master")]
+                diffs = [list(git.diff(hash)) for hash in hashes[:-1]]
+        with override_settings(GIT_DIFF_BACKEND="diff"):
+            git = GitClient(root_dir)
+            expected_diffs = [list(git.diff(hash)) for hash in hashes[:-1]]
+        assert diffs == expected_diffs
+        assert diffs[0] == []
+        assert diffs[1] == [GitDiffEntry("1", "0", "dir/c.txt")]
+        assert diffs[2] == [
+            GitDiffEntry("1", "1", "a.txt"),
+            GitDiffEntry("-", "-", "b.bin"),
+        ]
+
+    @override_settings(GIT_DIFF_BACKEND=DIFF_BACKEND_DIFF_TREE)
+    def test_root_commit(self, tmp_path):
+        with GitRepoFactory(tmp_path, self.commits) as root_dir:
+            with GitClient(root_dir) as git:
+                root_hash = list(git.log(branch="master"))[-1].hash
+                diffs = list(git.diff(root_hash))
+        assert diffs == [GitDiffEntry("2", "0", "a.txt")]
+
+    @override_settings(GIT_DIFF_BACKEND=DIFF_BACKEND_DIFF_TREE)
+    def test_process_died(self, tmp_path):
+        with GitRepoFactory(tmp_path, self.commits) as root_dir:
+            with GitClient(root_dir) as git:
+                root_hash = list(git.log(branch="master"))[-1].hash
+                assert list(git.diff(root_hash))
+                process = git._diff_tree_processes[0].process
+                process.kill()
+                process.wait()
+                diffs = list(git.diff(root_hash))
+        assert diffs == [GitDiffEntry("2", "0", "a.txt")]
+
+    @override_settings(GIT_DIFF_BACKEND=DIFF_BACKEND_DIFF_TREE)
+    def test_close(self, tmp_path):
+        with GitRepoFactory(tmp_path, self.commits) as root_dir:
+            git = GitClient(root_dir)
+            root_hash = list(git.log(branch="master"))[-1].hash
+            list(git.diff(root_hash))
+            process = git._diff_tree_processes[0].process
+            git.close()
+        assert process.returncode == 0
+        assert not git._diff_tree_processes
+
+
+class TestPathspecs:
+    def setup_method(self):
+        self.commits = (
+            GitRepoCommit(
+                "john@gmail.com",
+                "2020-02-10",
+                {"services/payments/a.py": "a\n", "other/b.py": "b\n"},
+            ),
+            GitRepoCommit("john@gmail.com", "2020-02-11", {"other/b.py": "c\n"}),
+            GitRepoCommit(
+                "john@gmail.com",
+                "2020-02-12",
+                {"services/payments/a.py": "b\n", "services/payments/x.lock": "x\n"},
+            ),
+        )
+        self.pathspecs = build_pathspecs(("services/payments",), ("*.lock",))
+
+    def test_build_pathspecs(self):
+        assert self.pathspecs == ["services/payments", ":(exclude)*.lock"]
+        assert build_pathspecs() == []
+
+    def test_log(self, tmp_path):
+        with GitRepoFactory(tmp_path, self.commits) as root_dir:
+            git = GitClient(root_dir, pathspecs=self.pathspecs)
+            dates = [x.date for x in git.log(branch="master")]
+            numstat_dates = [x.date for x, _ in git.log_numstat(branch="master")]
+        assert dates == numstat_dates == ["2020-02-12", "2020-02-10"]
+
+    @pytest.mark.parametrize("diff_backend", ("diff", DIFF_BACKEND_DIFF_TREE))
+    def test_diff(self, tmp_path, diff_backend):
+        with GitRepoFactory(tmp_path, self.commits) as root_dir:
+            with override_settings(GIT_DIFF_BACKEND=diff_backend), GitClient(
+                root_dir, pathspecs=self.pathspecs
+            ) as git:
+                hash = list(git.log(branch="master"))[0].hash
+                diffs = list(git.diff(hash))
+        assert diffs == [GitDiffEntry("1", "1", "services/payments/a.py")]
+
+    @override_settings(DO_USE_POPEN_SHELL=True)
+    def test_popen_shell(self, tmp_path):
+        repo_factory = GitRepoFactory(tmp_path, self.commits)
+        with repo_factory as root_dir:
+            # The pattern must not be expanded by the shell.
+            (root_dir / "y.lock").write_text("y\n")
+            git = GitClient(root_dir, pathspecs=self.pathspecs)
+            hash = repo_factory._git("rev-parse", "HEAD").strip()
+            diffs = list(git.diff(hash))
+        assert diffs == [GitDiffEntry("1", "1", "services/payments/a.py")]
+
+
+class TestParsers:
+    def setup_method(self):
+        # The output of `git log -z --numstat` with a rename, a binary file, paths
+        #  with a tab and a newline, a non-UTF-8 email and a commit with no files.
+        self.output = (
+            b"2fdffa2\x001581336000\x002020-02-10\x00\xff@gmail.com\x00NEW\x00"
+            b"\n1\t2\ta\tb.txt\x00-\t-\tx.bin\x000\t0\t\x00old.txt\x00new\nline.txt\x00"
+            b"\x00"
+            b"1111111\x001581249600\x002020-02-09\x00foo@gmail.com\x00OLD\x00"
+        )
+        self.expected = [
+            (
+                GitLogEntry("2fdffa2", "2020-02-10", "�@gmail.com", "NEW", 1581336000),
+                [
+                    GitDiffEntry("1", "2", "a\tb.txt"),
+                    GitDiffEntry("-", "-", "x.bin"),
+                    GitDiffEntry("0", "0", "new\nline.txt"),
+                ],
+            ),
+            (
+                GitLogEntry(
+                    "1111111", "2020-02-09", "foo@gmail.com", "OLD", 1581249600
+                ),
+                [],
+            ),
+        ]
+
+    @pytest.mark.parametrize("chunk_size", (1, 7, 2**16))
+    def test_log_parser(self, chunk_size):
+        parser = LogParser(do_parse_numstat=True)
+        items = list()
+        for i in range(0, len(self.output), chunk_size):
+            items += parser.feed(self.output[i : i + chunk_size])
+        items += parser.close()
+        assert items == self.expected
+
+    def test_log_parser_no_numstat(self):
+        output = (
+            self.output.split(b"\n", 1)[0]
+            + b"\x00"
+            + self.output.split(b"\x00\x00", 1)[1]
+        )
+        parser = LogParser()
+        items = parser.feed(output) + parser.close()
+        assert items == [x for x, _ in self.expected]
+
+    def test_numstat_parser(self):
+        output = self.output.split(b"\n", 1)[1].split(b"\x00\x00", 1)[0] + b"\x00"
+        parser = NumstatParser()
+        items = list()
+        for byte in output:
+            items += parser.feed(bytes([byte]))
+        items += parser.close()
+        assert items == self.expected[0][1]
+
+    @pytest.mark.parametrize("diff_backend", ("diff", DIFF_BACKEND_DIFF_TREE))
+    def test_special_paths(self, tmp_path, diff_backend):
+        commits = (
+            GitRepoCommit("john@gmail.com", "2020-02-10", {"a\tb.txt": "a\nb\n"}),
+            GitRepoCommit("john@gmail.com", "2020-02-11", {"new\nline.txt": "c\n"}),
+        )
+        with GitRepoFactory(tmp_path, commits) as root_dir:
+            with override_settings(GIT_DIFF_BACKEND=diff_backend), GitClient(
+                root_dir
+            ) as git:
+                numstat = [diffs for _, diffs in git.log_numstat(branch="master")]
+                diffs = [list(git.diff(x.hash)) for x in git.log(branch="master")]
+        assert numstat[0] == diffs[0] == [GitDiffEntry("1", "0", "new\nline.txt")]
+        assert numstat[1] == [GitDiffEntry("2", "0", "a\tb.txt")]
+
+
+class TestLogSharded:
+    def setup_method(self):
+        self.commits = [
+            GitRepoCommit(
+                "john@gmail.com" if i % 3 else "mary@gmail.com",
+                f"2020-02-{10 + i}",
+                {f"dir{i % 2}/a.txt": "a\n" * (i + 1), "b.lock": f"{i}\n"},
+            )
+            for i in range(9)
+        ]
+
+    @pytest.mark.parametrize("do_parse_numstat", (False, True))
+    @pytest.mark.parametrize(
+        "filters",
+        (
+            dict(),
+            dict(author="john", start_date=datetime(2020, 2, 12)),
+            dict(end_date=datetime(2020, 2, 15)),
+        ),
+    )
+    @override_settings(LOG_SHARD_SIZE=2)
+    def test_same_as_log(self, tmp_path, do_parse_numstat, filters):
+        with GitRepoFactory(tmp_path, self.commits) as root_dir:
+            git = GitClient(root_dir, pathspecs=["dir1"])
+            if do_parse_numstat:
+                expected = list(git.log_numstat(branch="master", **filters))
+            else:
+                expected = list(git.log(branch="master", **filters))
+            hashes = list(git.rev_list(branch="master", **filters))
+            commits = list(
+                git.log_sharded(
+                    branch="master",
+                    jobs=3,
+                    do_parse_numstat=do_parse_numstat,
+                    **filters,
+                )
+            )
+        assert commits == expected
+        assert commits
+        if do_parse_numstat:
+            assert hashes == [x.hash for x, _ in commits]
+        else:
+            assert hashes == [x.hash for x in commits]
+
+    @pytest.mark.parametrize(
+        "filters",
+        (
+            dict(),
+            dict(author="john", start_date=datetime(2020, 2, 12)),
+            dict(end_date=datetime(2020, 2, 15)),
+        ),
+    )
+    def test_rev_list_count(self, tmp_path, filters):
+        with GitRepoFactory(tmp_path, self.commits) as root_dir:
+            git = GitClient(root_dir, pathspecs=["dir1"])
+            n_commits = git.rev_list_count(branch="master", **filters)
+            expected = len(list(git.log(branch="master", **filters)))
+        assert n_commits == expected
+        assert n_commits
+
+    @override_settings(LOG_SHARD_SIZE=2)
+    def test_stop_early(self, tmp_path):
+        with GitRepoFactory(tmp_path, self.commits) as root_dir:
+            git = GitClient(root_dir)
+            commits = git.log_sharded(branch="master", jobs=2)
+            first = next(commits)
+            commits.close()
+        assert first.date == "2020-02-18"
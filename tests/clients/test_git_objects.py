@@ -0,0 +1,235 @@
+from datetime import datetime
+
+import pytest
+
+from git_loc.clients.git_client import (
+    DIFF_BACKEND_DIFF,
+    DIFF_BACKEND_DIFF_TREE,
+    GIT_BACKEND_OBJECTS,
+    GIT_BACKEND_SUBPROCESS,
+    GitClient,
+)
+from git_loc.clients.git_objects import GitObjectsReader, NotAGitRepo, UnknownRevision
+
+from ..testfactories.git_repo_factory import GitRepoCommit, GitRepoFactory
+from ..testutils.settings_testutils import override_settings
+
+# The identity and date of the tags and merges.
+GIT_ENV = dict(
+    GIT_AUTHOR_NAME="john",
+    GIT_AUTHOR_EMAIL="john@gmail.com",
+    GIT_AUTHOR_DATE="2020-03-06T12:00:00+0000",
+    GIT_COMMITTER_NAME="john",
+    GIT_COMMITTER_EMAIL="john@gmail.com",
+    GIT_COMMITTER_DATE="2020-03-06T12:00:00+0000",
+)
+LINES = "".join(f"line {i}\n" for i in range(40))
+
+
+def edit(content: str, *line_numbers) -> str:
+    lines = content.splitlines(keepends=True)
+    for i in line_numbers:
+        lines[i] = f"edited {i}\n"
+    return "".join(lines)
+
+
+COMMITS = (
+    GitRepoCommit(
+        "john@gmail.com",
+        "2020-02-10",
+        {
+            "a.txt": LINES,
+            "b.bin": b"\0\1\2" * 100,
+            "dir/c.txt": "c\n" * 10,
+            "dir/sub/d.py": LINES + "d\n",
+            "x/util.py": LINES + "util\n",
+            "ñandú.txt": "ñ\n",
+            "with space.txt": "a\n",
+            'quo"te.txt': "a\n",
+            "empty.txt": "",
+        },
+    ),
+    GitRepoCommit(
+        "Mary@Gmail.com",
+        "2020-02-11",
+        {
+            "a.txt": edit(LINES, 1, 5, 20),
+            "b.bin": b"\0\1\3" * 100,
+            "dir/c.txt": None,
+            # An exact rename.
+            "dir/sub/d.py": None,
+            "e/d.py": LINES + "d\n",
+            "no-newline.txt": "a\nb",
+            "crlf.txt": "a\r\nb\r\n",
+        },
+    ),
+    GitRepoCommit(
+        "john@gmail.com",
+        "2020-02-12",
+        {
+            # A rename with edits.
+            "a.txt": None,
+            "dir2/a2.txt": edit(LINES, 1, 5, 20, 30),
+            # A rename with the same basename.
+            "x/util.py": None,
+            "y/util.py": edit(LINES, 2, 3, 4) + "util\n",
+            "ñandú.txt": None,
+            "nandu.txt": "ñ\n",
+            "no-newline.txt": "a\nb\n",
+        },
+    ),
+    GitRepoCommit(
+        "john@gmail.com",
+        "2020-03-01",
+        {"crlf.txt": "a\r\nc\r\n", "empty.txt": "now\n", "big.txt": LINES * 50},
+    ),
+    GitRepoCommit("john@gmail.com", "2020-03-02", {}),
+    GitRepoCommit(
+        "mary@gmail.com",
+        "2020-04-01",
+        {"big.txt": edit(LINES * 50, *range(0, 2000, 7)), "e/d.py": None},
+    ),
+)
+
+
+@pytest.fixture(params=("loose", "packed"))
+def repo(request, tmp_path):
+    """
+    A repo with renames, binary files, quoted paths, tags, branches and a merge,
+     with loose objects or in a pack with deltas.
+    """
+    factory = GitRepoFactory(tmp_path, COMMITS)
+    with factory as root_dir:
+        factory._git("tag", "v1", "HEAD~3")
+        factory._git("tag", "-a", "v2", "-m", "Version 2", "HEAD~1", env=GIT_ENV)
+        factory._git("checkout", "-q", "-b", "feature", "HEAD~2")
+        factory.add_commit(
+            GitRepoCommit("john@gmail.com", "2020-03-05", {"f.txt": "f\n" * 5})
+        )
+        factory._git("checkout", "-q", "master")
+        factory._git(
+            "merge", "-q", "--no-ff", "-m", "Merge feature", "feature", env=GIT_ENV
+        )
+        factory.add_commit(
+            GitRepoCommit("mary@gmail.com", "2020-05-01", {"f.txt": "g\n" * 5})
+        )
+        if request.param == "packed":
+            factory._git("repack", "-q", "-a", "-d", "-f", "--depth=50")
+            factory._git("pack-refs", "--all")
+        yield factory
+
+
+def list_all(git: GitClient, factory: GitRepoFactory, **log_kwargs):
+    log = list(git.log(branch="master", **log_kwargs))
+    all_hashes = factory._git("rev-list", "master").split()
+    return dict(
+        log=log,
+        log_numstat=list(git.log_numstat(branch="master", **log_kwargs)),
+        diffs=[list(git.diff(hash)) for hash in all_hashes],
+    )
+
+
+class TestObjectsBackend:
+    @pytest.mark.parametrize(
+        "diff_backend", (DIFF_BACKEND_DIFF, DIFF_BACKEND_DIFF_TREE)
+    )
+    def test_same_as_subprocess_backend(self, repo, diff_backend):
+        with override_settings(
+            GIT_BACKEND=GIT_BACKEND_OBJECTS, GIT_DIFF_BACKEND=diff_backend
+        ):
+            with GitClient(repo.root_dir) as git:
+                actual = list_all(git, repo)
+        with override_settings(
+            GIT_BACKEND=GIT_BACKEND_SUBPROCESS, GIT_DIFF_BACKEND=diff_backend
+        ):
+            with GitClient(repo.root_dir) as git:
+                expected = list_all(git, repo)
+        assert actual == expected
+        # Check a few entries, so the test does not pass if both are empty.
+        assert len(actual["log"]) == 8
+        assert "(HEAD -> master)" in actual["log"][0].summary
+        # The paths are not quoted, and the path of a rename is its destination.
+        paths = {x.path for diffs in actual["diffs"] for x in diffs}
+        assert {"dir2/a2.txt", "y/util.py", "nandu.txt"} <= paths
+        assert not [x for x in paths if "=>" in x]
+
+    @pytest.mark.parametrize(
+        "log_kwargs",
+        (
+            dict(author="mary"),
+            dict(author="^Mary"),
+            dict(start_date=datetime(2020, 2, 12)),
+            dict(end_date=datetime(2020, 3, 2)),
+        ),
+    )
+    def test_log_filters(self, repo, log_kwargs):
+        with override_settings(GIT_BACKEND=GIT_BACKEND_OBJECTS):
+            with GitClient(repo.root_dir) as git:
+                actual = list(git.log(branch="master", **log_kwargs))
+        with override_settings(GIT_BACKEND=GIT_BACKEND_SUBPROCESS):
+            with GitClient(repo.root_dir) as git:
+                expected = list(git.log(branch="master", **log_kwargs))
+        assert actual == expected
+        assert actual
+
+    def test_log_range(self, repo):
+        tip = repo._git("rev-parse", "v1").strip()
+        with override_settings(GIT_BACKEND=GIT_BACKEND_OBJECTS):
+            with GitClient(repo.root_dir) as git:
+                actual = list(git.log(branch=f"{tip}..master"))
+        with override_settings(GIT_BACKEND=GIT_BACKEND_SUBPROCESS):
+            with GitClient(repo.root_dir) as git:
+                expected = list(git.log(branch=f"{tip}..master"))
+        assert actual == expected
+        assert len(actual) == 5
+
+    @pytest.mark.parametrize(
+        "pathspecs, subdir",
+        (
+            (["dir2", "e/"], ""),
+            (["*.txt", ":(exclude)big.txt", ":!dir2/*"], ""),
+            ([":(exclude)*.py"], ""),
+            (["*.py"], "y"),
+            (["../a.txt", "util.py"], "x"),
+        ),
+    )
+    def test_pathspecs(self, repo, pathspecs, subdir):
+        root_dir = repo.root_dir / subdir
+        root_dir.mkdir(exist_ok=True)
+        with override_settings(GIT_BACKEND=GIT_BACKEND_OBJECTS):
+            with GitClient(root_dir, pathspecs=pathspecs) as git:
+                actual = list_all(git, repo)
+        with override_settings(GIT_BACKEND=GIT_BACKEND_SUBPROCESS):
+            with GitClient(root_dir, pathspecs=pathspecs) as git:
+                expected = list_all(git, repo)
+        assert actual == expected
+        assert actual["log"]
+
+    @override_settings(GIT_BACKEND=GIT_BACKEND_OBJECTS)
+    def test_rev_parse_and_is_ancestor(self, repo):
+        with GitClient(repo.root_dir) as git:
+            for rev in ("master", "HEAD", "v1", "v2", "refs/heads/feature"):
+                expected = repo._git("rev-parse", f"{rev}^{{commit}}").strip()
+                assert git.rev_parse(rev) == expected
+            assert git.is_ancestor(git.rev_parse("v1"), "master")
+            assert not git.is_ancestor(git.rev_parse("master"), "v1")
+            assert not git.is_ancestor("1" * 40, "master")
+
+
+class TestGitObjectsReader:
+    def test_not_a_git_repo(self, tmp_path):
+        with pytest.raises(NotAGitRepo):
+            GitObjectsReader(tmp_path)
+
+    def test_unknown_revision(self, tmp_path):
+        with GitRepoFactory(tmp_path, COMMITS[:1]) as root_dir:
+            reader = GitObjectsReader(root_dir)
+            with pytest.raises(UnknownRevision):
+                reader.resolve("xxx")
+            reader.close()
+
+    def test_subdir(self, tmp_path):
+        with GitRepoFactory(tmp_path, COMMITS[:1]) as root_dir:
+            reader = GitObjectsReader(root_dir / "dir")
+            assert b"".join(reader.log_output("master")).count(b"\0") == 5
+            reader.close()
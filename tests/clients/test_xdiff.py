@@ -0,0 +1,110 @@
+import random
+import subprocess
+
+import pytest
+
+from git_loc.clients import xdiff
+
+
+def git_numstat(tmp_path, content1: bytes, content2: bytes) -> tuple[int, int]:
+    path1 = tmp_path / "a"
+    path2 = tmp_path / "b"
+    path1.write_bytes(content1)
+    path2.write_bytes(content2)
+    output = subprocess.run(
+        ("git", "diff", "--no-index", "--numstat", str(path1), str(path2)),
+        capture_output=True,
+    ).stdout.decode("utf-8")
+    if not output:
+        return 0, 0
+    insertions, deletions, _ = output.split("\t")
+    return int(insertions), int(deletions)
+
+
+def edit_lines(rnd: random.Random, lines: list[bytes], n_edits: int, n_words: int):
+    lines = list(lines)
+    for _ in range(n_edits):
+        pos = rnd.randrange(len(lines) + 1)
+        op = rnd.random()
+        if op < 0.4:
+            new_lines = [f"{rnd.randrange(n_words)}\n".encode() for _ in range(3)]
+            lines[pos:pos] = new_lines
+        elif op < 0.8:
+            del lines[pos : pos + rnd.randrange(1, 8)]
+        else:
+            lines[pos : pos + 2] = [f"x{rnd.randrange(n_words)}\n".encode()]
+    return lines
+
+
+class TestCountChangedLines:
+    def test_happy_flow(self):
+        lines1 = xdiff.split_lines(b"a\nb\nc\nd\n")
+        lines2 = xdiff.split_lines(b"a\nB\nc\nd\ne\n")
+        assert xdiff.count_changed_lines(lines1, lines2) == (2, 1)
+
+    def test_no_ending_newline(self):
+        lines1 = xdiff.split_lines(b"a\nb")
+        lines2 = xdiff.split_lines(b"a\nb\n")
+        assert xdiff.count_changed_lines(lines1, lines2) == (1, 1)
+
+    def test_empty(self):
+        assert xdiff.count_changed_lines([], []) == (0, 0)
+        assert xdiff.count_changed_lines([], xdiff.split_lines(b"a\nb\n")) == (2, 0)
+
+    @pytest.mark.parametrize("seed", range(4))
+    def test_same_as_git(self, tmp_path, seed):
+        rnd = random.Random(seed)
+        for _ in range(25):
+            # Few distinct words: many repeated lines, like blank lines and braces.
+            n_words = rnd.choice((3, 20, 1000))
+            lines1 = [
+                f"{rnd.randrange(n_words)}\n".encode()
+                for _ in range(rnd.choice((0, 10, 300)))
+            ]
+            lines2 = edit_lines(rnd, lines1, rnd.randrange(1, 30), n_words)
+            expected = git_numstat(tmp_path, b"".join(lines1), b"".join(lines2))
+            assert xdiff.count_changed_lines(lines1, lines2) == expected
+
+    def test_same_as_git_big_diff(self, tmp_path):
+        # Big and very different files: xdiff uses its heuristics to cut the cost.
+        rnd = random.Random(0)
+        lines1 = [f"{rnd.randrange(50)}\n".encode() for _ in range(4000)]
+        lines2 = edit_lines(rnd, lines1, 1500, 50)
+        expected = git_numstat(tmp_path, b"".join(lines1), b"".join(lines2))
+        assert xdiff.count_changed_lines(lines1, lines2) == expected
+
+
+class TestIsBinary:
+    def test_happy_flow(self):
+        assert xdiff.is_binary(b"a\0b")
+        assert not xdiff.is_binary(b"a\nb\n")
+
+    def test_nul_after_first_bytes(self):
+        assert not xdiff.is_binary(b"a" * xdiff.FIRST_FEW_BYTES + b"\0")
+
+
+class TestQuotePath:
+    def test_happy_flow(self):
+        assert xdiff.quote_path(b"dir/a.txt") == "dir/a.txt"
+        assert xdiff.quote_path(b"with space.txt") == "with space.txt"
+
+    def test_quoted(self):
+        assert xdiff.quote_path("ñ.txt".encode()) == '"\\303\\261.txt"'
+        assert xdiff.quote_path(b'a"b\tc') == '"a\\"b\\tc"'
+
+
+class TestFormatRename:
+    @pytest.mark.parametrize(
+        "src_path, dst_path, expected",
+        (
+            (b"a.txt", b"b.txt", "a.txt => b.txt"),
+            (b"dir/a.txt", b"dir/b.txt", "dir/{a.txt => b.txt}"),
+            (b"a/b/c.txt", b"a/d/c.txt", "a/{b => d}/c.txt"),
+            (b"dir/a.txt", b"a.txt", "dir/a.txt => a.txt"),
+            (b"a.txt", b"dir/a.txt", "a.txt => dir/a.txt"),
+            (b"a/b/c/d.txt", b"a/x.txt", "a/{b/c/d.txt => x.txt}"),
+            ("ñ.txt".encode(), b"n.txt", '"\\303\\261.txt" => n.txt'),
+        ),
+    )
+    def test_happy_flow(self, src_path, dst_path, expected):
+        assert xdiff.format_rename(src_path, dst_path) == expected
@@ -0,0 +1,35 @@
+import pytest
+
+from git_loc.conf import get_settings, set_setting
+from git_loc.conf.snapshot import FrozenSettings
+
+from ..testutils.settings_testutils import override_settings
+
+
+class TestSettingsSnapshot:
+    def test_happy_flow(self):
+        snapshot = get_settings()
+        assert snapshot.IS_TEST is True
+        assert "IS_TEST" in snapshot
+        assert snapshot.get("XXX", 1) == 1
+        assert get_settings() is snapshot
+
+    def test_frozen(self):
+        with pytest.raises(FrozenSettings):
+            get_settings().IS_TEST = False
+
+    def test_missing_key(self):
+        with pytest.raises(AttributeError):
+            get_settings().XXX
+
+    def test_override_settings(self):
+        with override_settings(DO_SUPPRESS_PRINT=True):
+            assert get_settings().DO_SUPPRESS_PRINT is True
+        with override_settings(DO_SUPPRESS_PRINT=False):
+            assert get_settings().DO_SUPPRESS_PRINT is False
+
+    def test_set_setting(self):
+        with override_settings():
+            set_setting("DO_SUPPRESS_PRINT", "xxx")
+            assert get_settings().DO_SUPPRESS_PRINT == "xxx"
+        assert get_settings().DO_SUPPRESS_PRINT != "xxx"
@@ -1,7 +1,10 @@
+from pathlib import Path
+
 import pytest
 from click.testing import CliRunner
 
 from git_loc.conf import settings
+from git_loc.domains.bench import SyntheticRepoSpec, generate_repo
 
 
 def pytest_configure(config):
@@ -37,3 +40,18 @@ def monkeysession(request):
 @pytest.fixture(autouse=True, scope="function")
 def cli_runner():
     return CliRunner(mix_stderr=False)
+
+
+@pytest.fixture
+def synthetic_repo(tmp_path):
+    """
+    Factory of synthetic repos (see `SyntheticRepoSpec`), like:
+        root_dir = synthetic_repo(n_commits=100, binary_ratio=0.1)
+    """
+
+    def make(**spec_kwargs) -> Path:
+        root_dir = tmp_path / f"synthetic-repo-{len(list(tmp_path.iterdir()))}"
+        generate_repo(root_dir, SyntheticRepoSpec(**spec_kwargs))
+        return root_dir
+
+    return make
@@ -0,0 +1,138 @@
+import pytest
+
+from git_loc.domains.aggregators import (
+    AuthorAggregator,
+    BucketAggregator,
+    LocStats,
+    PathAggregator,
+    UnknownBucket,
+)
+
+from ..testfactories.git_log_factory import GitLogEntry
+
+
+class TestAuthorAggregator:
+    def setup_method(self):
+        self.commit1 = GitLogEntry(
+            hash="1111111",
+            date="2020-02-10",
+            email="john@gmail.com",
+            summary="NEW Answer model",
+        )
+        self.commit2 = GitLogEntry(
+            hash="2222222",
+            date="2020-02-11",
+            email="John@Gmail.com",
+            summary="NEW Answer model",
+        )
+        self.commit3 = GitLogEntry(
+            hash="3333333",
+            date="2020-02-12",
+            email="john@work.com",
+            summary="NEW Answer model",
+        )
+        self.commit4 = GitLogEntry(
+            hash="4444444",
+            date="2020-02-12",
+            email="jane@gmail.com",
+            summary="NEW Answer model",
+        )
+
+    def test_happy_flow(self):
+        aggregator = AuthorAggregator()
+        aggregator.add_commit(self.commit1, 10, 2)
+        aggregator.add_commit(self.commit2, 1, 1)
+        aggregator.add_commit(self.commit3, 5, 0)
+        aggregator.add_commit(self.commit4, 20, 0)
+        assert aggregator.get_sorted_stats() == [
+            ("jane@gmail.com", LocStats(insertions=20, deletions=0, commits=1)),
+            ("john@gmail.com", LocStats(insertions=11, deletions=3, commits=2)),
+            ("john@work.com", LocStats(insertions=5, deletions=0, commits=1)),
+        ]
+
+    def test_aliases(self):
+        aggregator = AuthorAggregator(aliases={"JOHN@work.com": "john@gmail.com"})
+        aggregator.add_commit(self.commit1, 10, 2)
+        aggregator.add_commit(self.commit3, 5, 0)
+        assert aggregator.stats == {
+            "john@gmail.com": LocStats(insertions=15, deletions=2, commits=2),
+        }
+
+    def test_no_normalization(self):
+        aggregator = AuthorAggregator(do_normalize=False)
+        aggregator.add_commit(self.commit1, 10, 2)
+        aggregator.add_commit(self.commit2, 1, 1)
+        assert set(aggregator.stats) == {"john@gmail.com", "John@Gmail.com"}
+
+
+class TestPathAggregator:
+    def setup_method(self):
+        self.commit = GitLogEntry(
+            hash="1111111",
+            date="2020-02-10",
+            email="john@gmail.com",
+            summary="NEW Answer model",
+        )
+
+    def test_top_stats(self):
+        aggregator = PathAggregator()
+        aggregator.add_file(self.commit, "src/a.py", 10, 2)
+        aggregator.add_file(self.commit, "src/b.py", 1, 0)
+        aggregator.add_file(self.commit, "src/a.py", 0, 3)
+        aggregator.add_file(self.commit, "src/c.py", 5, 0)
+        aggregator.add_file(self.commit, "src/d.py", 5, 0)
+        assert aggregator.get_top_stats(3) == [
+            ("src/a.py", LocStats(insertions=10, deletions=5, commits=2)),
+            ("src/c.py", LocStats(insertions=5, deletions=0, commits=1)),
+            ("src/d.py", LocStats(insertions=5, deletions=0, commits=1)),
+        ]
+        assert len(aggregator.get_top_stats()) == 4
+
+
+class TestBucketAggregator:
+    def setup_method(self):
+        self.commits = [
+            GitLogEntry(
+                hash="1111111",
+                date=date,
+                email="john@gmail.com",
+                summary="NEW Answer model",
+            )
+            # 2020-02-10 is a Monday.
+            for date in ("2020-02-09", "2020-02-10", "2020-02-16", "2020-03-01")
+        ]
+
+    def _add_commits(self, aggregator):
+        for commit in self.commits:
+            aggregator.add_commit(commit, 10, 2)
+
+    def test_day(self):
+        aggregator = BucketAggregator("day")
+        self._add_commits(aggregator)
+        assert [x["bucket"] for x in aggregator.get_records()] == [
+            "2020-02-09",
+            "2020-02-10",
+            "2020-02-16",
+            "2020-03-01",
+        ]
+
+    def test_week(self):
+        aggregator = BucketAggregator("week")
+        self._add_commits(aggregator)
+        assert aggregator.get_records() == [
+            dict(bucket="2020-02-03", insertions=10, deletions=2, loc=12, commits=1),
+            dict(bucket="2020-02-10", insertions=20, deletions=4, loc=24, commits=2),
+            dict(bucket="2020-02-24", insertions=10, deletions=2, loc=12, commits=1),
+        ]
+
+    def test_month(self):
+        aggregator = BucketAggregator("month")
+        self._add_commits(aggregator)
+        assert aggregator.get_records() == [
+            dict(bucket="2020-02", insertions=30, deletions=6, loc=36, commits=3),
+            dict(bucket="2020-03", insertions=10, deletions=2, loc=12, commits=1),
+        ]
+
+    def test_unknown_bucket(self):
+        with pytest.raises(UnknownBucket):
+            BucketAggregator("year")
@@ -0,0 +1,78 @@
+from datetime import datetime
+
+import pytest
+
+from git_loc.domains.batch import BatchLocCounter, InvalidManifest
+
+from ..testfactories.git_repo_factory import GitRepoCommit, GitRepoFactory
+
+
+class TestBatchLocCounter:
+    def setup_method(self):
+        self.commits1 = (
+            GitRepoCommit("john@gmail.com", "2020-02-10", {"a.txt": "a\n"}),
+            GitRepoCommit("john@gmail.com", "2020-02-11", {"a.txt": "a\nb\nc\n"}),
+        )
+        self.commits2 = (
+            GitRepoCommit("john@gmail.com", "2020-02-10", {"a.txt": "a\n"}),
+            GitRepoCommit("john@gmail.com", "2020-02-11", {"b.lock": "b\n"}),
+            GitRepoCommit("john@gmail.com", "2020-02-12", {"c.txt": "c\n"}),
+        )
+
+    def test_happy_flow(self, tmp_path):
+        with GitRepoFactory(tmp_path / "repo1", self.commits1), GitRepoFactory(
+            tmp_path / "repo2", self.commits2
+        ):
+            manifest_path = tmp_path / "manifest.toml"
+            manifest_path.write_text(
+                "[defaults]\n"
+                'branch = "master"\n'
+                'globs_to_ignore = ["*.lock"]\n'
+                "[[repos]]\n"
+                f'root_dir = "{tmp_path / "repo1"}"\n'
+                "[[repos]]\n"
+                f'root_dir = "{tmp_path / "repo2"}"\n'
+                "[[repos]]\n"
+                f'root_dir = "{tmp_path / "repo2"}"\n'
+                'branch = "XXX"\n'
+            )
+            counter = BatchLocCounter.from_manifest(manifest_path)
+            results = counter.count(processes=2)
+        assert [x.loc_tot for x in results] == [2, 1, None]
+        assert [x.branch for x in results] == ["master", "master", "XXX"]
+        assert results[0].error is None
+        assert "GitProcessError" in results[2].error
+
+    def test_manifest_dates(self, tmp_path):
+        manifest_path = tmp_path / "manifest.toml"
+        manifest_path.write_text(
+            "[defaults]\n"
+            'branch = "master"\n'
+            "start_date = 2020-01-01\n"
+            "[[repos]]\n"
+            'root_dir = "/tmp"\n'
+            'end_date = "2020-12-31"\n'
+        )
+        counter = BatchLocCounter.from_manifest(manifest_path)
+        assert counter.repos_options == [
+            dict(
+                root_dir="/tmp",
+                branch="master",
+                start_date=datetime(2020, 1, 1),
+                end_date=datetime(2020, 12, 31),
+            )
+        ]
+
+    def test_manifest_unknown_option(self, tmp_path):
+        manifest_path = tmp_path / "manifest.toml"
+        manifest_path.write_text(
+            '[[repos]]\nroot_dir = "/tmp"\nbranch = "master"\nXXX = 1\n'
+        )
+        with pytest.raises(InvalidManifest):
+            BatchLocCounter.from_manifest(manifest_path)
+
+    def test_manifest_no_branch(self, tmp_path):
+        manifest_path = tmp_path / "manifest.toml"
+        manifest_path.write_text('[[repos]]\nroot_dir = "/tmp"\n')
+        with pytest.raises(InvalidManifest):
+            BatchLocCounter.from_manifest(manifest_path)
@@ -0,0 +1,82 @@
+import subprocess
+
+import pytest
+
+from git_loc.domains.bench import (
+    BENCH_CONFIG_NAMES,
+    Bench,
+    InvalidBenchResults,
+    SyntheticRepoSpec,
+    load_results,
+    save_results,
+)
+from git_loc.domains.main import STRATEGY_LOG_NUMSTAT, LocCounter
+from git_loc.domains.writers import FORMAT_NONE
+
+
+def git(root_dir, *args) -> str:
+    return subprocess.run(
+        ("git",) + args, cwd=root_dir, check=True, capture_output=True
+    ).stdout.decode("utf-8")
+
+
+class TestGenerateRepo:
+    def test_happy_flow(self, synthetic_repo):
+        root_dir = synthetic_repo(n_commits=30, n_authors=3, binary_ratio=0.2)
+        assert git(root_dir, "rev-list", "--count", "master").strip() == "30"
+        emails = set(git(root_dir, "log", "--format=%ae", "master").split())
+        assert emails <= {
+            "author0@example.com",
+            "author1@example.com",
+            "author2@example.com",
+        }
+        numstat = git(root_dir, "log", "--numstat", "--format=", "master")
+        assert "-\t-\t" in numstat
+
+    def test_reproducible(self, synthetic_repo):
+        root_dir1 = synthetic_repo(n_commits=10, seed=1)
+        root_dir2 = synthetic_repo(n_commits=10, seed=1)
+        root_dir3 = synthetic_repo(n_commits=10, seed=2)
+        tip1 = git(root_dir1, "rev-parse", "master")
+        assert tip1 == git(root_dir2, "rev-parse", "master")
+        assert tip1 != git(root_dir3, "rev-parse", "master")
+
+
+class TestBench:
+    def test_happy_flow(self, synthetic_repo):
+        spec = SyntheticRepoSpec(n_commits=20)
+        expected = LocCounter(synthetic_repo(**spec._asdict())).count(
+            branch="master", strategy=STRATEGY_LOG_NUMSTAT, output_format=FORMAT_NONE
+        )
+        results = Bench(spec).run()
+        assert [x.name for x in results] == list(BENCH_CONFIG_NAMES)
+        results = {x.name: x for x in results}
+        assert results["log-numstat"].loc_tot == expected
+        assert results["objects"].loc_tot == expected
+        assert results["diff"].n_git_processes == 21
+        assert results["log-numstat"].n_git_processes == 1
+        assert results["objects"].n_git_processes == 0
+        for result in results.values():
+            assert result.n_commits == 20
+            assert result.wall_time_s > 0
+            assert result.peak_rss_kb > 0
+
+    def test_peak_rss_of_fresh_process(self):
+        # 200 MB in this process, not in the process of the run.
+        ballast = b"x" * (200 * 1024 * 1024)
+        results = Bench(SyntheticRepoSpec(n_commits=5)).run(
+            config_names=["log-numstat"]
+        )
+        del ballast
+        assert 0 < results[0].peak_rss_kb < 200 * 1024
+
+    def test_save_and_load_results(self, tmp_path):
+        spec = SyntheticRepoSpec(n_commits=5)
+        results = Bench(spec).run(config_names=["log-numstat"], repeat=2)
+        save_results(tmp_path / "results.json", spec, results)
+        assert load_results(tmp_path / "results.json") == {"log-numstat": results[0]}
+
+    def test_load_invalid_results(self, tmp_path):
+        (tmp_path / "results.json").write_text('{"xxx": 1}')
+        with pytest.raises(InvalidBenchResults):
+            load_results(tmp_path / "results.json")
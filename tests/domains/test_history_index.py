@@ -0,0 +1,145 @@
+from datetime import datetime
+
+import pytest
+
+from git_loc.domains.aggregators import AuthorAggregator
+from git_loc.domains.history_index import BranchNotIndexed, HistoryIndex
+from git_loc.domains.main import STRATEGY_LOG_NUMSTAT, LocCounter
+from git_loc.domains.writers import FORMAT_NONE
+
+from ..testfactories.git_repo_factory import GitRepoCommit, GitRepoFactory
+from ..testutils.settings_testutils import override_settings
+
+
+class TestHistoryIndex:
+    def setup_method(self):
+        self.commits = (
+            GitRepoCommit("john@gmail.com", "2020-02-10", {"a.txt": "a\nb\n"}),
+            GitRepoCommit(
+                "mary@gmail.com",
+                "2020-02-11",
+                {"a.txt": "a\nc\nd\n", "b.bin": b"\0\1", "x.lock": "x\n"},
+            ),
+            GitRepoCommit("john@gmail.com", "2020-02-12", {"dir/c.txt": "c\n"}),
+            GitRepoCommit("john@gmail.com", "2020-02-13", {}),
+        )
+
+    @pytest.mark.parametrize(
+        "options",
+        (
+            dict(),
+            dict(author="john"),
+            dict(author="mary", globs_to_ignore=("*.lock",)),
+            dict(start_date=datetime(2020, 2, 5), end_date=datetime(2020, 2, 20)),
+            dict(files_to_ignore=("dir/",)),
+        ),
+    )
+    @pytest.mark.parametrize("output_format", (FORMAT_NONE, "jsonl"))
+    def test_same_as_count(self, tmp_path, options, output_format):
+        with GitRepoFactory(tmp_path / "repo", self.commits) as root_dir:
+            with override_settings(CACHE_DIR=str(tmp_path / "cache")):
+                counter = LocCounter(root_dir)
+                expected = counter.count(
+                    branch="master",
+                    strategy=STRATEGY_LOG_NUMSTAT,
+                    output_format=FORMAT_NONE,
+                    **options,
+                )
+                with HistoryIndex(root_dir) as index:
+                    index.update("master")
+                    loc_tot = counter.count_index(
+                        index, "master", output_format=output_format, **options
+                    )
+        assert loc_tot == expected
+
+    def test_aggregators(self, tmp_path):
+        with GitRepoFactory(tmp_path / "repo", self.commits) as root_dir:
+            with override_settings(CACHE_DIR=str(tmp_path / "cache")):
+                aggregator = AuthorAggregator()
+                with HistoryIndex(root_dir) as index:
+                    index.update("master")
+                    loc_tot = LocCounter(root_dir).count_index(
+                        index, "master", aggregators=[aggregator]
+                    )
+        assert loc_tot == 7
+        assert [(x, y.loc, y.commits) for x, y in aggregator.get_sorted_stats()] == [
+            ("mary@gmail.com", 4, 1),
+            ("john@gmail.com", 3, 3),
+        ]
+
+    def test_update(self, tmp_path):
+        repo_factory = GitRepoFactory(tmp_path / "repo", self.commits)
+        with repo_factory as root_dir, override_settings(
+            CACHE_DIR=str(tmp_path / "cache")
+        ):
+            with HistoryIndex(root_dir) as index:
+                assert index.update("master").n_new_commits == 4
+                assert index.update("master").n_new_commits == 0
+            repo_factory.add_commit(
+                GitRepoCommit("john@gmail.com", "2020-02-14", {"d.txt": "d\n"})
+            )
+            with HistoryIndex(root_dir) as index:
+                update = index.update("master")
+                branch = index.get_branch("master")
+                store = index.load_store("master")
+            assert update.n_new_commits == 1
+            assert branch.tip == update.tip
+            assert branch.n_commits == 5
+            assert [x.date for x, _ in store] == [
+                "2020-02-14",
+                "2020-02-13",
+                "2020-02-12",
+                "2020-02-11",
+                "2020-02-10",
+            ]
+            assert store[3][1][1].insertions == "-"
+
+            # The history is rewritten: the commits still in the branch are reused.
+            repo_factory._git("reset", "-q", "--hard", "HEAD~3")
+            repo_factory.add_commit(
+                GitRepoCommit("mary@gmail.com", "2020-02-15", {"e.txt": "e\n"})
+            )
+            with HistoryIndex(root_dir) as index:
+                update = index.update("master")
+                store = index.load_store("master")
+                loc_tot = LocCounter(root_dir).count_index(
+                    index, "master", output_format=FORMAT_NONE
+                )
+        assert update.n_new_commits == 1
+        assert [x.date for x, _ in store] == ["2020-02-15", "2020-02-11", "2020-02-10"]
+        assert loc_tot == 7
+
+    def test_dates(self, tmp_path):
+        with GitRepoFactory(tmp_path / "repo", self.commits) as root_dir:
+            with override_settings(CACHE_DIR=str(tmp_path / "cache")):
+                with HistoryIndex(root_dir) as index:
+                    index.update("master")
+                    # The whole days, like `LocCounter.count_store`.
+                    loc_tot = LocCounter(root_dir).count_index(
+                        index,
+                        "master",
+                        start_date=datetime(2020, 2, 11, 18),
+                        end_date=datetime(2020, 2, 12, 6),
+                        output_format=FORMAT_NONE,
+                    )
+        assert loc_tot == 5
+
+    def test_many_branches(self, tmp_path):
+        repo_factory = GitRepoFactory(tmp_path / "repo", self.commits)
+        with repo_factory as root_dir, override_settings(
+            CACHE_DIR=str(tmp_path / "cache")
+        ):
+            repo_factory._git("checkout", "-q", "-b", "feature", "HEAD~2")
+            repo_factory.add_commit(
+                GitRepoCommit("john@gmail.com", "2020-02-14", {"f.txt": "f\n"})
+            )
+            with HistoryIndex(root_dir) as index:
+                index.update("master")
+                # The 2 commits shared with master are not indexed again.
+                assert index.update("feature").n_new_commits == 1
+                assert index.get_branch("feature").n_commits == 3
+                assert index.get_branch("master").n_commits == 4
+                with pytest.raises(BranchNotIndexed):
+                    index.get_branch("XXX")
+                with pytest.raises(BranchNotIndexed):
+                    LocCounter(root_dir).count_index(index, "XXX")
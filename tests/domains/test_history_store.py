@@ -0,0 +1,108 @@
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Iterator
+
+import pytest
+
+from git_loc.clients.git_client import GitDiffEntry, GitLogEntry
+from git_loc.domains.history_store import HistoryStore, StoreFile
+
+
+def build_commits(n_commits: int, n_files: int) -> list:
+    return list(iter_commits(n_commits, n_files))
+
+
+def iter_commits(n_commits: int, n_files: int) -> Iterator:
+    for i in range(n_commits):
+        # At noon (UTC) of a day of February 2020.
+        day = datetime(2020, 2, i % 28 + 1, 12, tzinfo=timezone.utc)
+        commit = GitLogEntry(
+            f"{i:040x}",
+            day.date().isoformat(),
+            f"a{i % 3}@x.com",
+            "S",
+            int(day.timestamp()),
+        )
+        yield commit, [
+            GitDiffEntry(str(j), str(i), f"dir{j % 7}/file{j}.py")
+            if j % 10
+            else GitDiffEntry("-", "-", f"img{j}.png")
+            for j in range(n_files)
+        ]
+
+
+class TestHistoryStore:
+    def setup_method(self):
+        self.commits = build_commits(30, 12)
+        self.store = HistoryStore()
+        for commit, git_diff in self.commits:
+            self.store.append(commit, git_diff)
+
+    def test_happy_flow(self):
+        assert len(self.store) == 30
+        assert self.store.n_files == 360
+        assert list(self.store) == self.commits
+        assert self.store[3] == self.commits[3]
+        assert self.store[-1] == self.commits[-1]
+        with pytest.raises(IndexError):
+            self.store[30]
+
+    def test_iter_files(self):
+        files = list(self.store.iter_files(2))
+        assert files[0] == StoreFile(files[0].path_id, "img0.png", None, None, True)
+        assert files[1] == StoreFile(files[1].path_id, "dir1/file1.py", 1, 2, False)
+        # The paths are interned.
+        assert files[1].path_id == list(self.store.iter_files(5))[1].path_id
+
+    def test_iter_commits(self):
+        commits = list(
+            self.store.iter_commits(
+                author="a1",
+                start_date=datetime(2020, 2, 5),
+                end_date=datetime(2020, 2, 20),
+            )
+        )
+        assert [index for index, _ in commits] == [4, 7, 10, 13, 16, 19]
+        assert commits[0][1] == self.commits[4][0]
+
+    def test_slice(self):
+        store = self.store[5:8]
+        assert len(store) == 3
+        assert list(store) == self.commits[5:8]
+        assert list(self.store[::10]) == self.commits[::10]
+        assert len(self.store[10:5]) == 0
+
+    def test_slice_append(self):
+        n_emails, n_paths = len(self.store._emails), len(self.store._paths)
+        store = self.store[:5]
+        commit, _ = self.commits[0]
+        store.append(
+            commit._replace(email="new@x.com"), [GitDiffEntry("1", "0", "new.txt")]
+        )
+        assert list(store)[-1][0].email == "new@x.com"
+        # The string tables of the sliced store are not changed.
+        assert (len(self.store._emails), len(self.store._paths)) == (n_emails, n_paths)
+        assert list(self.store) == self.commits
+
+    def test_record(self):
+        store = HistoryStore()
+        commits = [(commit, iter(git_diff)) for commit, git_diff in self.commits]
+        assert list(store.record(commits)) == self.commits
+        assert list(store) == self.commits
+
+    def test_memory(self):
+        # The commits are generated while tracing, like when parsing the output of git.
+        tracemalloc.start()
+        rows = build_commits(200, 50)
+        rows_size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del rows
+
+        tracemalloc.start()
+        store = HistoryStore()
+        for commit, git_diff in iter_commits(200, 50):
+            store.append(commit, git_diff)
+        store_size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        assert store_size * 5 < rows_size
+        assert store.nbytes == 4 * (3 * 200 + 1 + 3 * 200 * 50) + 8 * 200 + 200 * 50
@@ -0,0 +1,101 @@
+from git_loc.domains.ignore import IgnoreMatcher
+
+
+class TestIgnoreMatcher:
+    def test_substrings(self):
+        matcher = IgnoreMatcher(substrings=("package-lock.json", "cassettes"))
+        assert matcher.is_ignored("package-lock.json")
+        assert matcher.is_ignored("frontend/package-lock.json")
+        assert matcher.is_ignored("tests/cassettes/test_x.yaml")
+        assert not matcher.is_ignored("package.json")
+
+    def test_substrings_special_chars(self):
+        matcher = IgnoreMatcher(substrings=("a.b", "(x)"))
+        assert matcher.is_ignored("dir/a.b")
+        assert not matcher.is_ignored("dir/axb")
+        assert matcher.is_ignored("dir/(x)/y")
+
+    def test_globs(self):
+        matcher = IgnoreMatcher(globs=("*.lock", "/vendor/", "gen/**/*_pb2.py"))
+        assert matcher.is_ignored("poetry.lock")
+        assert matcher.is_ignored("a/b/poetry.lock")
+        assert not matcher.is_ignored("a/b/poetry.locked")
+        assert matcher.is_ignored("vendor/lib/x.go")
+        assert not matcher.is_ignored("src/vendor/lib/x.go")
+        assert matcher.is_ignored("gen/x_pb2.py")
+        assert matcher.is_ignored("gen/a/b/x_pb2.py")
+        assert not matcher.is_ignored("src/gen/x_pb2.py")
+
+    def test_globs_dir_at_any_depth(self):
+        matcher = IgnoreMatcher(globs=("node_modules/",))
+        assert matcher.is_ignored("node_modules/a.js")
+        assert matcher.is_ignored("web/node_modules/a/b.js")
+        assert not matcher.is_ignored("web/node_modules.js")
+
+    def test_globs_negated(self):
+        matcher = IgnoreMatcher(globs=("*.json", "!package.json"))
+        assert matcher.is_ignored("a/b.json")
+        assert not matcher.is_ignored("a/package.json")
+        assert not matcher.is_ignored("a/b.py")
+
+    def test_globs_char_class(self):
+        matcher = IgnoreMatcher(globs=("file[0-9].txt", "x[!a].txt"))
+        assert matcher.is_ignored("file1.txt")
+        assert not matcher.is_ignored("filea.txt")
+        assert matcher.is_ignored("xb.txt")
+        assert not matcher.is_ignored("xa.txt")
+
+    def test_globs_char_class_negated(self):
+        matcher = IgnoreMatcher(globs=("[!a]",))
+        assert matcher.is_ignored("b")
+        assert matcher.is_ignored("dir/b")
+        assert not matcher.is_ignored("a")
+        matcher = IgnoreMatcher(globs=("y[^0-9]z",))
+        assert matcher.is_ignored("yxz")
+        assert not matcher.is_ignored("y1z")
+        # A negated class does not match the `/` between dirs.
+        assert not matcher.is_ignored("y/z")
+
+    def test_globs_char_class_special_chars(self):
+        matcher = IgnoreMatcher(globs=("a[\\]b", "c[]]d", "e[!]]f", "g[[]h"))
+        assert matcher.is_ignored("a\\b")
+        assert not matcher.is_ignored("a]b")
+        assert matcher.is_ignored("c]d")
+        assert matcher.is_ignored("exf")
+        assert not matcher.is_ignored("e]f")
+        assert matcher.is_ignored("g[h")
+
+    def test_globs_escaped(self):
+        matcher = IgnoreMatcher(globs=("\\*.txt", "\\!keep", "x\\[1]"))
+        assert matcher.is_ignored("*.txt")
+        assert matcher.is_ignored("dir/*.txt")
+        assert not matcher.is_ignored("a.txt")
+        # Not a negated pattern.
+        assert matcher.is_ignored("!keep")
+        assert matcher.is_ignored("x[1]")
+        assert not matcher.is_ignored("x1")
+
+    def test_globs_unclosed_bracket(self):
+        matcher = IgnoreMatcher(globs=("a[b", "[!c"))
+        assert matcher.is_ignored("a[b")
+        assert not matcher.is_ignored("ab")
+        assert matcher.is_ignored("[!c")
+
+    def test_from_file(self, tmp_path):
+        path = tmp_path / ".locignore"
+        path.write_text("# Lockfiles.\n*.lock\n\n!keep.lock\n")
+        matcher = IgnoreMatcher.from_file(path, substrings=("cassettes",))
+        assert matcher.globs == ("*.lock", "!keep.lock")
+        assert matcher.is_ignored("poetry.lock")
+        assert not matcher.is_ignored("keep.lock")
+        assert matcher.is_ignored("cassettes/a.yaml")
+
+    def test_empty(self):
+        matcher = IgnoreMatcher()
+        assert not matcher
+        assert not matcher.is_ignored("a.txt")
+
+    def test_memoized(self):
+        matcher = IgnoreMatcher(substrings=("a",))
+        matcher.is_ignored("a.txt")
+        assert matcher._cache == {"a.txt": True}
@@ -1,13 +1,28 @@
+import asyncio
 from datetime import datetime
 
 import pytest
 
-from git_loc.clients.git_client import NotADate
+from git_loc.clients.git_client import GitClient, NotADate
+from git_loc.domains.aggregators import AuthorAggregator, LocStats, PathAggregator
+from git_loc.domains.checkpoint import Checkpoint
+from git_loc.domains.history_store import HistoryStore
 from git_loc.domains.main import (
+    STRATEGIES,
+    STRATEGY_LOG_NUMSTAT,
+    AggregatorsNotSupportedWithCheckpoint,
     AuthorMismatch,
     EndDateMismatch,
     LocCounter,
     StartDateMismatch,
+    UnknownStrategy,
+)
+from git_loc.utils.profiler import (
+    STAGE_GIT_DIFF,
+    STAGE_GIT_LOG,
+    STAGE_IGNORE,
+    STAGE_PARSE,
+    Profiler,
 )
 
 from ..testfactories.git_log_factory import (
@@ -15,7 +30,10 @@ from ..testfactories.git_log_factory import (
     GitDiffFactory,
     GitLogEntry,
     GitLogFactory,
+    GitLogNumstatFactory,
 )
+from ..testfactories.git_repo_factory import GitRepoCommit, GitRepoFactory
+from ..testutils.settings_testutils import override_settings
 
 
 class TestLocCounter:
@@ -140,6 +158,35 @@ class TestLocCounter:
             )
         assert loc_tot == 26
 
+    def test_ignored_glob(self):
+        git_diff_entry3 = GitDiffEntry(
+            insertions="1",
+            deletions="9",
+            path="frontend/yarn.lock",
+        )
+        git_diff_entry4 = GitDiffEntry(
+            insertions="1",
+            deletions="11",
+            path="vendor/lib/x.go",
+        )
+        counter = LocCounter(root_dir="/tmp")
+        with GitLogFactory((self.git_log_entry1,)), GitDiffFactory(
+            (
+                self.git_diff_entry1,
+                self.git_diff_entry2,
+                git_diff_entry3,
+                git_diff_entry4,
+            )
+        ):
+            loc_tot = counter.count(
+                branch="master",
+                start_date=self.start_date,
+                end_date=self.end_date,
+                author="john",
+                globs_to_ignore=("*.lock", "/vendor/"),
+            )
+        assert loc_tot == 26
+
     def test_author_mismatch(self):
         counter = LocCounter(root_dir="/tmp")
         with GitLogFactory((self.git_log_entry1,)), GitDiffFactory(
@@ -209,3 +256,480 @@ class TestLocCounter:
                     author="john",
                     # files_to_ignore=("package-lock.json", ".gitignore"),
                 )
+
+
+class TestLocCounterLogNumstatStrategy:
+    def setup_method(self):
+        self.git_log_entry1 = GitLogEntry(
+            hash="1111111",
+            date="2020-02-10",
+            email="john@gmail.com",
+            summary="NEW Enable CORS for qa.mierecensioni.it (HEAD -> master, origin/master)",
+        )
+        self.git_log_entry2 = GitLogEntry(
+            hash="2222222",
+            date="2020-02-11",
+            email="john@gmail.com",
+            summary="NEW Answer model",
+        )
+        self.git_diff_entry1 = GitDiffEntry(
+            insertions="10",
+            deletions="2",
+            path="/tmp1",
+        )
+        self.git_diff_entry2 = GitDiffEntry(
+            insertions="11",
+            deletions="3",
+            path="/tmp2",
+        )
+        self.start_date = datetime(2020, 2, 1)
+        self.end_date = datetime(2020, 3, 1)
+
+    def test_happy_flow(self):
+        counter = LocCounter(root_dir="/tmp")
+        with GitLogNumstatFactory(
+            ((self.git_log_entry1, (self.git_diff_entry1, self.git_diff_entry2)),)
+        ):
+            loc_tot = counter.count(
+                branch="master",
+                start_date=self.start_date,
+                end_date=self.end_date,
+                author="john",
+                strategy=STRATEGY_LOG_NUMSTAT,
+            )
+        assert loc_tot == 26
+
+    def test_same_tot_as_diff_strategy(self):
+        git_diff_entry3 = GitDiffEntry(
+            insertions="-",
+            deletions="-",
+            path="/tmp/package-lock.json",
+        )
+        git_diff_entries = (self.git_diff_entry1, self.git_diff_entry2, git_diff_entry3)
+        counter = LocCounter(root_dir="/tmp")
+        with GitLogFactory((self.git_log_entry1, self.git_log_entry2)), GitDiffFactory(
+            git_diff_entries
+        ):
+            loc_tot_diff = counter.count(
+                branch="master",
+                files_to_ignore=("/tmp2",),
+            )
+        with GitLogNumstatFactory(
+            (
+                (self.git_log_entry1, git_diff_entries),
+                (self.git_log_entry2, git_diff_entries),
+            )
+        ):
+            loc_tot_log_numstat = counter.count(
+                branch="master",
+                files_to_ignore=("/tmp2",),
+                strategy=STRATEGY_LOG_NUMSTAT,
+            )
+        assert loc_tot_diff == loc_tot_log_numstat == 24
+
+    def test_author_mismatch(self):
+        counter = LocCounter(root_dir="/tmp")
+        with GitLogNumstatFactory(
+            ((self.git_log_entry1, (self.git_diff_entry1, self.git_diff_entry2)),)
+        ):
+            with pytest.raises(AuthorMismatch):
+                counter.count(
+                    branch="master",
+                    author="XXX",
+                    strategy=STRATEGY_LOG_NUMSTAT,
+                )
+
+    def test_unknown_strategy(self):
+        counter = LocCounter(root_dir="/tmp")
+        with pytest.raises(UnknownStrategy):
+            counter.count(branch="master", strategy="XXX")
+
+
+class TestLocCounterJobs:
+    def setup_method(self):
+        self.git_log_entries = [
+            GitLogEntry(
+                hash=f"{i:07d}",
+                date="2020-02-10",
+                email="john@gmail.com",
+                summary=f"Commit {i}",
+            )
+            for i in range(20)
+        ]
+        self.git_diff_entry1 = GitDiffEntry(
+            insertions="10",
+            deletions="2",
+            path="/tmp1",
+        )
+        self.git_diff_entry2 = GitDiffEntry(
+            insertions="11",
+            deletions="3",
+            path="/tmp2",
+        )
+
+    def test_happy_flow(self):
+        counter = LocCounter(root_dir="/tmp")
+        with GitLogFactory(self.git_log_entries), GitDiffFactory(
+            (self.git_diff_entry1, self.git_diff_entry2)
+        ):
+            loc_tot = counter.count(branch="master", jobs=4)
+        assert loc_tot == 26 * 20
+
+    def test_order(self):
+        # The fake `git diff` sleeps a different time for each hash, then outputs
+        #  the hash as path.
+        diff_bin = "f() { sleep 0.0$(( 1$5 % 7 )) ; printf '1\\t1\\t%s\\0' $5 ; } ; f"
+        counter = LocCounter(root_dir="/tmp")
+        with GitLogFactory(self.git_log_entries), override_settings(
+            GIT_DIFF_BIN=diff_bin
+        ):
+            commits_with_diffs = counter._iter_commits_with_diffs(
+                GitClient("/tmp"), branch="master", jobs=4
+            )
+            result = [
+                (c.hash, [d.path for d in diffs]) for c, diffs in commits_with_diffs
+            ]
+        assert result == [(x.hash, [x.hash]) for x in self.git_log_entries]
+
+    @pytest.mark.parametrize("strategy", STRATEGIES)
+    @override_settings(LOG_SHARD_SIZE=2)
+    def test_log_shards(self, tmp_path, strategy):
+        commits = [
+            GitRepoCommit("john@gmail.com", f"2020-02-{10 + i}", {"a.txt": "a\n" * i})
+            for i in range(1, 8)
+        ]
+        with GitRepoFactory(tmp_path, commits) as root_dir:
+            counter = LocCounter(root_dir=root_dir)
+            kwargs = dict(branch="master", strategy=strategy, do_use_cache=False)
+            loc_tot = counter.count(jobs=1, **kwargs)
+            sharded_loc_tot = counter.count(jobs=3, **kwargs)
+        assert sharded_loc_tot == loc_tot > 0
+
+
+class TestLocCounterCache:
+    def setup_method(self):
+        self.commits = (
+            GitRepoCommit("john@gmail.com", "2020-02-10", {"a.txt": "a\nb\n"}),
+            GitRepoCommit("john@gmail.com", "2020-02-11", {"a.txt": "a\nc\nd\n"}),
+            GitRepoCommit("john@gmail.com", "2020-02-12", {"b.txt": "b\n"}),
+        )
+
+    def test_happy_flow(self, tmp_path):
+        with GitRepoFactory(tmp_path / "repo", self.commits) as root_dir:
+            counter = LocCounter(root_dir=root_dir)
+            with override_settings(
+                CACHE_DIR=str(tmp_path / "cache"), DO_USE_DIFF_CACHE=True
+            ):
+                loc_tot = counter.count(branch="master")
+            # Now `git diff` fails, but the numstat is read from the cache.
+            with override_settings(
+                CACHE_DIR=str(tmp_path / "cache"),
+                DO_USE_DIFF_CACHE=True,
+                GIT_DIFF_BIN="/usr/bin/false",
+            ):
+                loc_tot_cached = counter.count(branch="master")
+        assert loc_tot == loc_tot_cached == 4
+
+    def test_no_cache(self, tmp_path):
+        with GitRepoFactory(tmp_path / "repo", self.commits) as root_dir:
+            counter = LocCounter(root_dir=root_dir)
+            with override_settings(
+                CACHE_DIR=str(tmp_path / "cache"), DO_USE_DIFF_CACHE=True
+            ):
+                counter.count(branch="master", do_use_cache=False)
+        assert not (tmp_path / "cache").exists()
+
+
+class TestLocCounterCheckpoint:
+    def setup_method(self):
+        self.commits = (
+            GitRepoCommit("john@gmail.com", "2020-02-10", {"a.txt": "a\nb\n"}),
+            GitRepoCommit("john@gmail.com", "2020-02-11", {"a.txt": "a\nc\nd\n"}),
+        )
+        self.new_commit = GitRepoCommit(
+            "john@gmail.com", "2020-02-12", {"b.txt": "b\nc\n"}
+        )
+
+    def test_happy_flow(self, tmp_path):
+        repo_factory = GitRepoFactory(tmp_path / "repo", self.commits)
+        with repo_factory as root_dir, override_settings(
+            CACHE_DIR=str(tmp_path / "cache")
+        ):
+            counter = LocCounter(root_dir=root_dir)
+            loc_tot = counter.count(branch="master", do_use_checkpoint=True)
+            tip = repo_factory._git("rev-parse", "HEAD").strip()
+            repo_factory.add_commit(self.new_commit)
+            rev, loc_tot_checkpoint = counter._get_incremental_rev(
+                GitClient(root_dir),
+                Checkpoint(tip=tip, loc_tot=loc_tot),
+                GitClient(root_dir).rev_parse("master"),
+            )
+            loc_tot_incremental = counter.count(branch="master", do_use_checkpoint=True)
+            loc_tot_full = counter.count(branch="master")
+        assert loc_tot == 3
+        assert rev.startswith(f"{tip}..")
+        assert loc_tot_checkpoint == 3
+        assert loc_tot_incremental == loc_tot_full == 5
+
+    def test_history_rewritten(self, tmp_path):
+        repo_factory = GitRepoFactory(tmp_path / "repo", self.commits)
+        with repo_factory as root_dir, override_settings(
+            CACHE_DIR=str(tmp_path / "cache")
+        ):
+            counter = LocCounter(root_dir=root_dir)
+            counter.count(branch="master", do_use_checkpoint=True)
+            # Rewrite the last commit, like before a force push.
+            repo_factory._git("reset", "-q", "--hard", "HEAD~1")
+            repo_factory.add_commit(self.new_commit)
+            loc_tot_incremental = counter.count(branch="master", do_use_checkpoint=True)
+            loc_tot_full = counter.count(branch="master")
+        assert loc_tot_incremental == loc_tot_full == 2
+
+    def test_different_options(self, tmp_path):
+        with GitRepoFactory(tmp_path / "repo", self.commits) as root_dir:
+            with override_settings(CACHE_DIR=str(tmp_path / "cache")):
+                counter = LocCounter(root_dir=root_dir)
+                counter.count(branch="master", do_use_checkpoint=True)
+                loc_tot = counter.count(
+                    branch="master",
+                    files_to_ignore=("a.txt",),
+                    do_use_checkpoint=True,
+                )
+        assert loc_tot == 0
+
+
+class TestLocCounterPaths:
+    def setup_method(self):
+        self.commits = (
+            GitRepoCommit(
+                "john@gmail.com",
+                "2020-02-10",
+                {"src/a.py": "a\nb\n", "docs/b.md": "b\n", "src/c.lock": "c\n"},
+            ),
+            GitRepoCommit("john@gmail.com", "2020-02-11", {"docs/b.md": "c\nd\n"}),
+            GitRepoCommit("john@gmail.com", "2020-02-12", {"src/a.py": "a\nc\n"}),
+        )
+
+    # The diff strategy ignores the root commit.
+    @pytest.mark.parametrize(
+        "strategy, expected", (("diff", 2), (STRATEGY_LOG_NUMSTAT, 4))
+    )
+    def test_happy_flow(self, tmp_path, strategy, expected):
+        with GitRepoFactory(tmp_path, self.commits) as root_dir:
+            counter = LocCounter(root_dir=root_dir)
+            loc_tot = counter.count(
+                branch="master",
+                paths=("src",),
+                paths_to_exclude=("*.lock",),
+                strategy=strategy,
+            )
+            loc_tot_ignored = counter.count(
+                branch="master",
+                globs_to_ignore=("docs/", "*.lock"),
+                strategy=strategy,
+            )
+        assert loc_tot == loc_tot_ignored == expected
+
+    def test_checkpoint(self, tmp_path):
+        with GitRepoFactory(tmp_path / "repo", self.commits) as root_dir:
+            with override_settings(CACHE_DIR=str(tmp_path / "cache")):
+                counter = LocCounter(root_dir=root_dir)
+                counter.count(branch="master", do_use_checkpoint=True)
+                loc_tot = counter.count(
+                    branch="master", paths=("docs",), do_use_checkpoint=True
+                )
+        assert loc_tot == 3
+
+
+class TestLocCounterAsync:
+    def setup_method(self):
+        self.commits = (
+            GitRepoCommit("john@gmail.com", "2020-02-10", {"a.py": "a\n"}),
+            GitRepoCommit("john@gmail.com", "2020-02-11", {"a.py": "a\nb\n"}),
+            GitRepoCommit("mary@gmail.com", "2020-02-12", {"b.lock": "c\nd\n"}),
+            GitRepoCommit("mary@gmail.com", "2020-02-13", {"c.py": "e\n"}),
+        )
+
+    @pytest.mark.parametrize("strategy", STRATEGIES)
+    def test_same_as_count(self, tmp_path, strategy):
+        with GitRepoFactory(tmp_path, self.commits) as root_dir:
+            counter = LocCounter(root_dir=root_dir)
+            kwargs = dict(
+                branch="master", globs_to_ignore=("*.lock",), strategy=strategy
+            )
+            expected = counter.count(**kwargs)
+            actual = asyncio.run(counter.count_async(**kwargs))
+        assert actual == expected
+        assert actual == (3 if strategy == STRATEGY_LOG_NUMSTAT else 2)
+
+    def test_many_counts(self, tmp_path):
+        async def count_all(counter: LocCounter) -> tuple[list[int], AuthorAggregator]:
+            # A single git process for all the counts.
+            semaphore = asyncio.Semaphore(1)
+            aggregator = AuthorAggregator()
+            counts = await asyncio.gather(
+                counter.count_async(branch="master", semaphore=semaphore),
+                counter.count_async(
+                    branch="master", semaphore=semaphore, aggregators=[aggregator]
+                ),
+                counter.count_async(
+                    branch="master", author="mary", semaphore=semaphore
+                ),
+            )
+            return counts, aggregator
+
+        with GitRepoFactory(tmp_path, self.commits) as root_dir:
+            counts, aggregator = asyncio.run(count_all(LocCounter(root_dir=root_dir)))
+        assert counts == [4, 4, 3]
+        assert dict(aggregator.get_sorted_stats())["mary@gmail.com"].loc == 3
+
+
+class TestLocCounterStore:
+    def setup_method(self):
+        self.commits = (
+            GitRepoCommit("john@gmail.com", "2020-02-10", {"a.py": "a\n"}),
+            GitRepoCommit("john@gmail.com", "2020-02-11", {"a.py": "a\nb\n"}),
+            GitRepoCommit("mary@gmail.com", "2020-02-12", {"b.lock": "c\nd\n"}),
+            GitRepoCommit("mary@gmail.com", "2020-02-13", {"c.py": "e\n"}),
+        )
+
+    def test_happy_flow(self, tmp_path):
+        store = HistoryStore()
+        with GitRepoFactory(tmp_path, self.commits) as root_dir:
+            counter = LocCounter(root_dir=root_dir)
+            expected = counter.count(
+                branch="master", strategy=STRATEGY_LOG_NUMSTAT, store=store
+            )
+        assert len(store) == 4
+        assert counter.count_store(store) == expected == 5
+
+    def test_filters(self, tmp_path):
+        store = HistoryStore()
+        with GitRepoFactory(tmp_path, self.commits) as root_dir:
+            counter = LocCounter(root_dir=root_dir)
+            counter.count(branch="master", strategy=STRATEGY_LOG_NUMSTAT, store=store)
+            expected = counter.count(
+                branch="master", author="mary", globs_to_ignore=("*.lock",)
+            )
+        aggregator = AuthorAggregator()
+        actual = counter.count_store(
+            store, author="mary", globs_to_ignore=("*.lock",), aggregators=[aggregator]
+        )
+        assert actual == expected == 1
+        assert dict(aggregator.get_sorted_stats())["mary@gmail.com"].loc == 1
+        actual = counter.count_store(
+            store, start_date=datetime(2020, 2, 11), end_date=datetime(2020, 2, 12)
+        )
+        assert actual == 3
+
+
+class TestLocCounterProfile:
+    def setup_method(self):
+        self.commits = (
+            GitRepoCommit("john@gmail.com", "2020-02-10", {"a.py": "a\n"}),
+            GitRepoCommit("john@gmail.com", "2020-02-11", {"a.py": "a\nb\n"}),
+            GitRepoCommit("mary@gmail.com", "2020-02-12", {"b.lock": "c\n"}),
+        )
+
+    @pytest.mark.parametrize("jobs", (1, 2))
+    def test_happy_flow(self, tmp_path, jobs):
+        with GitRepoFactory(tmp_path, self.commits) as root_dir:
+            with Profiler() as profiler:
+                LocCounter(root_dir=root_dir).count(
+                    branch="master",
+                    globs_to_ignore=("*.lock",),
+                    jobs=jobs,
+                    do_use_cache=False,
+                    profiler=profiler,
+                )
+        report = profiler.report()
+        stages = {x.name: x for x in report.stages}
+        assert {STAGE_GIT_LOG, STAGE_GIT_DIFF, STAGE_PARSE, STAGE_IGNORE} <= set(stages)
+        assert stages[STAGE_GIT_DIFF].n_calls >= 3
+        # 1 git log and 3 git diff processes (and 1 git rev-list, with the log in
+        #  shards).
+        assert report.n_git_processes == (4 if jobs == 1 else 5)
+        assert report.git_bytes_read > 0
+        assert report.tracemalloc_peak_bytes > 0
+
+    def test_log_numstat_strategy(self, tmp_path):
+        with GitRepoFactory(tmp_path, self.commits) as root_dir:
+            with Profiler(do_trace_memory=False) as profiler:
+                LocCounter(root_dir=root_dir).count(
+                    branch="master", strategy=STRATEGY_LOG_NUMSTAT, profiler=profiler
+                )
+        report = profiler.report()
+        assert report.n_git_processes == 1
+        assert STAGE_GIT_DIFF not in {x.name for x in report.stages}
+
+
+class TestLocCounterGroupByAuthor:
+    def setup_method(self):
+        self.git_log_entries = (
+            GitLogEntry(
+                hash="1111111",
+                date="2020-02-10",
+                email="john@gmail.com",
+                summary="NEW Answer model",
+            ),
+            GitLogEntry(
+                hash="2222222",
+                date="2020-02-11",
+                email="jane@gmail.com",
+                summary="NEW Answer model",
+            ),
+            GitLogEntry(
+                hash="3333333",
+                date="2020-02-12",
+                email="John@gmail.com",
+                summary="NEW Answer model",
+            ),
+        )
+        self.git_diff_entries = (
+            GitDiffEntry(insertions="10", deletions="2", path="/tmp1"),
+            GitDiffEntry(insertions="-", deletions="-", path="/tmp2"),
+            GitDiffEntry(insertions="1", deletions="1", path="/package-lock.json"),
+        )
+
+    def test_happy_flow(self):
+        counter = LocCounter(root_dir="/tmp")
+        aggregator = AuthorAggregator()
+        with GitLogFactory(self.git_log_entries), GitDiffFactory(self.git_diff_entries):
+            loc_tot = counter.count(
+                branch="master",
+                files_to_ignore=("package-lock.json",),
+                aggregators=(aggregator,),
+            )
+        assert loc_tot == 36
+        assert aggregator.get_sorted_stats() == [
+            ("john@gmail.com", LocStats(insertions=20, deletions=4, commits=2)),
+            ("jane@gmail.com", LocStats(insertions=10, deletions=2, commits=1)),
+        ]
+
+    def test_group_by_path(self):
+        counter = LocCounter(root_dir="/tmp")
+        aggregator = PathAggregator()
+        with GitLogFactory(self.git_log_entries), GitDiffFactory(self.git_diff_entries):
+            loc_tot = counter.count(
+                branch="master",
+                files_to_ignore=("package-lock.json",),
+                aggregators=(aggregator,),
+                output_format="none",
+            )
+        assert loc_tot == 36
+        assert aggregator.get_top_stats(1) == [
+            ("/tmp1", LocStats(insertions=30, deletions=6, commits=3)),
+        ]
+        assert aggregator.get_top_stats()[1] == (
+            "/tmp2",
+            LocStats(insertions=0, deletions=0, commits=3),
+        )
+
+    def test_checkpoint(self):
+        counter = LocCounter(root_dir="/tmp")
+        with pytest.raises(AggregatorsNotSupportedWithCheckpoint):
+            counter.count(
+                branch="master",
+                do_use_checkpoint=True,
+                aggregators=(AuthorAggregator(),),
+            )
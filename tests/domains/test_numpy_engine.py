@@ -0,0 +1,227 @@
+import io
+import sys
+from datetime import datetime
+
+import pytest
+
+from git_loc.clients.git_client import GitDiffEntry, GitLogEntry
+from git_loc.domains.aggregators import (
+    AuthorAggregator,
+    BaseAggregator,
+    BucketAggregator,
+    PathAggregator,
+)
+from git_loc.domains.history_store import HistoryStore
+from git_loc.domains.main import (
+    ENGINE_NUMPY,
+    ENGINE_PYTHON,
+    STRATEGY_LOG_NUMSTAT,
+    AuthorMismatch,
+    EndDateMismatch,
+    LocCounter,
+    StartDateMismatch,
+)
+from git_loc.domains.numpy_engine import NumpyNotInstalled
+from git_loc.domains.writers import FORMAT_JSONL, FORMAT_NONE
+
+from ..testfactories.git_log_factory import GitLogNumstatFactory
+from ..testfactories.git_repo_factory import GitRepoCommit, GitRepoFactory
+from .test_history_store import build_commits
+
+pytest.importorskip("numpy")
+
+
+class CommitsAggregator(BaseAggregator):
+    is_per_file = True
+
+    def __init__(self):
+        # An aggregator with no `add_stats`.
+        self.commits = list()
+        self.n_files = 0
+
+    def add_commit(self, commit, insertions, deletions):
+        self.commits.append((commit.hash, insertions, deletions))
+
+    def add_file(self, commit, path, insertions, deletions):
+        self.n_files += 1
+
+
+def build_aggregators() -> list:
+    return [
+        AuthorAggregator(aliases={"a2@x.com": "a0@x.com"}),
+        BucketAggregator("week"),
+        PathAggregator(),
+        CommitsAggregator(),
+    ]
+
+
+class TestCountStoreNumpy:
+    def setup_method(self):
+        self.store = HistoryStore()
+        for commit, git_diff in build_commits(60, 15):
+            self.store.append(commit, git_diff)
+        # A commit with no files.
+        self.store.append(build_commits(1, 0)[0][0], [])
+
+    @pytest.mark.parametrize(
+        "options",
+        (
+            dict(),
+            dict(author="a1"),
+            dict(author="XXX"),
+            dict(start_date=datetime(2020, 2, 5), end_date=datetime(2020, 2, 20)),
+            dict(files_to_ignore=("dir3/",), globs_to_ignore=("*.png", "file1*")),
+            dict(author="a2", globs_to_ignore=("*",)),
+        ),
+    )
+    def test_same_as_python(self, options):
+        counter = LocCounter("/tmp")
+        aggregators = build_aggregators()
+        expected = counter.count_store(
+            self.store, aggregators=aggregators, output_format=FORMAT_NONE, **options
+        )
+        numpy_aggregators = build_aggregators()
+        loc_tot = counter.count_store(
+            self.store,
+            aggregators=numpy_aggregators,
+            output_format=FORMAT_NONE,
+            engine=ENGINE_NUMPY,
+            **options,
+        )
+
+        assert loc_tot == expected
+        author, bucket, path, commits = aggregators
+        numpy_author, numpy_bucket, numpy_path, numpy_commits = numpy_aggregators
+        assert numpy_author.get_sorted_stats() == author.get_sorted_stats()
+        assert numpy_bucket.get_records() == bucket.get_records()
+        assert numpy_path.get_top_stats() == path.get_top_stats()
+        assert numpy_commits.commits == commits.commits
+        assert numpy_commits.n_files == commits.n_files
+
+    def test_writer(self):
+        counter = LocCounter("/tmp")
+        expected = io.StringIO()
+        counter.count_store(
+            self.store,
+            author="a0",
+            globs_to_ignore=("*.png",),
+            output_format=FORMAT_JSONL,
+            output=expected,
+        )
+        output = io.StringIO()
+        counter.count_store(
+            self.store,
+            author="a0",
+            globs_to_ignore=("*.png",),
+            output_format=FORMAT_JSONL,
+            output=output,
+            engine=ENGINE_NUMPY,
+        )
+        assert output.getvalue() == expected.getvalue()
+
+    def test_empty_store(self):
+        assert (
+            LocCounter("/tmp").count_store(
+                HistoryStore(),
+                author="a0",
+                aggregators=build_aggregators(),
+                output_format=FORMAT_NONE,
+                engine=ENGINE_NUMPY,
+            )
+            == 0
+        )
+
+    def test_numpy_not_installed(self, monkeypatch):
+        monkeypatch.setitem(sys.modules, "numpy", None)
+        with pytest.raises(NumpyNotInstalled):
+            LocCounter("/tmp").count_store(self.store, engine=ENGINE_NUMPY)
+
+
+class TestCountNumpy:
+    def test_same_as_python(self, tmp_path):
+        commits = (
+            GitRepoCommit("john@gmail.com", "2020-02-10", {"a.txt": "a\nb\n"}),
+            GitRepoCommit(
+                "mary@gmail.com", "2020-02-11", {"a.txt": "a\nc\n", "b.bin": b"\0"}
+            ),
+            GitRepoCommit("john@gmail.com", "2020-02-12", {"c.lock": "c\n"}),
+        )
+        with GitRepoFactory(tmp_path, commits) as root_dir:
+            counter = LocCounter(root_dir)
+            results = list()
+            for engine in ("python", ENGINE_NUMPY):
+                store = HistoryStore()
+                aggregators = build_aggregators()
+                loc_tot = counter.count(
+                    branch="master",
+                    author="john",
+                    globs_to_ignore=("*.lock",),
+                    strategy=STRATEGY_LOG_NUMSTAT,
+                    aggregators=aggregators,
+                    output_format=FORMAT_NONE,
+                    store=store,
+                    engine=engine,
+                )
+                results.append(
+                    (loc_tot, aggregators[0].get_sorted_stats(), list(store))
+                )
+        assert results[0] == results[1]
+        assert results[1][0] == 2
+
+    @pytest.mark.parametrize(
+        "filters",
+        (
+            dict(author="john", start_date=datetime(2020, 2, 11)),
+            dict(author="mary", end_date=datetime(2020, 2, 11)),
+            dict(start_date=datetime(2020, 2, 11), end_date=datetime(2020, 2, 12)),
+        ),
+    )
+    @pytest.mark.parametrize("strategy", ("diff", STRATEGY_LOG_NUMSTAT))
+    def test_filters(self, tmp_path, filters, strategy):
+        commits = (
+            GitRepoCommit("john@gmail.com", "2020-02-10", {"a.txt": "a\nb\n"}),
+            GitRepoCommit("mary@gmail.com", "2020-02-11", {"a.txt": "a\nc\n"}),
+            GitRepoCommit("john@gmail.com", "2020-02-12", {"b.txt": "b\n"}),
+            GitRepoCommit("john@gmail.com", "2020-02-13", {"c.txt": "c\n"}),
+        )
+        with GitRepoFactory(tmp_path, commits) as root_dir:
+            counter = LocCounter(root_dir)
+            loc_tots = [
+                counter.count(
+                    branch="master",
+                    strategy=strategy,
+                    do_use_cache=False,
+                    output_format=FORMAT_NONE,
+                    engine=engine,
+                    **filters,
+                )
+                for engine in (ENGINE_PYTHON, ENGINE_NUMPY)
+            ]
+        assert loc_tots[0] == loc_tots[1]
+        assert loc_tots[1] > 0
+
+    @pytest.mark.parametrize(
+        "filters, exception",
+        (
+            (dict(author="mary"), AuthorMismatch),
+            (dict(start_date=datetime(2020, 2, 11)), StartDateMismatch),
+            (dict(end_date=datetime(2020, 2, 9)), EndDateMismatch),
+        ),
+    )
+    @pytest.mark.parametrize("engine", (ENGINE_PYTHON, ENGINE_NUMPY))
+    def test_mismatch(self, filters, exception, engine):
+        # The commits returned by git are checked, not filtered again.
+        git_log_entry = GitLogEntry(
+            hash="1111111", date="2020-02-10", email="john@gmail.com", summary="S"
+        )
+        with GitLogNumstatFactory(
+            ((git_log_entry, (GitDiffEntry("10", "2", "/tmp1"),)),)
+        ):
+            with pytest.raises(exception):
+                LocCounter("/tmp").count(
+                    branch="master",
+                    strategy=STRATEGY_LOG_NUMSTAT,
+                    output_format=FORMAT_NONE,
+                    engine=engine,
+                    **filters,
+                )
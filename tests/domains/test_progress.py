@@ -0,0 +1,111 @@
+import io
+import json
+import threading
+import time
+
+from git_loc.clients.git_client import get_n_git_processes_running
+from git_loc.domains.main import STRATEGY_LOG_NUMSTAT, LocCounter
+from git_loc.domains.progress import Progress, ProgressSnapshot
+from git_loc.domains.writers import FORMAT_NONE
+from git_loc.utils.printer import ConsoleAdapter
+
+from ..testfactories.git_repo_factory import GitRepoCommit, GitRepoFactory
+from ..testutils.settings_testutils import override_settings
+
+
+class TestProgress:
+    def test_lines(self):
+        output = io.StringIO()
+        progress = Progress(ConsoleAdapter(file=output), is_tty=False)
+        with override_settings(DO_SUPPRESS_PRINT=False, PROGRESS_LOG_INTERVAL_S=60):
+            progress.start(lambda: 4)
+            assert list(progress.track("abc")) == ["a", "b", "c"]
+            progress.stop()
+
+        # Only the last line: the interval did not elapse.
+        lines = [json.loads(x) for x in output.getvalue().splitlines()]
+        assert len(lines) == 1
+        assert lines[0]["type"] == "progress"
+        assert lines[0]["commits"] == 3
+        assert lines[0]["total"] == 4
+        assert lines[0]["eta_s"] >= 0
+        assert set(lines[0]) == {
+            "type",
+            "commits",
+            "total",
+            "elapsed_s",
+            "commits_per_s",
+            "git_processes",
+            "eta_s",
+        }
+
+    def test_total_error(self):
+        output = io.StringIO()
+        progress = Progress(ConsoleAdapter(file=output), is_tty=False)
+        with override_settings(DO_SUPPRESS_PRINT=False):
+            # The total is only for the ETA: the error is not raised.
+            progress.start(lambda: 1 / 0)
+            progress.stop()
+        assert progress.total is None
+        assert json.loads(output.getvalue().splitlines()[-1])["eta_s"] is None
+
+    def test_total_not_known(self):
+        output = io.StringIO()
+        progress = Progress(ConsoleAdapter(file=output), is_tty=False)
+        is_count_done = threading.Event()
+
+        def get_total():
+            # Like a `git rev-list --count` slower than the count.
+            is_count_done.wait(5)
+            return 4
+
+        with override_settings(DO_SUPPRESS_PRINT=False, PROGRESS_TOTAL_TIMEOUT_S=0.1):
+            progress.start(get_total)
+            assert list(progress.track("abc")) == ["a", "b", "c"]
+            t0 = time.monotonic()
+            progress.stop()
+            is_count_done.set()
+        assert time.monotonic() - t0 < 2
+        assert progress.total is None
+        line = json.loads(output.getvalue().splitlines()[-1])
+        assert (line["commits"], line["total"], line["eta_s"]) == (3, None, None)
+
+    def test_format_status(self):
+        progress = Progress(ConsoleAdapter(file=io.StringIO()), is_tty=True)
+        snapshot = ProgressSnapshot(
+            n_commits=250,
+            total=1000,
+            elapsed_s=2.0,
+            commits_per_s=125.0,
+            n_git_processes=3,
+            eta_s=72.5,
+        )
+        assert progress._format_status(snapshot) == (
+            "Computing... 250/1000 commits (25%), 125.0 commits/s, 3 git processes,"
+            " ETA 1:12"
+        )
+        assert progress._format_status(snapshot._replace(total=None, eta_s=None)) == (
+            "Computing... 250 commits, 125.0 commits/s, 3 git processes"
+        )
+
+    def test_count(self, tmp_path):
+        commits = (
+            GitRepoCommit("john@gmail.com", "2020-02-10", {"a.txt": "a\n"}),
+            GitRepoCommit("mary@gmail.com", "2020-02-11", {"a.txt": "a\nb\n"}),
+            GitRepoCommit("john@gmail.com", "2020-02-12", {"b.txt": "b\n"}),
+        )
+        output = io.StringIO()
+        progress = Progress(ConsoleAdapter(file=output), is_tty=False)
+        with GitRepoFactory(tmp_path, commits) as root_dir:
+            with override_settings(DO_SUPPRESS_PRINT=False):
+                loc_tot = LocCounter(root_dir).count(
+                    branch="master",
+                    author="john",
+                    strategy=STRATEGY_LOG_NUMSTAT,
+                    output_format=FORMAT_NONE,
+                    progress=progress,
+                )
+        assert loc_tot == 2
+        assert (progress.n_commits, progress.total) == (2, 2)
+        assert json.loads(output.getvalue().splitlines()[-1])["commits"] == 2
+        assert get_n_git_processes_running() == 0
@@ -0,0 +1,280 @@
+import json
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime
+
+import pytest
+
+from git_loc.domains.history_store import HistoryStore
+from git_loc.domains.server import (
+    BranchHistory,
+    InvalidQuery,
+    LocServer,
+    ServerQuery,
+    SingleFlight,
+    UnknownRepo,
+    build_http_server,
+    parse_query,
+)
+
+from ..testfactories.git_repo_factory import GitRepoCommit, GitRepoFactory
+
+
+class TestSingleFlight:
+    def test_same_key(self):
+        single_flight = SingleFlight()
+        is_running = threading.Event()
+        do_finish = threading.Event()
+        calls = list()
+
+        def fn(x):
+            calls.append(x)
+            is_running.set()
+            do_finish.wait(5)
+            return x * 2
+
+        results = list()
+        leader = threading.Thread(
+            target=lambda: results.append(single_flight.run("k", fn, 1))
+        )
+        leader.start()
+        is_running.wait(5)
+        followers = [
+            threading.Thread(
+                target=lambda: results.append(single_flight.run("k", fn, 1))
+            )
+            for _ in range(3)
+        ]
+        for thread in followers:
+            thread.start()
+        # A different key is not shared.
+        assert single_flight.run("other", lambda: "other") == "other"
+        # Wait for the followers to wait for the result of the leader.
+        condition = single_flight._in_flight["k"]._condition
+        while len(condition._waiters) < 3:
+            time.sleep(0.01)
+        do_finish.set()
+        for thread in [leader] + followers:
+            thread.join(5)
+        assert calls == [1]
+        assert results == [2, 2, 2, 2]
+        assert not single_flight._in_flight
+
+    def test_exception(self):
+        single_flight = SingleFlight()
+        with pytest.raises(ZeroDivisionError):
+            single_flight.run("k", lambda: 1 / 0)
+        # The next call runs again.
+        assert single_flight.run("k", lambda: 1) == 1
+
+
+class TestParseQuery:
+    def test_happy_flow(self):
+        query = parse_query(
+            dict(
+                branch=["master"],
+                author=["john"],
+                start_date=["2020-02-10"],
+                ignore_glob=["*.lock", "*.min.js"],
+                group_by=["author"],
+                top_files=["10"],
+            )
+        )
+        assert query == ServerQuery(
+            branch="master",
+            author="john",
+            start_date=datetime(2020, 2, 10),
+            globs_to_ignore=("*.lock", "*.min.js"),
+            group_by="author",
+            top_files=10,
+        )
+
+    @pytest.mark.parametrize(
+        "params",
+        (
+            dict(),
+            dict(branch=["master"], xxx=["1"]),
+            dict(branch=["master", "main"]),
+            dict(branch=["master"], end_date=["2020-13-01"]),
+            dict(branch=["master"], group_by=["xxx"]),
+            dict(branch=["master"], bucket=["year"]),
+            dict(branch=["master"], top_files=["0"]),
+        ),
+    )
+    def test_invalid(self, params):
+        with pytest.raises(InvalidQuery):
+            parse_query(params)
+
+
+class TestBranchHistory:
+    def test_refresh(self, tmp_path, monkeypatch):
+        commits = (
+            GitRepoCommit("john@gmail.com", "2020-02-10", {"a.txt": "a\n"}),
+            GitRepoCommit("jane@gmail.com", "2020-02-11", {"a.txt": "a\nb\n"}),
+        )
+        repo_factory = GitRepoFactory(tmp_path, commits)
+        with repo_factory as root_dir:
+            history = BranchHistory(root_dir, "master")
+            store1, tip1 = history.refresh()
+            tip2 = repo_factory.add_commit(
+                GitRepoCommit("john@gmail.com", "2020-02-12", {"c.txt": "c\n"})
+            )
+            # The old commits are not appended again one by one.
+            monkeypatch.setattr(HistoryStore, "__iter__", None)
+            store2, tip = history.refresh()
+            monkeypatch.undo()
+        assert tip == tip2
+        assert len(store1) == 2
+        # The new commits are appended after the old ones.
+        assert store2._hashes[:2] == store1._hashes
+        assert tip2.startswith(store2._hashes[2])
+        # The previous store is not changed.
+        assert list(store1._paths.strings) == ["a.txt"]
+        assert store2._insertions is not store1._insertions
+
+
+class TestLocServer:
+    def setup_method(self):
+        self.commits = (
+            GitRepoCommit("john@gmail.com", "2020-02-10", {"a.txt": "a\n"}),
+            GitRepoCommit(
+                "jane@gmail.com", "2020-02-11", {"a.txt": "a\nb\n", "b.lock": "b\n"}
+            ),
+        )
+
+    def test_happy_flow(self, tmp_path):
+        with GitRepoFactory(tmp_path, self.commits) as root_dir:
+            server = LocServer([root_dir])
+            result = server.query(ServerQuery(branch="master"))
+            ignore_result = server.query(
+                ServerQuery(
+                    branch="master", globs_to_ignore=("*.lock",), group_by="author"
+                )
+            )
+        assert result["loc"] == 3
+        assert result["dir"] == str(root_dir.resolve())
+        assert len(result["tip"]) == 40
+        assert ignore_result["loc"] == 2
+        assert ignore_result["authors"] == [
+            dict(author="jane@gmail.com", insertions=1, deletions=0, loc=1, commits=1),
+            dict(author="john@gmail.com", insertions=1, deletions=0, loc=1, commits=1),
+        ]
+
+    def test_same_as_count(self, tmp_path):
+        with GitRepoFactory(tmp_path, self.commits) as root_dir:
+            server = LocServer([root_dir])
+            result = server.query(
+                ServerQuery(
+                    branch="master",
+                    author="jane",
+                    start_date=datetime(2020, 2, 11),
+                    bucket="day",
+                    group_by="path",
+                )
+            )
+        assert result["loc"] == 2
+        assert result["buckets"] == [
+            dict(bucket="2020-02-11", insertions=2, deletions=0, loc=2, commits=1)
+        ]
+        assert [x["path"] for x in result["paths"]] == ["a.txt", "b.lock"]
+
+    def test_refresh(self, tmp_path):
+        repo_factory = GitRepoFactory(tmp_path, self.commits)
+        with repo_factory as root_dir:
+            server = LocServer([root_dir])
+            query = ServerQuery(branch="master")
+            result1 = server.query(query)
+            # The result is cached until the branch moves.
+            assert server.query(query) is result1
+            tip = repo_factory.add_commit(
+                GitRepoCommit("john@gmail.com", "2020-02-12", {"c.txt": "c\n"})
+            )
+            result2 = server.query(query)
+            # The history is rewritten.
+            repo_factory._git("reset", "-q", "--hard", "HEAD~2")
+            result3 = server.query(query)
+        assert result2["tip"] == tip
+        assert result2["loc"] == 4
+        assert result3["loc"] == 1
+        # The results on the previous tips are dropped.
+        assert list(server._results) == [
+            (query._replace(root_dir=str(root_dir.resolve())), result3["tip"])
+        ]
+
+    def test_unknown_repo(self, tmp_path):
+        with GitRepoFactory(tmp_path / "repo1", self.commits), GitRepoFactory(
+            tmp_path / "repo2", self.commits
+        ):
+            server = LocServer([tmp_path / "repo1", tmp_path / "repo2"])
+            assert (
+                server.query(ServerQuery(tmp_path / "repo2" / ".", "master"))["loc"]
+                == 3
+            )
+            with pytest.raises(UnknownRepo):
+                server.query(ServerQuery(tmp_path, "master"))
+            with pytest.raises(InvalidQuery):
+                server.query(ServerQuery(branch="master"))
+
+
+class TestHttpServer:
+    def setup_method(self):
+        self.commits = (
+            GitRepoCommit("john@gmail.com", "2020-02-10", {"a.txt": "a\n"}),
+            GitRepoCommit("john@gmail.com", "2020-02-11", {"a.txt": "a\nb\nc\n"}),
+        )
+
+    def _get(self, server, path: str) -> tuple[int, dict]:
+        url = f"http://127.0.0.1:{server.server_address[1]}{path}"
+        try:
+            with urllib.request.urlopen(url, timeout=10) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as exc:
+            return exc.code, json.loads(exc.read())
+
+    def test_happy_flow(self, tmp_path):
+        with GitRepoFactory(tmp_path, self.commits) as root_dir:
+            server = build_http_server(LocServer([root_dir]))
+            thread = threading.Thread(target=server.serve_forever)
+            thread.start()
+            try:
+                count = self._get(server, "/count?branch=master&ignore_file=x.txt")
+                health = self._get(server, "/health")
+                missing_branch = self._get(server, "/count?author=john")
+                unknown_branch = self._get(server, "/count?branch=XXX")
+                not_found = self._get(server, "/xxx")
+            finally:
+                server.shutdown()
+                server.server_close()
+                thread.join(5)
+        assert count[0] == 200
+        assert count[1]["loc"] == 3
+        assert health == (200, dict(status="ok", repos=[str(root_dir.resolve())]))
+        assert missing_branch == (400, dict(error="Missing param: branch"))
+        assert unknown_branch[0] == 400
+        assert "fatal" in unknown_branch[1]["error"]
+        assert not_found[0] == 404
+
+    def test_unix_socket(self, tmp_path):
+        socket_path = tmp_path / "git-loc.sock"
+        with GitRepoFactory(tmp_path / "repo", self.commits) as root_dir:
+            server = build_http_server(LocServer([root_dir]), socket_path=socket_path)
+            thread = threading.Thread(target=server.serve_forever)
+            thread.start()
+            try:
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+                    client.connect(str(socket_path))
+                    client.sendall(b"GET /count?branch=master HTTP/1.0\r\n\r\n")
+                    response = b""
+                    while chunk := client.recv(4096):
+                        response += chunk
+            finally:
+                server.shutdown()
+                server.server_close()
+                thread.join(5)
+        head, _, body = response.partition(b"\r\n\r\n")
+        assert head.startswith(b"HTTP/1.0 200")
+        assert json.loads(body)["loc"] == 3
+        assert not socket_path.exists()
@@ -0,0 +1,133 @@
+import csv
+import io
+import json
+
+import pytest
+
+from git_loc.domains.writers import (
+    CSV_COLUMNS,
+    REPO_CSV_COLUMNS,
+    CsvWriter,
+    JsonlWriter,
+    TableWriter,
+    UnknownFormat,
+    build_writer,
+)
+
+from ..testfactories.git_log_factory import GitLogEntry
+
+
+class TestWriters:
+    def setup_method(self):
+        self.commit = GitLogEntry(
+            hash="1111111",
+            date="2020-02-10",
+            email="john@gmail.com",
+            summary="NEW Answer model",
+        )
+
+    def _write(self, writer):
+        writer.add_file(self.commit, "src/a.py", 10, 2, False)
+        writer.add_file(self.commit, "logo.png", None, None, False)
+        writer.add_file(self.commit, "poetry.lock", None, None, True)
+        writer.write_summary(12)
+
+    def test_jsonl(self):
+        stream = io.StringIO()
+        self._write(JsonlWriter(stream))
+        records = [json.loads(x) for x in stream.getvalue().splitlines()]
+        assert records == [
+            dict(
+                type="file",
+                hash="1111111",
+                date="2020-02-10",
+                email="john@gmail.com",
+                path="src/a.py",
+                insertions=10,
+                deletions=2,
+                is_ignored=False,
+            ),
+            dict(
+                type="file",
+                hash="1111111",
+                date="2020-02-10",
+                email="john@gmail.com",
+                path="logo.png",
+                insertions=None,
+                deletions=None,
+                is_ignored=False,
+            ),
+            dict(
+                type="file",
+                hash="1111111",
+                date="2020-02-10",
+                email="john@gmail.com",
+                path="poetry.lock",
+                insertions=None,
+                deletions=None,
+                is_ignored=True,
+            ),
+            dict(type="summary", loc=12),
+        ]
+
+    def test_csv(self):
+        stream = io.StringIO()
+        self._write(CsvWriter(stream))
+        rows = list(csv.reader(io.StringIO(stream.getvalue())))
+        assert rows == [
+            list(CSV_COLUMNS),
+            ["file", "1111111", "2020-02-10", "john@gmail.com", "src/a.py"]
+            + ["10", "2", "0", ""],
+            ["file", "1111111", "2020-02-10", "john@gmail.com", "logo.png"]
+            + ["", "", "0", ""],
+            ["file", "1111111", "2020-02-10", "john@gmail.com", "poetry.lock"]
+            + ["", "", "1", ""],
+            ["summary", "", "", "", "", "", "", "", "12"],
+        ]
+
+    def _write_repos(self, writer):
+        writer.add_repo("/srv/repos/payments", "master", 12, None)
+        writer.add_repo("/srv/repos/users", "XXX", None, "GitProcessError(...)")
+        writer.write_summary(12)
+
+    def test_jsonl_repos(self):
+        stream = io.StringIO()
+        self._write_repos(JsonlWriter(stream))
+        records = [json.loads(x) for x in stream.getvalue().splitlines()]
+        assert records == [
+            dict(
+                type="repo",
+                root_dir="/srv/repos/payments",
+                branch="master",
+                loc=12,
+                error=None,
+            ),
+            dict(
+                type="repo",
+                root_dir="/srv/repos/users",
+                branch="XXX",
+                loc=None,
+                error="GitProcessError(...)",
+            ),
+            dict(type="summary", loc=12),
+        ]
+
+    def test_csv_repos(self):
+        stream = io.StringIO()
+        self._write_repos(build_writer("csv", stream, csv_columns=REPO_CSV_COLUMNS))
+        rows = list(csv.reader(io.StringIO(stream.getvalue())))
+        assert rows == [
+            list(REPO_CSV_COLUMNS),
+            ["repo", "/srv/repos/payments", "master", "", "12"],
+            ["repo", "/srv/repos/users", "XXX", "GitProcessError(...)", ""],
+            ["summary", "", "", "", "12"],
+        ]
+
+    def test_table(self):
+        writer = TableWriter()
+        self._write(writer)
+        assert writer.table.row_count == 3
+
+    def test_unknown_format(self):
+        with pytest.raises(UnknownFormat):
+            build_writer("xml")
@@ -0,0 +1,43 @@
+import subprocess
+import sys
+
+from click.testing import CliRunner
+
+from git_loc.cli import cli
+
+
+def test_import_is_lazy():
+    # The heavy deps are imported only by the sub-command that is run.
+    code = (
+        "import sys; from git_loc.cli import cli; sys.argv = ['git-loc', '--version']\n"
+        "try:\n"
+        "    cli()\n"
+        "except SystemExit:\n"
+        "    pass\n"
+        "print(sorted(x for x in ('rich', 'dynaconf', 'git_loc.views.main')"
+        " if x in sys.modules))"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], check=True, capture_output=True
+    ).stdout.decode()
+    assert output.splitlines()[-1] == "[]"
+
+
+def test_help_lists_all_commands():
+    result = CliRunner().invoke(cli, ["--help"])
+    assert result.exit_code == 0
+    for name in (
+        "cache",
+        "count",
+        "count-many",
+        "health",
+        "index",
+        "serve",
+        "settings",
+    ):
+        assert name in result.output
+
+
+def test_unknown_command():
+    result = CliRunner().invoke(cli, ["xxx"])
+    assert result.exit_code == 2
@@ -1,3 +1,4 @@
+from datetime import datetime
 from typing import Collection, Optional
 
 from git_loc.clients.git_client import GitDiffEntry, GitLogEntry
@@ -5,6 +6,62 @@ from git_loc.clients.git_client import GitDiffEntry, GitLogEntry
 from ..testutils.settings_testutils import override_settings
 
 
+def format_git_log_entry(git_log_entry: GitLogEntry) -> bytes:
+    """
+    Format a commit like `git log -z --pretty=format:<LOG_FORMAT>`. With no timestamp,
+     the commit is at noon (UTC) of its date.
+    """
+    timestamp = git_log_entry.timestamp
+    if timestamp is None:
+        timestamp = int(
+            datetime.fromisoformat(f"{git_log_entry.date}T12:00:00+00:00").timestamp()
+        )
+    fields = (
+        git_log_entry.hash,
+        str(timestamp),
+        git_log_entry.date,
+        git_log_entry.email,
+        git_log_entry.summary,
+    )
+    return b"".join(x.encode("utf-8") + b"\0" for x in fields)
+
+
+def format_git_diff_entry(git_diff_entry: GitDiffEntry) -> bytes:
+    """
+    Format a file like `git diff -z --numstat`.
+    """
+    return (
+        f"{git_diff_entry.insertions}\t{git_diff_entry.deletions}\t"
+        f"{git_diff_entry.path}\0".encode("utf-8")
+    )
+
+
+def build_printf_command(output: bytes) -> str:
+    """
+    Return a shell command that prints `output` (any byte, like NUL, as an octal
+     escape), followed by a command that ignores the args of git.
+    """
+    return f"printf '{_escape(output)}' ; /usr/bin/true"
+
+
+def build_git_log_command(output: bytes, git_log_entries: Collection[GitLogEntry]):
+    """
+    Like `build_printf_command`, but `git rev-list` prints the hashes of the commits
+     (see `GitClient.log_sharded`), and `git rev-list --count` their number (see
+     `GitClient.rev_list_count`).
+    """
+    hashes = "".join(f"{x.hash}\n" for x in git_log_entries).encode("utf-8")
+    return (
+        f'f() {{ if [ "$2" = --count ] ; then echo {len(git_log_entries)} ;'
+        f" elif [ \"$1\" = rev-list ] ; then printf '{_escape(hashes)}' ;"
+        f" else printf '{_escape(output)}' ; fi ; }} ; f"
+    )
+
+
+def _escape(output: bytes) -> str:
+    return "".join(f"\\{x:03o}" for x in output)
+
+
 # Notice that this is a context manager!
 class GitLogFactory:
     def __init__(self, git_log_entries: Optional[Collection[GitLogEntry]]):
@@ -12,15 +69,12 @@ class GitLogFactory:
         self.git_log_entries = git_log_entries
 
     def __enter__(self):
-        def_args = '/bin/echo "" ; /usr/bin/true'
-        if self.git_log_entries is not None:
-            def_args = '/bin/echo "'
-            for git_log_entry in self.git_log_entries:
-                def_args += f"'{git_log_entry.hash} {git_log_entry.date} {git_log_entry.email} {git_log_entry.summary}'\n"
-            def_args += '" ; /usr/bin/true'
-
+        # Commits are separated by a NUL.
+        output = b"\0".join(format_git_log_entry(x) for x in self.git_log_entries or ())
         self.override_settings = override_settings(
-            GIT_LOG_BIN=def_args, DO_USE_POPEN_SHELL=True, do_allow_new_settings=True
+            GIT_LOG_BIN=build_git_log_command(output, self.git_log_entries or ()),
+            DO_USE_POPEN_SHELL=True,
+            do_allow_new_settings=True,
         )
         self.override_settings.__enter__()
 
@@ -35,15 +89,46 @@ class GitDiffFactory:
         self.git_diff_entries = git_diff_entries
 
     def __enter__(self):
-        def_args = '/bin/echo "" ; /usr/bin/true'
-        if self.git_diff_entries is not None:
-            def_args = '/bin/echo "'
-            for git_diff_entry in self.git_diff_entries:
-                def_args += f"{git_diff_entry.insertions}\t{git_diff_entry.deletions}\t{git_diff_entry.path}\n"
-            def_args += '" ; /usr/bin/true'
+        output = b"".join(format_git_diff_entry(x) for x in self.git_diff_entries or ())
+        self.override_settings = override_settings(
+            GIT_DIFF_BIN=build_printf_command(output),
+            DO_USE_POPEN_SHELL=True,
+            do_allow_new_settings=True,
+        )
+        self.override_settings.__enter__()
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.override_settings.__exit__()
 
+
+# Notice that this is a context manager!
+class GitLogNumstatFactory:
+    def __init__(
+        self,
+        git_log_numstat_entries: Optional[
+            Collection[tuple[GitLogEntry, Collection[GitDiffEntry]]]
+        ],
+    ):
+        self.mocks = list()
+        self.git_log_numstat_entries = git_log_numstat_entries
+
+    def __enter__(self):
+        commits = list()
+        for git_log_entry, git_diff_entries in self.git_log_numstat_entries or ():
+            commit = format_git_log_entry(git_log_entry)
+            # The numstat starts on a new line.
+            if git_diff_entries:
+                commit += b"\n" + b"".join(
+                    format_git_diff_entry(x) for x in git_diff_entries
+                )
+            commits.append(commit)
+        # Commits are separated by a NUL.
+        output = b"\0".join(commits)
+        git_log_entries = [x for x, _ in self.git_log_numstat_entries or ()]
         self.override_settings = override_settings(
-            GIT_DIFF_BIN=def_args, DO_USE_POPEN_SHELL=True, do_allow_new_settings=True
+            GIT_LOG_BIN=build_git_log_command(output, git_log_entries),
+            DO_USE_POPEN_SHELL=True,
+            do_allow_new_settings=True,
         )
         self.override_settings.__enter__()
 
@@ -0,0 +1,63 @@
+import os
+import subprocess
+from collections import namedtuple
+from pathlib import Path
+from typing import Collection, Optional
+
+# A commit to create: `files` maps a path to its new content, or to None to delete it.
+GitRepoCommit = namedtuple("GitRepoCommit", ("email", "date", "files"))
+
+
+# Notice that this is a context manager!
+class GitRepoFactory:
+    def __init__(self, root_dir: Path, commits: Collection[GitRepoCommit]):
+        """
+        Create a real Git repo in `root_dir` (typically pytest's `tmp_path`) with the
+         given commits, in the branch master.
+        """
+        self.root_dir = Path(root_dir)
+        self.commits = commits
+
+    def __enter__(self) -> Path:
+        self.root_dir.mkdir(parents=True, exist_ok=True)
+        self._git("init", "-q", "-b", "master")
+        for commit in self.commits:
+            self.add_commit(commit)
+        return self.root_dir
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        pass
+
+    def add_commit(self, commit: GitRepoCommit) -> str:
+        for path, content in commit.files.items():
+            file_path = self.root_dir / path
+            if content is None:
+                self._git("rm", "-q", path)
+                continue
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            if isinstance(content, bytes):
+                file_path.write_bytes(content)
+            else:
+                file_path.write_text(content)
+            self._git("add", path)
+        env = dict(
+            GIT_AUTHOR_NAME=commit.email.split("@")[0],
+            GIT_AUTHOR_EMAIL=commit.email,
+            GIT_AUTHOR_DATE=f"{commit.date}T12:00:00+0000",
+            GIT_COMMITTER_NAME=commit.email.split("@")[0],
+            GIT_COMMITTER_EMAIL=commit.email,
+            GIT_COMMITTER_DATE=f"{commit.date}T12:00:00+0000",
+        )
+        self._git(
+            "commit", "-q", "--allow-empty", "-m", f"Commit {commit.date}", env=env
+        )
+        return self._git("rev-parse", "HEAD").strip()
+
+    def _git(self, *args, env: Optional[dict] = None) -> str:
+        return subprocess.run(
+            ("git",) + args,
+            cwd=self.root_dir,
+            env={**os.environ, **(env or dict())},
+            check=True,
+            capture_output=True,
+        ).stdout.decode("utf-8")
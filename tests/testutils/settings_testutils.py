@@ -1,6 +1,6 @@
 from contextlib import ContextDecorator
 
-from git_loc.conf import settings
+from git_loc.conf import reset_settings, settings
 
 
 class override_settings(ContextDecorator):
@@ -38,8 +38,11 @@ class override_settings(ContextDecorator):
             if not self.do_allow_new_settings and key not in settings:
                 continue
             settings.set(key, value)
+        # `GitClient`, `ConsoleAdapter`... read the snapshot of the settings.
+        reset_settings()
 
     def __exit__(self, *exc):
         # To reset settings: https://github.com/rochacbruno/dynaconf/issues/441
         settings.reload()
         settings.validators.validate()
+        reset_settings()
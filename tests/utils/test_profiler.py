@@ -0,0 +1,72 @@
+import io
+import json
+import time
+
+from git_loc.utils.profiler import NULL_PROFILER, Profiler, dump_report
+
+
+class TestProfiler:
+    def test_nested_stages(self):
+        with Profiler(do_trace_memory=False) as profiler:
+            with profiler.stage("outer"):
+                time.sleep(0.02)
+                with profiler.stage("inner"):
+                    time.sleep(0.1)
+        report = profiler.report()
+        stages = {x.name: x for x in report.stages}
+        # The time of a stage excludes its nested stages.
+        assert 0.02 <= stages["outer"].wall_s < 0.1
+        assert stages["inner"].wall_s >= 0.1
+        assert report.wall_s >= 0.12
+        assert [x.name for x in report.stages] == ["inner", "outer"]
+
+    def test_iter_stage(self):
+        def producer():
+            for i in range(3):
+                time.sleep(0.01)
+                yield i
+
+        profiler = Profiler(do_trace_memory=False)
+        items = list()
+        for item in profiler.iter_stage("produce", producer()):
+            # The time of the consumer is not in the stage.
+            time.sleep(0.05)
+            items.append(item)
+        (stage,) = profiler.report().stages
+        assert items == [0, 1, 2]
+        assert stage.n_calls == 4
+        assert 0.03 <= stage.wall_s < 0.15
+
+    def test_git_processes(self):
+        profiler = Profiler(do_trace_memory=False)
+        for i in range(1, 21):
+            profiler.add_git_process(i / 100, 10)
+        profiler.add_git_bytes_read(5)
+        report = profiler.report()
+        assert report.n_git_processes == 20
+        assert report.git_latency_p50_s == 0.1
+        assert report.git_latency_p95_s == 0.19
+        assert report.git_latency_max_s == 0.2
+        assert report.git_bytes_read == 205
+
+    def test_trace_memory(self):
+        with Profiler() as profiler:
+            data = bytearray(1024 * 1024)
+        del data
+        assert profiler.report().tracemalloc_peak_bytes >= 1024 * 1024
+
+    def test_dump_report(self):
+        with Profiler(do_trace_memory=False) as profiler:
+            with profiler.stage("x"):
+                pass
+        stream = io.StringIO()
+        dump_report(profiler.report(), stream)
+        data = json.loads(stream.getvalue())
+        assert data["stages"][0]["name"] == "x"
+        assert data["n_git_processes"] == 0
+
+    def test_null_profiler(self):
+        with NULL_PROFILER.stage("x"):
+            pass
+        assert list(NULL_PROFILER.iter_stage("x", [1, 2])) == [1, 2]
+        assert NULL_PROFILER.report().stages == []
@@ -0,0 +1,125 @@
+import json
+
+from git_loc.utils.printer import remove_ansi_chars
+from git_loc.views.batch import _count_many
+
+from ..testfactories.git_repo_factory import GitRepoCommit, GitRepoFactory
+from ..testutils.settings_testutils import override_settings
+
+
+class TestCli:
+    def setup_method(self):
+        self.commits = (
+            GitRepoCommit("john@gmail.com", "2020-02-10", {"a.txt": "a\n"}),
+            GitRepoCommit("john@gmail.com", "2020-02-11", {"a.txt": "a\nb\nc\n"}),
+        )
+
+    @override_settings(DO_SUPPRESS_PRINT=False)
+    def test_happy_flow(self, cli_runner, tmp_path):
+        with GitRepoFactory(tmp_path / "repo1", self.commits), GitRepoFactory(
+            tmp_path / "repo2", self.commits
+        ):
+            manifest_path = tmp_path / "manifest.toml"
+            manifest_path.write_text(
+                "[defaults]\n"
+                'branch = "master"\n'
+                "[[repos]]\n"
+                f'root_dir = "{tmp_path / "repo1"}"\n'
+                "[[repos]]\n"
+                f'root_dir = "{tmp_path / "repo2"}"\n'
+            )
+            result = cli_runner.invoke(_count_many, [f"--manifest={manifest_path}"])
+
+        assert result.exit_code == 0
+        stdout = remove_ansi_chars(result.stdout).strip().split("\n")
+        assert stdout[-1] == "LOC: 4"
+
+    @override_settings(DO_SUPPRESS_PRINT=False)
+    def test_failed_repo(self, cli_runner, tmp_path):
+        with GitRepoFactory(tmp_path / "repo1", self.commits):
+            manifest_path = tmp_path / "manifest.toml"
+            manifest_path.write_text(
+                "[defaults]\n"
+                'branch = "master"\n'
+                "[[repos]]\n"
+                f'root_dir = "{tmp_path / "repo1"}"\n'
+                "[[repos]]\n"
+                f'root_dir = "{tmp_path / "repo1"}"\n'
+                'branch = "XXX"\n'
+            )
+            result = cli_runner.invoke(_count_many, [f"--manifest={manifest_path}"])
+
+        assert result.exit_code == 1
+        stdout = remove_ansi_chars(result.stdout).strip().split("\n")
+        assert stdout[-2] == "Failed repos: 1"
+        assert stdout[-1] == "LOC: 2"
+
+    def _write_manifest(self, tmp_path) -> str:
+        manifest_path = tmp_path / "manifest.toml"
+        manifest_path.write_text(
+            "[defaults]\n"
+            'branch = "master"\n'
+            "[[repos]]\n"
+            f'root_dir = "{tmp_path / "repo1"}"\n'
+            "[[repos]]\n"
+            f'root_dir = "{tmp_path / "repo1"}"\n'
+            'branch = "XXX"\n'
+        )
+        return str(manifest_path)
+
+    @override_settings(DO_SUPPRESS_PRINT=False)
+    def test_format_jsonl(self, cli_runner, tmp_path):
+        with GitRepoFactory(tmp_path / "repo1", self.commits):
+            result = cli_runner.invoke(
+                _count_many,
+                [f"--manifest={self._write_manifest(tmp_path)}", "--format=jsonl"],
+            )
+
+        assert result.exit_code == 1
+        # The messages go to stderr, the records to stdout.
+        records = [json.loads(x) for x in result.stdout.splitlines()]
+        assert [(x["type"], x["branch"], x["loc"]) for x in records[:2]] == [
+            ("repo", "master", 2),
+            ("repo", "XXX", None),
+        ]
+        assert records[1]["error"]
+        assert records[2] == dict(type="summary", loc=2)
+        assert "LOC: 2" in remove_ansi_chars(result.stderr)
+
+    @override_settings(DO_SUPPRESS_PRINT=False)
+    def test_format_csv_output(self, cli_runner, tmp_path):
+        output_path = tmp_path / "repos.csv"
+        with GitRepoFactory(tmp_path / "repo1", self.commits):
+            result = cli_runner.invoke(
+                _count_many,
+                [
+                    f"--manifest={self._write_manifest(tmp_path)}",
+                    "--format=csv",
+                    f"--output={output_path}",
+                ],
+            )
+
+        assert result.exit_code == 1
+        lines = output_path.read_text().splitlines()
+        assert lines[0] == "type,root_dir,branch,error,loc"
+        assert lines[1] == f"repo,{tmp_path / 'repo1'},master,,2"
+        assert lines[-1] == "summary,,,,2"
+        stdout = remove_ansi_chars(result.stdout).strip().split("\n")
+        assert stdout[-1] == "LOC: 2"
+
+    def test_output_requires_format(self, cli_runner, tmp_path):
+        result = cli_runner.invoke(
+            _count_many,
+            [
+                f"--manifest={self._write_manifest(tmp_path)}",
+                f"--output={tmp_path / 'repos.csv'}",
+            ],
+        )
+        assert result.exit_code == 2
+
+    def test_invalid_manifest(self, cli_runner, tmp_path):
+        manifest_path = tmp_path / "manifest.toml"
+        manifest_path.write_text("XXX")
+        result = cli_runner.invoke(_count_many, [f"--manifest={manifest_path}"])
+        assert result.exit_code == 2
+        assert "Invalid TOML" in result.stderr
@@ -0,0 +1,32 @@
+from git_loc.utils.printer import remove_ansi_chars
+from git_loc.views.bench import _bench
+
+from ..testutils.settings_testutils import override_settings
+
+
+class TestCli:
+    @override_settings(DO_SUPPRESS_PRINT=False)
+    def test_happy_flow(self, cli_runner, tmp_path):
+        output_path = tmp_path / "results.json"
+        result = cli_runner.invoke(
+            _bench,
+            ["--commits=10", "--repeat=1", "--config=diff", f"--output={output_path}"],
+        )
+        assert result.exit_code == 0
+        stdout = remove_ansi_chars(result.stdout)
+        assert "│ diff " in stdout
+        assert output_path.exists()
+
+        result = cli_runner.invoke(
+            _bench,
+            ["--commits=10", "--repeat=1", "--config=diff", f"--compare={output_path}"],
+        )
+        assert result.exit_code == 0
+        assert "│ x" in remove_ansi_chars(result.stdout)
+
+    def test_invalid_compare(self, cli_runner, tmp_path):
+        baseline_path = tmp_path / "results.json"
+        baseline_path.write_text("xxx")
+        result = cli_runner.invoke(_bench, [f"--compare={baseline_path}"])
+        assert result.exit_code == 2
+        assert "Not a bench results file" in result.stderr
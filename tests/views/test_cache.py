@@ -0,0 +1,38 @@
+from git_loc.clients.diff_cache import DiffCache
+from git_loc.clients.git_client import GitDiffEntry
+from git_loc.utils.printer import remove_ansi_chars
+from git_loc.views.cache import _cache
+
+from ..testutils.settings_testutils import override_settings
+
+
+class TestCli:
+    def setup_method(self):
+        self.git_diff_entry1 = GitDiffEntry(
+            insertions="10",
+            deletions="2",
+            path="/tmp1",
+        )
+
+    def test_stats(self, cli_runner, tmp_path):
+        with override_settings(CACHE_DIR=str(tmp_path), DO_SUPPRESS_PRINT=False):
+            cache = DiffCache("/tmp")
+            cache.set("1" * 40, "diff", [self.git_diff_entry1])
+            cache.close()
+            result = cli_runner.invoke(_cache, ["stats"])
+
+        assert result.exit_code == 0
+        stdout = remove_ansi_chars(result.stdout)
+        assert "/tmp " in stdout
+        assert " 1 " in stdout
+
+    def test_clear(self, cli_runner, tmp_path):
+        with override_settings(CACHE_DIR=str(tmp_path), DO_SUPPRESS_PRINT=False):
+            cache = DiffCache("/tmp")
+            cache.set("1" * 40, "diff", [self.git_diff_entry1])
+            cache.close()
+            result = cli_runner.invoke(_cache, ["clear", "--dir=/tmp"])
+
+        assert result.exit_code == 0
+        stdout = remove_ansi_chars(result.stdout).strip().split("\n")
+        assert stdout[-1] == "Deleted caches: 1"
@@ -0,0 +1,96 @@
+import pytest
+
+from git_loc.utils.printer import remove_ansi_chars
+from git_loc.views.index import _index
+from git_loc.views.main import _count
+
+from ..testfactories.git_repo_factory import GitRepoCommit, GitRepoFactory
+from ..testutils.settings_testutils import override_settings
+
+
+class TestCli:
+    def setup_method(self):
+        self.commits = (
+            GitRepoCommit("john@gmail.com", "2020-02-10", {"a.txt": "a\n"}),
+            GitRepoCommit("mary@gmail.com", "2020-02-11", {"a.txt": "a\nb\nc\n"}),
+        )
+
+    def test_happy_flow(self, cli_runner, tmp_path):
+        with GitRepoFactory(tmp_path / "repo", self.commits) as root_dir:
+            with override_settings(
+                CACHE_DIR=str(tmp_path / "cache"), DO_SUPPRESS_PRINT=False
+            ):
+                index_result = cli_runner.invoke(
+                    _index, [f"--dir={root_dir}", "--branch=master"]
+                )
+                count_result = cli_runner.invoke(
+                    _count,
+                    [
+                        f"--dir={root_dir}",
+                        "--branch=master",
+                        "--author=mary",
+                        "--from-index",
+                    ],
+                )
+
+        assert index_result.exit_code == 0
+        stdout = remove_ansi_chars(index_result.stdout)
+        assert " master " in stdout
+        assert "Index file:" in stdout
+        assert count_result.exit_code == 0
+        stdout = remove_ansi_chars(count_result.stdout).strip().split("\n")
+        assert stdout[-1] == "LOC: 2"
+
+    def test_not_indexed(self, cli_runner, tmp_path):
+        with GitRepoFactory(tmp_path / "repo", self.commits) as root_dir:
+            with override_settings(CACHE_DIR=str(tmp_path / "cache")):
+                result = cli_runner.invoke(
+                    _count, [f"--dir={root_dir}", "--branch=master", "--from-index"]
+                )
+
+        assert result.exit_code == 2
+
+    @pytest.mark.parametrize(
+        "option",
+        (
+            "--path=a.txt",
+            "--exclude-path=a.txt",
+            "--strategy=log-numstat",
+            "--jobs=2",
+            "--no-cache",
+            "--incremental",
+            "--progress",
+            "--profile",
+        ),
+    )
+    def test_unsupported_option(self, cli_runner, tmp_path, option):
+        with GitRepoFactory(tmp_path / "repo", self.commits) as root_dir:
+            with override_settings(CACHE_DIR=str(tmp_path / "cache")):
+                cli_runner.invoke(_index, [f"--dir={root_dir}", "--branch=master"])
+                result = cli_runner.invoke(
+                    _count,
+                    [f"--dir={root_dir}", "--branch=master", "--from-index", option],
+                )
+        assert result.exit_code == 2
+
+    def test_engine(self, cli_runner, tmp_path):
+        pytest.importorskip("numpy")
+        with GitRepoFactory(tmp_path / "repo", self.commits) as root_dir:
+            with override_settings(
+                CACHE_DIR=str(tmp_path / "cache"), DO_SUPPRESS_PRINT=False
+            ):
+                cli_runner.invoke(_index, [f"--dir={root_dir}", "--branch=master"])
+                result = cli_runner.invoke(
+                    _count,
+                    [
+                        f"--dir={root_dir}",
+                        "--branch=master",
+                        "--from-index",
+                        "--engine=numpy",
+                        "--group-by=author",
+                    ],
+                )
+        # The engine counts the commits loaded from the index.
+        assert result.exit_code == 0
+        stdout = remove_ansi_chars(result.stdout).strip().split("\n")
+        assert stdout[-1] == "LOC: 3"
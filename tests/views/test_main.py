@@ -1,3 +1,4 @@
+import json
 from datetime import datetime
 
 import pytest
@@ -12,7 +13,9 @@ from ..testfactories.git_log_factory import (
     GitDiffFactory,
     GitLogEntry,
     GitLogFactory,
+    GitLogNumstatFactory,
 )
+from ..testfactories.git_repo_factory import GitRepoCommit, GitRepoFactory
 from ..testutils.settings_testutils import override_settings
 
 
@@ -251,6 +254,341 @@ class TestCli:
         stdout = remove_ansi_chars(result.stdout).strip().split("\n")
         assert stdout[-1] == "LOC: 26"
 
+    @override_settings(DO_SUPPRESS_PRINT=False)
+    def test_strategy_log_numstat(self, cli_runner):
+        with GitLogNumstatFactory(
+            ((self.git_log_entry1, (self.git_diff_entry1, self.git_diff_entry2)),)
+        ):
+            result = cli_runner.invoke(
+                _count,
+                [
+                    "--dir=/tmp",
+                    "--branch=master",
+                    f"--start-date={self.start_date}",
+                    f"--end-date={self.end_date}",
+                    "--author=john",
+                    "--ignore-file=package-lock.json",
+                    "--strategy=log-numstat",
+                ],
+            )
+
+        assert result.exit_code == 0
+        stdout = remove_ansi_chars(result.stdout).strip().split("\n")
+        assert stdout[-1] == "LOC: 26"
+
+    @override_settings(DO_SUPPRESS_PRINT=False)
+    def test_ignore_glob_and_from(self, cli_runner, tmp_path):
+        git_diff_entry3 = GitDiffEntry(
+            insertions="1",
+            deletions="9",
+            path="frontend/yarn.lock",
+        )
+        ignore_file_path = tmp_path / ".locignore"
+        ignore_file_path.write_text("tmp2\n")
+        with GitLogFactory((self.git_log_entry1,)), GitDiffFactory(
+            (self.git_diff_entry1, self.git_diff_entry2, git_diff_entry3)
+        ):
+            result = cli_runner.invoke(
+                _count,
+                [
+                    "--dir=/tmp",
+                    "--branch=master",
+                    f"--start-date={self.start_date}",
+                    f"--end-date={self.end_date}",
+                    "--author=john",
+                    "--ignore-file=package-lock.json",
+                    "--ignore-glob=*.lock",
+                    f"--ignore-from={ignore_file_path}",
+                ],
+            )
+
+        assert result.exit_code == 0
+        stdout = remove_ansi_chars(result.stdout).strip().split("\n")
+        assert stdout[-1] == "LOC: 12"
+
+    @override_settings(DO_SUPPRESS_PRINT=False)
+    def test_paths(self, cli_runner, tmp_path):
+        commits = (
+            GitRepoCommit(
+                "john@gmail.com",
+                "2020-02-10",
+                {"src/a.py": "a\nb\n", "src/b.lock": "b\n", "docs/c.md": "c\n"},
+            ),
+        )
+        with GitRepoFactory(tmp_path, commits) as root_dir:
+            result = cli_runner.invoke(
+                _count,
+                [
+                    f"--dir={root_dir}",
+                    "--branch=master",
+                    "--path=src",
+                    "--exclude-path=*.lock",
+                    "--strategy=log-numstat",
+                ],
+            )
+
+        assert result.exit_code == 0
+        stdout = remove_ansi_chars(result.stdout).strip().split("\n")
+        assert "Paths: ('src',)" in stdout
+        assert "Excluded paths: ('*.lock',)" in stdout
+        assert stdout[-1] == "LOC: 2"
+
+    @override_settings(DO_SUPPRESS_PRINT=False)
+    def test_group_by_author(self, cli_runner):
+        git_log_entry2 = GitLogEntry(
+            hash="2222222",
+            date="2020-02-11",
+            email="jane@gmail.com",
+            summary="NEW Answer model",
+        )
+        with GitLogFactory((self.git_log_entry1, git_log_entry2)), GitDiffFactory(
+            (self.git_diff_entry1, self.git_diff_entry2)
+        ):
+            result = cli_runner.invoke(
+                _count,
+                [
+                    "--dir=/tmp",
+                    "--branch=master",
+                    "--group-by=author",
+                    "--author-alias=jane@gmail.com=jane@work.com",
+                ],
+            )
+
+        assert result.exit_code == 0
+        stdout = remove_ansi_chars(result.stdout)
+        assert "│ jane@work.com  │ 1       │ 21         │ 5         │ 26  │" in stdout
+        assert "│ john@gmail.com │ 1       │ 21         │ 5         │ 26  │" in stdout
+        assert "Start date: None" in stdout
+        assert stdout.strip().split("\n")[-1] == "LOC: 52"
+
+    @override_settings(DO_SUPPRESS_PRINT=False)
+    def test_engine_numpy(self, cli_runner):
+        pytest.importorskip("numpy")
+        git_log_entry2 = GitLogEntry(
+            hash="2222222",
+            date="2020-02-11",
+            email="jane@gmail.com",
+            summary="NEW Answer model",
+        )
+        with GitLogFactory((self.git_log_entry1, git_log_entry2)), GitDiffFactory(
+            (self.git_diff_entry1, self.git_diff_entry2)
+        ):
+            result = cli_runner.invoke(
+                _count,
+                [
+                    "--dir=/tmp",
+                    "--branch=master",
+                    "--group-by=author",
+                    "--engine=numpy",
+                ],
+            )
+
+        assert result.exit_code == 0
+        stdout = remove_ansi_chars(result.stdout)
+        assert "│ jane@gmail.com │ 1       │ 21         │ 5         │ 26  │" in stdout
+        assert "│ john@gmail.com │ 1       │ 21         │ 5         │ 26  │" in stdout
+        assert stdout.strip().split("\n")[-1] == "LOC: 52"
+
+    @override_settings(DO_SUPPRESS_PRINT=False)
+    def test_bucket_output(self, cli_runner, tmp_path):
+        git_log_entry2 = GitLogEntry(
+            hash="2222222",
+            date="2020-03-11",
+            email="jane@gmail.com",
+            summary="NEW Answer model",
+        )
+        bucket_output_path = tmp_path / "buckets.jsonl"
+        with GitLogFactory((self.git_log_entry1, git_log_entry2)), GitDiffFactory(
+            (self.git_diff_entry1, self.git_diff_entry2)
+        ):
+            result = cli_runner.invoke(
+                _count,
+                [
+                    "--dir=/tmp",
+                    "--branch=master",
+                    "--bucket=month",
+                    f"--bucket-output={bucket_output_path}",
+                ],
+            )
+
+        assert result.exit_code == 0
+        records = [json.loads(x) for x in bucket_output_path.read_text().splitlines()]
+        assert records == [
+            dict(bucket="2020-02", insertions=21, deletions=5, loc=26, commits=1),
+            dict(bucket="2020-03", insertions=21, deletions=5, loc=26, commits=1),
+        ]
+        stdout = remove_ansi_chars(result.stdout)
+        assert stdout.strip().split("\n")[-1] == "LOC: 52"
+
+    @override_settings(DO_SUPPRESS_PRINT=False)
+    def test_group_by_path(self, cli_runner):
+        with GitLogFactory((self.git_log_entry1,)), GitDiffFactory(
+            (self.git_diff_entry1, self.git_diff_entry2)
+        ):
+            result = cli_runner.invoke(
+                _count,
+                [
+                    "--dir=/tmp",
+                    "--branch=master",
+                    "--group-by=path",
+                    "--top-files=1",
+                ],
+            )
+
+        assert result.exit_code == 0
+        stdout = remove_ansi_chars(result.stdout)
+        assert "Top 1 files" in stdout
+        assert "│ /tmp2     │ 1       │ 11         │ 3         │ 14  │" in stdout
+        assert "/tmp1" not in stdout
+        assert stdout.strip().split("\n")[-1] == "LOC: 26"
+
+    @override_settings(DO_SUPPRESS_PRINT=False)
+    def test_format_jsonl(self, cli_runner):
+        with GitLogFactory((self.git_log_entry1,)), GitDiffFactory(
+            (self.git_diff_entry1, self.git_diff_entry2)
+        ):
+            result = cli_runner.invoke(
+                _count,
+                [
+                    "--dir=/tmp",
+                    "--branch=master",
+                    "--ignore-file=tmp2",
+                    "--format=jsonl",
+                ],
+            )
+
+        assert result.exit_code == 0
+        # Only the records go to stdout, the messages go to stderr.
+        records = [json.loads(x) for x in result.stdout.splitlines()]
+        assert [(x["type"], x.get("path"), x.get("is_ignored")) for x in records] == [
+            ("file", "/tmp1", False),
+            ("file", "/tmp2", True),
+            ("summary", None, None),
+        ]
+        assert records[-1]["loc"] == 12
+        assert remove_ansi_chars(result.stderr).strip().split("\n")[-1] == "LOC: 12"
+
+    @override_settings(DO_SUPPRESS_PRINT=False)
+    def test_format_csv_output(self, cli_runner, tmp_path):
+        output_path = tmp_path / "files.csv"
+        with GitLogFactory((self.git_log_entry1,)), GitDiffFactory(
+            (self.git_diff_entry1, self.git_diff_entry2)
+        ):
+            result = cli_runner.invoke(
+                _count,
+                [
+                    "--dir=/tmp",
+                    "--branch=master",
+                    "--format=csv",
+                    f"--output={output_path}",
+                ],
+            )
+
+        assert result.exit_code == 0
+        lines = output_path.read_text().splitlines()
+        assert lines[0].startswith("type,hash,")
+        assert len(lines) == 4
+        assert lines[-1] == "summary,,,,,,,,26"
+        stdout = remove_ansi_chars(result.stdout)
+        assert stdout.strip().split("\n")[-1] == "LOC: 26"
+
+    def test_output_without_streaming_format(self, cli_runner, tmp_path):
+        result = cli_runner.invoke(
+            _count,
+            ["--dir=/tmp", "--branch=master", f"--output={tmp_path / 'x.csv'}"],
+        )
+        assert result.exit_code == 2
+
+    def test_unknown_branch(self, cli_runner, tmp_path):
+        commits = (GitRepoCommit("john@gmail.com", "2020-02-10", {"a.txt": "a\n"}),)
+        with GitRepoFactory(tmp_path, commits) as root_dir:
+            result = cli_runner.invoke(
+                _count, [f"--dir={root_dir}", "--branch=XXX", "--no-cache"]
+            )
+
+        # The error of git, with no traceback.
+        assert result.exit_code == 1
+        assert "Git process exited with 128" in result.stderr
+        assert "XXX" in result.stderr
+        assert "Traceback" not in result.output
+
+    @pytest.mark.parametrize(
+        "options, message",
+        (
+            (["--group-by=author"], "not supported with --group-by"),
+            (["--bucket=week"], "not supported with --bucket"),
+            (
+                ["--group-by=path", "--bucket=day"],
+                "not supported with --group-by, --bucket",
+            ),
+        ),
+    )
+    def test_incremental_with_aggregators(self, cli_runner, options, message):
+        result = cli_runner.invoke(
+            _count, ["--dir=/tmp", "--branch=master", "--incremental", *options]
+        )
+        assert result.exit_code == 2
+        assert message in result.stderr
+
+    @override_settings(DO_SUPPRESS_PRINT=False)
+    def test_profile(self, cli_runner):
+        with GitLogFactory((self.git_log_entry1,)), GitDiffFactory(
+            (self.git_diff_entry1, self.git_diff_entry2)
+        ):
+            result = cli_runner.invoke(
+                _count, ["--dir=/tmp", "--branch=master", "--profile", "--no-cache"]
+            )
+
+        assert result.exit_code == 0
+        stdout = remove_ansi_chars(result.stdout)
+        assert "Profile" in stdout
+        assert "│ git diff " in stdout
+        assert "Git processes: 2" in stdout
+
+    @override_settings(DO_SUPPRESS_PRINT=False)
+    def test_progress(self, cli_runner):
+        with GitLogFactory((self.git_log_entry1,)), GitDiffFactory(
+            (self.git_diff_entry1, self.git_diff_entry2)
+        ):
+            result = cli_runner.invoke(
+                _count, ["--dir=/tmp", "--branch=master", "--progress"]
+            )
+
+        assert result.exit_code == 0
+        # Not a TTY: a JSON line on stderr.
+        line = json.loads(result.stderr.strip().split("\n")[-1])
+        assert line["type"] == "progress"
+        assert (line["commits"], line["total"]) == (1, 1)
+        assert remove_ansi_chars(result.stdout).strip().split("\n")[-1] == "LOC: 26"
+
+    def test_profile_output(self, cli_runner, tmp_path):
+        profile_path = tmp_path / "profile.json"
+        with GitLogFactory((self.git_log_entry1,)), GitDiffFactory(
+            (self.git_diff_entry1, self.git_diff_entry2)
+        ):
+            result = cli_runner.invoke(
+                _count,
+                [
+                    "--dir=/tmp",
+                    "--branch=master",
+                    "--no-cache",
+                    "--profile",
+                    f"--profile-output={profile_path}",
+                ],
+            )
+
+        assert result.exit_code == 0
+        profile = json.loads(profile_path.read_text())
+        assert profile["n_git_processes"] == 2
+        assert {x["name"] for x in profile["stages"]} >= {"git log", "git diff"}
+
+    def test_profile_output_without_profile(self, cli_runner, tmp_path):
+        result = cli_runner.invoke(
+            _count,
+            ["--dir=/tmp", "--branch=master", f"--profile-output={tmp_path / 'x'}"],
+        )
+        assert result.exit_code == 2
+
     @override_settings(DO_SUPPRESS_PRINT=False)
     def test_all_missing(self, cli_runner):
         with GitLogFactory((self.git_log_entry1,)), GitDiffFactory(